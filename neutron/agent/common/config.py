@@ -27,6 +27,13 @@ LOG = logging.getLogger(__name__)
 ROOT_HELPER_OPTS = [
     cfg.StrOpt('root_helper', default='sudo',
                help=_('Root helper application.')),
+    cfg.StrOpt('root_helper_daemon',
+               help=_('Root helper daemon application to use instead of '
+                      'root_helper for commands that do not need a custom '
+                      'environment. The daemon is started once and kept '
+                      'running, e.g. "sudo neutron-rootwrap-daemon '
+                      '/etc/neutron/rootwrap.conf". Requires oslo.rootwrap '
+                      '1.5.0 or later.')),
 ]
 
 AGENT_STATE_OPTS = [
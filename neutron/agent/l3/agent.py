@@ -14,9 +14,11 @@
 #
 
 import sys
+import time
 
 import eventlet
 eventlet.monkey_patch()
+import eventlet.queue
 
 import netaddr
 import os
@@ -36,6 +38,7 @@ from neutron.agent.linux import interface
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import iptables_manager
 from neutron.agent.linux import ra
+from neutron.agent.linux import utils as linux_utils
 from neutron.agent import rpc as agent_rpc
 from neutron.common import config as common_config
 from neutron.common import constants as l3_constants
@@ -47,6 +50,7 @@ from neutron.common import utils as common_utils
 from neutron import context as n_context
 from neutron.i18n import _LE, _LI, _LW
 from neutron import manager
+from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
 from neutron.openstack.common import periodic_task
@@ -77,6 +81,17 @@ FIP_PR_START = 32768
 FIP_PR_END = FIP_PR_START + 40000
 RPC_LOOP_INTERVAL = 1
 FLOATING_IP_CIDR_SUFFIX = '/32'
+# Number of router chunks fetched concurrently during a full sync
+SYNC_ROUTERS_MAX_CONCURRENT_CHUNKS = 4
+# Number of deferred router helpers (metadata proxy, radvd) run concurrently
+DEFERRED_HELPER_WORKERS = 2
+METADATA_PROXY_PER_ROUTER = 'per_router'
+METADATA_PROXY_SHARED = 'shared'
+# uuid of the process manager of the shared metadata proxy
+SHARED_METADATA_PROXY_ID = 'shared-metadata-proxy'
+# The start of the shared metadata proxy is checked every interval
+SHARED_METADATA_PROXY_START_CHECKS = 50
+SHARED_METADATA_PROXY_START_INTERVAL = 0.1
 
 
 class L3PluginApi(object):
@@ -90,6 +105,7 @@ class L3PluginApi(object):
               - get_agent_gateway_port
               Needed by the agent when operating in DVR/DVR_SNAT mode
         1.3 - Get the list of activated services
+        1.5 - Get the ids of the routers hosted by the agent
 
     """
 
@@ -104,6 +120,11 @@ class L3PluginApi(object):
         return cctxt.call(context, 'sync_routers', host=self.host,
                           router_ids=router_ids)
 
+    def get_router_ids(self, context):
+        """Make a remote process call to retrieve the hosted router ids."""
+        cctxt = self.client.prepare(version='1.5')
+        return cctxt.call(context, 'get_router_ids', host=self.host)
+
     def get_external_network_id(self, context):
         """Make a remote process call to retrieve the external network id.
 
@@ -194,12 +215,41 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                           "by the agents.")),
         cfg.BoolOpt('enable_metadata_proxy', default=True,
                     help=_("Allow running metadata proxy.")),
+        cfg.StrOpt('metadata_proxy_mode', default=METADATA_PROXY_PER_ROUTER,
+                   choices=[METADATA_PROXY_PER_ROUTER, METADATA_PROXY_SHARED],
+                   help=_("Run a metadata proxy process per router, or a "
+                          "single metadata proxy process listening in the "
+                          "namespaces of all the routers of the agent.  "
+                          "In shared mode the proxy of a HA router listens "
+                          "whatever the state of the router, instead of "
+                          "being started and stopped by keepalived.")),
         cfg.BoolOpt('router_delete_namespaces', default=False,
                     help=_("Delete namespace after removing a router.")),
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
                           'socket')),
+        cfg.IntOpt('router_processing_workers', default=8,
+                   help=_("Number of green threads processing router "
+                          "updates concurrently, at least 1.")),
+        cfg.IntOpt('router_update_aging_interval',
+                   default=queue.DEFAULT_AGING_INTERVAL,
+                   help=_("Seconds a router update from the periodic resync "
+                          "may wait before it takes precedence over newer "
+                          "updates triggered by RPC notifications. This "
+                          "keeps a large resync from delaying user "
+                          "requests while still bounding its delay.")),
+        cfg.IntOpt('sync_routers_chunk_size', default=256,
+                   help=_("Maximum number of routers fetched in a single "
+                          "RPC call during a full resync. Set to 0 to fetch "
+                          "all routers in one call.")),
+        cfg.BoolOpt('prioritize_forwarding_on_startup', default=False,
+                    help=_("Restore forwarding as fast as possible for the "
+                           "routers found when the agent starts: their "
+                           "namespaces are created in bulk and the metadata "
+                           "proxies and radvd daemons are started in the "
+                           "background until all of them have been "
+                           "processed once.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -268,7 +318,27 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             FIP_LL_SUBNET)
         self.fip_priorities = set(range(FIP_PR_START, FIP_PR_END))
 
-        self._queue = queue.RouterProcessingQueue()
+        self._queue = queue.RouterProcessingQueue(
+            self.conf.router_update_aging_interval)
+
+        # Startup state.  The routers fetched by the sync tasks are tracked
+        # in _startup_routers until they have been processed once.  Startup
+        # is over when this is the case for all the routers of the first
+        # successful full sync.
+        self._start_time = time.time()
+        self._starting = True
+        # Whether a router found at startup has been processed yet, the
+        # time to the first one is logged at info level
+        self._forwarding_started = False
+        self._startup_synced = False
+        self._startup_routers = set()
+        self._precreated_namespaces = set()
+        # Helper calls deferred to the background lane, keyed by
+        # (router_id, helper name).  A key stays in the dict while its call
+        # is pending or running so that calls for the same key keep their
+        # order.
+        self._deferred_helpers = {}
+        self._deferred_helper_keys = eventlet.queue.LightQueue()
         super(L3NATAgent, self).__init__(conf=self.conf)
 
         self.target_ex_net_id = None
@@ -299,6 +369,21 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             LOG.error(msg)
             raise SystemExit(1)
 
+        if self.conf.router_processing_workers < 1:
+            msg = _LE('router_processing_workers must be at least 1.')
+            LOG.error(msg)
+            raise SystemExit(1)
+
+        if self.conf.router_update_aging_interval < 0:
+            msg = _LE('router_update_aging_interval must not be negative.')
+            LOG.error(msg)
+            raise SystemExit(1)
+
+        if self.conf.sync_routers_chunk_size < 0:
+            msg = _LE('sync_routers_chunk_size must not be negative.')
+            LOG.error(msg)
+            raise SystemExit(1)
+
     def _list_namespaces(self):
         """Get a set of all router namespaces on host
 
@@ -391,10 +476,14 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         self.agent_gateway_port = None
 
     def _destroy_router_namespace(self, ns):
+        self._precreated_namespaces.discard(ns)
         router_id = self.get_router_id(ns)
-        ra.disable_ipv6_ra(router_id, ns, self.root_helper)
+        self._run_router_helper(router_id, 'radvd', ra.disable_ipv6_ra,
+                                router_id, ns, self.root_helper)
         if self.conf.enable_metadata_proxy:
-            self._destroy_metadata_proxy(router_id, ns)
+            self._run_router_helper(router_id, 'metadata-proxy',
+                                    self._destroy_metadata_proxy,
+                                    router_id, ns)
         ns_ip = ip_lib.IPWrapper(self.root_helper, namespace=ns)
         for d in ns_ip.get_devices(exclude_loopback=True):
             if d.name.startswith(INTERNAL_DEV_PREFIX):
@@ -421,8 +510,90 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                                       'net.ipv6.conf.all.forwarding=1'])
 
     def _create_router_namespace(self, ri):
+        if ri.ns_name in self._precreated_namespaces:
+            self._precreated_namespaces.discard(ri.ns_name)
+            return
         self._create_namespace(ri.ns_name)
 
+    def _precreate_router_namespaces(self, router_ids):
+        """Creates the namespaces of routers about to be added in bulk
+
+        Namespaces are created concurrently ahead of the processing of their
+        router.  A namespace which cannot be created is left to the
+        processing of its router.
+        """
+        def _precreate(ns_name):
+            try:
+                self._create_namespace(ns_name)
+            except Exception:
+                LOG.exception(_LE("Failed to create namespace %s"), ns_name)
+                return
+            self._precreated_namespaces.add(ns_name)
+
+        pool = eventlet.GreenPool(self.conf.router_processing_workers)
+        for router_id in router_ids:
+            if router_id not in self.router_info:
+                pool.spawn_n(_precreate, self.get_ns_name(router_id))
+        pool.waitall()
+
+    def _prioritize_forwarding(self):
+        return self._starting and self.conf.prioritize_forwarding_on_startup
+
+    def _run_router_helper(self, router_id, name, func, *args):
+        """Runs func to manage a helper process of a router
+
+        While the agent is starting the call is deferred to the background
+        lane, as helpers are not needed to forward traffic.  Calls for a
+        helper with a deferred call are deferred too so that they are run
+        in order.
+        """
+        key = (router_id, name)
+        if (not self._prioritize_forwarding() and
+                key not in self._deferred_helpers):
+            func(*args)
+            return
+        if key not in self._deferred_helpers:
+            self._deferred_helper_keys.put(key)
+        self._deferred_helpers[key] = (func, args)
+
+    def _run_deferred_helper(self, key):
+        while True:
+            call = self._deferred_helpers[key]
+            func, args = call
+            try:
+                func(*args)
+            except Exception:
+                LOG.exception(_LE("Failed to run %(helper)s for router "
+                                  "%(router)s"),
+                              {'helper': key[1], 'router': key[0]})
+            # Run again if a newer call was deferred meanwhile
+            if self._deferred_helpers[key] is call:
+                del self._deferred_helpers[key]
+                return
+
+    def _process_deferred_helpers_loop(self):
+        LOG.debug("Starting _process_deferred_helpers_loop")
+        pool = eventlet.GreenPool(size=DEFERRED_HELPER_WORKERS)
+        while True:
+            key = self._deferred_helper_keys.get()
+            pool.spawn_n(self._run_deferred_helper, key)
+
+    def _startup_router_done(self, router_id):
+        if self._starting:
+            self._startup_routers.discard(router_id)
+            self._check_startup_done()
+
+    def _check_startup_done(self):
+        if not self._startup_synced or self._startup_routers:
+            return
+        self._starting = False
+        LOG.info(_LI("%(count)d routers processed %(elapsed).3f seconds "
+                     "after agent start, %(deferred)d router helpers "
+                     "pending"),
+                 {'count': len(self.router_info),
+                  'elapsed': time.time() - self._start_time,
+                  'deferred': len(self._deferred_helpers)})
+
     def _fetch_external_net_id(self, force=False):
         """Find UUID of single external network for this agent."""
         if self.conf.gateway_external_network_id:
@@ -473,14 +644,28 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             self.process_ha_router_added(ri)
 
         if self.conf.enable_metadata_proxy:
-            if ri.is_ha:
+            # The shared proxy also listens in the namespace of a backup HA
+            # router, which gets no metadata requests until it becomes
+            # master, so it needs no keepalived notifiers.
+            if (ri.is_ha and
+                    self.conf.metadata_proxy_mode != METADATA_PROXY_SHARED):
                 self._add_keepalived_notifiers(ri)
             else:
-                self._spawn_metadata_proxy(ri.router_id, ri.ns_name)
+                self._run_router_helper(ri.router_id, 'metadata-proxy',
+                                        self._spawn_metadata_proxy,
+                                        ri.router_id, ri.ns_name)
 
     def _router_removed(self, router_id):
         ri = self.router_info.get(router_id)
         if ri is None:
+            ns = self.get_ns_name(router_id)
+            if ns in self._precreated_namespaces:
+                # The router was removed before being processed, its
+                # namespace is still empty
+                self._precreated_namespaces.discard(ns)
+                if self.conf.router_delete_namespaces:
+                    self._delete_namespace(
+                        ip_lib.IPWrapper(self.root_helper, namespace=ns), ns)
             LOG.warn(_LW("Info for router %s were not found. "
                          "Skipping router removal"), router_id)
             return
@@ -524,12 +709,73 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             self.root_helper,
             ns_name)
 
+    def _get_shared_metadata_proxy_routers_dir(self):
+        return os.path.join(self.conf.state_path, 'metadata-proxy-routers')
+
+    def _get_shared_metadata_proxy_callback(self):
+
+        def callback(pid_file):
+            metadata_proxy_socket = self.conf.metadata_proxy_socket
+            routers_dir = self._get_shared_metadata_proxy_routers_dir()
+            proxy_cmd = ['neutron-ns-metadata-proxy',
+                         '--pid_file=%s' % pid_file,
+                         '--metadata_proxy_socket=%s' % metadata_proxy_socket,
+                         '--routers_dir=%s' % routers_dir,
+                         '--state_path=%s' % self.conf.state_path,
+                         '--metadata_port=%s' % self.conf.metadata_port]
+            proxy_cmd.extend(config.get_log_args(
+                self.conf, 'neutron-ns-metadata-proxy-%s.log' %
+                SHARED_METADATA_PROXY_ID))
+            return proxy_cmd
+
+        return callback
+
+    @lockutils.synchronized(SHARED_METADATA_PROXY_ID)
+    def _update_shared_metadata_proxy(self, router_id, ns_name=None):
+        """Adds or removes a router from the shared metadata proxy
+
+        The router is removed when ns_name is None.  The proxy is started
+        if needed, it notices the change of its routers by itself otherwise.
+        Updates are serialized, so that the proxy is started only once.
+        """
+        routers_dir = self._get_shared_metadata_proxy_routers_dir()
+        router_file = os.path.join(routers_dir, router_id)
+        if ns_name is not None:
+            if not os.path.isdir(routers_dir):
+                os.makedirs(routers_dir, 0o755)
+            linux_utils.replace_file(router_file, ns_name)
+        elif os.path.exists(router_file):
+            os.unlink(router_file)
+        else:
+            return
+        pm = self._get_metadata_proxy_process_manager(
+            SHARED_METADATA_PROXY_ID, None)
+        if pm.active:
+            return
+        pm.enable(self._get_shared_metadata_proxy_callback())
+        # The pid file is written once the proxy daemonized, until then the
+        # proxy would not be seen as active by the next update
+        for i in range(SHARED_METADATA_PROXY_START_CHECKS):
+            if pm.active:
+                return
+            eventlet.sleep(SHARED_METADATA_PROXY_START_INTERVAL)
+        LOG.warn(_LW("The shared metadata proxy did not start within "
+                     "%s seconds"),
+                 SHARED_METADATA_PROXY_START_CHECKS *
+                 SHARED_METADATA_PROXY_START_INTERVAL)
+
     def _spawn_metadata_proxy(self, router_id, ns_name):
+        if self.conf.metadata_proxy_mode == METADATA_PROXY_SHARED:
+            self._update_shared_metadata_proxy(router_id, ns_name or '')
+            return
         callback = self._get_metadata_proxy_callback(router_id)
         pm = self._get_metadata_proxy_process_manager(router_id, ns_name)
         pm.enable(callback)
 
     def _destroy_metadata_proxy(self, router_id, ns_name):
+        # Routers are removed from the shared proxy whatever the mode, so
+        # that switching modes does not leave them served twice.
+        self._update_shared_metadata_proxy(router_id)
         pm = self._get_metadata_proxy_process_manager(router_id, ns_name)
         pm.disable()
 
@@ -598,11 +844,13 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
 
         # Enable RA
         if new_ipv6_port or old_ipv6_port:
-            ra.enable_ipv6_ra(ri.router_id,
-                              ri.ns_name,
-                              internal_ports,
-                              self.get_internal_device_name,
-                              self.root_helper)
+            self._run_router_helper(ri.router_id, 'radvd',
+                                    ra.enable_ipv6_ra,
+                                    ri.router_id,
+                                    ri.ns_name,
+                                    internal_ports,
+                                    self.get_internal_device_name,
+                                    self.root_helper)
 
         existing_devices = self._get_existing_devices(ri)
         current_internal_devs = set([n for n in existing_devices
@@ -638,6 +886,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
 
             self._set_subnet_info(ex_gw_port)
             if not ri.ex_gw_port:
+                ri.reset_floating_ip_state()
                 self.external_gateway_added(ri, ex_gw_port, interface_name)
             elif not _gateway_ports_equal(ex_gw_port, ri.ex_gw_port):
                 self.external_gateway_updated(ri, ex_gw_port, interface_name)
@@ -677,6 +926,8 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                 ri, ex_gw_port)
         except Exception:
             # TODO(salv-orlando): Less broad catching
+            # What was applied is unknown, start from scratch next time
+            ri.reset_floating_ip_state()
             # All floating IPs must be put in error state
             for fip in ri.router.get(l3_constants.FLOATINGIP_KEY, []):
                 fip_statuses[fip['id']] = l3_constants.FLOATINGIP_STATUS_ERROR
@@ -781,20 +1032,28 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
     def process_router_floating_ip_nat_rules(self, ri):
         """Configure NAT rules for the router's floating IPs.
 
-        Configures iptables rules for the floating ips of the given router
+        Configures iptables rules for the floating ips of the given router.
+        Only the rules of floating IPs added, removed or remapped since the
+        last call are changed.
         """
-        # Clear out all iptables rules for floating ips
-        ri.iptables_manager.ipv4['nat'].clear_rules_by_tag('floating_ip')
-
-        floating_ips = self.get_floating_ips(ri)
-        # Loop once to ensure that floating ips are configured.
-        for fip in floating_ips:
-            # Rebuild iptables rules for the floating ip.
-            fixed = fip['fixed_ip_address']
-            fip_ip = fip['floating_ip_address']
-            for chain, rule in self.floating_forward_rules(fip_ip, fixed):
-                ri.iptables_manager.ipv4['nat'].add_rule(chain, rule,
-                                                         tag='floating_ip')
+        nat = ri.iptables_manager.ipv4['nat']
+        nat_map = dict((fip['floating_ip_address'], fip['fixed_ip_address'])
+                       for fip in self.get_floating_ips(ri))
+        applied_map = ri.floating_ip_nat_map
+        if applied_map is None:
+            # Clear out all iptables rules for floating ips
+            nat.clear_rules_by_tag('floating_ip')
+            applied_map = {}
+
+        for fip_ip, fixed in applied_map.iteritems():
+            if nat_map.get(fip_ip) != fixed:
+                for chain, rule in self.floating_forward_rules(fip_ip, fixed):
+                    nat.remove_rule(chain, rule)
+        for fip_ip, fixed in nat_map.iteritems():
+            if applied_map.get(fip_ip) != fixed:
+                for chain, rule in self.floating_forward_rules(fip_ip, fixed):
+                    nat.add_rule(chain, rule, tag='floating_ip')
+        ri.floating_ip_nat_map = nat_map
 
         ri.iptables_manager.apply()
 
@@ -820,7 +1079,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
 
         return self.get_external_device_name(ex_gw_port['id'])
 
-    def _add_floating_ip(self, ri, fip, interface_name, device):
+    def _add_floating_ip(self, ri, fip, interface_name, batch):
         fip_ip = fip['floating_ip_address']
         ip_cidr = str(fip_ip) + FLOATING_IP_CIDR_SUFFIX
 
@@ -828,42 +1087,41 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             self._add_vip(ri, ip_cidr, interface_name)
         else:
             net = netaddr.IPNetwork(ip_cidr)
-            try:
-                device.addr.add(net.version, ip_cidr, str(net.broadcast))
-            except RuntimeError:
-                # any exception occurred here should cause the floating IP
-                # to be set in error state
-                LOG.warn(_LW("Unable to configure IP address for "
-                             "floating IP: %s"), fip['id'])
-                return l3_constants.FLOATINGIP_STATUS_ERROR
-            if ri.router['distributed']:
-                # Special Handling for DVR - update FIP namespace
-                # and ri.namespace to handle DVR based FIP
-                self.floating_ip_added_dist(ri, fip)
-            else:
-                # As GARP is processed in a distinct thread the call below
-                # won't raise an exception to be handled.
-                self._send_gratuitous_arp_packet(
-                    ri.ns_name, interface_name, fip_ip)
+            batch.add('address', 'add', ip_cidr, 'brd', str(net.broadcast),
+                      'scope', 'global', 'dev', interface_name)
             return l3_constants.FLOATINGIP_STATUS_ACTIVE
 
-    def _remove_floating_ip(self, ri, device, ip_cidr):
+    def _floating_ip_added(self, ri, fip, interface_name):
+        if ri.router['distributed']:
+            # Special Handling for DVR - update FIP namespace
+            # and ri.namespace to handle DVR based FIP
+            self.floating_ip_added_dist(ri, fip)
+        else:
+            # As GARP is processed in a distinct thread the call below
+            # won't raise an exception to be handled.
+            self._send_gratuitous_arp_packet(
+                ri.ns_name, interface_name, fip['floating_ip_address'])
+
+    def _remove_floating_ip(self, ri, ip_cidr, interface_name, batch):
         if ri.is_ha:
             self._remove_vip(ri, ip_cidr)
         else:
-            net = netaddr.IPNetwork(ip_cidr)
-            device.addr.delete(net.version, ip_cidr)
-            self.driver.delete_conntrack_state(root_helper=self.root_helper,
-                                               namespace=ri.ns_name,
-                                               ip=ip_cidr)
-            if ri.router['distributed']:
-                self.floating_ip_removed_dist(ri, ip_cidr)
+            batch.add('address', 'del', ip_cidr, 'dev', interface_name)
+
+    def _floating_ip_removed(self, ri, ip_cidr):
+        self.driver.delete_conntrack_state(root_helper=self.root_helper,
+                                           namespace=ri.ns_name,
+                                           ip=ip_cidr)
+        if ri.router['distributed']:
+            self.floating_ip_removed_dist(ri, ip_cidr)
 
     def process_router_floating_ip_addresses(self, ri, ex_gw_port):
         """Configure IP addresses on router's external gateway interface.
 
         Ensures addresses for existing floating IPs and cleans up
-        those that should not longer be configured.
+        those that should not longer be configured.  The addresses of the
+        device are only listed when those applied last time are unknown,
+        and those to add or remove are changed with a single 'ip -batch'.
         """
 
         fip_statuses = {}
@@ -875,8 +1133,16 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
 
         device = ip_lib.IPDevice(interface_name, self.root_helper,
                                  namespace=ri.ns_name)
-        existing_cidrs = set([addr['cidr'] for addr in device.addr.list()])
+        if (ri.floating_ip_cidrs is None or
+                ri.floating_ip_device != interface_name):
+            existing_cidrs = set(addr['cidr'] for addr in device.addr.list()
+                                 if addr['cidr'].endswith(
+                                     FLOATING_IP_CIDR_SUFFIX))
+        else:
+            existing_cidrs = ri.floating_ip_cidrs
         new_cidrs = set()
+        added_fips = {}
+        batch = ip_lib.IpCommandBatch(self.root_helper, namespace=ri.ns_name)
 
         # Loop once to ensure that floating ips are configured.
         for fip in floating_ips:
@@ -886,14 +1152,43 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             fip_statuses[fip['id']] = l3_constants.FLOATINGIP_STATUS_ACTIVE
             if ip_cidr not in existing_cidrs:
                 fip_statuses[fip['id']] = self._add_floating_ip(
-                    ri, fip, interface_name, device)
-
-        fips_to_remove = (
-            ip_cidr for ip_cidr in existing_cidrs - new_cidrs if
-            ip_cidr.endswith(FLOATING_IP_CIDR_SUFFIX))
-        for ip_cidr in fips_to_remove:
-            self._remove_floating_ip(ri, device, ip_cidr)
+                    ri, fip, interface_name, batch)
+                added_fips[ip_cidr] = fip
+
+        removed_cidrs = existing_cidrs - new_cidrs
+        for ip_cidr in removed_cidrs:
+            self._remove_floating_ip(ri, ip_cidr, interface_name, batch)
+
+        failed_cidrs = set()
+        for command, error in batch.execute(check_exit_code=False):
+            # any failure here should cause the floating IP to be set in
+            # error state, or its address to be removed again next time
+            ip_cidr = command[2]
+            failed_cidrs.add(ip_cidr)
+            if ip_cidr in added_fips:
+                LOG.warn(_LW("Unable to configure IP address for "
+                             "floating IP %(fip)s: %(error)s"),
+                         {'fip': added_fips[ip_cidr]['id'], 'error': error})
+                fip_statuses[added_fips[ip_cidr]['id']] = (
+                    l3_constants.FLOATINGIP_STATUS_ERROR)
+            else:
+                LOG.warn(_LW("Unable to remove IP address %(cidr)s of "
+                             "router %(router)s: %(error)s"),
+                         {'cidr': ip_cidr, 'router': ri.router_id,
+                          'error': error})
 
+        if not ri.is_ha:
+            for ip_cidr, fip in added_fips.items():
+                if ip_cidr not in failed_cidrs:
+                    self._floating_ip_added(ri, fip, interface_name)
+            for ip_cidr in removed_cidrs - failed_cidrs:
+                self._floating_ip_removed(ri, ip_cidr)
+
+        # Addresses which failed to be added or removed are retried on the
+        # next update
+        ri.floating_ip_cidrs = ((new_cidrs - failed_cidrs) |
+                                (removed_cidrs & failed_cidrs))
+        ri.floating_ip_device = interface_name
         return fip_statuses
 
     def _get_ex_gw_port(self, ri):
@@ -1524,15 +1819,29 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                 raise n_exc.RouterNotCompatibleWithAgent(
                     router_id=router['id'])
 
-        if router['id'] not in self.router_info:
+        added = router['id'] not in self.router_info
+        if added:
             self._router_added(router['id'], router)
         ri = self.router_info[router['id']]
         ri.router = router
         self.process_router(ri)
+        if added and self._starting:
+            log = LOG.debug
+            if not self._forwarding_started:
+                self._forwarding_started = True
+                log = LOG.info
+            log(_LI("Router %(router)s forwarding %(elapsed).3f seconds "
+                    "after agent start"),
+                {'router': router['id'],
+                 'elapsed': time.time() - self._start_time})
 
     def _process_router_update(self):
         for rp, update in self._queue.each_update_to_next_router():
-            LOG.debug("Starting router update for %s", update.id)
+            LOG.debug("Starting router update for %(router)s, waited "
+                      "%(wait).3f seconds, queue depth %(depths)s",
+                      {'router': update.id, 'wait': update.wait_time or 0,
+                       'depths': self._queue.depths()})
+            start = time.time()
             router = update.router
             if update.action != queue.DELETE_ROUTER and not router:
                 try:
@@ -1550,6 +1859,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
 
             if not router:
                 self._router_removed(update.id)
+                self._startup_router_done(update.id)
                 continue
 
             try:
@@ -1561,12 +1871,16 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                     LOG.error(_LE("Removing incompatible router '%s'"),
                               router['id'])
                     self._router_removed(router['id'])
-            LOG.debug("Finished a router update for %s", update.id)
+            finally:
+                self._startup_router_done(update.id)
+            LOG.debug("Finished a router update for %(router)s in "
+                      "%(elapsed).3f seconds",
+                      {'router': update.id, 'elapsed': time.time() - start})
             rp.fetched_and_processed(update.timestamp)
 
     def _process_routers_loop(self):
         LOG.debug("Starting _process_routers_loop")
-        pool = eventlet.GreenPool(size=8)
+        pool = eventlet.GreenPool(size=self.conf.router_processing_workers)
         while True:
             pool.spawn_n(self._process_router_update)
 
@@ -1593,26 +1907,22 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
 
         try:
             if self.conf.use_namespaces:
-                routers = self.plugin_rpc.get_routers(context)
+                curr_router_ids = self._fetch_and_queue_routers(context,
+                                                                timestamp)
             else:
-                routers = self.plugin_rpc.get_routers(context,
-                                                      [self.conf.router_id])
+                curr_router_ids = self._queue_sync_routers(
+                    context, [self.conf.router_id], timestamp)
 
         except messaging.MessagingException:
             LOG.exception(_LE("Failed synchronizing routers due to RPC error"))
         else:
-            LOG.debug('Processing :%r', routers)
-            for r in routers:
-                update = queue.RouterUpdate(r['id'],
-                                            queue.PRIORITY_SYNC_ROUTERS_TASK,
-                                            router=r,
-                                            timestamp=timestamp)
-                self._queue.add(update)
             self.fullsync = False
             LOG.debug("periodic_sync_routers_task successfully completed")
+            if self._starting:
+                self._startup_synced = True
+                self._check_startup_done()
 
             # Resync is not necessary for the cleanup of stale namespaces
-            curr_router_ids = set([r['id'] for r in routers])
 
             # Two kinds of stale routers:  Routers for which info is cached in
             # self.router_info and the others.  First, handle the former.
@@ -1629,16 +1939,75 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                 ids_to_keep = curr_router_ids | prev_router_ids
                 self._cleanup_namespaces(namespaces, ids_to_keep)
 
+    def _queue_sync_routers(self, context, router_ids, timestamp):
+        """Fetches routers from the plugin and queues them for processing
+
+        Returns the set of ids of the routers that were returned.
+        """
+        routers = self.plugin_rpc.get_routers(context, router_ids)
+        LOG.debug('Processing :%r', routers)
+        if self._starting:
+            self._startup_routers.update(r['id'] for r in routers)
+            if self.conf.use_namespaces and self._prioritize_forwarding():
+                self._precreate_router_namespaces(r['id'] for r in routers)
+        for r in routers:
+            update = queue.RouterUpdate(r['id'],
+                                        queue.PRIORITY_SYNC_ROUTERS_TASK,
+                                        router=r,
+                                        timestamp=timestamp)
+            self._queue.add(update)
+        return set(r['id'] for r in routers)
+
+    def _fetch_and_queue_routers(self, context, timestamp):
+        """Fetches and queues all the routers hosted by this agent
+
+        The ids are fetched first and the routers themselves are then
+        fetched in chunks of at most sync_routers_chunk_size, several chunks
+        at a time.  Routers are queued as soon as their chunk arrives so
+        that processing starts before the whole sync is done.
+        """
+        chunk_size = self.conf.sync_routers_chunk_size
+        if chunk_size <= 0:
+            return self._queue_sync_routers(context, None, timestamp)
+        try:
+            router_ids = self.plugin_rpc.get_router_ids(context)
+        except messaging.UnsupportedVersion:
+            LOG.debug("Server does not support get_router_ids, fetching "
+                      "all routers at once")
+            return self._queue_sync_routers(context, None, timestamp)
+        if not router_ids:
+            return set()
+
+        pool = eventlet.GreenPool(SYNC_ROUTERS_MAX_CONCURRENT_CHUNKS)
+        threads = [pool.spawn(self._queue_sync_routers, context,
+                              router_ids[i:i + chunk_size], timestamp)
+                   for i in range(0, len(router_ids), chunk_size)]
+        curr_router_ids = set()
+        for thread in threads:
+            # wait() re-raises any exception from the chunk so that the
+            # caller leaves fullsync set.
+            curr_router_ids |= thread.wait()
+        return curr_router_ids
+
     def after_start(self):
         eventlet.spawn_n(self._process_routers_loop)
+        eventlet.spawn_n(self._process_deferred_helpers_loop)
         LOG.info(_LI("L3 agent started"))
 
-    def _update_routing_table(self, ri, operation, route):
-        cmd = ['ip', 'route', operation, 'to', route['destination'],
-               'via', route['nexthop']]
+    def _update_routing_table(self, ri, operation, route, batch=None):
+        """Changes a static route of the router
+
+        The change is queued in batch if one is given.
+        """
+        args = [operation, 'to', route['destination'],
+                'via', route['nexthop']]
+        if batch is not None:
+            batch.add('route', *args)
+            return
         ip_wrapper = ip_lib.IPWrapper(self.root_helper,
                                       namespace=ri.ns_name)
-        ip_wrapper.netns.execute(cmd, check_exit_code=False)
+        ip_wrapper.netns.execute(['ip', 'route'] + args,
+                                 check_exit_code=False)
 
     def routes_updated(self, ri):
         new_routes = ri.router['routes']
@@ -1649,6 +2018,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         old_routes = ri.routes
         adds, removes = common_utils.diff_list_of_dict(old_routes,
                                                        new_routes)
+        batch = ip_lib.IpCommandBatch(self.root_helper, namespace=ri.ns_name)
         for route in adds:
             LOG.debug("Added route entry is '%s'", route)
             # remove replaced route from deleted route
@@ -1656,10 +2026,15 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                 if route['destination'] == del_route['destination']:
                     removes.remove(del_route)
             #replace success even if there is no existing route
-            self._update_routing_table(ri, 'replace', route)
+            self._update_routing_table(ri, 'replace', route, batch)
         for route in removes:
             LOG.debug("Removed route entry is '%s'", route)
-            self._update_routing_table(ri, 'delete', route)
+            self._update_routing_table(ri, 'delete', route, batch)
+        for command, error in batch.execute(check_exit_code=False):
+            LOG.warn(_LW("Failed to update route of router %(router)s with "
+                         "'ip %(command)s': %(error)s"),
+                     {'router': ri.router_id, 'command': ' '.join(command),
+                      'error': error})
         ri.routes = new_routes
 
 
@@ -1741,6 +2116,7 @@ def _register_opts(conf):
     config.register_root_helper(conf)
     conf.register_opts(interface.OPTS)
     conf.register_opts(external_process.OPTS)
+    conf.register_opts(ip_lib.OPTS)
 
 
 def main(manager='neutron.agent.l3.agent.L3NATAgentWithStateReport'):
@@ -28,14 +28,23 @@ class RouterInfo(ha.RouterMixin):
         self.snat_ports = []
         self.floating_ips = set()
         self.floating_ips_dict = {}
+        # Floating IP state last applied to the router, so that updates only
+        # touch what changed.  None means that the state is unknown and has
+        # to be rebuilt.
+        self.floating_ip_nat_map = None
+        self.floating_ip_cidrs = None
+        self.floating_ip_device = None
         self.root_helper = root_helper
         # Invoke the setter for establishing initial SNAT action
         self.router = router
         self.ns_name = ns_name
+        # Router updates, like floating IP changes, then only rewrite the
+        # chains they changed
         self.iptables_manager = iptables_manager.IptablesManager(
             root_helper=root_helper,
             use_ipv6=use_ipv6,
-            namespace=self.ns_name)
+            namespace=self.ns_name,
+            incremental_apply=True)
         self.snat_iptables_manager = None
         self.routes = []
         # DVR Data
@@ -64,6 +73,16 @@ class RouterInfo(ha.RouterMixin):
             # Gateway port was removed, remove rules
             self._snat_action = 'remove_rules'
 
+    def reset_floating_ip_state(self):
+        """Forgets the applied floating IP state
+
+        The next update then rebuilds the floating IP NAT rules and checks
+        the addresses actually configured on the device.
+        """
+        self.floating_ip_nat_map = None
+        self.floating_ip_cidrs = None
+        self.floating_ip_device = None
+
     def perform_snat_action(self, snat_callback, *args):
         # Process SNAT rules for attached subnets
         if self._snat_action:
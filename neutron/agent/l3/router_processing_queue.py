@@ -14,8 +14,11 @@
 #
 
 import datetime
-import Queue
+import heapq
+import time
 
+import eventlet
+import eventlet.queue
 from oslo.utils import timeutils
 
 # Lower value is higher priority
@@ -23,6 +26,10 @@ PRIORITY_RPC = 0
 PRIORITY_SYNC_ROUTERS_TASK = 1
 DELETE_ROUTER = 1
 
+# Default number of seconds a sync update may wait before it is considered
+# as urgent as a freshly queued RPC update.
+DEFAULT_AGING_INTERVAL = 60
+
 
 class RouterUpdate(object):
     """Encapsulates a router update
@@ -39,6 +46,17 @@ class RouterUpdate(object):
         self.id = router_id
         self.action = action
         self.router = router
+        # Wall clock times used to report queueing metrics.  These are
+        # unrelated to timestamp, which tracks the freshness of router data.
+        self.enqueued_at = None
+        self.dequeued_at = None
+
+    @property
+    def wait_time(self):
+        """Seconds spent in the processing queue, None if not dequeued."""
+        if self.enqueued_at is None or self.dequeued_at is None:
+            return None
+        return self.dequeued_at - self.enqueued_at
 
     def __lt__(self, other):
         """Implements priority among updates
@@ -135,14 +153,78 @@ class ExclusiveRouterProcessor(object):
                     yield update
 
 
+class _LanedPriorityQueue(object):
+    """Priority queue with one lane per update priority
+
+    Each priority gets its own heap so that a large burst of low priority
+    updates, like the full resync done after an agent restart, does not
+    delay updates triggered by users.  To keep the lower priority lanes from
+    starving, each update is given a deadline: the time it was queued plus
+    aging_interval seconds for every step it is below PRIORITY_RPC.  The
+    lane whose head has the earliest deadline is served next, so an update
+    that has waited long enough is handled before fresher, higher priority
+    ones.
+
+    The lanes are only touched by green threads between two yields, so they
+    need no lock.  Waiting workers block on a queue holding one token per
+    queued update.
+    """
+    def __init__(self, aging_interval=DEFAULT_AGING_INTERVAL):
+        self._aging_interval = aging_interval
+        self._lanes = {}
+        self._tokens = eventlet.queue.LightQueue()
+
+    def qsize(self):
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def put(self, update):
+        update.enqueued_at = time.time()
+        heapq.heappush(self._lanes.setdefault(update.priority, []), update)
+        self._tokens.put(None)
+
+    def _deadline(self, update):
+        return (update.enqueued_at +
+                self._aging_interval * (update.priority - PRIORITY_RPC))
+
+    def _pop(self):
+        lane = min((lane for lane in self._lanes.values() if lane),
+                   key=lambda lane: (self._deadline(lane[0]), lane[0]))
+        update = heapq.heappop(lane)
+        update.dequeued_at = time.time()
+        return update
+
+    def get(self):
+        """Waits for an update and removes it from its lane"""
+        self._tokens.get()
+        return self._pop()
+
+    def get_nowait(self):
+        """Removes the next update, raises eventlet.queue.Empty if none"""
+        self._tokens.get_nowait()
+        return self._pop()
+
+    def depths(self):
+        """Returns the number of queued updates keyed by priority"""
+        return dict((priority, len(lane))
+                    for priority, lane in self._lanes.items())
+
+
 class RouterProcessingQueue(object):
     """Manager of the queue of routers to process."""
-    def __init__(self):
-        self._queue = Queue.PriorityQueue()
+    def __init__(self, aging_interval=DEFAULT_AGING_INTERVAL):
+        self._queue = _LanedPriorityQueue(aging_interval)
 
     def add(self, update):
         self._queue.put(update)
 
+    def qsize(self):
+        """Returns the total number of updates waiting to be processed"""
+        return self._queue.qsize()
+
+    def depths(self):
+        """Returns the number of waiting updates keyed by priority"""
+        return self._queue.depths()
+
     def each_update_to_next_router(self):
         """Grabs the next router from the queue and processes
 
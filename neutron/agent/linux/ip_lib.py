@@ -14,10 +14,13 @@
 #    under the License.
 
 import os
+import re
+import socket
 
 import netaddr
 from oslo.config import cfg
 
+from neutron.agent.linux import netlink
 from neutron.agent.linux import utils
 from neutron.common import exceptions
 
@@ -26,6 +29,16 @@ OPTS = [
     cfg.BoolOpt('ip_lib_force_root',
                 default=False,
                 help=_('Force ip_lib calls to use the root helper')),
+    cfg.StrOpt('ip_lib_backend',
+               default='iproute2',
+               choices=['iproute2', 'netlink'],
+               help=_("Backend used by ip_lib to query links, addresses "
+                      "and routes. 'netlink' reads them directly from the "
+                      "kernel instead of running the ip command. When the "
+                      "agent does not run as root, the sockets used in "
+                      "other namespaces are opened by a helper started "
+                      "once through the root helper. Changes always use "
+                      "the ip command.")),
 ]
 
 
@@ -35,6 +48,10 @@ LOOPBACK_DEVNAME = 'lo'
 VLAN_INTERFACE_DETAIL = ['vlan protocol 802.1q',
                          'vlan protocol 802.1Q',
                          'vlan id']
+# Printed by 'ip -batch' to stderr after the errors of a failed command
+BATCH_FAILURE_RE = re.compile(r'^Command failed (?:-|\S+):(\d+)$')
+# Objects which may be changed with an 'ip -batch' call
+BATCH_OBJECTS = ('address', 'link', 'neighbour', 'route', 'rule')
 
 
 class SubProcessBase(object):
@@ -49,6 +66,16 @@ class SubProcessBase(object):
             # Only callers that need to force use of the root helper
             # need to register the option.
             self.force_root = False
+        try:
+            self.backend = cfg.CONF.ip_lib_backend
+        except cfg.NoSuchOptError:
+            self.backend = 'iproute2'
+
+    def _use_netlink(self):
+        """Returns whether queries can be answered by the netlink backend"""
+        if self.backend != 'netlink' or self.force_root:
+            return False
+        return netlink.can_dump(self.namespace, self.root_helper)
 
     def _run(self, options, command, args):
         if self.namespace:
@@ -104,6 +131,18 @@ class IPWrapper(SubProcessBase):
         return IPDevice(name, self.root_helper, self.namespace)
 
     def get_devices(self, exclude_loopback=False):
+        if self._use_netlink():
+            try:
+                return [IPDevice(link['name'], self.root_helper,
+                                 self.namespace)
+                        for link in netlink.get_links(self.namespace,
+                                                      self.root_helper)
+                        if not (exclude_loopback and
+                                link['name'] == LOOPBACK_DEVNAME)]
+            except netlink.SocketHelperError:
+                # Fall back to the ip command
+                pass
+
         retval = []
         output = self._execute(['o', 'd'], 'link', ('list',),
                                self.root_helper, self.namespace)
@@ -252,6 +291,21 @@ class IpDeviceCommandBase(IpCommandBase):
     def name(self):
         return self._parent.name
 
+    def _use_netlink(self):
+        return self._parent._use_netlink()
+
+    def _get_netlink_link(self):
+        """Returns the netlink attributes of the device
+
+        Raises RuntimeError if the device does not exist, like the failed
+        ip command would.
+        """
+        for link in netlink.get_links(self._parent.namespace,
+                                      self._parent.root_helper):
+            if link['name'] == self.name:
+                return link
+        raise RuntimeError(_('Device "%s" does not exist.') % self.name)
+
 
 class IpLinkCommand(IpDeviceCommandBase):
     COMMAND = 'link'
@@ -308,6 +362,14 @@ class IpLinkCommand(IpDeviceCommandBase):
 
     @property
     def attributes(self):
+        if self._use_netlink():
+            try:
+                return dict((key, value) for key, value in
+                            self._get_netlink_link().items()
+                            if key not in ('index', 'name'))
+            except netlink.SocketHelperError:
+                # Fall back to the ip command
+                pass
         return self._parse_line(self._run('show', self.name, options='o'))
 
     def _parse_line(self, value):
@@ -348,6 +410,13 @@ class IpAddrCommand(IpDeviceCommandBase):
         self._as_root('flush', self.name)
 
     def list(self, scope=None, to=None, filters=None):
+        if self._use_netlink() and set(filters or []) <= set(['permanent']):
+            try:
+                return self._list_netlink(scope, to, filters)
+            except netlink.SocketHelperError:
+                # Fall back to the ip command
+                pass
+
         if filters is None:
             filters = []
 
@@ -386,6 +455,26 @@ class IpAddrCommand(IpDeviceCommandBase):
                                dynamic=('dynamic' == parts[-1])))
         return retval
 
+    def _list_netlink(self, scope=None, to=None, filters=None):
+        index = self._get_netlink_link()['index']
+        if to:
+            to = netaddr.IPNetwork(to)
+        retval = []
+        for address in netlink.get_addresses(self._parent.namespace,
+                                             self._parent.root_helper):
+            if address['index'] != index:
+                continue
+            if scope and address['scope'] != scope:
+                continue
+            if filters and not address['permanent']:
+                continue
+            if to and netaddr.IPNetwork(address['cidr']).ip not in to:
+                continue
+            retval.append(dict((key, address[key]) for key in
+                               ('cidr', 'broadcast', 'scope', 'ip_version',
+                                'dynamic')))
+        return retval
+
 
 class IpRouteCommand(IpDeviceCommandBase):
     COMMAND = 'route'
@@ -425,6 +514,13 @@ class IpRouteCommand(IpDeviceCommandBase):
         self._as_root('del', cidr, 'dev', self.name, 'scope', 'link')
 
     def get_gateway(self, scope=None, filters=None):
+        if self._use_netlink() and not filters:
+            try:
+                return self._get_gateway_netlink(scope)
+            except netlink.SocketHelperError:
+                # Fall back to the ip command
+                pass
+
         if filters is None:
             filters = []
 
@@ -448,6 +544,23 @@ class IpRouteCommand(IpDeviceCommandBase):
 
         return retval
 
+    def _get_gateway_netlink(self, scope=None):
+        index = self._get_netlink_link()['index']
+        for route in netlink.get_routes(self._parent.namespace,
+                                        self._parent.root_helper):
+            # Like 'ip route list', only consider the IPv4 main table.
+            if (route['family'] != socket.AF_INET or
+                    route['table'] != netlink.RT_TABLE_MAIN or
+                    route['dst_len'] or route.get('oif') != index or
+                    'gateway' not in route):
+                continue
+            if scope and route['scope'] != scope:
+                continue
+            retval = dict(gateway=route['gateway'])
+            if 'metric' in route:
+                retval.update(metric=route['metric'])
+            return retval
+
     def pullup_route(self, interface_name):
         """Ensures that the route entry for the interface is before all
         others on the same subnet.
@@ -562,6 +675,99 @@ class IpNetnsCommand(IpCommandBase):
         return False
 
 
+class IpCommandBatch(object):
+    """Runs several ip commands with a single 'ip -batch' call
+
+    Running a command in a namespace costs a fork of the root helper and
+    entering the namespace.  Commands added to a batch are instead fed to a
+    single 'ip -force -batch -', which goes on after a failed command and
+    reports its line, so errors are still attributed to their command.
+
+    The batch is run as root and inside the namespace with 'ip netns exec',
+    which does not restrict the commands it reads.  Only commands changing
+    one of BATCH_OBJECTS are accepted and their arguments must be single
+    words, so that a value coming from the API can not add a line running
+    'ip netns exec' with arbitrary programs.
+    """
+
+    def __init__(self, root_helper=None, namespace=None):
+        self.root_helper = root_helper
+        self.namespace = namespace
+        self._commands = []
+
+    def __len__(self):
+        return len(self._commands)
+
+    def add(self, command, *args):
+        """Queues 'ip <command> <args>'
+
+        Raises ValueError if command is not one of BATCH_OBJECTS or if an
+        argument is empty or contains whitespace.
+        """
+        if command not in BATCH_OBJECTS:
+            raise ValueError(_("Command 'ip %s' can not be batched") %
+                             command)
+        args = [str(arg) for arg in args]
+        for arg in args:
+            if arg.split() != [arg]:
+                raise ValueError(_("Invalid argument %(arg)r for batched "
+                                   "command 'ip %(command)s'") %
+                                 {'arg': arg, 'command': command})
+        self._commands.append([command] + args)
+
+    def execute(self, check_exit_code=True):
+        """Runs the queued commands and empties the batch
+
+        Returns a list of (command, error) tuples, one for each command that
+        failed.  If check_exit_code is True, a RuntimeError describing the
+        failures is raised instead.  A RuntimeError is always raised when ip
+        fails without reporting which commands failed, e.g. when the
+        namespace does not exist.
+        """
+        commands, self._commands = self._commands, []
+        if not commands:
+            return []
+        cmd = ['ip', '-force', '-batch', '-']
+        if self.namespace:
+            cmd = ['ip', 'netns', 'exec', self.namespace] + cmd
+        stdout, stderr, returncode = utils.execute(
+            cmd, root_helper=self.root_helper,
+            process_input='\n'.join(' '.join(c) for c in commands) + '\n',
+            check_exit_code=False, return_stderr=True,
+            log_fail_as_error=False, return_code=True)
+
+        failures = []
+        errors = []
+        for line in stderr.splitlines():
+            line = line.strip()
+            match = BATCH_FAILURE_RE.match(line)
+            if match:
+                command = commands[int(match.group(1)) - 1]
+                failures.append((command, '\n'.join(errors)))
+                errors = []
+            elif line:
+                errors.append(line)
+        if errors and failures:
+            # Errors printed after the last failed command belong to it
+            command, error = failures[-1]
+            failures[-1] = (command, '\n'.join([error] + errors).strip())
+        if returncode and not failures:
+            # The batch itself could not run, e.g. a missing namespace
+            raise RuntimeError(
+                _('Failed to run ip -batch in namespace %(namespace)s, exit '
+                  'code %(code)s: %(error)s')
+                % {'namespace': self.namespace, 'code': returncode,
+                   'error': '\n'.join(errors)})
+
+        if failures and check_exit_code:
+            raise RuntimeError(
+                _('Failed to run in namespace %(namespace)s:\n%(failures)s')
+                % {'namespace': self.namespace,
+                   'failures': '\n'.join('ip %s: %s' % (' '.join(c), e)
+                                         for c, e in failures)})
+        return failures
+
+
 def device_exists(device_name, root_helper=None, namespace=None):
     """Return True if the device exists in the namespace."""
     try:
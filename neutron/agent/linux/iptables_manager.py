@@ -280,11 +280,18 @@ class IptablesManager(object):
     wrapped in the same was as the built-in filter chains. Additionally,
     there's a snat chain that is applied after the POSTROUTING chain.
 
+    With incremental_apply, the rules applied last are remembered and an
+    apply only rewrites the wrapped chains whose rules changed since, with
+    a single iptables-restore --noflush.  The counters of the rules of the
+    rewritten chains are reset, so this is not meant for managers whose
+    counters are read.  Any other change, like adding or removing a chain,
+    is applied as usual.
+
     """
 
     def __init__(self, _execute=None, state_less=False,
                  root_helper=None, use_ipv6=False, namespace=None,
-                 binary_name=binary_name):
+                 binary_name=binary_name, incremental_apply=False):
         if _execute:
             self.execute = _execute
         else:
@@ -296,6 +303,10 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        self.incremental_apply = incremental_apply
+        # Chains and rules last applied, keyed by command, or None when
+        # they are unknown
+        self._applied_state = None
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -406,48 +417,132 @@ class IptablesManager(object):
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
+        applied_state, self._applied_state = self._applied_state, None
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, root_helper=self.root_helper)
-            all_lines = all_tables.split('\n')
-            # Traverse tables in sorted order for predictable dump output
-            for table_name in sorted(tables):
-                table = tables[table_name]
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            try:
-                self.execute(args, process_input='\n'.join(all_lines),
-                             root_helper=self.root_helper)
-            except RuntimeError as r_error:
-                with excutils.save_and_reraise_exception():
-                    try:
-                        line_no = int(re.search(
-                            'iptables-restore: line ([0-9]+?) failed',
-                            str(r_error)).group(1))
-                        context = IPTABLES_ERROR_LINES_OF_CONTEXT
-                        log_start = max(0, line_no - context)
-                        log_end = line_no + context
-                    except AttributeError:
-                        # line error wasn't found, print all lines instead
-                        log_start = 0
-                        log_end = len(all_lines)
-                    log_lines = ('%7d. %s' % (idx, l)
-                                 for idx, l in enumerate(
-                                     all_lines[log_start:log_end],
-                                     log_start + 1)
-                                 )
-                    LOG.error(_LE("IPTablesManager.apply failed to apply the "
-                                  "following set of iptables rules:\n%s"),
-                              '\n'.join(log_lines))
+            lines = None
+            if applied_state:
+                lines = self._get_incremental_lines(
+                    applied_state[cmd], self._get_rules_state(tables))
+            if lines is None:
+                self._apply_tables(cmd, tables)
+            elif lines:
+                self._restore(cmd, lines, ['-n'])
+
+        if self.incremental_apply:
+            state = dict((cmd, self._get_rules_state(tables))
+                         for cmd, tables in s)
+            if None not in state.values():
+                self._applied_state = state
         LOG.debug("IPTablesManager.apply completed with success")
 
+    def _apply_tables(self, cmd, tables):
+        args = ['%s-save' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        all_tables = self.execute(args, root_helper=self.root_helper)
+        all_lines = all_tables.split('\n')
+        # Traverse tables in sorted order for predictable dump output
+        for table_name in sorted(tables):
+            table = tables[table_name]
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+        self._restore(cmd, all_lines, ['-c'])
+
+    def _restore(self, cmd, all_lines, options):
+        args = ['%s-restore' % (cmd,)] + options
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            self.execute(args, process_input='\n'.join(all_lines),
+                         root_helper=self.root_helper)
+        except RuntimeError as r_error:
+            with excutils.save_and_reraise_exception():
+                try:
+                    line_no = int(re.search(
+                        'iptables-restore: line ([0-9]+?) failed',
+                        str(r_error)).group(1))
+                    context = IPTABLES_ERROR_LINES_OF_CONTEXT
+                    log_start = max(0, line_no - context)
+                    log_end = line_no + context
+                except AttributeError:
+                    # line error wasn't found, print all lines instead
+                    log_start = 0
+                    log_end = len(all_lines)
+                log_lines = ('%7d. %s' % (idx, l)
+                             for idx, l in enumerate(
+                                 all_lines[log_start:log_end],
+                                 log_start + 1)
+                             )
+                LOG.error(_LE("IPTablesManager.apply failed to apply the "
+                              "following set of iptables rules:\n%s"),
+                          '\n'.join(log_lines))
+
+    def _get_rules_state(self, tables):
+        """Returns the chains and rules of tables as a full apply sets them
+
+        None is returned when unwrapped chains or rules are to be removed,
+        which only a full apply does.
+        """
+        state = {}
+        for table_name, table in tables.items():
+            if table.remove_chains or table.remove_rules:
+                return None
+            wrapped = dict(('%s-%s' % (self.wrap_name, name), [])
+                           for name in table.chains)
+            unwrapped = []
+            # Like _modify_rules, put the top rules first and only keep the
+            # last occurrence of duplicated rules
+            rules = ([r for r in table.rules if r.top] +
+                     [r for r in table.rules if not r.top])
+            seen = set()
+            for rule in reversed(rules):
+                rule_str = str(rule).strip()
+                if rule_str in seen:
+                    continue
+                seen.add(rule_str)
+                if rule.wrap:
+                    wrapped['%s-%s' % (self.wrap_name, rule.chain)].append(
+                        rule_str)
+                else:
+                    unwrapped.append(rule_str)
+            state[table_name] = {
+                'unwrapped_chains': frozenset(table.unwrapped_chains),
+                'unwrapped_rules': unwrapped,
+                'wrapped': dict((chain, list(reversed(chain_rules)))
+                                for chain, chain_rules in wrapped.items())}
+        return state
+
+    def _get_incremental_lines(self, applied, state):
+        """Returns the iptables-restore --noflush input going to state
+
+        Only the wrapped chains whose rules changed are declared, which
+        flushes them, and filled again.  None is returned when anything else
+        changed.
+        """
+        if (state is None or applied is None or
+                sorted(applied) != sorted(state)):
+            return None
+        lines = []
+        for table_name in sorted(state):
+            old, new = applied[table_name], state[table_name]
+            if (old['unwrapped_chains'] != new['unwrapped_chains'] or
+                    old['unwrapped_rules'] != new['unwrapped_rules'] or
+                    sorted(old['wrapped']) != sorted(new['wrapped'])):
+                return None
+            changed = sorted(chain for chain, rules in new['wrapped'].items()
+                             if old['wrapped'][chain] != rules)
+            if changed:
+                lines.append('*%s' % table_name)
+                lines += [':%s - [0:0]' % chain for chain in changed]
+                for chain in changed:
+                    lines += new['wrapped'][chain]
+                lines.append('COMMIT')
+        if lines:
+            # End the last line
+            lines.append('')
+        return lines
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -690,3 +785,48 @@ class IptablesManager(object):
                 acc['bytes'] += int(data[1])
 
         return acc
+
+    def get_traffic_counters_of_chains(self, chains, wrap=True):
+        """Return the traffic counters of several chains at once.
+
+        Each table holding any of the chains is listed once in a single
+        command, instead of once per chain as get_traffic_counters does.
+        The counters are not reset, callers wanting the traffic counted
+        since a previous read keep the counters returned by that read.
+
+        Returns a dict of the sums of the counters of the rules of each
+        chain, chains which do not exist are left out.
+        """
+        names = {}
+        cmd_tables = set()
+        for chain in chains:
+            name = get_chain_name(chain, wrap)
+            if wrap:
+                name = '%s-%s' % (self.wrap_name, name)
+            names[name] = chain
+            cmd_tables.update(self._get_traffic_counters_cmd_tables(chain,
+                                                                    wrap))
+        accs = {}
+        ns_params = []
+        if self.namespace:
+            ns_params = ['ip', 'netns', 'exec', self.namespace]
+        for cmd, table in sorted(cmd_tables):
+            args = ns_params + [cmd, '-t', table, '-L', '-n', '-v', '-x']
+            current_table = self.execute(args, root_helper=self.root_helper)
+
+            acc = None
+            for line in current_table.split('\n'):
+                data = line.split()
+                if not data:
+                    acc = None
+                elif data[0] == 'Chain':
+                    name = data[1]
+                    chain = names.get(name)
+                    acc = None
+                    if chain is not None:
+                        acc = accs.setdefault(chain, {'pkts': 0, 'bytes': 0})
+                elif (acc is not None and len(data) >= 2 and
+                        data[0].isdigit() and data[1].isdigit()):
+                    acc['pkts'] += int(data[0])
+                    acc['bytes'] += int(data[1])
+        return accs
@@ -0,0 +1,478 @@
+# Copyright 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Minimal read-only rtnetlink client.
+
+This module dumps links, addresses and routes directly from the kernel so
+that ip_lib does not need to fork 'ip' and parse its output for queries.
+Only dumps are implemented: changes are still made with the 'ip' command.
+
+Dumping does not require any privilege in the namespace of the agent.
+Reading another namespace requires entering it, which is only possible when
+running as root.  Unprivileged agents get the sockets of other namespaces
+from the socket helper, a small privileged process started once through the
+root helper.  Since the kernel checks the credentials of both the opener and
+the user of a netlink socket for changes, the sockets it hands out can only
+be used for dumps.
+"""
+
+import _multiprocessing
+import contextlib
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import shlex
+import socket
+import struct
+import threading
+import time
+
+import netaddr
+
+from neutron.common import utils
+from neutron.i18n import _LW
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+NETNS_RUN_DIR = '/var/run/netns'
+SOCKET_HELPER = 'neutron-netlink-socket-helper'
+# Seconds during which a failed socket helper is not restarted
+SOCKET_HELPER_RETRY_INTERVAL = 60
+CLONE_NEWNET = 0x40000000
+
+NETLINK_ROUTE = 0
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+RTM_NEWLINK = 16
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_GETROUTE = 26
+
+IFLA_ADDRESS = 1
+IFLA_BROADCAST = 2
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_QDISC = 6
+IFLA_TXQLEN = 13
+IFLA_OPERSTATE = 16
+IFLA_LINKMODE = 17
+IFLA_IFALIAS = 20
+IFLA_GROUP = 27
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_BROADCAST = 4
+IFA_FLAGS = 8
+IFA_F_PERMANENT = 0x80
+
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_TABLE = 15
+
+RT_TABLE_MAIN = 254
+ARPHRD_ETHER = 1
+
+NLMSGHDR = struct.Struct('=IHHII')
+NLMSGERR = struct.Struct('=i')
+RTATTR = struct.Struct('=HH')
+IFINFOMSG = struct.Struct('=BxHiII')
+IFADDRMSG = struct.Struct('=BBBBI')
+RTMSG = struct.Struct('=BBBBBBBBI')
+
+# Names used by 'ip' for the values of IFLA_OPERSTATE and of the scopes.
+OPERSTATES = ['UNKNOWN', 'NOTPRESENT', 'DOWN', 'LOWERLAYERDOWN',
+              'TESTING', 'DORMANT', 'UP']
+LINKMODES = ['DEFAULT', 'DORMANT']
+SCOPES = {0: 'global', 200: 'site', 253: 'link', 254: 'host', 255: 'nowhere'}
+
+_RECV_BUFSIZE = 65536
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _parse_attrs(data, offset):
+    """Returns a dict of the rtattrs found in data starting at offset."""
+    attrs = {}
+    while offset + RTATTR.size <= len(data):
+        length, attr_type = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attrs[attr_type] = data[offset + RTATTR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def _string(value):
+    return value.split('\0', 1)[0]
+
+
+def _uint32(value):
+    return struct.unpack('=I', value[:4])[0]
+
+
+def _mac(value):
+    return ':'.join('%02x' % ord(c) for c in value)
+
+
+def _ip(family, value):
+    if family == socket.AF_INET:
+        return str(netaddr.IPAddress(struct.unpack('!I', value)[0], 4))
+    high, low = struct.unpack('!QQ', value)
+    return str(netaddr.IPAddress((high << 64) | low, 6))
+
+
+def parse_link(data, offset):
+    """Converts a RTM_NEWLINK message to the keys used by 'ip -o link'.
+
+    Groups other than the default one are returned as numbers, 'ip' would
+    show the names given to them in /etc/iproute2/group.
+    """
+    family, link_type, index, flags, change = IFINFOMSG.unpack_from(
+        data, offset)
+    attrs = _parse_attrs(data, offset + IFINFOMSG.size)
+    link = {'index': index,
+            'name': _string(attrs.get(IFLA_IFNAME, ''))}
+    if IFLA_MTU in attrs:
+        link['mtu'] = _uint32(attrs[IFLA_MTU])
+    if IFLA_QDISC in attrs:
+        link['qdisc'] = _string(attrs[IFLA_QDISC])
+    if IFLA_OPERSTATE in attrs:
+        state = ord(attrs[IFLA_OPERSTATE][0])
+        if state < len(OPERSTATES):
+            link['state'] = OPERSTATES[state]
+    if IFLA_LINKMODE in attrs:
+        mode = ord(attrs[IFLA_LINKMODE][0])
+        if mode < len(LINKMODES):
+            link['mode'] = LINKMODES[mode]
+    if IFLA_GROUP in attrs:
+        link['group'] = _uint32(attrs[IFLA_GROUP]) or 'default'
+    if IFLA_TXQLEN in attrs:
+        link['qlen'] = _uint32(attrs[IFLA_TXQLEN])
+    if IFLA_IFALIAS in attrs:
+        link['alias'] = _string(attrs[IFLA_IFALIAS])
+    if link_type == ARPHRD_ETHER and IFLA_ADDRESS in attrs:
+        link['link/ether'] = _mac(attrs[IFLA_ADDRESS])
+        if IFLA_BROADCAST in attrs:
+            link['brd'] = _mac(attrs[IFLA_BROADCAST])
+    return link
+
+
+def parse_addr(data, offset):
+    """Converts a RTM_NEWADDR message to the dicts of IpAddrCommand.list."""
+    family, prefixlen, flags, scope, index = IFADDRMSG.unpack_from(
+        data, offset)
+    attrs = _parse_attrs(data, offset + IFADDRMSG.size)
+    if IFA_FLAGS in attrs:
+        flags = _uint32(attrs[IFA_FLAGS])
+    # For IPv4 IFA_LOCAL is the address of the interface while IFA_ADDRESS
+    # may be the address of the peer of a point to point link.
+    address = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+    cidr = '%s/%s' % (_ip(family, address), prefixlen)
+    if family == socket.AF_INET6:
+        version = 6
+        broadcast = '::'
+    else:
+        version = 4
+        if IFA_BROADCAST in attrs:
+            broadcast = _ip(family, attrs[IFA_BROADCAST])
+        else:
+            broadcast = str(netaddr.IPNetwork(cidr).broadcast)
+    return {'index': index,
+            'cidr': cidr,
+            'broadcast': broadcast,
+            'scope': SCOPES.get(scope, str(scope)),
+            'ip_version': version,
+            'dynamic': not flags & IFA_F_PERMANENT,
+            'permanent': bool(flags & IFA_F_PERMANENT)}
+
+
+def parse_route(data, offset):
+    """Converts a RTM_NEWROUTE message to a dict."""
+    (family, dst_len, src_len, tos, table, protocol, scope, route_type,
+     flags) = RTMSG.unpack_from(data, offset)
+    attrs = _parse_attrs(data, offset + RTMSG.size)
+    route = {'family': family,
+             'dst_len': dst_len,
+             'scope': SCOPES.get(scope, str(scope)),
+             'table': table}
+    if RTA_TABLE in attrs:
+        route['table'] = _uint32(attrs[RTA_TABLE])
+    if RTA_DST in attrs:
+        route['dst'] = _ip(family, attrs[RTA_DST])
+    if RTA_GATEWAY in attrs:
+        route['gateway'] = _ip(family, attrs[RTA_GATEWAY])
+    if RTA_OIF in attrs:
+        route['oif'] = _uint32(attrs[RTA_OIF])
+    if RTA_PRIORITY in attrs:
+        route['metric'] = _uint32(attrs[RTA_PRIORITY])
+    return route
+
+
+def _setns(fd):
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if libc.setns(fd, CLONE_NEWNET) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+
+
+@contextlib.contextmanager
+def in_namespace(namespace):
+    """Runs the block in the given network namespace.
+
+    Sockets created in the block stay attached to the namespace after the
+    process has gone back to its own.  This requires running as root.
+    """
+    try:
+        target = os.open(os.path.join(NETNS_RUN_DIR, namespace), os.O_RDONLY)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            raise RuntimeError(_('Cannot open network namespace "%s"')
+                               % namespace)
+        raise
+    current = os.open('/proc/self/ns/net', os.O_RDONLY)
+    try:
+        _setns(target)
+        try:
+            yield
+        finally:
+            _setns(current)
+    finally:
+        os.close(target)
+        os.close(current)
+
+
+class SocketHelperError(RuntimeError):
+    """The socket helper could not provide a socket."""
+
+
+class SocketHelper(object):
+    """Client of the privileged helper opening sockets in namespaces.
+
+    The helper is started through the root helper on first use and reads
+    namespace names on its standard input, which is a unix socket.  For each
+    name it replies with a status line, followed by the descriptor of a
+    rtnetlink socket opened in the namespace when the status is 0.  The
+    helper exits when the agent closes its end of the socket.
+    """
+
+    def __init__(self, root_helper):
+        self.root_helper = root_helper
+        self._conn = None
+        self._process = None
+        self._retry_time = 0
+        self._lock = threading.Lock()
+
+    def is_usable(self):
+        return self._conn is not None or time.time() >= self._retry_time
+
+    def _start(self):
+        conn, helper_conn = socket.socketpair(socket.AF_UNIX,
+                                              socket.SOCK_STREAM)
+        try:
+            self._process = utils.subprocess_popen(
+                shlex.split(self.root_helper) + [SOCKET_HELPER],
+                stdin=helper_conn.fileno())
+        except Exception:
+            conn.close()
+            raise
+        finally:
+            helper_conn.close()
+        self._conn = conn
+
+    def _stop(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._process is not None:
+            self._process.wait()
+            self._process = None
+        self._retry_time = time.time() + SOCKET_HELPER_RETRY_INTERVAL
+
+    def _read_status(self):
+        status = ''
+        while not status.endswith('\n'):
+            # Read byte by byte, the descriptor follows the status line
+            data = self._conn.recv(1)
+            if not data:
+                raise EOFError()
+            status += data
+        return int(status)
+
+    def open_socket(self, namespace):
+        with self._lock:
+            if not self.is_usable():
+                raise SocketHelperError(_('The netlink socket helper '
+                                          'is not available'))
+            try:
+                if self._conn is None:
+                    self._start()
+                self._conn.sendall(namespace + '\n')
+                status = self._read_status()
+                if not status:
+                    # recvfd does not wait on the non blocking green socket
+                    select.select([self._conn], [], [])
+                    fd = _multiprocessing.recvfd(self._conn.fileno())
+            except Exception as e:
+                LOG.warning(_LW("Failed to get a netlink socket for "
+                                "namespace %(namespace)s from the socket "
+                                "helper: %(error)s"),
+                            {'namespace': namespace, 'error': e})
+                self._stop()
+                raise SocketHelperError(_('The netlink socket helper '
+                                          'failed'))
+        if status == errno.ENOENT:
+            # Like in_namespace
+            raise RuntimeError(_('Cannot open network namespace "%s"')
+                               % namespace)
+        elif status:
+            raise OSError(status, os.strerror(status))
+        try:
+            return socket.fromfd(fd, socket.AF_NETLINK, socket.SOCK_RAW,
+                                 NETLINK_ROUTE)
+        finally:
+            os.close(fd)
+
+
+_socket_helpers = {}
+
+
+def get_socket_helper(root_helper):
+    """Returns the socket helper started with root_helper."""
+    helper = _socket_helpers.get(root_helper)
+    if helper is None:
+        helper = _socket_helpers.setdefault(root_helper,
+                                            SocketHelper(root_helper))
+    return helper
+
+
+def can_dump(namespace=None, root_helper=None):
+    """Returns whether the namespace can be dumped by this process.
+
+    Other namespaces can be dumped when running as root, or with the socket
+    helper when it is not failing.
+    """
+    if not namespace or os.geteuid() == 0:
+        return True
+    return bool(root_helper) and get_socket_helper(root_helper).is_usable()
+
+
+def _open_socket(namespace=None, root_helper=None):
+    """Opens a rtnetlink socket in the given network namespace.
+
+    A netlink socket stays attached to the namespace it was created in, so
+    the namespace only needs to be entered while creating the socket.
+    When not running as root, the socket is requested from the socket helper
+    started with root_helper, and SocketHelperError is raised if it fails.
+    """
+    if not namespace:
+        return socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             NETLINK_ROUTE)
+    if os.geteuid() != 0:
+        if not root_helper:
+            raise SocketHelperError(_('A root helper is required to open '
+                                      'a netlink socket in a namespace'))
+        return get_socket_helper(root_helper).open_socket(namespace)
+    with in_namespace(namespace):
+        return socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             NETLINK_ROUTE)
+
+
+def _serve_socket(conn, namespace):
+    if not namespace or '/' in namespace or namespace.startswith('.'):
+        conn.sendall('%d\n' % errno.EINVAL)
+        return
+    try:
+        sock = _open_socket(namespace)
+    except RuntimeError:
+        conn.sendall('%d\n' % errno.ENOENT)
+        return
+    except EnvironmentError as e:
+        conn.sendall('%d\n' % (e.errno or errno.EIO))
+        return
+    try:
+        conn.sendall('0\n')
+        _multiprocessing.sendfd(conn.fileno(), sock.fileno())
+    finally:
+        sock.close()
+
+
+def serve_sockets(conn):
+    """Opens netlink sockets in namespaces for the process at conn.
+
+    This is the privileged side of SocketHelper.
+    """
+    data = ''
+    while True:
+        received = conn.recv(4096)
+        if not received:
+            return
+        data += received
+        while '\n' in data:
+            namespace, data = data.split('\n', 1)
+            _serve_socket(conn, namespace)
+
+
+def _dump(namespace, msg_type, header, parser, root_helper=None):
+    sock = _open_socket(namespace, root_helper)
+    try:
+        # A zeroed header requests the objects of all address families.
+        body = '\0' * header.size
+        sock.sendall(NLMSGHDR.pack(NLMSGHDR.size + len(body), msg_type,
+                                   NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + body)
+        results = []
+        while True:
+            data = sock.recv(_RECV_BUFSIZE)
+            offset = 0
+            while offset + NLMSGHDR.size <= len(data):
+                length, nl_type, flags, nl_seq, pid = NLMSGHDR.unpack_from(
+                    data, offset)
+                if nl_type == NLMSG_DONE:
+                    return results
+                if nl_type == NLMSG_ERROR:
+                    error = -NLMSGERR.unpack_from(
+                        data, offset + NLMSGHDR.size)[0]
+                    raise OSError(error, os.strerror(error))
+                results.append(parser(data, offset + NLMSGHDR.size))
+                offset += _align(length)
+    finally:
+        sock.close()
+
+
+def get_links(namespace=None, root_helper=None):
+    """Returns the links of a namespace as dicts."""
+    return _dump(namespace, RTM_GETLINK, IFINFOMSG, parse_link, root_helper)
+
+
+def get_addresses(namespace=None, root_helper=None):
+    """Returns the addresses of a namespace as dicts."""
+    return _dump(namespace, RTM_GETADDR, IFADDRMSG, parse_addr, root_helper)
+
+
+def get_routes(namespace=None, root_helper=None):
+    """Returns the routes of a namespace as dicts."""
+    return _dump(namespace, RTM_GETROUTE, RTMSG, parse_route, root_helper)
@@ -13,14 +13,35 @@
 #    under the License.
 
 import eventlet
+from oslo.serialization import jsonutils
 
 from neutron.agent.linux import async_process
-from neutron.i18n import _LE
+from neutron.i18n import _LE, _LW
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
+OVSDB_ACTION_INITIAL = 'initial'
+OVSDB_ACTION_INSERT = 'insert'
+OVSDB_ACTION_DELETE = 'delete'
+OVSDB_ACTION_NEW = 'new'
+
+
+def _val_data_to_py(data):
+    """Convert an ovsdb JSON value to the corresponding python value.
+
+    Maps are returned as dicts, sets as lists and atoms as they are.
+    """
+    if isinstance(data, list) and len(data) == 2:
+        if data[0] == 'map':
+            return dict(data[1])
+        if data[0] == 'set':
+            return data[1]
+        if data[0] == 'uuid':
+            return data[1]
+    return data
+
 
 class OvsdbMonitor(async_process.AsyncProcess):
     """Manages an invocation of 'ovsdb-client monitor'."""
@@ -59,17 +80,91 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
     The has_updates() method indicates whether changes to the ovsdb
     Interface table have been detected since the monitor started or
     since the previous access.
+
+    The row changes received from ovsdb are also collected, and can be
+    retrieved with get_events() to process only the interfaces which
+    changed instead of listing all of them.
     """
 
     def __init__(self, root_helper=None, respawn_interval=None):
         super(SimpleInterfaceMonitor, self).__init__(
             'Interface',
-            columns=['name', 'ofport'],
+            columns=['name', 'ofport', 'external_ids'],
             format='json',
             root_helper=root_helper,
             respawn_interval=respawn_interval,
         )
         self.data_received = False
+        self._reset_events()
+        # Changes occurring while the monitor is not running are lost, so
+        # the events are not complete until the monitor is active.
+        self._events_complete = False
+
+    def _reset_events(self):
+        self.new_events = {'added': {}, 'removed': {}, 'modified': {}}
+
+    def process_events(self):
+        """Collect the row changes received since the previous call.
+
+        Returns True if any output was received from the monitor.
+        """
+        lines = list(self.iter_stdout())
+        for line in lines:
+            try:
+                output = jsonutils.loads(line)
+            except ValueError:
+                LOG.warning(_LW('Unable to parse output received from '
+                                'ovsdb monitor: %s'), line)
+                self._events_complete = False
+                continue
+            headings = output.get('headings', [])
+            for row in output.get('data', []):
+                row = dict(zip(headings, row))
+                self._process_row(row)
+        return bool(lines)
+
+    def _process_row(self, row):
+        action = row.get('action')
+        name = row.get('name')
+        device = {'name': name,
+                  'ofport': _val_data_to_py(row.get('ofport')),
+                  'external_ids': _val_data_to_py(row.get('external_ids'))}
+        added = self.new_events['added']
+        removed = self.new_events['removed']
+        modified = self.new_events['modified']
+        if action in (OVSDB_ACTION_INITIAL, OVSDB_ACTION_INSERT):
+            added[name] = device
+        elif action == OVSDB_ACTION_DELETE:
+            modified.pop(name, None)
+            if added.pop(name, None) is None:
+                removed[name] = device
+        elif action == OVSDB_ACTION_NEW:
+            # 'new' rows carry all the columns of a modified row, while the
+            # preceding 'old' row only carries the columns which changed.
+            if name in added:
+                added[name] = device
+            else:
+                modified[name] = device
+
+    def get_events(self):
+        """Return the interface changes collected since the previous call.
+
+        Returns a dict with the 'added', 'removed' and 'modified' lists of
+        interfaces, each described by its name, ofport and external_ids,
+        or None if the changes may be incomplete, e.g. because the
+        monitor has been restarted, in which case the caller needs to
+        list all the interfaces.
+        """
+        self.process_events()
+        events = dict((key, list(value.values()))
+                      for key, value in self.new_events.items())
+        self._reset_events()
+        if not self._events_complete:
+            if self.is_active:
+                # The changes received from now on are complete
+                self._events_complete = True
+            return None
+        return events
 
     @property
     def is_active(self):
@@ -86,7 +181,7 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
         the absence of updates at the expense of potential false
         positives.
         """
-        return bool(list(self.iter_stdout())) or not self.is_active
+        return self.process_events() or not self.is_active
 
     def start(self, block=False, timeout=5):
         super(SimpleInterfaceMonitor, self).start()
@@ -97,6 +192,7 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
 
     def _kill(self, *args, **kwargs):
         self.data_received = False
+        self._events_complete = False
         super(SimpleInterfaceMonitor, self)._kill(*args, **kwargs)
 
     def _read_stdout(self):
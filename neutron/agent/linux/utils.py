@@ -20,18 +20,108 @@ import shlex
 import socket
 import struct
 import tempfile
+import threading
+import time
 
 from eventlet.green import subprocess
 from eventlet import greenthread
+from oslo.config import cfg
 from oslo.utils import excutils
 
 from neutron.common import constants
 from neutron.common import utils
+from neutron.i18n import _LW
 from neutron.openstack.common import log as logging
 
+try:
+    from oslo_rootwrap import client as rootwrap_client
+except ImportError:
+    # The rootwrap daemon is only available from oslo.rootwrap 1.5.0 on
+    rootwrap_client = None
+
 
 LOG = logging.getLogger(__name__)
 
+# Seconds during which the root helper daemon is not used after a failure.
+# The delay doubles after each consecutive failure, up to the maximum.
+DAEMON_RETRY_MIN_INTERVAL = 1
+DAEMON_RETRY_MAX_INTERVAL = 60
+
+
+class RootwrapDaemonHelper(object):
+    """Manages the connection of the process to the root helper daemon
+
+    The daemon is started on first use and then stays up, so privileged
+    commands no longer pay for starting and configuring rootwrap each time.
+    If the daemon cannot be used, execute() falls back to running the
+    root helper for each command, and a new daemon is tried after a delay.
+    """
+    _client = None
+    _daemon_cmd = None
+    _retry_time = 0
+    _retry_interval = DAEMON_RETRY_MIN_INTERVAL
+    _missing_client_logged = False
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_daemon_cmd(cls):
+        try:
+            return cfg.CONF.AGENT.root_helper_daemon
+        except (cfg.NoSuchOptError, cfg.NoSuchGroupError):
+            # Only agents register the root helper options
+            return None
+
+    @classmethod
+    def get_client(cls):
+        daemon_cmd = cls.get_daemon_cmd()
+        if not daemon_cmd:
+            return None
+        if rootwrap_client is None:
+            if not cls._missing_client_logged:
+                LOG.warning(_LW("root_helper_daemon is set but the rootwrap "
+                                "daemon client cannot be imported, "
+                                "oslo.rootwrap 1.5.0 or later is required. "
+                                "Commands are run with the root helper."))
+                cls._missing_client_logged = True
+            return None
+        if time.time() < cls._retry_time:
+            return None
+        with cls._lock:
+            if cls._client is None or cls._daemon_cmd != daemon_cmd:
+                cls._client = rootwrap_client.Client(shlex.split(daemon_cmd))
+                cls._daemon_cmd = daemon_cmd
+            return cls._client
+
+    @classmethod
+    def execute(cls, cmd, process_input=None):
+        """Runs cmd through the daemon
+
+        Returns a (returncode, stdout, stderr) tuple, or None if the daemon
+        is not configured or not usable.
+        """
+        client = cls.get_client()
+        if client is None:
+            return None
+        try:
+            result = client.execute(cmd, process_input)
+        except Exception:
+            with cls._lock:
+                LOG.warning(_LW("Failed to run command through the root "
+                                "helper daemon %(daemon)s, falling back to "
+                                "the root helper for %(interval)s seconds"),
+                            {'daemon': cls._daemon_cmd,
+                             'interval': cls._retry_interval},
+                            exc_info=True)
+                # A new daemon is started on the next attempt
+                if cls._client is client:
+                    cls._client = None
+                cls._retry_time = time.time() + cls._retry_interval
+                cls._retry_interval = min(cls._retry_interval * 2,
+                                          DAEMON_RETRY_MAX_INTERVAL)
+            return None
+        cls._retry_interval = DAEMON_RETRY_MIN_INTERVAL
+        return result
+
 
 def create_process(cmd, root_helper=None, addl_env=None):
     """Create a process object for the given command.
@@ -59,26 +149,43 @@ def create_process(cmd, root_helper=None, addl_env=None):
 
 def execute(cmd, root_helper=None, process_input=None, addl_env=None,
             check_exit_code=True, return_stderr=False, log_fail_as_error=True,
-            extra_ok_codes=None):
+            extra_ok_codes=None, return_code=False):
+    start = time.time()
     try:
-        obj, cmd = create_process(cmd, root_helper=root_helper,
-                                  addl_env=addl_env)
-        _stdout, _stderr = obj.communicate(process_input)
-        obj.stdin.close()
+        result = None
+        # The daemon runs commands with its own environment
+        if root_helper and not addl_env:
+            result = RootwrapDaemonHelper.execute(map(str, cmd),
+                                                  process_input)
+        if result is not None:
+            returncode, _stdout, _stderr = result
+            helper = 'root helper daemon'
+        else:
+            obj, cmd = create_process(cmd, root_helper=root_helper,
+                                      addl_env=addl_env)
+            _stdout, _stderr = obj.communicate(process_input)
+            obj.stdin.close()
+            returncode = obj.returncode
+            helper = root_helper
+        exit_code = returncode
+        LOG.debug("Command %(cmd)s ran in %(elapsed).3f seconds "
+                  "(root helper: %(helper)s)",
+                  {'cmd': cmd, 'elapsed': time.time() - start,
+                   'helper': helper})
         m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                        'stdout': _stdout, 'stderr': _stderr}
 
         extra_ok_codes = extra_ok_codes or []
-        if obj.returncode and obj.returncode in extra_ok_codes:
-            obj.returncode = None
+        if returncode and returncode in extra_ok_codes:
+            returncode = None
 
-        if obj.returncode and log_fail_as_error:
+        if returncode and log_fail_as_error:
             LOG.error(m)
         else:
             LOG.debug(m)
 
-        if obj.returncode and check_exit_code:
+        if returncode and check_exit_code:
             raise RuntimeError(m)
     finally:
         # NOTE(termie): this appears to be necessary to let the subprocess
@@ -86,6 +193,10 @@ def execute(cmd, root_helper=None, process_input=None, addl_env=None,
         #               it two execute calls in a row hangs the second one
         greenthread.sleep(0)
 
+    if return_code:
+        # The exit code is returned even if it is one of extra_ok_codes
+        return ((_stdout, _stderr, exit_code) if return_stderr
+                else (_stdout, exit_code))
     return (_stdout, _stderr) if return_stderr else _stdout
 
 
@@ -21,6 +21,7 @@ import sys
 import eventlet
 eventlet.monkey_patch()
 
+import eventlet.pools
 import httplib2
 from neutronclient.v2_0 import client
 from oslo.config import cfg
@@ -37,7 +38,7 @@ from neutron.common import rpc as n_rpc
 from neutron.common import topics
 from neutron.common import utils
 from neutron import context
-from neutron.i18n import _LE, _LW
+from neutron.i18n import _LE, _LI, _LW
 from neutron.openstack.common.cache import cache
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import loopingcall
@@ -62,6 +63,107 @@ class MetadataPluginAPI(object):
         return cctxt.call(context, 'get_ports', filters=filters)
 
 
+class PortIndex(object):
+    """Index of the ports used to identify the instances sending requests
+
+    Ports are indexed by network and fixed IP address, and router interface
+    ports by router.  Updates and removals received while loading the ports
+    take precedence over the loaded ports, which may be older.
+    """
+
+    ROUTER_INTERFACE_OWNERS = (n_const.DEVICE_OWNER_ROUTER_INTF,
+                               n_const.DEVICE_OWNER_DVR_INTERFACE)
+
+    def __init__(self):
+        self._ports = {}
+        self._ports_by_address = {}
+        # router_id -> {port_id: network_id}
+        self._router_ports = {}
+        self._changed_during_load = None
+
+    def __len__(self):
+        return len(self._ports)
+
+    def _add(self, port):
+        port = {'id': port['id'],
+                'network_id': port['network_id'],
+                'device_id': port['device_id'],
+                'device_owner': port['device_owner'],
+                'tenant_id': port['tenant_id'],
+                'fixed_ips': port['fixed_ips']}
+        self._ports[port['id']] = port
+        for fixed_ip in port['fixed_ips']:
+            address = (port['network_id'], fixed_ip['ip_address'])
+            self._ports_by_address[address] = port
+        if port['device_owner'] in self.ROUTER_INTERFACE_OWNERS:
+            router_ports = self._router_ports.setdefault(port['device_id'],
+                                                         {})
+            router_ports[port['id']] = port['network_id']
+
+    def _remove(self, port_id):
+        port = self._ports.pop(port_id, None)
+        if not port:
+            return
+        for fixed_ip in port['fixed_ips']:
+            address = (port['network_id'], fixed_ip['ip_address'])
+            if self._ports_by_address.get(address) is port:
+                del self._ports_by_address[address]
+        router_ports = self._router_ports.get(port['device_id'])
+        if router_ports and port_id in router_ports:
+            del router_ports[port_id]
+            if not router_ports:
+                del self._router_ports[port['device_id']]
+
+    def update(self, port):
+        self._remove(port['id'])
+        self._add(port)
+        if self._changed_during_load is not None:
+            self._changed_during_load.add(port['id'])
+
+    def remove(self, port_id):
+        self._remove(port_id)
+        if self._changed_during_load is not None:
+            self._changed_during_load.add(port_id)
+
+    def begin_load(self):
+        self._changed_during_load = set()
+
+    def load(self, ports):
+        changed = self._changed_during_load or set()
+        for port in ports:
+            if port['id'] not in changed:
+                self._remove(port['id'])
+                self._add(port)
+        self._changed_during_load = None
+
+    def get_router_networks(self, router_id):
+        """Returns the networks of a router, None if it is unknown."""
+        router_ports = self._router_ports.get(router_id)
+        if not router_ports:
+            return None
+        return tuple(set(router_ports.values()))
+
+    def get_ports(self, networks, ip_address):
+        return [self._ports_by_address[(network_id, ip_address)]
+                for network_id in networks
+                if (network_id, ip_address) in self._ports_by_address]
+
+
+class PortIndexRpcCallback(object):
+    """Keeps a PortIndex current from the port notifications to agents."""
+
+    target = messaging.Target(version='1.0')
+
+    def __init__(self, index):
+        self.index = index
+
+    def port_update(self, context, **kwargs):
+        self.index.update(kwargs['port'])
+
+    def port_delete(self, context, **kwargs):
+        self.index.remove(kwargs['port_id'])
+
+
 class MetadataProxyHandler(object):
     OPTS = [
         cfg.StrOpt('admin_user',
@@ -109,7 +211,20 @@ class MetadataProxyHandler(object):
                    help=_("Client certificate for nova metadata api server.")),
         cfg.StrOpt('nova_client_priv_key',
                    default='',
-                   help=_("Private key of client certificate."))
+                   help=_("Private key of client certificate.")),
+        cfg.BoolOpt('enable_port_index', default=False,
+                    help=_("Keep an index of the ports in each metadata "
+                           "worker to identify instances without querying "
+                           "the Neutron server. The index is loaded when a "
+                           "worker starts and then kept current by port "
+                           "notifications, which requires a plugin sending "
+                           "them such as ML2.")),
+        cfg.IntOpt('nova_metadata_pool_size',
+                   default=16,
+                   help=_("Maximum number of connections to the nova "
+                          "metadata server kept open by each metadata "
+                          "worker. Requests wait for a free connection "
+                          "when all of them are in use."))
     ]
 
     def __init__(self, conf):
@@ -124,6 +239,14 @@ class MetadataProxyHandler(object):
         self.context = context.get_admin_context_without_session()
         # Use RPC by default
         self.use_rpc = True
+        # The port index is loaded by each worker process when it starts.
+        self._port_index = None
+        self._port_index_pid = None
+        # httplib2.Http objects keep their connections alive, so pooling
+        # them saves a TCP, and possibly TLS, handshake per request.
+        self._http_pool = eventlet.pools.Pool(
+            max_size=self.conf.nova_metadata_pool_size,
+            create=self._create_http)
 
     def _get_neutron_client(self):
         qclient = client.Client(
@@ -220,6 +343,42 @@ class MetadataProxyHandler(object):
         self.auth_info = client.get_auth_info()
         return ports['ports']
 
+    def load_port_index(self):
+        """Loads the port index of this process, if enabled.
+
+        Requests are served from the server until the index is loaded.
+        """
+        if (not self.conf.enable_port_index or
+                self._port_index_pid == os.getpid()):
+            return
+        self._port_index_pid = os.getpid()
+        self._port_index = None
+        index = PortIndex()
+        try:
+            # Subscribe before loading so that no change is missed
+            self._port_index_connection = agent_rpc.create_consumers(
+                [PortIndexRpcCallback(index)], topics.AGENT,
+                [[topics.PORT, topics.UPDATE],
+                 [topics.PORT, topics.DELETE]])
+            index.begin_load()
+            index.load(self._get_ports_from_server())
+        except Exception:
+            LOG.exception(_LE("Failed to load the port index, ports "
+                              "will be fetched from the server"))
+        else:
+            LOG.info(_LI("Loaded %d ports in the port index"), len(index))
+            self._port_index = index
+
+    def _get_port_index(self):
+        """Returns the loaded port index of this process, or None."""
+        if not self.conf.enable_port_index:
+            return None
+        if self._port_index_pid != os.getpid():
+            # The index was not loaded by this process on start
+            eventlet.spawn_n(self.load_port_index)
+            return None
+        return self._port_index
+
     def _get_ports(self, remote_address, network_id=None, router_id=None):
         """Search for all ports that contain passed ip address and belongs to
         given network.
@@ -227,15 +386,27 @@ class MetadataProxyHandler(object):
         If no network is passed ports are searched on all networks connected to
         given router. Either one of network_id or router_id must be passed.
 
+        The port index is searched first when loaded.  When the port is not
+        found there, the networks of the router, which may be stale in the
+        index, and the ports are both queried from the server.
         """
+        index = self._get_port_index()
+        networks = None
         if network_id:
             networks = (network_id,)
         elif router_id:
-            networks = self._get_router_networks(router_id)
+            if index:
+                networks = index.get_router_networks(router_id)
         else:
             raise TypeError(_("Either one of parameter network_id or router_id"
                               " must be passed to _get_ports method."))
 
+        if index and networks:
+            ports = index.get_ports(networks, remote_address)
+            if ports:
+                return ports
+        if not network_id:
+            networks = self._get_router_networks(router_id)
         return self._get_ports_for_remote_address(remote_address, networks)
 
     def _get_instance_and_tenant_id(self, req):
@@ -266,16 +437,9 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http(
-            ca_certs=self.conf.auth_ca_cert,
-            disable_ssl_certificate_validation=self.conf.nova_metadata_insecure
-        )
-        if self.conf.nova_client_cert and self.conf.nova_client_priv_key:
-            h.add_certificate(self.conf.nova_client_priv_key,
-                              self.conf.nova_client_cert,
-                              nova_ip_port)
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        with self._http_pool.item() as h:
+            resp, content = h.request(url, method=req.method,
+                                      headers=headers, body=req.body)
 
         if resp.status == 200:
             LOG.debug(str(resp))
@@ -303,6 +467,19 @@ class MetadataProxyHandler(object):
         else:
             raise Exception(_('Unexpected response code: %s') % resp.status)
 
+    def _create_http(self):
+        h = httplib2.Http(
+            ca_certs=self.conf.auth_ca_cert,
+            disable_ssl_certificate_validation=self.conf.nova_metadata_insecure
+        )
+        if self.conf.nova_client_cert and self.conf.nova_client_priv_key:
+            nova_ip_port = '%s:%s' % (self.conf.nova_metadata_ip,
+                                      self.conf.nova_metadata_port)
+            h.add_certificate(self.conf.nova_client_priv_key,
+                              self.conf.nova_client_cert,
+                              nova_ip_port)
+        return h
+
     def _sign_instance_id(self, instance_id):
         return hmac.new(self.conf.metadata_proxy_shared_secret,
                         instance_id,
@@ -320,6 +497,9 @@ class UnixDomainHttpProtocol(eventlet.wsgi.HttpProtocol):
 
 class WorkerService(wsgi.WorkerService):
     def start(self):
+        # Loaded in the background, requests are served from the server
+        # meanwhile
+        self._service.pool.spawn_n(self._application.load_port_index)
         self._server = self._service.pool.spawn(self._service._run,
                                                 self._application,
                                                 self._service._socket)
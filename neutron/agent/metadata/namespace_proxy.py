@@ -13,25 +13,37 @@
 #    under the License.
 
 import httplib
+import os
+import signal
 import socket
+import tempfile
 
 import eventlet
 eventlet.monkey_patch()
 
+import eventlet.pools
+import eventlet.queue
+import eventlet.wsgi
 import httplib2
 from oslo.config import cfg
 import six.moves.urllib.parse as urlparse
 import webob
 
 from neutron.agent.linux import daemon
+from neutron.agent.linux import netlink
 from neutron.common import config
 from neutron.common import utils
-from neutron.i18n import _LE
+from neutron.i18n import _LE, _LI
 from neutron.openstack.common import log as logging
 from neutron import wsgi
 
 LOG = logging.getLogger(__name__)
 
+# Default maximum number of connections kept open to the metadata agent
+DEFAULT_HTTP_POOL_SIZE = 16
+# Seconds between two checks of the routers of the shared proxy
+ROUTERS_POLL_INTERVAL = 1
+
 
 class UnixDomainHTTPConnection(httplib.HTTPConnection):
     """Connection class for HTTP over UNIX domain socket."""
@@ -47,6 +59,11 @@ class UnixDomainHTTPConnection(httplib.HTTPConnection):
         self.sock.connect(cfg.CONF.metadata_proxy_socket)
 
 
+def create_http_pool(max_size=DEFAULT_HTTP_POOL_SIZE):
+    return eventlet.pools.Pool(max_size=max_size,
+                               create=lambda: httplib2.Http())
+
+
 class NetworkMetadataProxyHandler(object):
     """Proxy AF_INET metadata request through Unix Domain socket.
 
@@ -54,7 +71,7 @@ class NetworkMetadataProxyHandler(object):
     accessible within the isolated tenant context.
     """
 
-    def __init__(self, network_id=None, router_id=None):
+    def __init__(self, network_id=None, router_id=None, http_pool=None):
         self.network_id = network_id
         self.router_id = router_id
 
@@ -62,6 +79,10 @@ class NetworkMetadataProxyHandler(object):
             msg = _('network_id and router_id are None. One must be provided.')
             raise ValueError(msg)
 
+        # httplib2.Http objects keep their connections to the metadata
+        # agent alive, pooling them avoids a new connection per request.
+        self.http_pool = http_pool or create_http_pool()
+
     @webob.dec.wsgify(RequestClass=webob.Request)
     def __call__(self, req):
         LOG.debug("Request: %s", req)
@@ -95,13 +116,13 @@ class NetworkMetadataProxyHandler(object):
             query_string,
             ''))
 
-        h = httplib2.Http()
-        resp, content = h.request(
-            url,
-            method=method,
-            headers=headers,
-            body=body,
-            connection_type=UnixDomainHTTPConnection)
+        with self.http_pool.item() as h:
+            resp, content = h.request(
+                url,
+                method=method,
+                headers=headers,
+                body=body,
+                connection_type=UnixDomainHTTPConnection)
 
         if resp.status == 200:
             LOG.debug(resp)
@@ -144,6 +165,123 @@ class ProxyDaemon(daemon.Daemon):
         proxy.wait()
 
 
+class SharedMetadataProxy(object):
+    """Proxies the metadata requests of many routers from one process.
+
+    routers_dir holds a file per router, named after the router id and
+    containing the name of the namespace of the router.  The proxy listens
+    on port in each of these namespaces and tags the requests received
+    there with the id of the router.  The routers are read again when
+    routers_dir changes, or when reload() is called.
+    """
+
+    def __init__(self, routers_dir, port):
+        self.routers_dir = routers_dir
+        self.port = port
+        self.pool = eventlet.GreenPool()
+        # Connections to the metadata agent are shared by all the routers
+        self.http_pool = create_http_pool()
+        # router_id -> (namespace, listening socket, server thread)
+        self.servers = {}
+        self._reload_requests = eventlet.queue.LightQueue()
+        self._routers_dir_mtime = None
+
+    def _get_routers_dir_mtime(self):
+        try:
+            return os.stat(self.routers_dir).st_mtime
+        except OSError:
+            return None
+
+    def _read_routers(self):
+        try:
+            router_ids = os.listdir(self.routers_dir)
+        except OSError:
+            return {}
+        routers = {}
+        for router_id in router_ids:
+            if router_id.startswith(tempfile.template):
+                # A router file being written by the agent
+                continue
+            try:
+                with open(os.path.join(self.routers_dir, router_id)) as f:
+                    routers[router_id] = f.read().strip()
+            except IOError:
+                # The router was removed meanwhile
+                continue
+        return routers
+
+    def _listen(self, namespace):
+        if not namespace:
+            return eventlet.listen(('0.0.0.0', self.port))
+        with netlink.in_namespace(namespace):
+            return eventlet.listen(('0.0.0.0', self.port))
+
+    def _start_server(self, router_id, namespace):
+        try:
+            sock = self._listen(namespace)
+        except Exception:
+            LOG.exception(_LE("Failed to listen in namespace %(ns)s for "
+                              "router %(router)s"),
+                          {'ns': namespace, 'router': router_id})
+            return
+        handler = NetworkMetadataProxyHandler(router_id=router_id,
+                                              http_pool=self.http_pool)
+        thread = eventlet.spawn(eventlet.wsgi.server, sock, handler,
+                                custom_pool=self.pool,
+                                log=logging.WritableLogger(LOG))
+        self.servers[router_id] = (namespace, sock, thread)
+
+    def _stop_server(self, router_id):
+        namespace, sock, thread = self.servers.pop(router_id)
+        thread.kill()
+        sock.close()
+
+    def sync(self):
+        """Serves the routers found in routers_dir, and only those."""
+        # Taken before reading, so that changes made meanwhile are seen by
+        # the next check
+        self._routers_dir_mtime = self._get_routers_dir_mtime()
+        routers = self._read_routers()
+        for router_id, server in self.servers.items():
+            if routers.get(router_id) != server[0]:
+                self._stop_server(router_id)
+        for router_id, namespace in routers.iteritems():
+            if router_id not in self.servers:
+                self._start_server(router_id, namespace)
+        LOG.info(_LI("Serving metadata for %d routers"), len(self.servers))
+
+    def reload(self, *args):
+        """Requests a sync, this can be used as a signal handler."""
+        self._reload_requests.put(None)
+
+    def run(self):
+        self.sync()
+        while True:
+            try:
+                self._reload_requests.get(timeout=ROUTERS_POLL_INTERVAL)
+            except eventlet.queue.Empty:
+                # Adding, changing or removing a router file renames or
+                # unlinks it, which updates the mtime of routers_dir
+                if self._get_routers_dir_mtime() == self._routers_dir_mtime:
+                    continue
+            # Reload requests received meanwhile are served by this sync
+            while not self._reload_requests.empty():
+                self._reload_requests.get()
+            self.sync()
+
+
+class SharedProxyDaemon(daemon.Daemon):
+    def __init__(self, pidfile, port, routers_dir):
+        super(SharedProxyDaemon, self).__init__(pidfile)
+        self.port = port
+        self.routers_dir = routers_dir
+
+    def run(self):
+        proxy = SharedMetadataProxy(self.routers_dir, self.port)
+        signal.signal(signal.SIGHUP, proxy.reload)
+        proxy.run()
+
+
 def main():
     opts = [
         cfg.StrOpt('network_id',
@@ -152,6 +290,11 @@ def main():
         cfg.StrOpt('router_id',
                    help=_('Router that will have connected instances\' '
                           'metadata proxied.')),
+        cfg.StrOpt('routers_dir',
+                   help=_('Directory listing the routers that will have '
+                          'their connected instances\' metadata proxied by '
+                          'this process. When set, the network_id and '
+                          'router_id options are ignored.')),
         cfg.StrOpt('pid_file',
                    help=_('Location of pid file of this process.')),
         cfg.BoolOpt('daemonize',
@@ -172,10 +315,15 @@ def main():
     cfg.CONF(project='neutron', default_config_files=[])
     config.setup_logging()
     utils.log_opt_values(LOG)
-    proxy = ProxyDaemon(cfg.CONF.pid_file,
-                        cfg.CONF.metadata_port,
-                        network_id=cfg.CONF.network_id,
-                        router_id=cfg.CONF.router_id)
+    if cfg.CONF.routers_dir:
+        proxy = SharedProxyDaemon(cfg.CONF.pid_file,
+                                  cfg.CONF.metadata_port,
+                                  cfg.CONF.routers_dir)
+    else:
+        proxy = ProxyDaemon(cfg.CONF.pid_file,
+                            cfg.CONF.metadata_port,
+                            network_id=cfg.CONF.network_id,
+                            router_id=cfg.CONF.router_id)
 
     if cfg.CONF.daemonize:
         proxy.start()
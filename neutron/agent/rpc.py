@@ -77,6 +77,8 @@ class PluginApi(object):
         1.3 - get_device_details rpc signature upgrade to obtain 'host' and
               return value to include fixed_ips and device_owner for
               the device port
+        1.4 - Added update_devices_up and update_devices_down to update
+              the status of a list of devices in a single call
     '''
 
     def __init__(self, topic):
@@ -115,6 +117,33 @@ class PluginApi(object):
         return cctxt.call(context, 'update_device_up', device=device,
                           agent_id=agent_id, host=host)
 
+    def update_devices_down(self, context, devices, agent_id, host=None):
+        try:
+            cctxt = self.client.prepare(version='1.4')
+            res = cctxt.call(context, 'update_devices_down',
+                             devices=devices, agent_id=agent_id, host=host)
+        except messaging.UnsupportedVersion:
+            # Fall back to per device calls for servers which have not been
+            # upgraded yet.
+            res = [
+                self.update_device_down(context, device, agent_id, host)
+                for device in devices
+            ]
+        return res
+
+    def update_devices_up(self, context, devices, agent_id, host=None):
+        try:
+            cctxt = self.client.prepare(version='1.4')
+            res = cctxt.call(context, 'update_devices_up',
+                             devices=devices, agent_id=agent_id, host=host)
+        except messaging.UnsupportedVersion:
+            # Fall back to per device calls for servers which have not been
+            # upgraded yet.
+            for device in devices:
+                self.update_device_up(context, device, agent_id, host)
+            res = list(devices)
+        return res
+
     def tunnel_sync(self, context, tunnel_ip, tunnel_type=None):
         cctxt = self.client.prepare()
         return cctxt.call(context, 'tunnel_sync', tunnel_ip=tunnel_ip,
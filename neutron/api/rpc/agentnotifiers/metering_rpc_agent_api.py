@@ -26,14 +26,19 @@ LOG = logging.getLogger(__name__)
 
 
 class MeteringAgentNotifyAPI(object):
-    """API for plugin to notify L3 metering agent."""
+    """API for plugin to notify L3 metering agent.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - Add add_metering_label_rule and remove_metering_label_rule.
+    """
 
     def __init__(self, topic=topics.METERING_AGENT):
         self.topic = topic
         target = messaging.Target(topic=topic, version='1.0')
         self.client = n_rpc.get_client(target)
 
-    def _agent_notification(self, context, method, routers):
+    def _agent_notification(self, context, method, routers, version='1.0'):
         """Notify l3 metering agents hosted by l3 agent hosts."""
         adminContext = context if context.is_admin else context.elevated()
         plugin = manager.NeutronManager.get_service_plugins().get(
@@ -57,7 +62,7 @@ class MeteringAgentNotifyAPI(object):
                 l3_routers[l3_agent.host] = l3_router
 
         for host, routers in l3_routers.iteritems():
-            cctxt = self.client.prepare(server=host)
+            cctxt = self.client.prepare(server=host, version=version)
             cctxt.cast(context, method, routers=routers)
 
     def _notification_fanout(self, context, method, router_id):
@@ -69,15 +74,15 @@ class MeteringAgentNotifyAPI(object):
         cctxt = self.client.prepare(fanout=True)
         cctxt.cast(context, method, router_id=router_id)
 
-    def _notification(self, context, method, routers):
+    def _notification(self, context, method, routers, version='1.0'):
         """Notify all the agents that are hosting the routers."""
         plugin = manager.NeutronManager.get_service_plugins().get(
             service_constants.L3_ROUTER_NAT)
         if utils.is_extension_supported(
             plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
-            self._agent_notification(context, method, routers)
+            self._agent_notification(context, method, routers, version)
         else:
-            cctxt = self.client.prepare(fanout=True)
+            cctxt = self.client.prepare(fanout=True, version=version)
             cctxt.cast(context, method, routers=routers)
 
     def router_deleted(self, context, router_id):
@@ -95,3 +100,11 @@ class MeteringAgentNotifyAPI(object):
 
     def remove_metering_label(self, context, routers):
         self._notification(context, 'remove_metering_label', routers)
+
+    def add_metering_label_rule(self, context, routers):
+        self._notification(context, 'add_metering_label_rule', routers,
+                           version='1.1')
+
+    def remove_metering_label_rule(self, context, routers):
+        self._notification(context, 'remove_metering_label_rule', routers,
+                           version='1.1')
@@ -40,7 +40,8 @@ class L3RpcCallback(object):
     # 1.2 Added methods for DVR support
     # 1.3 Added a method that returns the list of activated services
     # 1.4 Added L3 HA update_router_state
-    target = messaging.Target(version='1.4')
+    # 1.5 Added get_router_ids
+    target = messaging.Target(version='1.5')
 
     @property
     def plugin(self):
@@ -86,6 +87,33 @@ class L3RpcCallback(object):
                   jsonutils.dumps(routers, indent=5))
         return routers
 
+    def get_router_ids(self, context, **kwargs):
+        """Returns the ids of the routers to sync to a specific agent.
+
+        Agents use this to split a full sync into several sync_routers calls
+        of bounded size.
+
+        @param context: contain user information
+        @param kwargs: host
+        @return: a list of router ids
+        """
+        host = kwargs.get('host')
+        context = neutron_context.get_admin_context()
+        if not self.l3plugin:
+            LOG.error(_LE('No plugin for L3 routing registered! Will reply '
+                          'to l3 agent with empty router id list.'))
+            return []
+        elif utils.is_extension_supported(
+                self.l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
+            if cfg.CONF.router_auto_schedule:
+                self.l3plugin.auto_schedule_routers(context, host, None)
+            return self.l3plugin.list_router_ids_on_active_l3_agent(
+                context, host)
+        # Like get_sync_data, admin down routers are returned so that the
+        # agent can remove them
+        routers = self.l3plugin.get_routers(context, fields=['id'])
+        return [router['id'] for router in routers]
+
     def _ensure_host_set_on_ports(self, context, host, routers):
         for router in routers:
             LOG.debug("Checking router: %(id)s for host: %(host)s",
@@ -14,6 +14,7 @@
 #    under the License.
 
 import copy
+import hashlib
 import netaddr
 import webob.exc
 
@@ -27,6 +28,7 @@ from neutron.api.v2 import resource as wsgi_resource
 from neutron.common import constants as const
 from neutron.common import exceptions
 from neutron.common import rpc as n_rpc
+from neutron.db import revision_db
 from neutron.i18n import _LE, _LI
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import policy as common_policy
@@ -69,6 +71,7 @@ class Controller(object):
         self._native_bulk = self._is_native_bulk_supported()
         self._native_pagination = self._is_native_pagination_supported()
         self._native_sorting = self._is_native_sorting_supported()
+        self._revision_tracking = self._is_revision_tracking_supported()
         self._policy_attrs = [name for (name, info) in self._attr_info.items()
                               if info.get('required_by_policy')]
         self._notifier = n_rpc.get_notifier('network')
@@ -129,6 +132,35 @@ class Controller(object):
                                     % self._plugin.__class__.__name__)
         return getattr(self._plugin, native_sorting_attr_name, False)
 
+    def _is_revision_tracking_supported(self):
+        revision_tracking_attr_name = ("_%s__revision_tracking_support"
+                                       % self._plugin.__class__.__name__)
+        return getattr(self._plugin, revision_tracking_attr_name, False)
+
+    def _check_etag(self, request):
+        """Computes the ETag of a GET and checks it against the request.
+
+        The ETag covers the revisions of the collection, the request and
+        everything policies depend on. HTTPNotModified is raised when the
+        client already has the response, otherwise the ETag is stored in
+        the request environment for the response.
+        """
+        if not self._revision_tracking:
+            return
+        context = request.context
+        revisions = revision_db.get_revisions(context, self._collection)
+        if revisions is None:
+            return
+        etag = hashlib.md5(repr((
+            request.path_qs, revisions, context.tenant_id, context.user_id,
+            context.is_admin, sorted(context.roles),
+            policy.get_rules_digest()))).hexdigest()
+        if etag in request.if_none_match:
+            not_modified = webob.exc.HTTPNotModified()
+            not_modified.etag = etag
+            raise not_modified
+        request.environ['neutron.etag'] = etag
+
     def _exclude_attributes_by_policy(self, context, data):
         """Identifies attributes to exclude according to authZ policies.
 
@@ -137,14 +169,16 @@ class Controller(object):
         to see them.
         """
         attributes_to_exclude = []
+        credentials = None
         for attr_name in data.keys():
             attr_data = self._attr_info.get(attr_name)
             if attr_data and attr_data['is_visible']:
-                if policy.check(
+                checker = policy.Checker(
                     context,
                     '%s:%s' % (self._plugin_handlers[self.SHOW], attr_name),
-                    data,
-                    might_not_exist=True):
+                    might_not_exist=True, credentials=credentials)
+                credentials = checker.credentials
+                if checker(data):
                     # this attribute is visible, check next one
                     continue
             # if the code reaches this point then either the policy check
@@ -250,11 +284,12 @@ class Controller(object):
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
-            obj_list = [obj for obj in obj_list
-                        if policy.check(request.context,
-                                        self._plugin_handlers[self.SHOW],
-                                        obj,
-                                        plugin=self._plugin)]
+            # The rule and the credentials are the same for all the objects
+            # and the result only depends on a few of their fields.
+            checker = policy.Checker(request.context,
+                                     self._plugin_handlers[self.SHOW])
+            checker.prefetch(obj_list)
+            obj_list = [obj for obj in obj_list if checker(obj)]
         # Use the first element in the list for discriminating which attributes
         # should be filtered out because of authZ policies
         # fields_to_add contains a list of attributes added for request policy
@@ -264,11 +299,13 @@ class Controller(object):
         if obj_list:
             fields_to_strip += self._exclude_attributes_by_policy(
                 request.context, obj_list[0])
+        # The items are only copied without the stripped fields while the
+        # response is serialized, one at a time.
         collection = {self._collection:
-                      [self._filter_attributes(
+                      (self._filter_attributes(
                           request.context, obj,
                           fields_to_strip=fields_to_strip)
-                       for obj in obj_list]}
+                       for obj in obj_list)}
         pagination_links = pagination_helper.get_links(obj_list)
         if pagination_links:
             collection[self._collection + "_links"] = pagination_links
@@ -308,6 +345,7 @@ class Controller(object):
         parent_id = kwargs.get(self._parent_id_name)
         # Ensure policy engine is initialized
         policy.init()
+        self._check_etag(request)
         return self._items(request, True, parent_id)
 
     def show(self, request, id, **kwargs):
@@ -321,6 +359,7 @@ class Controller(object):
             parent_id = kwargs.get(self._parent_id_name)
             # Ensure policy engine is initialized
             policy.init()
+            self._check_etag(request)
             return {self._resource:
                     self._view(request.context,
                                self._item(request,
@@ -385,38 +424,50 @@ class Controller(object):
         if self._collection in body:
             # Have to account for bulk create
             items = body[self._collection]
-            deltas = {}
-            bulk = True
         else:
             items = [body]
-            bulk = False
         # Ensure policy engine is initialized
         policy.init()
+        deltas = {}
         for item in items:
             self._validate_network_tenant_ownership(request,
                                                     item[self._resource])
             policy.enforce(request.context,
                            action,
                            item[self._resource])
-            try:
-                tenant_id = item[self._resource]['tenant_id']
-                count = quota.QUOTAS.count(request.context, self._resource,
-                                           self._plugin, self._collection,
-                                           tenant_id)
-                if bulk:
-                    delta = deltas.get(tenant_id, 0) + 1
-                    deltas[tenant_id] = delta
-                else:
-                    delta = 1
-                kwargs = {self._resource: count + delta}
-            except exceptions.QuotaResourceUnknown as e:
-                # We don't want to quota this resource
-                LOG.debug(e)
-            else:
-                quota.QUOTAS.limit_check(request.context,
-                                         item[self._resource]['tenant_id'],
-                                         **kwargs)
+            tenant_id = item[self._resource]['tenant_id']
+            deltas[tenant_id] = deltas.get(tenant_id, 0) + 1
+
+        reservations = self._make_reservations(request.context, deltas)
+        try:
+            result = self._create(request, body, action, parent_id)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for reservation in reservations:
+                    quota.QUOTAS.cancel_reservation(request.context,
+                                                    reservation)
+        for reservation in reservations:
+            quota.QUOTAS.commit_reservation(request.context, reservation)
+        return result
 
+    def _make_reservations(self, context, deltas):
+        """Reserves the resources created by each tenant."""
+        reservations = []
+        try:
+            for tenant_id, delta in sorted(deltas.items()):
+                reservations.append(quota.QUOTAS.make_reservation(
+                    context, tenant_id, {self._resource: delta},
+                    self._plugin, self._collection, tenant_id))
+        except exceptions.QuotaResourceUnknown as e:
+            # We don't want to quota this resource
+            LOG.debug(e)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                for reservation in reservations:
+                    quota.QUOTAS.cancel_reservation(context, reservation)
+        return reservations
+
+    def _create(self, request, body, action, parent_id):
         def notify(create_result):
             notifier_method = self._resource + '.create.end'
             self._notifier.info(request.context,
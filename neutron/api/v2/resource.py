@@ -100,6 +100,8 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
                 {'NeutronError': get_exception_data(e)})
             kwargs = {'body': body, 'content_type': content_type}
             raise mapped_exc(**kwargs)
+        except webob.exc.HTTPNotModified:
+            raise
         except webob.exc.HTTPException as e:
             type_, value, tb = sys.exc_info()
             LOG.exception(_LE('%s failed'), action)
@@ -134,15 +136,26 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             raise webob.exc.HTTPInternalServerError(**kwargs)
 
         status = action_status.get(action, 200)
-        body = serializer.serialize(result)
+        body = None
+        app_iter = None
+        if wsgi.is_streamed(result):
+            # Collections are serialized while the response is written
+            app_iter = serializer.serialize_iter(result)
+        else:
+            body = serializer.serialize(result)
         # NOTE(jkoelker) Comply with RFC2616 section 9.7
         if status == 204:
             content_type = ''
             body = None
-
-        return webob.Response(request=request, status=status,
-                              content_type=content_type,
-                              body=body)
+            app_iter = None
+
+        response = webob.Response(request=request, status=status,
+                                  content_type=content_type,
+                                  body=body, app_iter=app_iter)
+        etag = request.environ.get('neutron.etag')
+        if etag:
+            response.etag = etag
+        return response
     return resource
 
 
@@ -0,0 +1,33 @@
+# Copyright 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Privileged helper opening rtnetlink sockets in network namespaces.
+
+It is started by the netlink backend of ip_lib through the root helper, with
+a unix socket as standard input.
+"""
+
+import socket
+
+from neutron.agent.linux import netlink
+
+
+def main():
+    conn = socket.fromfd(0, socket.AF_UNIX, socket.SOCK_STREAM)
+    # The agent may have made its end of the socket non blocking
+    conn.setblocking(True)
+    try:
+        netlink.serve_sockets(conn)
+    finally:
+        conn.close()
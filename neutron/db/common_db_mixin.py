@@ -15,6 +15,7 @@
 
 import weakref
 
+from sqlalchemy import orm
 from sqlalchemy import sql
 
 from neutron.common import exceptions as n_exc
@@ -170,15 +171,53 @@ class CommonDbMixin(object):
                                                     marker_obj=marker_obj)
         return collection
 
+    def _get_projected_columns(self, model, fields):
+        """Returns the columns to select for the fields, if any.
+
+        A projection is possible only when every requested field is a column
+        of the model.  Otherwise, or when no fields were requested, None is
+        returned and the full objects must be loaded to build the dicts.
+        """
+        if not fields:
+            return None
+        column_attrs = orm.class_mapper(model).column_attrs
+        if any(field not in column_attrs for field in fields):
+            return None
+        unique_fields = []
+        for field in fields:
+            if field not in unique_fields:
+                unique_fields.append(field)
+        return [getattr(model, field) for field in unique_fields]
+
+    def _get_projected_items(self, query, columns):
+        """Selects only the columns of the query and returns them as dicts.
+
+        No object is loaded, so neither the eagerly loaded relationships of
+        the model nor the dict extend functions are processed.
+        """
+        keys = [column.key for column in columns]
+        return [dict(zip(keys, row)) for row in query.with_entities(*columns)]
+
     def _get_collection(self, context, model, dict_func, filters=None,
                         fields=None, sorts=None, limit=None, marker_obj=None,
-                        page_reverse=False):
+                        page_reverse=False, column_projection=False):
+        """Returns the dicts of a collection.
+
+        With column_projection, fields which are all columns of the model are
+        selected directly, which is only valid if dict_func copies these
+        columns unchanged.
+        """
         query = self._get_collection_query(context, model, filters=filters,
                                            sorts=sorts,
                                            limit=limit,
                                            marker_obj=marker_obj,
                                            page_reverse=page_reverse)
-        items = [dict_func(c, fields) for c in query]
+        columns = (column_projection and
+                   self._get_projected_columns(model, fields))
+        if columns:
+            items = self._get_projected_items(query, columns)
+        else:
+            items = [dict_func(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
         return items
@@ -68,6 +68,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     __native_bulk_support = True
     __native_pagination_support = True
     __native_sorting_support = True
+    __revision_tracking_support = True
 
     def __init__(self):
         if cfg.CONF.notify_nova_on_port_status_changes:
@@ -586,12 +587,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                 'subnet_id': result['subnet_id']})
         return ips
 
-    def _validate_subnet_cidr(self, context, network, new_subnet_cidr):
+    def _validate_subnet_cidr(self, context, network, new_subnet_cidr,
+                              subnet_list=None):
         """Validate the CIDR for a subnet.
 
         Verifies the specified CIDR does not overlap with the ones defined
         for the other subnets specified for this network, or with any other
-        CIDR if overlapping IPs are disabled.
+        CIDR if overlapping IPs are disabled. These subnets are loaded
+        unless subnet_list is given.
         """
         new_subnet_ipset = netaddr.IPSet([new_subnet_cidr])
         # Disallow subnets with prefix length 0 as they will lead to
@@ -604,10 +607,11 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                 err_msg = _("0 is not allowed as CIDR prefix length")
                 raise n_exc.InvalidInput(error_message=err_msg)
 
-        if cfg.CONF.allow_overlapping_ips:
-            subnet_list = network.subnets
-        else:
-            subnet_list = self._get_all_subnets(context)
+        if subnet_list is None:
+            if cfg.CONF.allow_overlapping_ips:
+                subnet_list = network.subnets
+            else:
+                subnet_list = self._get_all_subnets(context)
         for subnet in subnet_list:
             if (netaddr.IPSet([subnet.cidr]) & new_subnet_ipset):
                 # don't give out details of the overlapping subnet
@@ -908,16 +912,36 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         #                unneeded db action if the operation raises
         tenant_id = self._get_tenant_id_for_create(context, n)
         with context.session.begin(subtransactions=True):
-            args = {'tenant_id': tenant_id,
-                    'id': n.get('id') or uuidutils.generate_uuid(),
-                    'name': n['name'],
-                    'admin_state_up': n['admin_state_up'],
-                    'shared': n['shared'],
-                    'status': n.get('status', constants.NET_STATUS_ACTIVE)}
-            network = models_v2.Network(**args)
+            network = self._make_network_model(tenant_id, n)
             context.session.add(network)
         return self._make_network_dict(network, process_extensions=False)
 
+    def _make_network_model(self, tenant_id, n):
+        args = {'tenant_id': tenant_id,
+                'id': n.get('id') or uuidutils.generate_uuid(),
+                'name': n['name'],
+                'admin_state_up': n['admin_state_up'],
+                'shared': n['shared'],
+                'status': n.get('status', constants.NET_STATUS_ACTIVE)}
+        return models_v2.Network(**args)
+
+    def _create_networks_db(self, context, networks):
+        """Creates the networks of a bulk request.
+
+        The networks are inserted with a single flush. Must be called in a
+        transaction.
+        """
+        network_dbs = [
+            self._make_network_model(
+                self._get_tenant_id_for_create(context, n), n)
+            for n in networks]
+        context.session.add_all(network_dbs)
+        context.session.flush()
+        for network_db in network_dbs:
+            # New networks have no subnets, there is no need to load them
+            orm.attributes.set_committed_value(network_db, 'subnets', [])
+        return network_dbs
+
     def update_network(self, context, id, network):
         n = network['network']
         with context.session.begin(subtransactions=True):
@@ -975,7 +999,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                     sorts=sorts,
                                     limit=limit,
                                     marker_obj=marker_obj,
-                                    page_reverse=page_reverse)
+                                    page_reverse=page_reverse,
+                                    column_projection=True)
 
     def get_networks_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Network,
@@ -1079,11 +1104,22 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     def create_subnet(self, context, subnet):
 
-        net = netaddr.IPNetwork(subnet['subnet']['cidr'])
-        # turn the CIDR into a proper subnet
-        subnet['subnet']['cidr'] = '%s/%s' % (net.network, net.prefixlen)
-
         s = subnet['subnet']
+        self._prepare_subnet(context, s)
+
+        tenant_id = self._get_tenant_id_for_create(context, s)
+        with context.session.begin(subtransactions=True):
+            network = self._get_network(context, s["network_id"])
+            self._validate_subnet_cidr(context, network, s['cidr'])
+            subnet = self._make_subnet_model(context, tenant_id, s, network)
+
+        return self._make_subnet_dict(subnet)
+
+    def _prepare_subnet(self, context, s):
+        """Completes and validates the attributes of a new subnet."""
+        net = netaddr.IPNetwork(s['cidr'])
+        # turn the CIDR into a proper subnet
+        s['cidr'] = '%s/%s' % (net.network, net.prefixlen)
 
         if s['gateway_ip'] is attributes.ATTR_NOT_SPECIFIED:
             s['gateway_ip'] = str(netaddr.IPAddress(net.first + 1))
@@ -1098,55 +1134,110 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
         self._validate_subnet(context, s)
 
-        tenant_id = self._get_tenant_id_for_create(context, s)
-        with context.session.begin(subtransactions=True):
-            network = self._get_network(context, s["network_id"])
-            self._validate_subnet_cidr(context, network, s['cidr'])
-            # The 'shared' attribute for subnets is for internal plugin
-            # use only. It is not exposed through the API
-            args = {'tenant_id': tenant_id,
-                    'id': s.get('id') or uuidutils.generate_uuid(),
-                    'name': s['name'],
-                    'network_id': s['network_id'],
-                    'ip_version': s['ip_version'],
-                    'cidr': s['cidr'],
-                    'enable_dhcp': s['enable_dhcp'],
-                    'gateway_ip': s['gateway_ip'],
-                    'shared': network.shared}
-            if s['ip_version'] == 6 and s['enable_dhcp']:
-                if attributes.is_attr_set(s['ipv6_ra_mode']):
-                    args['ipv6_ra_mode'] = s['ipv6_ra_mode']
-                if attributes.is_attr_set(s['ipv6_address_mode']):
-                    args['ipv6_address_mode'] = s['ipv6_address_mode']
-            subnet = models_v2.Subnet(**args)
-
-            context.session.add(subnet)
-            if s['dns_nameservers'] is not attributes.ATTR_NOT_SPECIFIED:
-                for addr in s['dns_nameservers']:
-                    ns = models_v2.DNSNameServer(address=addr,
-                                                 subnet_id=subnet.id)
-                    context.session.add(ns)
-
-            if s['host_routes'] is not attributes.ATTR_NOT_SPECIFIED:
-                for rt in s['host_routes']:
-                    route = models_v2.SubnetRoute(
-                        subnet_id=subnet.id,
-                        destination=rt['destination'],
-                        nexthop=rt['nexthop'])
-                    context.session.add(route)
-
-            for pool in s['allocation_pools']:
-                ip_pool = models_v2.IPAllocationPool(subnet=subnet,
-                                                     first_ip=pool['start'],
-                                                     last_ip=pool['end'])
-                context.session.add(ip_pool)
-                ip_range = models_v2.IPAvailabilityRange(
-                    ipallocationpool=ip_pool,
-                    first_ip=pool['start'],
-                    last_ip=pool['end'])
-                context.session.add(ip_range)
+    def _make_subnet_model(self, context, tenant_id, s, network):
+        """Adds a subnet and its DNS servers, routes and pools to the session.
 
-        return self._make_subnet_dict(subnet)
+        Returns the subnet, whose DNS servers and routes are not loaded.
+        """
+        # The 'shared' attribute for subnets is for internal plugin
+        # use only. It is not exposed through the API
+        args = {'tenant_id': tenant_id,
+                'id': s.get('id') or uuidutils.generate_uuid(),
+                'name': s['name'],
+                'network_id': s['network_id'],
+                'ip_version': s['ip_version'],
+                'cidr': s['cidr'],
+                'enable_dhcp': s['enable_dhcp'],
+                'gateway_ip': s['gateway_ip'],
+                'shared': network.shared}
+        if s['ip_version'] == 6 and s['enable_dhcp']:
+            if attributes.is_attr_set(s['ipv6_ra_mode']):
+                args['ipv6_ra_mode'] = s['ipv6_ra_mode']
+            if attributes.is_attr_set(s['ipv6_address_mode']):
+                args['ipv6_address_mode'] = s['ipv6_address_mode']
+        subnet = models_v2.Subnet(**args)
+
+        context.session.add(subnet)
+        if s['dns_nameservers'] is not attributes.ATTR_NOT_SPECIFIED:
+            for addr in s['dns_nameservers']:
+                ns = models_v2.DNSNameServer(address=addr,
+                                             subnet_id=subnet.id)
+                context.session.add(ns)
+
+        if s['host_routes'] is not attributes.ATTR_NOT_SPECIFIED:
+            for rt in s['host_routes']:
+                route = models_v2.SubnetRoute(
+                    subnet_id=subnet.id,
+                    destination=rt['destination'],
+                    nexthop=rt['nexthop'])
+                context.session.add(route)
+
+        for pool in s['allocation_pools']:
+            ip_pool = models_v2.IPAllocationPool(subnet=subnet,
+                                                 first_ip=pool['start'],
+                                                 last_ip=pool['end'])
+            context.session.add(ip_pool)
+            ip_range = models_v2.IPAvailabilityRange(
+                ipallocationpool=ip_pool,
+                first_ip=pool['start'],
+                last_ip=pool['end'])
+            context.session.add(ip_range)
+        return subnet
+
+    def _create_subnets_db(self, context, subnets):
+        """Creates the subnets of a bulk request.
+
+        The networks of the subnets, and the subnets their CIDRs must not
+        overlap with, are loaded with one query each. The subnets, their
+        DNS servers, routes, allocation pools and availability ranges are
+        then inserted with a single flush. Must be called in a transaction.
+        """
+        for s in subnets:
+            self._prepare_subnet(context, s)
+        network_ids = set(s['network_id'] for s in subnets)
+        query = self._model_query(context, models_v2.Network).filter(
+            models_v2.Network.id.in_(network_ids))
+        networks = dict((network.id, network) for network in query)
+        for s in subnets:
+            if s['network_id'] not in networks:
+                raise n_exc.NetworkNotFound(net_id=s['network_id'])
+
+        if cfg.CONF.allow_overlapping_ips:
+            subnet_lists = dict((network.id, list(network.subnets))
+                                for network in networks.values())
+        else:
+            all_subnets = list(self._get_all_subnets(context))
+            subnet_lists = dict.fromkeys(network_ids, all_subnets)
+
+        subnet_dbs = []
+        for s in subnets:
+            network = networks[s['network_id']]
+            subnet_list = subnet_lists[network.id]
+            self._validate_subnet_cidr(context, network, s['cidr'],
+                                       subnet_list=subnet_list)
+            tenant_id = self._get_tenant_id_for_create(context, s)
+            subnet = self._make_subnet_model(context, tenant_id, s, network)
+            # Later subnets of the request must not overlap with this one
+            subnet_list.append(subnet)
+            subnet_dbs.append(subnet)
+        context.session.flush()
+
+        # Load the DNS servers and routes of all the subnets at once
+        subnet_ids = [subnet_db.id for subnet_db in subnet_dbs]
+        for attr, key, model in (
+                ('dns_nameservers', 'dns_nameservers',
+                 models_v2.DNSNameServer),
+                ('routes', 'host_routes', models_v2.SubnetRoute)):
+            rows = {}
+            if any(attributes.is_attr_set(s[key]) for s in subnets):
+                query = context.session.query(model).filter(
+                    model.subnet_id.in_(subnet_ids))
+                for row in query:
+                    rows.setdefault(row.subnet_id, []).append(row)
+            for subnet in subnet_dbs:
+                orm.attributes.set_committed_value(
+                    subnet, attr, rows.get(subnet.id, []))
+        return subnet_dbs
 
     def _update_subnet_dns_nameservers(self, context, id, s):
         old_dns_list = self._get_dns_by_subnet(context, id)
@@ -1304,7 +1395,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                     sorts=sorts,
                                     limit=limit,
                                     marker_obj=marker_obj,
-                                    page_reverse=page_reverse)
+                                    page_reverse=page_reverse,
+                                    column_projection=True)
 
     def get_subnets_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Subnet,
@@ -1481,11 +1573,18 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                   sorts=None, limit=None, marker=None,
                   page_reverse=False):
         marker_obj = self._get_marker_obj(context, 'port', limit, marker)
+        # Filtering on fixed IPs joins the allocations, which may return a
+        # port more than once without the uniquing done when loading objects.
+        columns = (not (filters and filters.get('fixed_ips')) and
+                   self._get_projected_columns(models_v2.Port, fields))
         query = self._get_ports_query(context, filters=filters,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
-        items = [self._make_port_dict(c, fields) for c in query]
+        if columns:
+            items = self._get_projected_items(query, columns)
+        else:
+            items = [self._make_port_dict(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
         return items
@@ -149,12 +149,12 @@ class External_net_db_mixin(object):
         if not vals:
             return nets
 
-        ext_nets = set(en['network_id']
-                       for en in context.session.query(ExternalNetwork))
+        # The network dicts are already extended by _extend_network_dict_l3
+        # from the eagerly loaded association, no query is needed.
         if vals[0]:
-            return [n for n in nets if n['id'] in ext_nets]
+            return [n for n in nets if n[external_net.EXTERNAL]]
         else:
-            return [n for n in nets if n['id'] not in ext_nets]
+            return [n for n in nets if not n[external_net.EXTERNAL]]
 
     def get_external_network_id(self, context):
         nets = self.get_networks(context, {external_net.EXTERNAL: [True]})
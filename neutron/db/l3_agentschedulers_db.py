@@ -291,8 +291,12 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         else:
             return {'routers': []}
 
-    def list_active_sync_routers_on_active_l3_agent(
-            self, context, host, router_ids):
+    def list_router_ids_on_active_l3_agent(self, context, host,
+                                           router_ids=None):
+        """Returns the ids of the routers bound to the l3 agent on host.
+
+        No routers are returned if the agent is administratively down.
+        """
         agent = self._get_agent_by_type_and_host(
             context, constants.AGENT_TYPE_L3, host)
         if not agent.admin_state_up:
@@ -304,7 +308,12 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         if router_ids:
             query = query.filter(
                 RouterL3AgentBinding.router_id.in_(router_ids))
-        router_ids = [item[0] for item in query]
+        return [item[0] for item in query]
+
+    def list_active_sync_routers_on_active_l3_agent(
+            self, context, host, router_ids):
+        router_ids = self.list_router_ids_on_active_l3_agent(
+            context, host, router_ids)
         if router_ids:
             if n_utils.is_extension_supported(self,
                                               constants.L3_HA_MODE_EXT_ALIAS):
@@ -80,6 +80,8 @@ class Router(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
         RouterPort,
         backref='router',
         lazy='dynamic')
+    __table_args__ = (
+        sa.Index('ix_routers_tenant_id', 'tenant_id'),)
 
 
 class FloatingIP(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
@@ -102,6 +104,8 @@ class FloatingIP(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     last_known_router_id = sa.Column(sa.String(36))
     status = sa.Column(sa.String(16))
     router = orm.relationship(Router, backref='floating_ips')
+    __table_args__ = (
+        sa.Index('ix_floatingips_tenant_id', 'tenant_id'),)
 
 
 class L3_NAT_dbonly_mixin(l3.RouterPluginBase):
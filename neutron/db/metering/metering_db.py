@@ -53,6 +53,10 @@ class MeteringLabel(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
         foreign_keys='MeteringLabel.tenant_id',
         uselist=True)
     shared = sa.Column(sa.Boolean, default=False, server_default=sql.false())
+    # Incremented on each rule change so that agents can detect missed
+    # rule updates
+    revision_number = sa.Column(sa.Integer, nullable=False, default=0,
+                                server_default='0')
 
 
 class MeteringDbMixin(metering.MeteringPluginBase,
@@ -121,6 +125,14 @@ class MeteringDbMixin(metering.MeteringPluginBase,
                'excluded': metering_label_rule['excluded']}
         return self._fields(res, fields)
 
+    def _bump_metering_label_revision(self, context, label_id):
+        # The increment is done by the database so that concurrent rule
+        # changes on the same label never get the same revision.
+        (context.session.query(MeteringLabel).
+         filter_by(id=label_id).
+         update({'revision_number': MeteringLabel.revision_number + 1},
+                synchronize_session='fetch'))
+
     def get_metering_label_rules(self, context, filters=None, fields=None,
                                  sorts=None, limit=None, marker=None,
                                  page_reverse=False):
@@ -177,6 +189,7 @@ class MeteringDbMixin(metering.MeteringPluginBase,
                                             excluded=m['excluded'],
                                             remote_ip_prefix=ip_prefix)
             context.session.add(metering_db)
+            self._bump_metering_label_revision(context, label_id)
 
         return self._make_metering_label_rule_dict(metering_db)
 
@@ -187,6 +200,8 @@ class MeteringDbMixin(metering.MeteringPluginBase,
             except orm.exc.NoResultFound:
                 raise metering.MeteringLabelRuleNotFound(rule_id=rule_id)
 
+            self._bump_metering_label_revision(context,
+                                               rule['metering_label_id'])
             context.session.delete(rule)
 
     def _get_metering_rules_dict(self, metering_label):
@@ -208,27 +223,36 @@ class MeteringDbMixin(metering.MeteringPluginBase,
 
         return res
 
-    def _process_sync_metering_data(self, context, labels):
+    def _get_metering_label_routers(self, context, label):
+        if label.shared:
+            return self._get_collection_query(context, l3_db.Router)
+        return label.routers
+
+    def _process_sync_metering_data(self, context, labels, router_ids=None):
         all_routers = None
 
         routers_dict = {}
         for label in labels:
             if label.shared:
                 if not all_routers:
-                    all_routers = self._get_collection_query(context,
-                                                             l3_db.Router)
+                    all_routers = self._get_metering_label_routers(context,
+                                                                   label)
                 routers = all_routers
             else:
                 routers = label.routers
 
             for router in routers:
+                if router_ids and router['id'] not in router_ids:
+                    continue
                 router_dict = routers_dict.get(
                     router['id'],
                     self._make_router_dict(router))
 
                 rules = self._get_metering_rules_dict(label)
 
-                data = {'id': label['id'], 'rules': rules}
+                data = {'id': label['id'],
+                        'revision_number': label['revision_number'],
+                        'rules': rules}
                 router_dict[constants.METERING_LABEL_KEY].append(data)
 
                 routers_dict[router['id']] = router_dict
@@ -244,4 +268,24 @@ class MeteringDbMixin(metering.MeteringPluginBase,
             labels = (labels.join(MeteringLabel.routers).
                       filter(l3_db.Router.id.in_(router_ids)))
 
-        return self._process_sync_metering_data(context, labels)
+        return self._process_sync_metering_data(context, labels, router_ids)
+
+    def get_sync_data_metering_rule(self, context, rule):
+        """Returns the routers of the label of a rule with only this rule.
+
+        The label carries its current revision number so that the agents can
+        apply the change incrementally.
+        """
+        label = self._get_by_id(context, MeteringLabel,
+                                rule['metering_label_id'])
+        data = {'id': label['id'],
+                'revision_number': label['revision_number'],
+                'rule': rule}
+
+        routers = []
+        for router in self._get_metering_label_routers(context, label):
+            router_dict = self._make_router_dict(router)
+            router_dict[constants.METERING_LABEL_KEY].append(data)
+            routers.append(router_dict)
+
+        return routers
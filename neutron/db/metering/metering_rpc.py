@@ -25,8 +25,14 @@ LOG = logging.getLogger(__name__)
 
 
 class MeteringRpcCallbacks(object):
+    """Metering agent RPC callbacks.
 
-    target = messaging.Target(version='1.0')
+    API version history:
+        1.0 - Initial version.
+        1.1 - Add router_ids to get_sync_data_metering.
+    """
+
+    target = messaging.Target(version='1.1')
 
     def __init__(self, meter_plugin):
         self.meter_plugin = meter_plugin
@@ -38,9 +44,11 @@ class MeteringRpcCallbacks(object):
             return
 
         host = kwargs.get('host')
+        requested_ids = kwargs.get('router_ids')
         if not utils.is_extension_supported(
             l3_plugin, consts.L3_AGENT_SCHEDULER_EXT_ALIAS) or not host:
-            return self.meter_plugin.get_sync_data_metering(context)
+            return self.meter_plugin.get_sync_data_metering(
+                context, router_ids=requested_ids)
         else:
             agents = l3_plugin.get_l3_agents(context, filters={'host': [host]})
             if not agents:
@@ -49,6 +57,9 @@ class MeteringRpcCallbacks(object):
 
             routers = l3_plugin.list_routers_on_l3_agent(context, agents[0].id)
             router_ids = [router['id'] for router in routers['routers']]
+            if requested_ids:
+                router_ids = [router_id for router_id in router_ids
+                              if router_id in requested_ids]
             if not router_ids:
                 return
 
@@ -0,0 +1,46 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+"""pagination_indexes
+
+Revision ID: 1f2e3d4c5b6a
+Revises: 4a1b2c3d5e6f
+Create Date: 2015-01-19 14:02:51.137940
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1f2e3d4c5b6a'
+down_revision = '4a1b2c3d5e6f'
+
+from alembic import op
+
+
+# NOTE: tenant_id is a VARCHAR(255), which leaves no room for the id in an
+# InnoDB utf8 index key. InnoDB appends the primary key to secondary indexes
+# anyway, so these also serve the ordering on id used by pagination.
+TENANT_TABLES = ['networks', 'subnets', 'ports', 'routers', 'floatingips',
+                 'securitygroups']
+
+
+def upgrade(active_plugins=None, options=None):
+    for table in TENANT_TABLES:
+        op.create_index('ix_%s_tenant_id' % table, table, ['tenant_id'])
+    op.create_index('ix_ports_network_id_id', 'ports', ['network_id', 'id'])
+
+
+def downgrade(active_plugins=None, options=None):
+    op.drop_index('ix_ports_network_id_id', 'ports')
+    for table in TENANT_TABLES:
+        op.drop_index('ix_%s_tenant_id' % table, table)
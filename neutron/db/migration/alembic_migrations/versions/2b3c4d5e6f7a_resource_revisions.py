@@ -0,0 +1,53 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+"""resource_revisions
+
+Revision ID: 2b3c4d5e6f7a
+Revises: 1f2e3d4c5b6a
+Create Date: 2015-01-22 09:41:27.601284
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2b3c4d5e6f7a'
+down_revision = '1f2e3d4c5b6a'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+COLLECTIONS = ('networks', 'subnets', 'ports', 'routers')
+SHARDS = 16
+
+
+def upgrade(active_plugins=None, options=None):
+    op.create_table(
+        'resourcerevisions',
+        sa.Column('collection', sa.String(length=255), nullable=False),
+        sa.Column('shard', sa.Integer(), autoincrement=False,
+                  nullable=False),
+        sa.Column('revision', sa.BigInteger(), server_default='0',
+                  nullable=False),
+        sa.PrimaryKeyConstraint('collection', 'shard'))
+    # The writing transactions only update the counters
+    for collection in COLLECTIONS:
+        for shard in range(SHARDS):
+            op.execute("INSERT INTO resourcerevisions "
+                       "(collection, shard, revision) "
+                       "VALUES ('%s', %d, 0)" % (collection, shard))
+
+
+def downgrade(active_plugins=None, options=None):
+    op.drop_table('resourcerevisions')
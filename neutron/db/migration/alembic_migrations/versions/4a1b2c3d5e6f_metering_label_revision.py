@@ -0,0 +1,39 @@
+# Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+"""metering_label_revision
+
+Revision ID: 4a1b2c3d5e6f
+Revises: 28c0ffb8ebbd
+Create Date: 2015-01-12 10:21:07.418302
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4a1b2c3d5e6f'
+down_revision = '28c0ffb8ebbd'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade(active_plugins=None, options=None):
+    op.add_column('meteringlabels', sa.Column('revision_number',
+                                              sa.Integer(),
+                                              server_default='0',
+                                              nullable=False))
+
+
+def downgrade(active_plugins=None, options=None):
+    op.drop_column('meteringlabels', 'revision_number')
@@ -135,6 +135,9 @@ class Port(model_base.BASEV2, HasId, HasTenant):
     status = sa.Column(sa.String(16), nullable=False)
     device_id = sa.Column(sa.String(255), nullable=False)
     device_owner = sa.Column(sa.String(255), nullable=False)
+    __table_args__ = (
+        sa.Index('ix_ports_tenant_id', 'tenant_id'),
+        sa.Index('ix_ports_network_id_id', 'network_id', 'id'))
 
     def __init__(self, id=None, tenant_id=None, name=None, network_id=None,
                  mac_address=None, admin_state_up=None, status=None,
@@ -199,6 +202,8 @@ class Subnet(model_base.BASEV2, HasId, HasTenant):
                                   constants.DHCPV6_STATEFUL,
                                   constants.DHCPV6_STATELESS,
                                   name='ipv6_address_modes'), nullable=True)
+    __table_args__ = (
+        sa.Index('ix_subnets_tenant_id', 'tenant_id'),)
 
 
 class Network(model_base.BASEV2, HasId, HasTenant):
@@ -211,3 +216,5 @@ class Network(model_base.BASEV2, HasId, HasTenant):
     status = sa.Column(sa.String(16))
     admin_state_up = sa.Column(sa.Boolean)
     shared = sa.Column(sa.Boolean)
+    __table_args__ = (
+        sa.Index('ix_networks_tenant_id', 'tenant_id'),)
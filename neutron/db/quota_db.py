@@ -13,11 +13,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+from oslo.config import cfg
+from oslo.db import exception as db_exc
+from oslo.utils import timeutils
 import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy import orm
 
 from neutron.common import exceptions
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.openstack.common import uuidutils
+from neutron import quota
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -31,6 +40,37 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2):
+    """Represents the number of resources of a kind owned by a tenant.
+
+    A dirty usage has to be counted again before being used.
+    """
+    tenant_id = sa.Column(sa.String(255), primary_key=True)
+    resource = sa.Column(sa.String(255), primary_key=True)
+    in_use = sa.Column(sa.Integer, nullable=False, default=0,
+                       server_default='0')
+    dirty = sa.Column(sa.Boolean, nullable=False, default=False,
+                      server_default=sa.sql.false())
+
+
+class ResourceDelta(model_base.BASEV2):
+    """Represents the number of resources of a kind in a reservation."""
+    resource = sa.Column(sa.String(255), primary_key=True)
+    reservation_id = sa.Column(sa.String(36),
+                               sa.ForeignKey('reservations.id',
+                                             ondelete='CASCADE'),
+                               primary_key=True)
+    amount = sa.Column(sa.Integer, nullable=False)
+
+
+class Reservation(model_base.BASEV2, models_v2.HasId):
+    """Represents resources reserved by a tenant while being created."""
+    tenant_id = sa.Column(sa.String(255), index=True)
+    expiration = sa.Column(sa.DateTime, nullable=False)
+    deltas = orm.relationship(ResourceDelta, lazy='joined',
+                              cascade='all, delete-orphan')
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain quota
     information.
@@ -84,8 +124,8 @@ class DbQuotaDriver(object):
 
         all_tenant_quotas = {}
 
-        for quota in context.session.query(Quota):
-            tenant_id = quota['tenant_id']
+        for q in context.session.query(Quota):
+            tenant_id = q['tenant_id']
 
             # avoid setdefault() because only want to copy when actually req'd
             tenant_quota = all_tenant_quotas.get(tenant_id)
@@ -94,7 +134,7 @@ class DbQuotaDriver(object):
                 tenant_quota['tenant_id'] = tenant_id
                 all_tenant_quotas[tenant_id] = tenant_quota
 
-            tenant_quota[quota['resource']] = quota['limit']
+            tenant_quota[q['resource']] = q['limit']
 
         return all_tenant_quotas.values()
 
@@ -177,3 +217,252 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+
+def _is_usage_tracked():
+    return cfg.CONF.QUOTAS.quota_driver == quota.QUOTA_TRACKING_DRIVER
+
+
+def _get_tracked_tables():
+    """Maps the tables of the resources registered in QUOTAS.
+
+    The table of a resource is named after it, like securitygrouprules for
+    security_group_rule, and has a tenant_id column.  Returns a dict from
+    table names to resource names and a dict from table names to the
+    resources whose rows are deleted by the database when rows of the table
+    are deleted.
+    """
+    names = dict((resource.replace('_', '') + 's', resource)
+                 for resource in quota.QUOTAS.resources)
+    tables = model_base.BASEV2.metadata.tables
+    resources = dict((name, resource) for name, resource in names.items()
+                     if name in tables and 'tenant_id' in tables[name].c)
+    cascades = {}
+    for name, resource in resources.items():
+        for fk in tables[name].foreign_keys:
+            if fk.ondelete and fk.ondelete.upper() == 'CASCADE':
+                cascades.setdefault(fk.column.table.name, set()).add(resource)
+    return resources, cascades
+
+
+_tracked_tables = (None, None)
+
+
+def get_tracked_tables():
+    global _tracked_tables
+    # Resources are registered and models loaded along with extensions
+    key = (frozenset(quota.QUOTAS.resources),
+           len(model_base.BASEV2.metadata.tables))
+    if _tracked_tables[0] != key:
+        _tracked_tables = (key, _get_tracked_tables())
+    return _tracked_tables[1]
+
+
+def _update_usages(session, deltas, dirty):
+    """Updates the usages by deltas and marks the dirty ones.
+
+    dirty holds (resource, tenant_id) tuples, a tenant_id of None marking
+    the usages of all the tenants.
+    """
+    table = QuotaUsage.__table__
+    # Rows are always updated in the same order to avoid deadlocks
+    for (tenant_id, resource), delta in sorted(deltas.items()):
+        if delta:
+            session.execute(table.update().where(
+                sa.and_(table.c.tenant_id == tenant_id,
+                        table.c.resource == resource)).values(
+                in_use=table.c.in_use + delta))
+    all_tenants = set(resource for resource, tenant_id in dirty
+                      if tenant_id is None)
+    for resource, tenant_id in sorted(dirty):
+        if tenant_id is None:
+            criteria = table.c.resource == resource
+        elif resource not in all_tenants:
+            criteria = sa.and_(table.c.tenant_id == tenant_id,
+                               table.c.resource == resource)
+        else:
+            continue
+        session.execute(table.update().where(criteria).values(dirty=True))
+
+
+def _cascaded_usages(cascades, table_name, tenant_id):
+    # The rows deleted by the database belong to the tenant of their parent
+    return set((resource, tenant_id)
+               for resource in cascades.get(table_name, ()))
+
+
+@event.listens_for(orm.Session, 'after_flush')
+def _track_flushed_resources(session, flush_context):
+    if not _is_usage_tracked():
+        return
+    resources, cascades = get_tracked_tables()
+    deltas = {}
+    dirty = set()
+    for instances, delta in ((session.new, 1), (session.deleted, -1)):
+        for instance in instances:
+            table = getattr(instance, '__table__', None)
+            if table is None:
+                continue
+            resource = resources.get(table.name)
+            if resource:
+                key = (instance.tenant_id, resource)
+                deltas[key] = deltas.get(key, 0) + delta
+            if delta < 0:
+                dirty |= _cascaded_usages(
+                    cascades, table.name, getattr(instance, 'tenant_id', None))
+    _update_usages(session, deltas, dirty)
+
+
+@event.listens_for(orm.Session, 'after_bulk_delete')
+def _track_bulk_deleted_resources(delete_context):
+    if not _is_usage_tracked() or not delete_context.rowcount:
+        return
+    resources, cascades = get_tracked_tables()
+    name = delete_context.primary_table.name
+    deltas = {}
+    dirty = set()
+    resource = resources.get(name)
+    # The instances matched in the session are known when the session
+    # is synchronized by evaluating the criteria of the query.
+    matched = getattr(delete_context, 'matched_objects', None)
+    if matched is not None and len(matched) == delete_context.rowcount:
+        for instance in matched:
+            tenant_id = getattr(instance, 'tenant_id', None)
+            if resource:
+                key = (tenant_id, resource)
+                deltas[key] = deltas.get(key, 0) - 1
+            dirty |= _cascaded_usages(cascades, name, tenant_id)
+    else:
+        dirty |= _cascaded_usages(cascades, name, None)
+        if resource:
+            dirty.add((resource, None))
+    _update_usages(delete_context.session, deltas, dirty)
+
+
+class UsageTrackingQuotaDriver(DbQuotaDriver):
+    """Driver keeping track of the usage of the tenants in the database.
+
+    The usage of the resources stored in tables is updated along with the
+    rows of the tables, in the same transaction, so that the resources of a
+    tenant do not need to be counted for checking its quotas.  Resources
+    being created are reserved until their creation completes.
+
+    Usages are only counted when first needed, or when rows were deleted
+    without the driver knowing their tenant.
+    """
+
+    def _ensure_usages(self, context, tenant_id, keys):
+        query = context.session.query(QuotaUsage.resource).filter(
+            QuotaUsage.tenant_id == tenant_id,
+            QuotaUsage.resource.in_(keys))
+        existing = set(usage.resource for usage in query)
+        for resource in sorted(set(keys) - existing):
+            try:
+                with context.session.begin():
+                    context.session.add(QuotaUsage(tenant_id=tenant_id,
+                                                   resource=resource,
+                                                   in_use=0, dirty=True))
+            except db_exc.DBDuplicateEntry:
+                # The usage was created concurrently
+                pass
+
+    def _get_usages(self, context, tenant_id, resources, keys, count_args):
+        """Returns the usages of a tenant, locking the tracked ones.
+
+        Must be called in a transaction.
+        """
+        tables = dict((resource, name) for name, resource in
+                      get_tracked_tables()[0].items() if resource in keys)
+        usages = dict((key, resources[key].count(context, *count_args))
+                      for key in keys if key not in tables)
+        if not tables:
+            return usages
+        query = context.session.query(QuotaUsage).filter(
+            QuotaUsage.tenant_id == tenant_id,
+            QuotaUsage.resource.in_(list(tables))).with_lockmode('update')
+        for usage in query:
+            if usage.dirty:
+                table = model_base.BASEV2.metadata.tables[
+                    tables[usage.resource]]
+                usage.in_use = context.session.query(
+                    sa.func.count()).select_from(table).filter(
+                    table.c.tenant_id == tenant_id).scalar()
+                usage.dirty = False
+            usages[usage.resource] = usage.in_use
+        return usages
+
+    def _get_reserved(self, context, tenant_id, keys, now):
+        query = context.session.query(
+            ResourceDelta.resource, sa.func.sum(ResourceDelta.amount)).join(
+            Reservation).filter(
+            Reservation.tenant_id == tenant_id,
+            Reservation.expiration > now,
+            ResourceDelta.resource.in_(keys)).group_by(
+            ResourceDelta.resource)
+        return dict((resource, amount or 0) for resource, amount in query)
+
+    def make_reservation(self, context, tenant_id, resources, deltas,
+                         *count_args):
+        """Reserve resources for a tenant before creating them.
+
+        The usages and current reservations of the tenant plus the deltas
+        are checked against its quotas.  Expired reservations of the
+        tenant are deleted.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to reserve resources for.
+        :param resources: A dictionary of the registered resources.
+        :param deltas: A dictionary of the numbers of resources to create.
+        :param count_args: The arguments of the count functions of the
+                           resources whose usage is not tracked.
+        :returns: the id of the reservation.
+        """
+
+        keys = deltas.keys()
+        quotas = self._get_quotas(context, tenant_id, resources, keys)
+        self._ensure_usages(context, tenant_id,
+                            [key for key in get_tracked_tables()[0].values()
+                             if key in deltas])
+        now = timeutils.utcnow()
+        with context.session.begin(subtransactions=True):
+            usages = self._get_usages(context, tenant_id, resources, keys,
+                                      count_args)
+            reserved = self._get_reserved(context, tenant_id, keys, now)
+            overs = [key for key, delta in deltas.items()
+                     if quotas[key] >= 0 and
+                     quotas[key] < usages[key] + reserved.get(key, 0) + delta]
+            if overs:
+                raise exceptions.OverQuota(overs=sorted(overs))
+
+            expired = context.session.query(Reservation).filter(
+                Reservation.tenant_id == tenant_id,
+                Reservation.expiration <= now)
+            for reservation in expired:
+                context.session.delete(reservation)
+            expiration = now + datetime.timedelta(
+                seconds=cfg.CONF.QUOTAS.reservation_expiration)
+            reservation = Reservation(id=uuidutils.generate_uuid(),
+                                      tenant_id=tenant_id,
+                                      expiration=expiration)
+            reservation.deltas = [ResourceDelta(resource=key, amount=delta)
+                                  for key, delta in deltas.items()]
+            context.session.add(reservation)
+        return reservation.id
+
+    def _remove_reservation(self, context, reservation_id):
+        with context.session.begin(subtransactions=True):
+            reservation = context.session.query(Reservation).filter_by(
+                id=reservation_id).first()
+            if reservation:
+                context.session.delete(reservation)
+
+    def commit_reservation(self, context, reservation_id):
+        """Remove a reservation whose resources have been created.
+
+        The usages were updated while the resources were created.
+        """
+        self._remove_reservation(context, reservation_id)
+
+    def cancel_reservation(self, context, reservation_id):
+        """Remove a reservation whose resources were not created."""
+        self._remove_reservation(context, reservation_id)
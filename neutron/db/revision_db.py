@@ -0,0 +1,193 @@
+# Copyright 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Revisions of the collections of resources.
+
+The revision of a tracked collection is incremented by every transaction
+which wrote to a table holding attributes of its resources in the API,
+like the IP allocations of ports. The API uses the revisions to build the
+ETags of GET responses.
+
+Each revision is split into REVISION_SHARDS counters, a transaction only
+increments the counters of the resources it wrote, chosen from their ids.
+The revision of a collection is the sum of its counters, which grows with
+each write, while writers of different resources rarely wait for the same
+counter.
+
+The counters are incremented in the writing transaction, so that a change
+can not be committed without its revision, but only right before the
+commit, so that writers only wait for each other on the lock of a counter
+while committing.
+"""
+
+import zlib
+
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy import orm
+
+from neutron.db import model_base
+
+# The collections whose revisions make up their ETags
+TRACKED_COLLECTIONS = {
+    'networks': ('networks', ),
+    'subnets': ('subnets', ),
+    'ports': ('ports', ),
+    # The external gateway info of routers comes from their gateway port
+    'routers': ('routers', 'ports'),
+}
+
+# The tables holding attributes of the resources of the tracked collections,
+# with the column of each table holding the id of the resource
+REVISED_TABLES = {
+    'networks': (('networks', 'id'), ),
+    # Networks list the ids of their subnets
+    'subnets': (('networks', 'network_id'), ('subnets', 'id')),
+    'ml2_network_segments': (('networks', 'network_id'), ),
+    'externalnetworks': (('networks', 'network_id'), ),
+    'networksecuritybindings': (('networks', 'network_id'), ),
+    'ipallocationpools': (('subnets', 'subnet_id'), ),
+    'dnsnameservers': (('subnets', 'subnet_id'), ),
+    'subnetroutes': (('subnets', 'subnet_id'), ),
+    'ports': (('ports', 'id'), ),
+    'ipallocations': (('ports', 'port_id'), ),
+    'ml2_port_bindings': (('ports', 'port_id'), ),
+    'ml2_dvr_port_bindings': (('ports', 'port_id'), ),
+    'portbindingports': (('ports', 'port_id'), ),
+    'securitygroupportbindings': (('ports', 'port_id'), ),
+    'allowedaddresspairs': (('ports', 'port_id'), ),
+    'extradhcpopts': (('ports', 'port_id'), ),
+    'portsecuritybindings': (('ports', 'port_id'), ),
+    'routers': (('routers', 'id'), ),
+    'routerroutes': (('routers', 'router_id'), ),
+    'router_extra_attributes': (('routers', 'router_id'), ),
+}
+
+# Number of counters of the revision of each collection
+REVISION_SHARDS = 16
+
+_REVISED_KEY = 'neutron_revised_collections'
+
+
+class ResourceRevision(model_base.BASEV2):
+    """Represents a counter of the revision of a collection of resources."""
+
+    collection = sa.Column(sa.String(255), primary_key=True)
+    shard = sa.Column(sa.Integer, primary_key=True, autoincrement=False)
+    revision = sa.Column(sa.BigInteger, nullable=False, default=0,
+                         server_default='0')
+
+
+def get_revisions(context, collection):
+    """Returns the revisions versioning a collection in the API.
+
+    None is returned if the collection is not tracked.
+    """
+    collections = TRACKED_COLLECTIONS.get(collection)
+    if not collections:
+        return None
+    query = context.session.query(
+        ResourceRevision.collection,
+        sa.func.sum(ResourceRevision.revision)).filter(
+            ResourceRevision.collection.in_(collections)).group_by(
+                ResourceRevision.collection)
+    revisions = dict((c, int(revision)) for c, revision in query)
+    return [revisions.get(c, 0) for c in collections]
+
+
+def _get_shard(resource_id):
+    if not resource_id:
+        return 0
+    return zlib.crc32(str(resource_id)) % REVISION_SHARDS
+
+
+def _record(session, counters):
+    session.info.setdefault(_REVISED_KEY, set()).update(counters)
+
+
+def _record_instance(session, instance):
+    table = getattr(instance, '__table__', None)
+    if table is None or table.name not in REVISED_TABLES:
+        return
+    mapper = orm.object_mapper(instance)
+    # The attributes are not loaded, deleted rows could not be loaded
+    values = orm.attributes.instance_state(instance).dict
+    counters = []
+    for collection, column in REVISED_TABLES[table.name]:
+        key = mapper.get_property_by_column(table.c[column]).key
+        counters.append((collection, _get_shard(values.get(key))))
+    _record(session, counters)
+
+
+def _record_table(session, table):
+    # The rows written in bulk are unknown, their first counter is used
+    _record(session, [(collection, 0) for collection, column
+                      in REVISED_TABLES.get(table.name, ())])
+
+
+@event.listens_for(orm.Session, 'after_flush')
+def _after_flush(session, flush_context):
+    for instance in session.new | session.dirty | session.deleted:
+        _record_instance(session, instance)
+
+
+@event.listens_for(orm.Session, 'after_bulk_update')
+def _after_bulk_update(update_context):
+    _record_table(update_context.session, update_context.primary_table)
+
+
+@event.listens_for(orm.Session, 'after_bulk_delete')
+def _after_bulk_delete(delete_context):
+    _record_table(delete_context.session, delete_context.primary_table)
+
+
+@event.listens_for(orm.Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_REVISED_KEY, None)
+
+
+@event.listens_for(orm.Session, 'before_commit')
+def _before_commit(session):
+    if session.transaction.nested:
+        # The revisions are incremented by the enclosing transaction
+        return
+    if session.new or session.dirty or session.deleted:
+        # The changes left are flushed by the commit after this event
+        session.flush()
+    counters = session.info.pop(_REVISED_KEY, None)
+    if counters:
+        bump_revisions(session, counters)
+
+
+def _bump_revision(session, collection, shard):
+    table = ResourceRevision.__table__
+    result = session.execute(
+        table.update().where(sa.and_(
+            table.c.collection == collection,
+            table.c.shard == shard)).values(revision=table.c.revision + 1))
+    if not result.rowcount:
+        # The rows are created by the migration, this is a new database
+        session.execute(table.insert().values(collection=collection,
+                                              shard=shard, revision=1))
+
+
+def bump_revisions(session, counters):
+    """Increments the given (collection, shard) revision counters.
+
+    The counters are updated in the current transaction of the session, in
+    the same order by all the transactions so that they can not deadlock.
+    """
+    for collection, shard in sorted(counters):
+        _bump_revision(session, collection, shard)
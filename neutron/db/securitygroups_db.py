@@ -38,6 +38,8 @@ class SecurityGroup(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
 
     name = sa.Column(sa.String(255))
     description = sa.Column(sa.String(255))
+    __table_args__ = (
+        sa.Index('ix_securitygroups_tenant_id', 'tenant_id'),)
 
 
 class SecurityGroupPortBinding(model_base.BASEV2):
@@ -285,7 +287,7 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
                     port_range_max=rule['port_range_max'],
                     remote_ip_prefix=rule.get('remote_ip_prefix'))
                 context.session.add(db)
-            ret.append(self._make_security_group_rule_dict(db))
+                ret.append(self._make_security_group_rule_dict(db))
         return ret
 
     def create_security_group_rule(self, context, security_group_rule):
@@ -336,6 +338,7 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
         """
         new_rules = set()
         tenant_ids = set()
+        remote_group_ids = set()
         for rules in security_group_rule['security_group_rules']:
             rule = rules.get('security_group_rule')
             new_rules.add(rule['security_group_id'])
@@ -350,9 +353,10 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
                 tenant_ids.add(rule['tenant_id'])
             remote_group_id = rule.get('remote_group_id')
             # Check that remote_group_id exists for tenant
-            if remote_group_id:
+            if remote_group_id and remote_group_id not in remote_group_ids:
                 self.get_security_group(context, remote_group_id,
                                         tenant_id=rule['tenant_id'])
+                remote_group_ids.add(remote_group_id)
         if len(new_rules) > 1:
             raise ext_sg.SecurityGroupNotSingleGroupRules()
         security_group_id = new_rules.pop()
@@ -396,31 +400,37 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
         return res
 
     def _check_for_duplicate_rules(self, context, security_group_rules):
+        def _rule_key(rule):
+            return tuple(sorted(rule.items()))
+
+        counts = {}
+        for i in security_group_rules:
+            key = _rule_key(i['security_group_rule'])
+            counts[key] = counts.get(key, 0) + 1
+
+        # Check in database if rules exist, loading the rules of all the
+        # security groups of the request at once.
+        # Note(arosen): the call to get_security_group_rules wildcards
+        # values in the filter that have a value of [None]. For
+        # example, filters = {'remote_group_id': [None]} will return
+        # all security group rules regardless of their value of
+        # remote_group_id. Therefore rules are matched below on all
+        # their values.
+        security_group_ids = set(i['security_group_rule']['security_group_id']
+                                 for i in security_group_rules)
+        db_rules = {}
+        for db_rule in self.get_security_group_rules(
+                context, {'security_group_id': list(security_group_ids)}):
+            # need to remove id from db_rule for matching
+            id = db_rule.pop('id')
+            db_rules[_rule_key(db_rule)] = id
+
         for i in security_group_rules:
-            found_self = False
-            for j in security_group_rules:
-                if i['security_group_rule'] == j['security_group_rule']:
-                    if found_self:
-                        raise ext_sg.DuplicateSecurityGroupRuleInPost(rule=i)
-                    found_self = True
-
-            # Check in database if rule exists
-            filters = self._make_security_group_rule_filter_dict(i)
-            db_rules = self.get_security_group_rules(context, filters)
-            # Note(arosen): the call to get_security_group_rules wildcards
-            # values in the filter that have a value of [None]. For
-            # example, filters = {'remote_group_id': [None]} will return
-            # all security group rules regardless of their value of
-            # remote_group_id. Therefore it is not possible to do this
-            # query unless the behavior of _get_collection()
-            # is changed which cannot be because other methods are already
-            # relying on this behavior. Therefore, we do the filtering
-            # below to check for these corner cases.
-            for db_rule in db_rules:
-                # need to remove id from db_rule for matching
-                id = db_rule.pop('id')
-                if (i['security_group_rule'] == db_rule):
-                    raise ext_sg.SecurityGroupRuleExists(id=id)
+            key = _rule_key(i['security_group_rule'])
+            if counts[key] > 1:
+                raise ext_sg.DuplicateSecurityGroupRuleInPost(rule=i)
+            if key in db_rules:
+                raise ext_sg.SecurityGroupRuleExists(id=db_rules[key])
 
     def _validate_ip_prefix(self, rule):
         """Check that a valid cidr was specified as remote_ip_prefix
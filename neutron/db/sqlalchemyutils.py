@@ -35,6 +35,8 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
     With a compound-values sort key, (k1, k2, k3) we must do this to repeat
     the lexicographical ordering:
     (k1 > X1) or (k1 == X1 && k2 > X2) or (k1 == X1 && k2 == X2 && k3 > X3)
+    Databases do not use an index on (k1, k2, k3) for such a disjunction, so
+    the redundant k1 >= X1 is added to it to restrict the range of the scan.
     The reason of didn't use OFFSET clause was it don't scale, please refer
     discussion at https://lists.launchpad.net/openstack/msg02547.html
 
@@ -99,6 +101,12 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
             criteria_list.append(criteria)
 
         f = sqlalchemy.sql.or_(*criteria_list)
+        if len(sorts) > 1 and marker_values[0] is not None:
+            model_attr = getattr(model, sorts[0][0])
+            if sorts[0][1]:
+                f = sqlalchemy.sql.and_(model_attr >= marker_values[0], f)
+            else:
+                f = sqlalchemy.sql.and_(model_attr <= marker_values[0], f)
         query = query.filter(f)
 
     if limit:
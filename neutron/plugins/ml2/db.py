@@ -65,6 +65,32 @@ def add_network_segment(session, network_id, segment, segment_index=0,
               'network_id': record.network_id})
 
 
+def add_networks_segments(session, networks_segments):
+    """Add the tenant segments of several networks at once.
+
+    :param networks_segments: list of (network_id, segment) tuples
+    """
+    records = []
+    for network_id, segment in networks_segments:
+        record = models.NetworkSegment(
+            id=uuidutils.generate_uuid(),
+            network_id=network_id,
+            network_type=segment.get(api.NETWORK_TYPE),
+            physical_network=segment.get(api.PHYSICAL_NETWORK),
+            segmentation_id=segment.get(api.SEGMENTATION_ID),
+            segment_index=0,
+            is_dynamic=False
+        )
+        segment[api.ID] = record.id
+        records.append(record)
+        LOG.info(_LI("Added segment %(id)s of type %(network_type)s for "
+                     "network %(network_id)s"),
+                 {'id': record.id,
+                  'network_type': record.network_type,
+                  'network_id': record.network_id})
+    session.add_all(records)
+
+
 def get_network_segments(session, network_id, filter_dynamic=False):
     with session.begin(subtransactions=True):
         query = (session.query(models.NetworkSegment).
@@ -77,6 +103,28 @@ def get_network_segments(session, network_id, filter_dynamic=False):
         return [_make_segment_dict(record) for record in records]
 
 
+def get_networks_segments(session, network_ids, filter_dynamic=False):
+    """Returns the segments of several networks with a single query.
+
+    The result maps each network id to its list of segments.
+    """
+    if not network_ids:
+        return {}
+
+    with session.begin(subtransactions=True):
+        query = (session.query(models.NetworkSegment).
+                 filter(models.NetworkSegment.network_id.in_(network_ids)).
+                 order_by(models.NetworkSegment.segment_index))
+        if filter_dynamic is not None:
+            query = query.filter_by(is_dynamic=filter_dynamic)
+        records = query.all()
+
+        result = dict((net_id, []) for net_id in network_ids)
+        for record in records:
+            result[record.network_id].append(_make_segment_dict(record))
+        return result
+
+
 def get_segment_by_id(session, segment_id):
     with session.begin(subtransactions=True):
         try:
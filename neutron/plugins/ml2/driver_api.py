@@ -412,6 +412,36 @@ class MechanismDriver(object):
         """
         pass
 
+    def create_network_bulk_precommit(self, contexts):
+        """Allocate resources for new networks created in bulk.
+
+        :param contexts: list of NetworkContext instances describing the
+        new networks.
+
+        Called instead of create_network_precommit when networks are
+        created in bulk, inside transaction context on session. Call
+        cannot block.  Raising an exception will result in a rollback
+        of the current transaction. The default implementation calls
+        create_network_precommit for each network.
+        """
+        for context in contexts:
+            self.create_network_precommit(context)
+
+    def create_network_bulk_postcommit(self, contexts):
+        """Create networks created in bulk.
+
+        :param contexts: list of NetworkContext instances describing the
+        new networks.
+
+        Called instead of create_network_postcommit when networks are
+        created in bulk, after the transaction commits. Raising an
+        exception will cause the deletion of all the networks. The
+        default implementation calls create_network_postcommit for each
+        network.
+        """
+        for context in contexts:
+            self.create_network_postcommit(context)
+
     def update_network_precommit(self, context):
         """Update resources of a network.
 
@@ -502,6 +532,36 @@ class MechanismDriver(object):
         """
         pass
 
+    def create_subnet_bulk_precommit(self, contexts):
+        """Allocate resources for new subnets created in bulk.
+
+        :param contexts: list of SubnetContext instances describing the
+        new subnets.
+
+        Called instead of create_subnet_precommit when subnets are
+        created in bulk, inside transaction context on session. Call
+        cannot block.  Raising an exception will result in a rollback
+        of the current transaction. The default implementation calls
+        create_subnet_precommit for each subnet.
+        """
+        for context in contexts:
+            self.create_subnet_precommit(context)
+
+    def create_subnet_bulk_postcommit(self, contexts):
+        """Create subnets created in bulk.
+
+        :param contexts: list of SubnetContext instances describing the
+        new subnets.
+
+        Called instead of create_subnet_postcommit when subnets are
+        created in bulk, after the transaction commits. Raising an
+        exception will cause the deletion of all the subnets. The
+        default implementation calls create_subnet_postcommit for each
+        subnet.
+        """
+        for context in contexts:
+            self.create_subnet_postcommit(context)
+
     def update_subnet_precommit(self, context):
         """Update resources of a subnet.
 
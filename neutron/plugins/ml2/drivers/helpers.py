@@ -142,3 +142,48 @@ class TypeDriverHelper(api.TypeDriver):
                         "after %(number)s failed attempts"),
                     {"type": network_type, "number": DB_MAX_ATTEMPTS})
         raise exc.NoNetworkFoundInMaximumAllowedAttempts()
+
+    def allocate_partially_specified_segments(self, session, count,
+                                              **filters):
+        """Allocate count model segments from pool specified by filters.
+
+        Free segments are selected count at a time instead of one by one.
+        Return the list of allocated db objects, which is shorter than
+        count if the pool is exhausted.
+        """
+
+        network_type = self.get_type()
+        allocs = []
+        with session.begin(subtransactions=True):
+            select = (session.query(self.model).
+                      filter_by(allocated=False, **filters))
+
+            # Selected segments can be allocated before update by someone
+            # else, we retry until enough updates succeed or DB_MAX_ATTEMPTS
+            # attempts
+            for attempt in range(1, DB_MAX_ATTEMPTS + 1):
+                candidates = select.limit(count - len(allocs)).all()
+                if not candidates:
+                    # No resource available
+                    return allocs
+
+                for alloc in candidates:
+                    raw_segment = dict((k, alloc[k])
+                                       for k in self.primary_keys)
+                    updated = (session.query(self.model).
+                               filter_by(allocated=False, **raw_segment).
+                               update({"allocated": True}))
+                    if updated:
+                        allocs.append(alloc)
+                LOG.debug("%(type)s segments allocate from pool, attempt "
+                          "%(attempt)s allocated %(allocated)s of "
+                          "%(count)s segments",
+                          {"type": network_type, "attempt": attempt,
+                           "allocated": len(allocs), "count": count})
+                if len(allocs) == count:
+                    return allocs
+
+        LOG.warning(_LW("Allocate %(type)s segments from pool failed "
+                        "after %(number)s failed attempts"),
+                    {"type": network_type, "number": DB_MAX_ATTEMPTS})
+        raise exc.NoNetworkFoundInMaximumAllowedAttempts()
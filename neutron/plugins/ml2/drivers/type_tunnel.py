@@ -118,6 +118,13 @@ class TunnelTypeDriver(helpers.TypeDriverHelper):
                 api.PHYSICAL_NETWORK: None,
                 api.SEGMENTATION_ID: getattr(alloc, self.segmentation_key)}
 
+    def allocate_tenant_segments(self, session, count):
+        allocs = self.allocate_partially_specified_segments(session, count)
+        return [{api.NETWORK_TYPE: self.get_type(),
+                 api.PHYSICAL_NETWORK: None,
+                 api.SEGMENTATION_ID: getattr(alloc, self.segmentation_key)}
+                for alloc in allocs]
+
     def release_segment(self, session, segment):
         tunnel_id = segment[api.SEGMENTATION_ID]
 
@@ -223,6 +223,13 @@ class VlanTypeDriver(helpers.TypeDriverHelper):
                 api.PHYSICAL_NETWORK: alloc.physical_network,
                 api.SEGMENTATION_ID: alloc.vlan_id}
 
+    def allocate_tenant_segments(self, session, count):
+        allocs = self.allocate_partially_specified_segments(session, count)
+        return [{api.NETWORK_TYPE: p_const.TYPE_VLAN,
+                 api.PHYSICAL_NETWORK: alloc.physical_network,
+                 api.SEGMENTATION_ID: alloc.vlan_id}
+                for alloc in allocs]
+
     def release_segment(self, session, segment):
         physical_network = segment[api.PHYSICAL_NETWORK]
         vlan_id = segment[api.SEGMENTATION_ID]
@@ -123,8 +123,18 @@ class TypeManager(stevedore.named.NamedExtensionManager):
     def _extend_network_dict_provider(self, context, network):
         id = network['id']
         segments = db.get_network_segments(context.session, id)
+        self._set_network_dict_provider(network, segments)
+
+    def _extend_networks_dict_provider(self, context, networks):
+        """Extends the dicts of networks with the segments of all at once."""
+        ids = [network['id'] for network in networks]
+        segments = db.get_networks_segments(context.session, ids)
+        for network in networks:
+            self._set_network_dict_provider(network, segments[network['id']])
+
+    def _set_network_dict_provider(self, network, segments):
         if not segments:
-            LOG.error(_LE("Network %s has no segments"), id)
+            LOG.error(_LE("Network %s has no segments"), network['id'])
             network[provider.NETWORK_TYPE] = None
             network[provider.PHYSICAL_NETWORK] = None
             network[provider.SEGMENTATION_ID] = None
@@ -152,15 +162,39 @@ class TypeManager(stevedore.named.NamedExtensionManager):
         with session.begin(subtransactions=True):
             network_id = network['id']
             if segments:
-                for segment_index, segment in enumerate(segments):
-                    segment = self.reserve_provider_segment(
-                        session, segment)
-                    db.add_network_segment(session, network_id,
-                                           segment, segment_index)
+                self._reserve_provider_segments(session, network_id,
+                                                segments)
             else:
                 segment = self.allocate_tenant_segment(session)
                 db.add_network_segment(session, network_id, segment)
 
+    def create_networks_segments(self, context, networks):
+        """Call type drivers to create the segments of networks in bulk.
+
+        The segments of the tenant networks are allocated together.
+        """
+        session = context.session
+        with session.begin(subtransactions=True):
+            tenant_network_ids = []
+            for network in networks:
+                segments = self._process_provider_create(network)
+                if segments:
+                    self._reserve_provider_segments(session, network['id'],
+                                                    segments)
+                else:
+                    tenant_network_ids.append(network['id'])
+            if tenant_network_ids:
+                segments = self.allocate_tenant_segments(
+                    session, len(tenant_network_ids))
+                db.add_networks_segments(session,
+                                         zip(tenant_network_ids, segments))
+
+    def _reserve_provider_segments(self, session, network_id, segments):
+        for segment_index, segment in enumerate(segments):
+            segment = self.reserve_provider_segment(session, segment)
+            db.add_network_segment(session, network_id,
+                                   segment, segment_index)
+
     def is_partial_segment(self, segment):
         network_type = segment[api.NETWORK_TYPE]
         driver = self.drivers.get(network_type)
@@ -192,6 +226,28 @@ class TypeManager(stevedore.named.NamedExtensionManager):
                 return segment
         raise exc.NoNetworkAvailable()
 
+    def allocate_tenant_segments(self, session, count):
+        """Allocate count tenant network segments.
+
+        Type drivers may allocate several segments at once through an
+        allocate_tenant_segments(session, count) method.
+        """
+        segments = []
+        for network_type in self.tenant_network_types:
+            driver = self.drivers.get(network_type)
+            allocate = getattr(driver.obj, 'allocate_tenant_segments', None)
+            if allocate:
+                segments.extend(allocate(session, count - len(segments)))
+            else:
+                while len(segments) < count:
+                    segment = driver.obj.allocate_tenant_segment(session)
+                    if not segment:
+                        break
+                    segments.append(segment)
+            if len(segments) == count:
+                return segments
+        raise exc.NoNetworkAvailable()
+
     def release_network_segments(self, session, network_id):
         segments = db.get_network_segments(session, network_id,
                                            filter_dynamic=None)
@@ -330,6 +386,33 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         """
         self._call_on_drivers("create_network_postcommit", context)
 
+    def create_network_bulk_precommit(self, contexts):
+        """Notify all mechanism drivers during bulk network creation.
+
+        :raises: neutron.plugins.ml2.common.MechanismDriverError
+        if any mechanism driver create_network_bulk_precommit call fails.
+
+        Called within the database transaction creating all the
+        networks. If a mechanism driver raises an exception, then a
+        MechanismDriverError is propagated to the caller, triggering a
+        rollback. There is no guarantee that all mechanism drivers are
+        called in this case.
+        """
+        self._call_on_drivers("create_network_bulk_precommit", contexts)
+
+    def create_network_bulk_postcommit(self, contexts):
+        """Notify all mechanism drivers after bulk network creation.
+
+        :raises: neutron.plugins.ml2.common.MechanismDriverError
+        if any mechanism driver create_network_bulk_postcommit call fails.
+
+        Called after the database transaction. If a mechanism driver
+        raises an exception, then a MechanismDriverError is propagated
+        to the caller, where all the networks will be deleted. There is
+        no guarantee that all mechanism drivers are called in this case.
+        """
+        self._call_on_drivers("create_network_bulk_postcommit", contexts)
+
     def update_network_precommit(self, context):
         """Notify all mechanism drivers during network update.
 
@@ -415,6 +498,33 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
         """
         self._call_on_drivers("create_subnet_postcommit", context)
 
+    def create_subnet_bulk_precommit(self, contexts):
+        """Notify all mechanism drivers during bulk subnet creation.
+
+        :raises: neutron.plugins.ml2.common.MechanismDriverError
+        if any mechanism driver create_subnet_bulk_precommit call fails.
+
+        Called within the database transaction creating all the
+        subnets. If a mechanism driver raises an exception, then a
+        MechanismDriverError is propagated to the caller, triggering a
+        rollback. There is no guarantee that all mechanism drivers are
+        called in this case.
+        """
+        self._call_on_drivers("create_subnet_bulk_precommit", contexts)
+
+    def create_subnet_bulk_postcommit(self, contexts):
+        """Notify all mechanism drivers after bulk subnet creation.
+
+        :raises: neutron.plugins.ml2.common.MechanismDriverError
+        if any mechanism driver create_subnet_bulk_postcommit call fails.
+
+        Called after the database transaction. If a mechanism driver
+        raises an exception, then a MechanismDriverError is propagated
+        to the caller, where all the subnets will be deleted. There is
+        no guarantee that all mechanism drivers are called in this case.
+        """
+        self._call_on_drivers("create_subnet_bulk_postcommit", contexts)
+
     def update_subnet_precommit(self, context):
         """Notify all mechanism drivers during subnet update.
 
@@ -51,6 +51,7 @@ from neutron.db import securitygroups_rpc_base as sg_db_rpc
 from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import extra_dhcp_opt as edo_ext
 from neutron.extensions import l3agentscheduler
+from neutron.extensions import multiprovidernet as mpnet
 from neutron.extensions import portbindings
 from neutron.extensions import providernet as provider
 from neutron.i18n import _LE, _LI, _LW
@@ -100,6 +101,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
     __native_bulk_support = True
     __native_pagination_support = True
     __native_sorting_support = True
+    __revision_tracking_support = True
 
     # List of supported extensions
     _supported_extension_aliases = ["provider", "external-net", "binding",
@@ -157,9 +159,27 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                                   fanout=False)
         return self.conn.consume_in_threads()
 
+    def _get_provider_filters(self, filters):
+        return dict(
+            (key, filters[key]) for key in (provider.NETWORK_TYPE,
+                                            provider.PHYSICAL_NETWORK,
+                                            provider.SEGMENTATION_ID)
+            if filters and filters.get(key))
+
     def _filter_nets_provider(self, context, nets, filters):
-        # TODO(rkukura): Implement filtering.
-        return nets
+        # The provider attributes are not columns of the networks table, so
+        # the networks are filtered on the segments already in their dicts.
+        provider_filters = self._get_provider_filters(filters)
+        if not provider_filters:
+            return nets
+
+        def _matches(segment):
+            return all(segment.get(key) in values
+                       for key, values in provider_filters.iteritems())
+
+        return [net for net in nets
+                if any(_matches(segment)
+                       for segment in net.get(mpnet.SEGMENTS, [net]))]
 
     def _notify_l3_agent_new_port(self, context, port):
         if not port:
@@ -485,7 +505,44 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                                   segment[api.SEGMENTATION_ID],
                                   segment[api.PHYSICAL_NETWORK])
 
-    # TODO(apech): Need to override bulk operations
+    def create_network_bulk(self, context, networks):
+        items = [item['network'] for item in networks['networks']]
+        session = context.session
+        with session.begin(subtransactions=True):
+            for tenant_id in set(self._get_tenant_id_for_create(context, n)
+                                 for n in items):
+                self._ensure_default_security_group(context, tenant_id)
+            network_dbs = self._create_networks_db(context, items)
+            results = []
+            for net_data, network_db in zip(items, network_dbs):
+                result = self._make_network_dict(network_db,
+                                                 process_extensions=False)
+                self.extension_manager.process_create_network(
+                    session, net_data, result)
+                self._process_l3_create(context, result, net_data)
+                net_data['id'] = result['id']
+                results.append(result)
+            self.type_manager.create_networks_segments(context, items)
+            self.type_manager._extend_networks_dict_provider(context,
+                                                             results)
+            mech_contexts = [driver_context.NetworkContext(self, context,
+                                                           network)
+                             for network in results]
+            self.mechanism_manager.create_network_bulk_precommit(
+                mech_contexts)
+
+        try:
+            self.mechanism_manager.create_network_bulk_postcommit(
+                mech_contexts)
+        except ml2_exc.MechanismDriverError:
+            with excutils.save_and_reraise_exception():
+                ids = [res['id'] for res in results]
+                LOG.error(_LE("mechanism_manager.create_network_bulk_"
+                              "postcommit failed, deleting networks %s"),
+                          ids)
+                for id in ids:
+                    self.delete_network(context, id)
+        return results
 
     def create_network(self, context, network):
         net_data = network['network']
@@ -551,13 +608,20 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
     def get_networks(self, context, filters=None, fields=None,
                      sorts=None, limit=None, marker=None, page_reverse=False):
+        # When only columns of the networks are requested and not filtered
+        # on provider attributes, the segments are not needed and the base
+        # class selects the columns directly.
+        if (self._get_projected_columns(models_v2.Network, fields) and
+                not self._get_provider_filters(filters)):
+            return super(Ml2Plugin, self).get_networks(
+                context, filters, fields, sorts, limit, marker, page_reverse)
+
         session = context.session
         with session.begin(subtransactions=True):
             nets = super(Ml2Plugin,
                          self).get_networks(context, filters, None, sorts,
                                             limit, marker, page_reverse)
-            for net in nets:
-                self.type_manager._extend_network_dict_provider(context, net)
+            self.type_manager._extend_networks_dict_provider(context, nets)
 
             nets = self._filter_nets_provider(context, nets, filters)
             nets = self._filter_nets_l3(context, nets, filters)
@@ -666,6 +730,37 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                           " failed"))
         self.notifier.network_delete(context, id)
 
+    def create_subnet_bulk(self, context, subnets):
+        items = subnets['subnets']
+        session = context.session
+        with session.begin(subtransactions=True):
+            subnet_dbs = self._create_subnets_db(
+                context, [item['subnet'] for item in items])
+            results = []
+            for item, subnet_db in zip(items, subnet_dbs):
+                result = self._make_subnet_dict(subnet_db)
+                self.extension_manager.process_create_subnet(session, item,
+                                                             result)
+                results.append(result)
+            mech_contexts = [driver_context.SubnetContext(self, context,
+                                                          subnet)
+                             for subnet in results]
+            self.mechanism_manager.create_subnet_bulk_precommit(
+                mech_contexts)
+
+        try:
+            self.mechanism_manager.create_subnet_bulk_postcommit(
+                mech_contexts)
+        except ml2_exc.MechanismDriverError:
+            with excutils.save_and_reraise_exception():
+                ids = [res['id'] for res in results]
+                LOG.error(_LE("mechanism_manager.create_subnet_bulk_"
+                              "postcommit failed, deleting subnets %s"),
+                          ids)
+                for id in ids:
+                    self.delete_subnet(context, id)
+        return results
+
     def create_subnet(self, context, subnet):
         session = context.session
         with session.begin(subtransactions=True):
@@ -1051,6 +1146,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             # fact that an error occurred.
             LOG.error(_LE("mechanism_manager.delete_port_postcommit failed for"
                           " port %s"), id)
+        self.notifier.port_delete(context, id)
         self.notify_security_groups_member_updated(context, port)
 
     def get_bound_port_context(self, plugin_context, port_id, host=None):
@@ -1162,6 +1258,57 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return port['id']
 
+    def update_port_statuses(self, context, port_ids, status, host=None):
+        """
+        Updates the status of several ports in a single transaction.
+        Returns the list of port_ids (non-truncated uuids) of the ports
+        which exist.
+        """
+        existing_port_ids = []
+        dvr_port_ids = []
+        mech_contexts = []
+        networks = {}
+        session = context.session
+        # REVISIT: Serialize this operation with a semaphore, see
+        # update_port_status.
+        with contextlib.nested(lockutils.lock('db-access'),
+                               session.begin(subtransactions=True)):
+            for port_id in port_ids:
+                port = db.get_port(session, port_id)
+                if not port:
+                    LOG.warning(_LW("Port %(port)s updated up by agent not "
+                                    "found"), {'port': port_id})
+                    continue
+                if port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE:
+                    # The status of DVR ports is tracked per host binding
+                    dvr_port_ids.append(port_id)
+                    continue
+                existing_port_ids.append(port['id'])
+                if port.status == status:
+                    continue
+                original_port = self._make_port_dict(port)
+                port.status = status
+                updated_port = self._make_port_dict(port)
+                network_id = original_port['network_id']
+                if network_id not in networks:
+                    networks[network_id] = self.get_network(context,
+                                                            network_id)
+                mech_context = driver_context.PortContext(
+                    self, context, updated_port, networks[network_id],
+                    port.port_binding, original_port=original_port)
+                self.mechanism_manager.update_port_precommit(mech_context)
+                mech_contexts.append(mech_context)
+
+        for mech_context in mech_contexts:
+            self.mechanism_manager.update_port_postcommit(mech_context)
+
+        for port_id in dvr_port_ids:
+            port_id = self.update_port_status(context, port_id, status, host)
+            if port_id:
+                existing_port_ids.append(port_id)
+
+        return existing_port_ids
+
     def port_bound_to_host(self, context, port_id, host):
         port = db.get_port(context.session, port_id)
         if not port:
@@ -44,7 +44,8 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
     #   1.3 get_device_details rpc signature upgrade to obtain 'host' and
     #       return value to include fixed_ips and device_owner for
     #       the device port
-    target = messaging.Target(version='1.3')
+    #   1.4 Support update_devices_up and update_devices_down
+    target = messaging.Target(version='1.4')
 
     def __init__(self, notifier, type_manager):
         self.setup_tunnel_callback_mixin(notifier, type_manager)
@@ -161,16 +162,86 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
         port_id = plugin.update_port_status(rpc_context, port_id,
                                             q_const.PORT_STATUS_ACTIVE,
                                             host)
+        self._notify_dvr_vmarp_table_update(rpc_context, plugin, [port_id])
+
+    def _get_port_ids_bound_to_host(self, rpc_context, plugin, devices, host):
+        """Map the port ids of devices bound to host to their device."""
+        port_ids = {}
+        for device in devices:
+            port_id = plugin._device_to_port_id(device)
+            if (host and not plugin.port_bound_to_host(rpc_context,
+                                                       port_id, host)):
+                LOG.debug("Device %(device)s not bound to the"
+                          " agent host %(host)s",
+                          {'device': device, 'host': host})
+                continue
+            port_ids[port_id] = device
+        return port_ids
+
+    def _notify_dvr_vmarp_table_update(self, rpc_context, plugin, port_ids):
         l3plugin = manager.NeutronManager.get_service_plugins().get(
             service_constants.L3_ROUTER_NAT)
         if (l3plugin and
             utils.is_extension_supported(l3plugin,
                                          q_const.L3_DISTRIBUTED_EXT_ALIAS)):
-            try:
-                port = plugin._get_port(rpc_context, port_id)
-                l3plugin.dvr_vmarp_table_update(rpc_context, port, "add")
-            except exceptions.PortNotFound:
-                LOG.debug('Port %s not found during ARP update', port_id)
+            for port_id in port_ids:
+                try:
+                    port = plugin._get_port(rpc_context, port_id)
+                    l3plugin.dvr_vmarp_table_update(rpc_context, port, "add")
+                except exceptions.PortNotFound:
+                    LOG.debug('Port %s not found during ARP update', port_id)
+
+    def update_devices_up(self, rpc_context, **kwargs):
+        """Devices are up on agent.
+
+        The status of all the devices is updated in a single transaction.
+        Returns the list of devices which were processed.
+        """
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        host = kwargs.get('host')
+        LOG.debug("Devices %(devices)s up at agent %(agent_id)s",
+                  {'devices': devices, 'agent_id': agent_id})
+        plugin = manager.NeutronManager.get_plugin()
+        port_ids = self._get_port_ids_bound_to_host(rpc_context, plugin,
+                                                    devices, host)
+        if port_ids:
+            updated_port_ids = plugin.update_port_statuses(
+                rpc_context, port_ids.keys(), q_const.PORT_STATUS_ACTIVE,
+                host)
+            self._notify_dvr_vmarp_table_update(rpc_context, plugin,
+                                                updated_port_ids)
+        return devices
+
+    def update_devices_down(self, rpc_context, **kwargs):
+        """Devices no longer exist on agent.
+
+        The status of all the devices is updated in a single transaction.
+        Returns a list with an entry per device in the format returned by
+        update_device_down.
+        """
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        host = kwargs.get('host')
+        LOG.debug("Devices %(devices)s no longer exist at agent "
+                  "%(agent_id)s",
+                  {'devices': devices, 'agent_id': agent_id})
+        plugin = manager.NeutronManager.get_plugin()
+        port_ids = self._get_port_ids_bound_to_host(rpc_context, plugin,
+                                                    devices, host)
+        # Devices not bound to this host are reported as existing, as done
+        # by update_device_down.
+        existing_devices = set(devices) - set(port_ids.values())
+        if port_ids:
+            updated_port_ids = plugin.update_port_statuses(
+                rpc_context, port_ids.keys(), q_const.PORT_STATUS_DOWN,
+                host)
+            for port_id, device in port_ids.items():
+                if any(updated_port_id.startswith(port_id)
+                       for updated_port_id in updated_port_ids):
+                    existing_devices.add(device)
+        return [{'device': device, 'exists': device in existing_devices}
+                for device in devices]
 
 
 class AgentNotifierApi(dvr_rpc.DVRAgentRpcApiMixin,
@@ -193,6 +264,9 @@ class AgentNotifierApi(dvr_rpc.DVRAgentRpcApiMixin,
         self.topic_port_update = topics.get_topic_name(topic,
                                                        topics.PORT,
                                                        topics.UPDATE)
+        self.topic_port_delete = topics.get_topic_name(topic,
+                                                       topics.PORT,
+                                                       topics.DELETE)
         target = messaging.Target(topic=topic, version='1.0')
         self.client = n_rpc.get_client(target)
 
@@ -208,3 +282,8 @@ class AgentNotifierApi(dvr_rpc.DVRAgentRpcApiMixin,
         cctxt.cast(context, 'port_update', port=port,
                    network_type=network_type, segmentation_id=segmentation_id,
                    physical_network=physical_network)
+
+    def port_delete(self, context, port_id):
+        cctxt = self.client.prepare(topic=self.topic_port_delete,
+                                    fanout=True)
+        cctxt.cast(context, 'port_delete', port_id=port_id)
@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import hashlib
 import signal
 import sys
@@ -140,7 +141,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                  ovsdb_monitor_respawn_interval=(
                      constants.DEFAULT_OVSDBMON_RESPAWN),
                  arp_responder=False,
-                 use_veth_interconnection=False):
+                 use_veth_interconnection=False,
+                 device_processing_chunk_size=0):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -163,6 +165,9 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                supported.
         :param use_veth_interconnection: use veths instead of patch ports to
                interconnect the integration bridge to physical bridges.
+        :param device_processing_chunk_size: Optional, the number of devices
+               per chunk when processing added or updated devices in a
+               pipeline. 0 disables the pipeline.
         '''
         super(OVSNeutronAgent, self).__init__()
         self.use_veth_interconnection = use_veth_interconnection
@@ -208,6 +213,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
 
         self.polling_interval = polling_interval
         self.minimize_polling = minimize_polling
+        self.device_processing_chunk_size = device_processing_chunk_size
         self.ovsdb_monitor_respawn_interval = ovsdb_monitor_respawn_interval
 
         if tunnel_types:
@@ -974,6 +980,69 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         port_info['removed'] = registered_ports - cur_ports
         return port_info
 
+    def _get_port_id_from_event(self, device):
+        """Return the neutron port id of an interface reported by ovsdb.
+
+        None is returned if the interface is not a VIF.
+        """
+        external_ids = device.get('external_ids') or {}
+        if 'attached-mac' not in external_ids:
+            return
+        if 'iface-id' in external_ids:
+            return external_ids['iface-id']
+        if 'xs-vif-uuid' in external_ids:
+            return self.int_br.get_xapi_iface_id(external_ids['xs-vif-uuid'])
+
+    def process_ports_events(self, events, registered_ports,
+                             updated_ports=None):
+        """Compute port changes from the events reported by ovsdb.
+
+        Unlike scan_ports, which lists all the VIFs of the integration
+        bridge, only the interfaces which have changed since the previous
+        iteration are examined.
+        """
+        added_ports = set()
+        removed_ports = set()
+        if updated_ports is None:
+            updated_ports = set()
+        for device in events['removed']:
+            port_id = self._get_port_id_from_event(device)
+            if port_id in registered_ports:
+                removed_ports.add(port_id)
+        for device in events['added'] + events['modified']:
+            port_id = self._get_port_id_from_event(device)
+            if not port_id:
+                continue
+            # Do not consider VIFs which aren't yet ready, see
+            # OVSBridge.get_vif_port_set
+            try:
+                ready = int(device['ofport']) > 0
+            except (ValueError, TypeError):
+                ready = False
+            if not ready:
+                if port_id in registered_ports:
+                    removed_ports.add(port_id)
+                continue
+            if port_id in removed_ports:
+                # The interface has been plugged again, it must be rewired
+                removed_ports.discard(port_id)
+                updated_ports.add(port_id)
+            elif port_id not in registered_ports:
+                added_ports.add(port_id)
+        cur_ports = (registered_ports - removed_ports) | added_ports
+        self.int_br_device_count = len(cur_ports)
+        port_info = {'current': cur_ports}
+        updated_ports.update(self.check_changed_vlans(registered_ports))
+        # Some updated ports might have been removed in the meanwhile, and
+        # therefore should not be processed.
+        updated_ports &= cur_ports
+        if updated_ports:
+            port_info['updated'] = updated_ports
+        if added_ports or removed_ports:
+            port_info['added'] = added_ports
+            port_info['removed'] = removed_ports
+        return port_info
+
     def check_changed_vlans(self, registered_ports):
         """Return ports which have lost their vlan tag.
 
@@ -1094,16 +1163,25 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                     br.delete_flows(in_port=ofport)
                     self.tun_br_ofports[tunnel_type].pop(remote_ip, None)
 
-    def treat_devices_added_or_updated(self, devices, ovs_restarted):
-        skipped_devices = []
+    def get_devices_details(self, devices):
         try:
-            devices_details_list = self.plugin_rpc.get_devices_details_list(
+            return self.plugin_rpc.get_devices_details_list(
                 self.context,
                 devices,
                 self.agent_id,
                 cfg.CONF.host)
         except Exception as e:
             raise DeviceListRetrievalError(devices=devices, error=e)
+
+    def treat_devices_added_or_updated(self, devices, ovs_restarted):
+        devices_details_list = self.get_devices_details(devices)
+        return self.treat_devices_details(devices_details_list,
+                                          ovs_restarted)
+
+    def treat_devices_details(self, devices_details_list, ovs_restarted):
+        skipped_devices = []
+        devices_up = []
+        devices_down = []
         for details in devices_details_list:
             device = details['device']
             LOG.debug("Processing port: %s", device)
@@ -1134,17 +1212,23 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                 # API server, thus possibly preventing instance spawn.
                 if details.get('admin_state_up'):
                     LOG.debug("Setting status for %s to UP", device)
-                    self.plugin_rpc.update_device_up(
-                        self.context, device, self.agent_id, cfg.CONF.host)
+                    devices_up.append(device)
                 else:
                     LOG.debug("Setting status for %s to DOWN", device)
-                    self.plugin_rpc.update_device_down(
-                        self.context, device, self.agent_id, cfg.CONF.host)
+                    devices_down.append(device)
                 LOG.info(_LI("Configuration for device %s completed."), device)
             else:
                 LOG.warn(_LW("Device %s not defined on plugin"), device)
                 if (port and port.ofport != -1):
                     self.port_dead(port)
+        # The status of all the processed devices is reported with a single
+        # call for each status.
+        if devices_up:
+            self.plugin_rpc.update_devices_up(
+                self.context, devices_up, self.agent_id, cfg.CONF.host)
+        if devices_down:
+            self.plugin_rpc.update_devices_down(
+                self.context, devices_down, self.agent_id, cfg.CONF.host)
         return skipped_devices
 
     def treat_ancillary_devices_added(self, devices):
@@ -1157,68 +1241,129 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         except Exception as e:
             raise DeviceListRetrievalError(devices=devices, error=e)
 
+        devices_up = []
         for details in devices_details_list:
             device = details['device']
             LOG.info(_LI("Ancillary Port %s added"), device)
+            devices_up.append(device)
 
-            # update plugin about port status
-            self.plugin_rpc.update_device_up(self.context,
-                                             device,
-                                             self.agent_id,
-                                             cfg.CONF.host)
+        # update plugin about port status
+        if devices_up:
+            self.plugin_rpc.update_devices_up(self.context,
+                                              devices_up,
+                                              self.agent_id,
+                                              cfg.CONF.host)
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
         for device in devices:
             LOG.info(_LI("Attachment %s removed"), device)
-            try:
-                self.plugin_rpc.update_device_down(self.context,
-                                                   device,
-                                                   self.agent_id,
-                                                   cfg.CONF.host)
-            except Exception as e:
-                LOG.debug("port_removed failed for %(device)s: %(e)s",
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        try:
+            self.plugin_rpc.update_devices_down(self.context,
+                                                list(devices),
+                                                self.agent_id,
+                                                cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("port_removed failed for %(devices)s: %(e)s",
+                      {'devices': devices, 'e': e})
+            return True
+        for device in devices:
             self.port_unbound(device)
-        return resync
+        return False
 
     def treat_ancillary_devices_removed(self, devices):
-        resync = False
         for device in devices:
             LOG.info(_LI("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id,
-                                                             cfg.CONF.host)
-            except Exception as e:
-                LOG.debug("port_removed failed for %(device)s: %(e)s",
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        try:
+            devices_details = self.plugin_rpc.update_devices_down(
+                self.context, list(devices), self.agent_id, cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("port_removed failed for %(devices)s: %(e)s",
+                      {'devices': devices, 'e': e})
+            return True
+        for details in devices_details:
             if details['exists']:
-                LOG.info(_LI("Port %s updated."), device)
+                LOG.info(_LI("Port %s updated."), details['device'])
                 # Nothing to do regarding local networking
             else:
-                LOG.debug("Device %s not defined on plugin", device)
-        return resync
+                LOG.debug("Device %s not defined on plugin",
+                          details['device'])
+        return False
+
+    def _process_devices_pipelined(self, port_info, devices, ovs_restarted):
+        """Process added and updated devices in a pipeline of chunks.
+
+        At each step the details of chunk N+1 are retrieved from the
+        plugin while the firewall is set up for chunk N and chunk N-1 is
+        wired, so that the RPC round trips overlap with the local
+        configuration. Firewall setup always precedes the wiring of a chunk.
+
+        :returns: the list of skipped devices.
+        :raises DeviceListRetrievalError: if the details of a chunk cannot
+                be retrieved.
+        """
+        added = port_info.get('added', set())
+        updated = port_info.get('updated', set())
+        devices = list(devices)
+        chunk_size = self.device_processing_chunk_size
+        chunks = [set(devices[i:i + chunk_size])
+                  for i in moves.xrange(0, len(devices), chunk_size)]
+        stage_times = collections.defaultdict(float)
+        details = {}
+        skipped_devices = []
+
+        def _run_stage(stage, func, *args):
+            start = time.time()
+            try:
+                return func(*args)
+            finally:
+                stage_times[stage] += time.time() - start
+
+        def _setup_filters(chunk):
+            self.sg_agent.setup_port_filters(chunk & added, chunk & updated)
+
+        def _wire(index):
+            skipped_devices.extend(
+                self.treat_devices_details(details.pop(index),
+                                           ovs_restarted))
+
+        def _fetch(index):
+            details[index] = self.get_devices_details(list(chunks[index]))
+
+        start = time.time()
+        pool = eventlet.GreenPool(3)
+        for step in moves.xrange(len(chunks) + 2):
+            threads = []
+            if step - 2 >= 0:
+                threads.append(pool.spawn(_run_stage, 'wiring',
+                                          _wire, step - 2))
+            if 0 <= step - 1 < len(chunks):
+                threads.append(pool.spawn(_run_stage, 'firewall',
+                                          _setup_filters, chunks[step - 1]))
+            if step < len(chunks):
+                threads.append(pool.spawn(_run_stage, 'details',
+                                          _fetch, step))
+            pool.waitall()
+            # Re-raise the first failure of this step, if any
+            for thread in threads:
+                thread.wait()
+        LOG.debug("process_network_ports - iteration:%(iter_num)d - "
+                  "processed %(num_devices)d devices in %(num_chunks)d "
+                  "chunks in %(elapsed).3f. Time spent per stage: "
+                  "details %(details).3f, firewall %(firewall).3f, "
+                  "wiring %(wiring).3f",
+                  {'iter_num': self.iter_num,
+                   'num_devices': len(devices),
+                   'num_chunks': len(chunks),
+                   'elapsed': time.time() - start,
+                   'details': stage_times['details'],
+                   'firewall': stage_times['firewall'],
+                   'wiring': stage_times['wiring']})
+        return skipped_devices
 
     def process_network_ports(self, port_info, ovs_restarted):
         resync_a = False
         resync_b = False
-        # TODO(salv-orlando): consider a solution for ensuring notifications
-        # are processed exactly in the same order in which they were
-        # received. This is tricky because there are two notification
-        # sources: the neutron server, and the ovs db monitor process
-        # If there is an exception while processing security groups ports
-        # will not be wired anyway, and a resync will be triggered
-        # TODO(salv-orlando): Optimize avoiding applying filters unnecessarily
-        # (eg: when there are no IP address changes)
-        self.sg_agent.setup_port_filters(port_info.get('added', set()),
-                                         port_info.get('updated', set()))
         # VIF wiring needs to be performed always for 'new' devices.
         # For updated ports, re-wiring is not needed in most cases, but needs
         # to be performed anyway when the admin state of a device is changed.
@@ -1226,11 +1371,30 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         # list at the same time; avoid processing it twice.
         devices_added_updated = (port_info.get('added', set()) |
                                  port_info.get('updated', set()))
+        pipelined = (self.device_processing_chunk_size > 0 and
+                     len(devices_added_updated) >
+                     self.device_processing_chunk_size)
+        if not pipelined:
+            # TODO(salv-orlando): consider a solution for ensuring
+            # notifications are processed exactly in the same order in which
+            # they were received. This is tricky because there are two
+            # notification sources: the neutron server, and the ovs db
+            # monitor process
+            # If there is an exception while processing security groups
+            # ports will not be wired anyway, and a resync will be triggered
+            # TODO(salv-orlando): Optimize avoiding applying filters
+            # unnecessarily (eg: when there are no IP address changes)
+            self.sg_agent.setup_port_filters(port_info.get('added', set()),
+                                             port_info.get('updated', set()))
         if devices_added_updated:
             start = time.time()
             try:
-                skipped_devices = self.treat_devices_added_or_updated(
-                    devices_added_updated, ovs_restarted)
+                if pipelined:
+                    skipped_devices = self._process_devices_pipelined(
+                        port_info, devices_added_updated, ovs_restarted)
+                else:
+                    skipped_devices = self.treat_devices_added_or_updated(
+                        devices_added_updated, ovs_restarted)
                 LOG.debug("process_network_ports - iteration:%(iter_num)d -"
                           "treat_devices_added_or_updated completed. "
                           "Skipped %(num_skipped)d devices of "
@@ -1407,7 +1571,16 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                     updated_ports_copy = self.updated_ports
                     self.updated_ports = set()
                     reg_ports = (set() if ovs_restarted else ports)
-                    port_info = self.scan_ports(reg_ports, updated_ports_copy)
+                    # Always consume the ovsdb events, even when all the
+                    # ports have to be scanned.
+                    events = polling_manager.get_events()
+                    if events is not None and reg_ports and (
+                            not self.ancillary_brs):
+                        port_info = self.process_ports_events(
+                            events, reg_ports, updated_ports_copy)
+                    else:
+                        port_info = self.scan_ports(reg_ports,
+                                                    updated_ports_copy)
                     LOG.debug("Agent rpc_loop - iteration:%(iter_num)d - "
                               "port information retrieved. "
                               "Elapsed:%(elapsed).3f",
@@ -1521,6 +1694,8 @@ def create_agent_config_map(config):
         l2_population=config.AGENT.l2_population,
         arp_responder=config.AGENT.arp_responder,
         use_veth_interconnection=config.OVS.use_veth_interconnection,
+        device_processing_chunk_size=(
+            config.AGENT.device_processing_chunk_size),
     )
 
     # If enable_tunneling is TRUE, set tunnel_type to default to GRE
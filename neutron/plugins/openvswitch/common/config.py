@@ -81,6 +81,12 @@ agent_opts = [
                        "outgoing IP packet carrying GRE/VXLAN tunnel.")),
     cfg.BoolOpt('enable_distributed_routing', default=False,
                 help=_("Make the l2 agent run in DVR mode.")),
+    cfg.IntOpt('device_processing_chunk_size', default=0,
+               help=_("Number of devices per chunk when processing added "
+                      "or updated devices in a pipeline, overlapping the "
+                      "retrieval of device details, the firewall setup and "
+                      "the wiring of consecutive chunks. 0 disables the "
+                      "pipeline.")),
 ]
 
 
@@ -173,26 +173,21 @@ class SriovNicSwitchAgent(sg_rpc.SecurityGroupAgentRpcMixin):
         return (resync_a | resync_b)
 
     def treat_device(self, device, pci_slot, admin_state_up):
+        """Set the state of a device.
+
+        Returns True if the device state was set, False otherwise.
+        """
         if self.eswitch_mgr.device_exists(device, pci_slot):
             try:
                 self.eswitch_mgr.set_device_state(device, pci_slot,
                                                   admin_state_up)
             except exc.SriovNicError:
                 LOG.exception(_LE("Failed to set device %s state"), device)
-                return
-            if admin_state_up:
-                # update plugin about port status
-                self.plugin_rpc.update_device_up(self.context,
-                                                 device,
-                                                 self.agent_id,
-                                                 cfg.CONF.host)
-            else:
-                self.plugin_rpc.update_device_down(self.context,
-                                                   device,
-                                                   self.agent_id,
-                                                   cfg.CONF.host)
+                return False
+            return True
         else:
             LOG.info(_LI("No device with MAC %s defined on agent."), device)
+            return False
 
     def treat_devices_added_updated(self, devices):
         try:
@@ -205,6 +200,8 @@ class SriovNicSwitchAgent(sg_rpc.SecurityGroupAgentRpcMixin):
             # resync is needed
             return True
 
+        devices_up = []
+        devices_down = []
         for device_details in devices_details_list:
             device = device_details['device']
             LOG.debug("Port with MAC address %s is added", device)
@@ -213,33 +210,48 @@ class SriovNicSwitchAgent(sg_rpc.SecurityGroupAgentRpcMixin):
                 LOG.info(_LI("Port %(device)s updated. Details: %(details)s"),
                          {'device': device, 'details': device_details})
                 profile = device_details['profile']
-                self.treat_device(device_details['device'],
-                                  profile.get('pci_slot'),
-                                  device_details['admin_state_up'])
+                admin_state_up = device_details['admin_state_up']
+                if self.treat_device(device_details['device'],
+                                     profile.get('pci_slot'),
+                                     admin_state_up):
+                    if admin_state_up:
+                        devices_up.append(device)
+                    else:
+                        devices_down.append(device)
             else:
                 LOG.info(_LI("Device with MAC %s not defined on plugin"),
                          device)
+
+        # update plugin about port status
+        if devices_up:
+            self.plugin_rpc.update_devices_up(self.context,
+                                              devices_up,
+                                              self.agent_id,
+                                              cfg.CONF.host)
+        if devices_down:
+            self.plugin_rpc.update_devices_down(self.context,
+                                                devices_down,
+                                                self.agent_id,
+                                                cfg.CONF.host)
         return False
 
     def treat_devices_removed(self, devices):
-        resync = False
         for device in devices:
             LOG.info(_LI("Removing device with mac_address %s"), device)
-            try:
-                dev_details = self.plugin_rpc.update_device_down(self.context,
-                                                                 device,
-                                                                 self.agent_id,
-                                                                 cfg.CONF.host)
-            except Exception as e:
-                LOG.debug("Removing port failed for device %(device)s "
-                          "due to %(exc)s", {'device': device, 'exc': e})
-                resync = True
-                continue
+        try:
+            devices_details = self.plugin_rpc.update_devices_down(
+                self.context, list(devices), self.agent_id, cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("Removing port failed for devices %(devices)s "
+                      "due to %(exc)s", {'devices': devices, 'exc': e})
+            return True
+        for dev_details in devices_details:
             if dev_details['exists']:
-                LOG.info(_LI("Port %s updated."), device)
+                LOG.info(_LI("Port %s updated."), dev_details['device'])
             else:
-                LOG.debug("Device %s not defined on plugin", device)
-        return resync
+                LOG.debug("Device %s not defined on plugin",
+                          dev_details['device'])
+        return False
 
     def daemon_loop(self):
         sync = True
@@ -18,6 +18,7 @@ Policy engine for neutron.  Largely copied from nova.
 """
 
 import collections
+import hashlib
 import itertools
 import logging
 import re
@@ -40,6 +41,8 @@ LOG = log.getLogger(__name__)
 _ENFORCER = None
 ADMIN_CTX_POLICY = 'context_is_admin'
 ADVSVC_CTX_POLICY = 'context_is_advsvc'
+# Maximum number of parent resources retrieved by a call of Checker.prefetch
+PREFETCH_CHUNK_SIZE = 500
 # Maps deprecated 'extension' policies to new-style policies
 DEPRECATED_POLICY_MAP = {
     'extension:provider_network':
@@ -79,6 +82,19 @@ def init():
         _ENFORCER.load_rules(True)
 
 
+_rules_digest = (None, None)
+
+
+def get_rules_digest():
+    """Returns a digest of the policy rules, which changes with them."""
+    global _rules_digest
+    init()
+    rules = _ENFORCER.rules
+    if _rules_digest[0] is not rules:
+        _rules_digest = (rules, hashlib.md5(str(rules)).hexdigest())
+    return _rules_digest[1]
+
+
 def refresh():
     """Reset policy and init a new instance of Enforcer."""
     reset()
@@ -422,6 +438,254 @@ def enforce(context, action, target, plugin=None):
     return result
 
 
+def _get_parent_lookup(target_field):
+    """Returns the parent resource, field and foreign key of a target field.
+
+    None is returned when the target field does not reference a parent
+    resource which OwnerCheck could load.
+    """
+    for separator in (':', '_'):
+        if separator in target_field:
+            parent_res, parent_field = target_field.split(separator, 1)
+            foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
+                "%ss" % parent_res)
+            if foreign_key:
+                return parent_res, parent_field, foreign_key
+            return None
+    return None
+
+
+def _get_target_fields(rule, seen, parents):
+    """Returns the target fields a rule depends on.
+
+    None is returned when the rule contains a check which may depend on
+    something else than the target fields it names and the credentials.
+    The parent resources loaded by the OwnerChecks of the rule are added
+    to parents as (target field, parent resource, parent field, foreign
+    key) tuples.
+    """
+    if isinstance(rule, (policy.TrueCheck, policy.FalseCheck,
+                         policy.RoleCheck)):
+        return set()
+    if isinstance(rule, policy.RuleCheck):
+        if rule.match in seen:
+            return set()
+        seen.add(rule.match)
+        try:
+            return _get_target_fields(_ENFORCER.rules[rule.match], seen,
+                                      parents)
+        except KeyError:
+            return set()
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        fields = set()
+        for sub_rule in rule.rules:
+            sub_fields = _get_target_fields(sub_rule, seen, parents)
+            if sub_fields is None:
+                return None
+            fields |= sub_fields
+        return fields
+    if isinstance(rule, policy.NotCheck):
+        return _get_target_fields(rule.rule, seen, parents)
+    if isinstance(rule, OwnerCheck):
+        fields = set([rule.target_field])
+        lookup = _get_parent_lookup(rule.target_field)
+        if lookup:
+            # A field of a parent resource is loaded from the foreign key
+            fields.add(lookup[2])
+            parents.append((rule.target_field, ) + lookup)
+        return fields
+    if isinstance(rule, FieldCheck):
+        return set([rule.field])
+    if isinstance(rule, policy.GenericCheck):
+        return set(re.findall(r'%\((.*?)\)s', rule.match))
+    return None
+
+
+def _without_parent_checks(rule, seen):
+    """Returns the rule with the OwnerChecks of parent resources failing.
+
+    The rule returned passes only if the original rule passes whatever the
+    parent resources.  None is returned when this is not the case, as a
+    check of a parent resource is negated, or when the rule can not be
+    analysed.  The rule itself is returned when it has no such check.
+    """
+    if isinstance(rule, OwnerCheck):
+        if _get_parent_lookup(rule.target_field):
+            return policy.FalseCheck()
+        return rule
+    if isinstance(rule, policy.RuleCheck):
+        if rule.match in seen:
+            return None
+        try:
+            sub_rule = _ENFORCER.rules[rule.match]
+        except KeyError:
+            return rule
+        new_rule = _without_parent_checks(sub_rule, seen | set([rule.match]))
+        return rule if new_rule is sub_rule else new_rule
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        sub_rules = [_without_parent_checks(r, seen) for r in rule.rules]
+        if None in sub_rules:
+            return None
+        if all(new is old for new, old in zip(sub_rules, rule.rules)):
+            return rule
+        return rule.__class__(sub_rules)
+    if isinstance(rule, policy.NotCheck):
+        if _without_parent_checks(rule.rule, seen) is rule.rule:
+            return rule
+        return None
+    return rule
+
+
+class Checker(object):
+    """Checks an action on many targets with the same context.
+
+    The credentials and, for read actions, the match rule are computed once.
+    The results are memoized by the values of the target fields the rule
+    depends on, so that targets which only differ by other fields, like the
+    ports of a tenant, are evaluated once.
+
+    The parent resources needed by OwnerChecks are cached for the lifetime
+    of the checker, and can be loaded for a whole list of targets at once
+    with prefetch().  prefetch() first checks the targets with the checks
+    of parent resources failing, so that the parents of the targets which
+    pass anyway, e.g. for an admin or the owner of the target, are not
+    loaded.
+    """
+
+    def __init__(self, context, action, might_not_exist=False,
+                 credentials=None):
+        init()
+        self.action = action
+        self.skip = might_not_exist and not (_ENFORCER.rules and
+                                             action in _ENFORCER.rules)
+        self.credentials = credentials or context.to_dict()
+        self.match_rule = None
+        self.rule_without_parents = None
+        self.fields = None
+        self.parents = []
+        self.parent_cache = {}
+        resource, is_write = get_resource_and_action(action)
+        if not is_write and not self.skip:
+            # Read rules do not depend on the attributes of the target
+            self.match_rule = _build_match_rule(action, {})
+            fields = _get_target_fields(self.match_rule, set(),
+                                        self.parents)
+            if fields is not None:
+                self.fields = sorted(fields)
+            if self.parents:
+                self.rule_without_parents = _without_parent_checks(
+                    self.match_rule, set())
+        self.results = {}
+
+    def _known_without_parents(self, target):
+        """Returns True if the result for target needs no parent resource.
+
+        A target which passes the rule without its parents is memoized as
+        allowed.
+        """
+        key = self._get_key(target)
+        if key is not None and key in self.results:
+            return True
+        if self.rule_without_parents is None:
+            return False
+        result = _ENFORCER.enforce(self.rule_without_parents, target,
+                                   self.credentials)
+        if result and key is not None:
+            self.results[key] = result
+        return result
+
+    def prefetch(self, targets):
+        """Loads the parent resources needed to check all the targets.
+
+        Each type of parent resource is retrieved from the core plugin with
+        a call per PREFETCH_CHUNK_SIZE resources, instead of one call per
+        target in OwnerCheck.  Only the parents of the targets which do not
+        pass the rule without them are loaded.
+        """
+        if self.skip or not self.parents:
+            return
+        parent_fields = collections.defaultdict(set)
+        parent_ids = collections.defaultdict(set)
+        for target in targets:
+            missing = []
+            for target_field, parent_res, parent_field, foreign_key in (
+                    self.parents):
+                parent_fields[parent_res].add(parent_field)
+                parent_id = target.get(foreign_key)
+                if (target_field not in target and parent_id and
+                        (parent_res, parent_id) not in self.parent_cache):
+                    missing.append((parent_res, parent_id))
+            if missing and not self._known_without_parents(target):
+                for parent_res, parent_id in missing:
+                    parent_ids[parent_res].add(parent_id)
+        if not parent_ids:
+            return
+        # NOTE(ihrachys): if import is put in global, circular
+        # import failure occurs
+        manager = importutils.import_module('neutron.manager')
+        context = importutils.import_module('neutron.context')
+        plugin = manager.NeutronManager.get_instance().plugin
+        admin_context = context.get_admin_context()
+        for parent_res, ids in parent_ids.items():
+            f = getattr(plugin, 'get_%ss' % parent_res)
+            fields = ['id'] + sorted(parent_fields[parent_res])
+            ids = sorted(ids)
+            for i in range(0, len(ids), PREFETCH_CHUNK_SIZE):
+                chunk = ids[i:i + PREFETCH_CHUNK_SIZE]
+                for data in f(admin_context, filters={'id': chunk},
+                              fields=fields):
+                    self.parent_cache[(parent_res, data['id'])] = data
+
+    def _load_parent_fields(self, target):
+        for target_field, parent_res, parent_field, foreign_key in (
+                self.parents):
+            if target_field in target:
+                continue
+            data = self.parent_cache.get(
+                (parent_res, target.get(foreign_key)))
+            if data and parent_field in data:
+                target[target_field] = data[parent_field]
+
+    def _cache_parent_fields(self, target):
+        # OwnerCheck stores the fields it loaded in the target
+        for target_field, parent_res, parent_field, foreign_key in (
+                self.parents):
+            if target_field in target and target.get(foreign_key):
+                data = self.parent_cache.setdefault(
+                    (parent_res, target[foreign_key]),
+                    {'id': target[foreign_key]})
+                data.setdefault(parent_field, target[target_field])
+
+    def _get_key(self, target):
+        if self.fields is None:
+            return None
+        key = tuple(target.get(field) for field in self.fields)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def __call__(self, target):
+        """Returns True if the action is allowed on the target."""
+        if self.skip:
+            return True
+        key = self._get_key(target)
+        if key is not None and key in self.results:
+            return self.results[key]
+
+        self._load_parent_fields(target)
+        match_rule = (self.match_rule or
+                      _build_match_rule(self.action, target))
+        result = _ENFORCER.enforce(match_rule, target, self.credentials)
+        if not result:
+            log_rule_list(match_rule)
+        self._cache_parent_fields(target)
+        if key is not None:
+            self.results[key] = result
+        return result
+
+
 def check_is_admin(context):
     """Verify context has admin rights according to policy settings."""
     init()
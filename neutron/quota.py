@@ -27,6 +27,7 @@ from neutron.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 QUOTA_DB_MODULE = 'neutron.db.quota_db'
 QUOTA_DB_DRIVER = 'neutron.db.quota_db.DbQuotaDriver'
+QUOTA_TRACKING_DRIVER = 'neutron.db.quota_db.UsageTrackingQuotaDriver'
 QUOTA_CONF_DRIVER = 'neutron.quota.ConfDriver'
 
 quota_opts = [
@@ -53,6 +54,12 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default=QUOTA_DB_DRIVER,
                help=_('Default driver to use for quota checks')),
+    cfg.IntOpt('reservation_expiration',
+               default=120,
+               help=_('Number of seconds after which a reservation of '
+                      'resources which is neither committed nor cancelled '
+                      'is ignored. Only used by quota drivers tracking '
+                      'usage.')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -220,7 +227,7 @@ class QuotaEngine(object):
         if self._driver is None:
             _driver_class = (self._driver_class or
                              cfg.CONF.QUOTAS.quota_driver)
-            if (_driver_class == QUOTA_DB_DRIVER and
+            if (_driver_class in (QUOTA_DB_DRIVER, QUOTA_TRACKING_DRIVER) and
                     QUOTA_DB_MODULE not in sys.modules):
                 # If quotas table is not loaded, force config quota driver.
                 _driver_class = QUOTA_CONF_DRIVER
@@ -298,6 +305,42 @@ class QuotaEngine(object):
         return self.get_driver().limit_check(context, tenant_id,
                                              self._resources, values)
 
+    def make_reservation(self, context, tenant_id, deltas, *args):
+        """Reserve resources for a tenant before creating them.
+
+        The values of deltas are the numbers of resources of each kind to
+        be created.  Drivers which do not track usage check the counts of
+        the resources plus the deltas against the limits, args being
+        passed to the count functions as with count().
+
+        This method will raise an OverQuota exception if any of the
+        deltas exceeds the quota.
+
+        :param context: The request context, for access checks.
+        :returns: the id of the reservation, or None if the driver does
+                  not make reservations.
+        """
+
+        driver = self.get_driver()
+        if hasattr(driver, 'make_reservation'):
+            return driver.make_reservation(context, tenant_id,
+                                           self._resources, deltas, *args)
+        values = dict((resource, self.count(context, resource, *args) + delta)
+                      for resource, delta in deltas.items())
+        self.limit_check(context, tenant_id, **values)
+
+    def commit_reservation(self, context, reservation_id):
+        """Release a reservation whose resources have been created."""
+
+        if reservation_id is not None:
+            self.get_driver().commit_reservation(context, reservation_id)
+
+    def cancel_reservation(self, context, reservation_id):
+        """Release a reservation whose resources were not created."""
+
+        if reservation_id is not None:
+            self.get_driver().cancel_reservation(context, reservation_id)
+
     @property
     def resources(self):
         return self._resources
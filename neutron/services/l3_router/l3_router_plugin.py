@@ -50,6 +50,10 @@ class L3RouterPlugin(common_db_mixin.CommonDbMixin,
                                    "extraroute", "l3_agent_scheduler",
                                    "l3-ha"]
 
+    __native_pagination_support = True
+    __native_sorting_support = True
+    __revision_tracking_support = True
+
     def __init__(self):
         self.setup_rpc()
         self.router_scheduler = importutils.import_object(
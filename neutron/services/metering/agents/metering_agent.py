@@ -53,8 +53,12 @@ class MeteringPluginRpc(object):
         target = messaging.Target(topic=topics.METERING_PLUGIN, version='1.0')
         self.client = n_rpc.get_client(target)
 
-    def _get_sync_data_metering(self, context):
+    def _get_sync_data_metering(self, context, router_ids=None):
         try:
+            if router_ids:
+                cctxt = self.client.prepare(version='1.1')
+                return cctxt.call(context, 'get_sync_data_metering',
+                                  host=self.host, router_ids=router_ids)
             cctxt = self.client.prepare()
             return cctxt.call(context, 'get_sync_data_metering',
                               host=self.host)
@@ -63,6 +67,14 @@ class MeteringPluginRpc(object):
 
 
 class MeteringAgent(MeteringPluginRpc, manager.Manager):
+    """Metering agent.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - Add add_metering_label_rule and remove_metering_label_rule.
+    """
+
+    target = messaging.Target(version='1.1')
 
     Opts = [
         cfg.StrOpt('driver',
@@ -73,6 +85,10 @@ class MeteringAgent(MeteringPluginRpc, manager.Manager):
                    help=_("Interval between two metering measures")),
         cfg.IntOpt('report_interval', default=300,
                    help=_("Interval between two metering reports")),
+        cfg.IntOpt('full_sync_interval', default=300,
+                   help=_("Interval between two full synchronizations of "
+                          "the routers, which picks up the routers added "
+                          "since the last one")),
     ]
 
     def __init__(self, host, conf=None):
@@ -92,6 +108,12 @@ class MeteringAgent(MeteringPluginRpc, manager.Manager):
         self.label_tenant_id = {}
         self.routers = {}
         self.metering_infos = {}
+        # The routers are fully synchronized at startup and then every
+        # full_sync_interval, as the agent is not notified of new routers.
+        # In between only the routers which missed a rule update are.
+        self.fullsync = True
+        self.last_full_sync = 0
+        self.resync_router_ids = set()
         super(MeteringAgent, self).__init__(host=host)
 
     def _load_drivers(self):
@@ -161,7 +183,18 @@ class MeteringAgent(MeteringPluginRpc, manager.Manager):
             self._add_metering_info(label_id, acc['pkts'], acc['bytes'])
 
     def _metering_loop(self):
+        start = time.time()
         self._add_metering_infos()
+        elapsed = time.time() - start
+        LOG.debug("Collected the traffic counters of %(routers)d routers in "
+                  "%(elapsed).3f seconds",
+                  {'routers': len(self.routers), 'elapsed': elapsed})
+        if elapsed > self.conf.measure_interval:
+            LOG.warn(_LW("Collecting the traffic counters took %(elapsed).3f "
+                         "seconds, more than measure_interval "
+                         "(%(interval)s seconds)"),
+                     {'elapsed': elapsed,
+                      'interval': self.conf.measure_interval})
 
         ts = int(time.time())
         delta = ts - self.last_report
@@ -187,10 +220,97 @@ class MeteringAgent(MeteringPluginRpc, manager.Manager):
 
     @periodic_task.periodic_task(run_immediately=True)
     def _sync_routers_task(self, context):
-        routers = self._get_sync_data_metering(self.context)
-        if not routers:
+        now = time.time()
+        if now - self.last_full_sync >= self.conf.full_sync_interval:
+            self.fullsync = True
+        if self.fullsync:
+            routers = self._get_sync_data_metering(self.context)
+            if not routers:
+                return
+            self.fullsync = False
+            self.last_full_sync = now
+            self._update_routers(context, routers)
+        elif self.resync_router_ids:
+            self._resync_routers(context)
+
+    def _resync_routers(self, context):
+        router_ids = self.resync_router_ids
+        self.resync_router_ids = set()
+        LOG.debug("Resynchronizing the metering labels of routers %s",
+                  router_ids)
+        routers = self._get_sync_data_metering(self.context,
+                                               list(router_ids))
+        if routers is None:
+            self.resync_router_ids |= router_ids
             return
-        self._update_routers(context, routers)
+
+        # The labels installed on the routers are replaced by the current
+        # ones, the counters of the old labels are collected first.
+        self._add_metering_infos()
+        stale_routers = [self.routers.pop(router_id)
+                         for router_id in router_ids
+                         if router_id in self.routers]
+        self._invoke_driver(context, stale_routers, 'remove_metering_label')
+
+        routers = [router for router in routers
+                   if router['id'] in router_ids]
+        for router in routers:
+            self.routers[router['id']] = router
+        self._invoke_driver(context, routers, 'add_metering_label')
+
+    def _check_label_revisions(self, routers):
+        """Returns the label rule changes which can be applied in order.
+
+        A change is skipped when its revision was already applied.  Routers
+        for which a revision was missed are scheduled for a resync.
+        """
+        in_order = []
+        for router in routers:
+            known_router = self.routers.get(router['id'])
+            if not known_router:
+                self.resync_router_ids.add(router['id'])
+                continue
+            known_labels = dict(
+                (label['id'], label)
+                for label in known_router.get(constants.METERING_LABEL_KEY,
+                                              []))
+            labels = []
+            for label in router.get(constants.METERING_LABEL_KEY, []):
+                known_label = known_labels.get(label['id'])
+                if not known_label:
+                    break
+                revision = known_label.get('revision_number', 0)
+                if label['revision_number'] > revision + 1:
+                    break
+                if label['revision_number'] == revision + 1:
+                    labels.append((known_label, label))
+            else:
+                if labels:
+                    in_order.append((router, labels))
+                continue
+            LOG.debug("Missed a metering rule update of router %s",
+                      router['id'])
+            self.resync_router_ids.add(router['id'])
+        return in_order
+
+    def _update_label_rules(self, context, routers, func_name):
+        updates = []
+        for router, labels in self._check_label_revisions(routers):
+            for known_label, label in labels:
+                rules = [rule for rule in known_label.get('rules', [])
+                         if rule['id'] != label['rule']['id']]
+                if func_name == 'add_metering_label_rule':
+                    rules.append(label['rule'])
+                known_label['rules'] = rules
+                known_label['revision_number'] = label['revision_number']
+
+            update = dict(router)
+            update[constants.METERING_LABEL_KEY] = [
+                label for known_label, label in labels]
+            updates.append(update)
+
+        if updates:
+            return self._invoke_driver(context, updates, func_name)
 
     def router_deleted(self, context, router_id):
         self._add_metering_infos()
@@ -224,8 +344,30 @@ class MeteringAgent(MeteringPluginRpc, manager.Manager):
         return self._invoke_driver(context, routers,
                                    'update_metering_label_rules')
 
+    def add_metering_label_rule(self, context, routers):
+        LOG.debug("Add a metering rule from agent")
+        return self._update_label_rules(context, routers,
+                                        'add_metering_label_rule')
+
+    def remove_metering_label_rule(self, context, routers):
+        LOG.debug("Remove a metering rule from agent")
+        return self._update_label_rules(context, routers,
+                                        'remove_metering_label_rule')
+
     def add_metering_label(self, context, routers):
         LOG.debug("Creating a metering label from agent")
+        for router in routers:
+            known_router = self.routers.get(router['id'])
+            if not known_router:
+                self.routers[router['id']] = router
+                continue
+            labels = known_router.setdefault(constants.METERING_LABEL_KEY,
+                                             [])
+            label_ids = set(label['id'] for label in labels)
+            labels.extend(
+                label for label in router.get(constants.METERING_LABEL_KEY,
+                                              [])
+                if label['id'] not in label_ids)
         return self._invoke_driver(context, routers,
                                    'add_metering_label')
 
@@ -233,6 +375,16 @@ class MeteringAgent(MeteringPluginRpc, manager.Manager):
         self._add_metering_infos()
 
         LOG.debug("Delete a metering label from agent")
+        for router in routers:
+            known_router = self.routers.get(router['id'])
+            if not known_router:
+                continue
+            label_ids = set(label['id'] for label in
+                            router.get(constants.METERING_LABEL_KEY, []))
+            known_router[constants.METERING_LABEL_KEY] = [
+                label for label in
+                known_router.get(constants.METERING_LABEL_KEY, [])
+                if label['id'] not in label_ids]
         return self._invoke_driver(context, routers,
                                    'remove_metering_label')
 
@@ -36,6 +36,14 @@ class MeteringAbstractDriver(object):
     def update_metering_label_rules(self, context, routers):
         pass
 
+    @abc.abstractmethod
+    def add_metering_label_rule(self, context, routers):
+        pass
+
+    @abc.abstractmethod
+    def remove_metering_label_rule(self, context, routers):
+        pass
+
     @abc.abstractmethod
     def add_metering_label(self, context, routers):
         pass
@@ -78,6 +78,8 @@ class RouterWithMetering(object):
             binary_name=WRAP_NAME,
             use_ipv6=ipv6_utils.is_enabled())
         self.metering_labels = {}
+        # label_id -> counters of the label chain at the last read
+        self.last_counters = {}
 
 
 class IptablesMeteringDriver(abstract_driver.MeteringAbstractDriver):
@@ -108,7 +110,8 @@ class IptablesMeteringDriver(abstract_driver.MeteringAbstractDriver):
         router_ids = set(router['id'] for router in routers)
         for router_id, rm in six.iteritems(self.routers):
             if router_id not in router_ids:
-                self._process_disassociate_metering_label(rm.router)
+                self._process_disassociate_metering_label(
+                    self._get_installed_labels(rm))
 
         for router in routers:
             old_gw_port_id = None
@@ -120,12 +123,21 @@ class IptablesMeteringDriver(abstract_driver.MeteringAbstractDriver):
             if gw_port_id != old_gw_port_id:
                 if old_rm:
                     with IptablesManagerTransaction(old_rm.iptables_manager):
-                        self._process_disassociate_metering_label(router)
+                        self._process_disassociate_metering_label(
+                            self._get_installed_labels(old_rm))
                         if gw_port_id:
                             self._process_associate_metering_label(router)
                 elif gw_port_id:
                     self._process_associate_metering_label(router)
 
+    def _get_installed_labels(self, rm):
+        # Labels are added and removed one at a time, so the last router
+        # received does not necessarily list all the labels installed.
+        router = dict(rm.router)
+        router[constants.METERING_LABEL_KEY] = [
+            {'id': label_id} for label_id in rm.metering_labels]
+        return router
+
     @log.log
     def remove_router(self, context, router_id):
         if router_id in self.routers:
@@ -134,29 +146,35 @@ class IptablesMeteringDriver(abstract_driver.MeteringAbstractDriver):
     def get_external_device_name(self, port_id):
         return (EXTERNAL_DEV_PREFIX + port_id)[:self.driver.DEV_NAME_LEN]
 
+    def _get_iptables_rule(self, ext_dev, rule, label_chain):
+        """Returns the iptables rule of a metering rule and if it is on top."""
+        remote_ip = rule['remote_ip_prefix']
+
+        if rule['direction'] == 'egress':
+            dir_opt = '-o %s -s %s' % (ext_dev, remote_ip)
+        else:
+            dir_opt = '-i %s -d %s' % (ext_dev, remote_ip)
+
+        if rule['excluded']:
+            return '%s -j RETURN' % dir_opt, True
+        return '%s -j %s' % (dir_opt, label_chain), False
+
     def _process_metering_label_rules(self, rm, rules, label_chain,
-                                      rules_chain):
+                                      rules_chain, remove=False):
         im = rm.iptables_manager
-        ext_dev = self.get_external_device_name(rm.router['gw_port_id'])
-        if not ext_dev:
+        if not rm.router['gw_port_id']:
             return
+        ext_dev = self.get_external_device_name(rm.router['gw_port_id'])
 
         for rule in rules:
-            remote_ip = rule['remote_ip_prefix']
-
-            if rule['direction'] == 'egress':
-                dir_opt = '-o %s -s %s' % (ext_dev, remote_ip)
-            else:
-                dir_opt = '-i %s -d %s' % (ext_dev, remote_ip)
-
-            if rule['excluded']:
-                ipt_rule = '%s -j RETURN' % dir_opt
-                im.ipv4['filter'].add_rule(rules_chain, ipt_rule,
-                                           wrap=False, top=True)
+            ipt_rule, top = self._get_iptables_rule(ext_dev, rule,
+                                                    label_chain)
+            if remove:
+                im.ipv4['filter'].remove_rule(rules_chain, ipt_rule,
+                                              wrap=False, top=top)
             else:
-                ipt_rule = '%s -j %s' % (dir_opt, label_chain)
                 im.ipv4['filter'].add_rule(rules_chain, ipt_rule,
-                                           wrap=False, top=False)
+                                           wrap=False, top=top)
 
     def _process_associate_metering_label(self, router):
         self._update_router(router)
@@ -219,6 +237,7 @@ class IptablesMeteringDriver(abstract_driver.MeteringAbstractDriver):
                                                                 wrap=False)
 
                 del rm.metering_labels[label_id]
+                rm.last_counters.pop(label_id, None)
 
     @log.log
     def add_metering_label(self, context, routers):
@@ -255,11 +274,61 @@ class IptablesMeteringDriver(abstract_driver.MeteringAbstractDriver):
                                                        label_chain,
                                                        rules_chain)
 
+    @log.log
+    def add_metering_label_rule(self, context, routers):
+        for router in routers:
+            self._update_metering_label_rule(router, remove=False)
+
+    @log.log
+    def remove_metering_label_rule(self, context, routers):
+        for router in routers:
+            self._update_metering_label_rule(router, remove=True)
+
+    def _update_metering_label_rule(self, router, remove):
+        """Adds or removes a single rule without rebuilding its label."""
+        rm = self.routers.get(router['id'])
+        if not rm:
+            return
+
+        with IptablesManagerTransaction(rm.iptables_manager):
+            labels = router.get(constants.METERING_LABEL_KEY, [])
+            for label in labels:
+                label_id = label['id']
+                if label_id not in rm.metering_labels:
+                    continue
+
+                label_chain = iptables_manager.get_chain_name(WRAP_NAME +
+                                                              LABEL + label_id,
+                                                              wrap=False)
+                rules_chain = iptables_manager.get_chain_name(WRAP_NAME +
+                                                              RULE + label_id,
+                                                              wrap=False)
+                self._process_metering_label_rules(rm, [label['rule']],
+                                                   label_chain,
+                                                   rules_chain,
+                                                   remove=remove)
+
     @log.log
     def remove_metering_label(self, context, routers):
         for router in routers:
             self._process_disassociate_metering_label(router)
 
+    def _get_counters_delta(self, rm, label_id, counters):
+        """Returns the traffic counted by a label since its last read.
+
+        The chains are never zeroed, which would lose the traffic counted
+        between reading and zeroing them.  Counters lower than at the last
+        read mean that the chain was created again, all of its traffic is
+        new then.
+        """
+        last = rm.last_counters.get(label_id)
+        rm.last_counters[label_id] = counters
+        if (last is None or counters['pkts'] < last['pkts'] or
+                counters['bytes'] < last['bytes']):
+            return counters
+        return {'pkts': counters['pkts'] - last['pkts'],
+                'bytes': counters['bytes'] - last['bytes']}
+
     @log.log
     def get_traffic_counters(self, context, routers):
         accs = {}
@@ -268,20 +337,23 @@ class IptablesMeteringDriver(abstract_driver.MeteringAbstractDriver):
             if not rm:
                 continue
 
-            for label_id, label in rm.metering_labels.items():
-                chain = iptables_manager.get_chain_name(WRAP_NAME + LABEL +
-                                                        label_id, wrap=False)
-
-                chain_acc = rm.iptables_manager.get_traffic_counters(
-                    chain, wrap=False, zero=True)
+            # The counters of all the labels of the router are read at once
+            chains = dict((iptables_manager.get_chain_name(
+                WRAP_NAME + LABEL + label_id, wrap=False), label_id)
+                for label_id in rm.metering_labels)
+            if not chains:
+                continue
 
-                if not chain_acc:
-                    continue
+            chain_accs = rm.iptables_manager.get_traffic_counters_of_chains(
+                chains, wrap=False)
 
+            for chain, chain_acc in chain_accs.items():
+                label_id = chains[chain]
+                delta = self._get_counters_delta(rm, label_id, chain_acc)
                 acc = accs.get(label_id, {'pkts': 0, 'bytes': 0})
 
-                acc['pkts'] += chain_acc['pkts']
-                acc['bytes'] += chain_acc['bytes']
+                acc['pkts'] += delta['pkts']
+                acc['bytes'] += delta['bytes']
 
                 accs[label_id] = acc
 
@@ -30,6 +30,14 @@ class NoopMeteringDriver(abstract_driver.MeteringAbstractDriver):
     def update_metering_label_rules(self, context, routers):
         pass
 
+    @log.log
+    def add_metering_label_rule(self, context, routers):
+        pass
+
+    @log.log
+    def remove_metering_label_rule(self, context, routers):
+        pass
+
     @log.log
     def add_metering_label(self, context, routers):
         pass
@@ -39,7 +39,7 @@ class MeteringPlugin(metering_db.MeteringDbMixin):
         label = super(MeteringPlugin, self).create_metering_label(
             context, metering_label)
 
-        data = self.get_sync_data_metering(context)
+        data = self.get_sync_data_metering(context, label['id'])
         self.meter_rpc.add_metering_label(context, data)
 
         return label
@@ -57,16 +57,15 @@ class MeteringPlugin(metering_db.MeteringDbMixin):
         rule = super(MeteringPlugin, self).create_metering_label_rule(
             context, metering_label_rule)
 
-        data = self.get_sync_data_metering(context)
-        self.meter_rpc.update_metering_label_rules(context, data)
+        data = self.get_sync_data_metering_rule(context, rule)
+        self.meter_rpc.add_metering_label_rule(context, data)
 
         return rule
 
     def delete_metering_label_rule(self, context, rule_id):
-        rule = super(MeteringPlugin, self).delete_metering_label_rule(
+        rule = self.get_metering_label_rule(context, rule_id)
+        super(MeteringPlugin, self).delete_metering_label_rule(
             context, rule_id)
 
-        data = self.get_sync_data_metering(context)
-        self.meter_rpc.update_metering_label_rules(context, data)
-
-        return rule
+        data = self.get_sync_data_metering_rule(context, rule)
+        self.meter_rpc.remove_metering_label_rule(context, data)
@@ -14,6 +14,7 @@
 #    under the License.
 
 import collections
+import os
 
 from oslo.config import cfg
 from oslo.utils import importutils
@@ -130,3 +131,41 @@ class IpLibTestCase(IpLibTestFramework):
                 *attr, root_helper=self.root_helper))
 
         device.link.delete()
+
+
+class IpLibBackendParityTestCase(IpLibTestFramework):
+    """Checks that both ip_lib backends see the same devices."""
+
+    def setUp(self):
+        super(IpLibBackendParityTestCase, self).setUp()
+        if os.geteuid() != 0:
+            self.skipTest('The netlink backend only reads other namespaces '
+                          'when running as root')
+        cfg.CONF.register_opts(ip_lib.OPTS)
+        self.addCleanup(cfg.CONF.clear_override, 'ip_lib_backend')
+
+    def _query(self, backend, attr):
+        cfg.CONF.set_override('ip_lib_backend', backend)
+        ip = ip_lib.IPWrapper(self.root_helper, namespace=attr.namespace)
+        device = ip.device(attr.name)
+        link = device.link.attributes
+        return {
+            'devices': sorted(d.name for d in ip.get_devices()),
+            'link': dict((key, link.get(key))
+                         for key in ('link/ether', 'mtu', 'state', 'qdisc',
+                                     'mode', 'group')),
+            'addresses': device.addr.list(),
+            'global_addresses': device.addr.list(scope='global',
+                                                 filters=['permanent']),
+            'matching_addresses': device.addr.list(
+                to=attr.ip_cidr.split('/')[0]),
+            'gateway': device.route.get_gateway(),
+        }
+
+    def test_backends_agree(self):
+        attr = self.generate_device_details()
+        device = self.manage_device(attr)
+        device.route.add_gateway('240.0.0.254', metric=10)
+
+        self.assertEqual(self._query('iproute2', attr),
+                         self._query('netlink', attr))
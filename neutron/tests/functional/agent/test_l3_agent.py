@@ -334,6 +334,27 @@ class L3AgentTestCase(L3AgentTestFramework):
             self.agent.get_ha_device_name, router.ns_name))
 
 
+class L3AgentStartupTestCase(L3AgentTestFramework):
+    def setUp(self):
+        super(L3AgentStartupTestCase, self).setUp()
+        self.agent.conf.set_override('prioritize_forwarding_on_startup',
+                                     True)
+
+    def _run_deferred_helpers(self):
+        while not self.agent._deferred_helper_keys.empty():
+            self.agent._run_deferred_helper(
+                self.agent._deferred_helper_keys.get())
+
+    def test_metadata_proxy_deferred_while_starting(self):
+        router_info = self.generate_router_info(enable_ha=False)
+        router = self.manage_router(self.agent, router_info)
+        self.assertTrue(self._namespace_exists(router))
+        self.assertFalse(self._metadata_proxy_exists(self.agent.conf, router))
+
+        self._run_deferred_helpers()
+        self.assertTrue(self._metadata_proxy_exists(self.agent.conf, router))
+
+
 class L3HATestFramework(L3AgentTestFramework):
     def setUp(self):
         super(L3HATestFramework, self).setUp()
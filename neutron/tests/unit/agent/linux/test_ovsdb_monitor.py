@@ -14,6 +14,7 @@
 
 import eventlet.event
 import mock
+from oslo.serialization import jsonutils
 
 from neutron.agent.linux import ovsdb_monitor
 from neutron.tests import base
@@ -101,3 +102,74 @@ class TestSimpleInterfaceMonitor(base.BaseTestCase):
                 return_value=output):
             self.monitor._read_stdout()
         self.assertFalse(self.monitor.data_received)
+
+    def _output(self, *rows):
+        return jsonutils.dumps({
+            'headings': ['row', 'action', 'name', 'ofport', 'external_ids'],
+            'data': [list(row) for row in rows]})
+
+    def _row(self, action, name, ofport=1, iface_id='port-id'):
+        external_ids = ['map', [['iface-id', iface_id],
+                                ['attached-mac', 'fa:16:3e:00:00:01']]]
+        return ['row-uuid', action, name, ofport, external_ids]
+
+    def _set_output(self, *lines):
+        return mock.patch.object(self.monitor, 'iter_stdout',
+                                 return_value=iter(lines))
+
+    def _set_active(self):
+        self.monitor._events_complete = True
+
+    def test_process_events_returns_false_without_output(self):
+        with self._set_output():
+            self.assertFalse(self.monitor.process_events())
+
+    def test_get_events_returns_none_until_monitor_is_active(self):
+        with self._set_output(self._output(self._row('initial', 'tap1'))):
+            self.assertIsNone(self.monitor.get_events())
+        self.monitor.data_received = True
+        self.monitor._kill_event = eventlet.event.Event()
+        with self._set_output():
+            self.assertIsNone(self.monitor.get_events())
+        with self._set_output():
+            self.assertEqual({'added': [], 'removed': [], 'modified': []},
+                             self.monitor.get_events())
+
+    def test_get_events(self):
+        self._set_active()
+        output = [self._output(self._row('insert', 'tap1', ['set', []]),
+                               self._row('delete', 'tap2')),
+                  self._output(['row-uuid', 'old', None, ['set', []], None],
+                               self._row('new', 'tap1', 5)),
+                  self._output(self._row('new', 'tap3', 7))]
+        with self._set_output(*output):
+            events = self.monitor.get_events()
+        external_ids = {'iface-id': 'port-id',
+                        'attached-mac': 'fa:16:3e:00:00:01'}
+        self.assertEqual(
+            {'added': [{'name': 'tap1', 'ofport': 5,
+                        'external_ids': external_ids}],
+             'removed': [{'name': 'tap2', 'ofport': 1,
+                          'external_ids': external_ids}],
+             'modified': [{'name': 'tap3', 'ofport': 7,
+                           'external_ids': external_ids}]},
+            events)
+        with self._set_output():
+            self.assertEqual({'added': [], 'removed': [], 'modified': []},
+                             self.monitor.get_events())
+
+    def test_get_events_ignores_interfaces_added_and_deleted(self):
+        self._set_active()
+        output = [self._output(self._row('insert', 'tap1')),
+                  self._output(self._row('delete', 'tap1'))]
+        with self._set_output(*output):
+            self.assertEqual({'added': [], 'removed': [], 'modified': []},
+                             self.monitor.get_events())
+
+    def test__kill_resets_events_completion(self):
+        self._set_active()
+        with mock.patch(
+                'neutron.agent.linux.ovsdb_monitor.OvsdbMonitor._kill'):
+            self.monitor._kill()
+        with self._set_output():
+            self.assertIsNone(self.monitor.get_events())
@@ -87,6 +87,10 @@ class TestAlwaysPoll(base.BaseTestCase):
         pm = polling.AlwaysPoll()
         self.assertTrue(pm.is_polling_required)
 
+    def test_get_events_returns_none(self):
+        pm = polling.AlwaysPoll()
+        self.assertIsNone(pm.get_events())
+
 
 class TestInterfacePollingMinimizer(base.BaseTestCase):
 
@@ -115,3 +119,9 @@ class TestInterfacePollingMinimizer(base.BaseTestCase):
     def test__is_polling_required_returns_when_updates_are_present(self):
         with self.mock_has_updates(True):
             self.assertTrue(self.pm._is_polling_required())
+
+    def test_get_events_calls_monitor_get_events(self):
+        with mock.patch.object(self.pm._monitor, 'get_events',
+                               return_value='events') as mock_get_events:
+            self.assertEqual('events', self.pm.get_events())
+        mock_get_events.assert_called_with()
@@ -705,45 +705,39 @@ class TestCiscoNetworksV2(CiscoML2MechanismTestCase,
                           test_ml2_plugin.TestMl2NetworksV2):
 
     def test_create_networks_bulk_emulated_plugin_failure(self):
-        real_has_attr = hasattr
-
-        def fakehasattr(item, attr):
-            if attr.endswith('__native_bulk_support'):
-                return False
-            return real_has_attr(item, attr)
-
+        #ensures the API choose the emulation code path
+        self._use_emulated_bulk()
         plugin_obj = manager.NeutronManager.get_plugin()
         orig = plugin_obj.create_network
-        #ensures the API choose the emulation code path
-        with mock.patch('__builtin__.hasattr',
-                        new=fakehasattr):
-            with mock.patch.object(plugin_obj,
-                                   'create_network') as patched_plugin:
-                def side_effect(*args, **kwargs):
-                    return self._fail_second_call(patched_plugin, orig,
-                                                  *args, **kwargs)
-                patched_plugin.side_effect = side_effect
-                res = self._create_network_bulk(self.fmt, 2, 'test', True)
-                LOG.debug("response is %s" % res)
-                # We expect an internal server error as we injected a fault
-                self._validate_behavior_on_bulk_failure(
-                    res,
-                    'networks',
-                    wexc.HTTPInternalServerError.code)
+        with mock.patch.object(plugin_obj,
+                               'create_network') as patched_plugin:
+            def side_effect(*args, **kwargs):
+                return self._fail_second_call(patched_plugin, orig,
+                                              *args, **kwargs)
+            patched_plugin.side_effect = side_effect
+            res = self._create_network_bulk(self.fmt, 2, 'test', True)
+            LOG.debug("response is %s" % res)
+            # We expect an internal server error as we injected a fault
+            self._validate_behavior_on_bulk_failure(
+                res,
+                'networks',
+                wexc.HTTPInternalServerError.code)
 
     def test_create_networks_bulk_native_plugin_failure(self):
         if self._skip_native_bulk:
             self.skipTest("Plugin does not support native bulk network create")
-        plugin_obj = manager.NeutronManager.get_plugin()
-        orig = plugin_obj.create_network
-        with mock.patch.object(plugin_obj,
-                               'create_network') as patched_plugin:
+        # The native path does not call create_network, the fault is
+        # injected while processing the second network
+        ext_manager = manager.NeutronManager.get_plugin().extension_manager
+        orig = ext_manager.process_create_network
+        with mock.patch.object(ext_manager,
+                               'process_create_network') as patched:
 
             def side_effect(*args, **kwargs):
-                return self._fail_second_call(patched_plugin, orig,
+                return self._fail_second_call(patched, orig,
                                               *args, **kwargs)
 
-            patched_plugin.side_effect = side_effect
+            patched.side_effect = side_effect
             res = self._create_network_bulk(self.fmt, 2, 'test', True)
             # We expect an internal server error as we injected a fault
             self._validate_behavior_on_bulk_failure(
@@ -756,30 +750,22 @@ class TestCiscoSubnetsV2(CiscoML2MechanismTestCase,
                          test_ml2_plugin.TestMl2SubnetsV2):
 
     def test_create_subnets_bulk_emulated_plugin_failure(self):
-        real_has_attr = hasattr
-
         #ensures the API choose the emulation code path
-        def fakehasattr(item, attr):
-            if attr.endswith('__native_bulk_support'):
-                return False
-            return real_has_attr(item, attr)
-
-        with mock.patch('__builtin__.hasattr',
-                        new=fakehasattr):
-            plugin_obj = manager.NeutronManager.get_plugin()
-            orig = plugin_obj.create_subnet
-            with mock.patch.object(plugin_obj,
-                                   'create_subnet') as patched_plugin:
+        self._use_emulated_bulk()
+        plugin_obj = manager.NeutronManager.get_plugin()
+        orig = plugin_obj.create_subnet
+        with mock.patch.object(plugin_obj,
+                               'create_subnet') as patched_plugin:
 
-                def side_effect(*args, **kwargs):
-                    self._fail_second_call(patched_plugin, orig,
-                                           *args, **kwargs)
+            def side_effect(*args, **kwargs):
+                return self._fail_second_call(patched_plugin, orig,
+                                              *args, **kwargs)
 
-                patched_plugin.side_effect = side_effect
-                with self.network() as net:
-                    res = self._create_subnet_bulk(self.fmt, 2,
-                                                   net['network']['id'],
-                                                   'test')
+            patched_plugin.side_effect = side_effect
+            with self.network() as net:
+                res = self._create_subnet_bulk(self.fmt, 2,
+                                               net['network']['id'],
+                                               'test')
                 # We expect an internal server error as we injected a fault
                 self._validate_behavior_on_bulk_failure(
                     res,
@@ -789,15 +775,17 @@ class TestCiscoSubnetsV2(CiscoML2MechanismTestCase,
     def test_create_subnets_bulk_native_plugin_failure(self):
         if self._skip_native_bulk:
             self.skipTest("Plugin does not support native bulk subnet create")
-        plugin_obj = manager.NeutronManager.get_plugin()
-        orig = plugin_obj.create_subnet
-        with mock.patch.object(plugin_obj,
-                               'create_subnet') as patched_plugin:
+        # The native path does not call create_subnet, the fault is
+        # injected while processing the second subnet
+        ext_manager = manager.NeutronManager.get_plugin().extension_manager
+        orig = ext_manager.process_create_subnet
+        with mock.patch.object(ext_manager,
+                               'process_create_subnet') as patched:
             def side_effect(*args, **kwargs):
-                return self._fail_second_call(patched_plugin, orig,
+                return self._fail_second_call(patched, orig,
                                               *args, **kwargs)
 
-            patched_plugin.side_effect = side_effect
+            patched.side_effect = side_effect
             with self.network() as net:
                 res = self._create_subnet_bulk(self.fmt, 2,
                                                net['network']['id'],
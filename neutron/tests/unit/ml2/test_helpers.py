@@ -146,3 +146,35 @@ class HelpersTest(testlib_api.SqlTestCase):
                     self.driver.allocate_partially_specified_segment,
                     self.session)
                 log_warning.assert_called_once_with(mock.ANY, mock.ANY)
+
+    def test_allocate_partial_segments(self):
+        observed = self.driver.allocate_partially_specified_segments(
+            self.session, 3)
+        self.assertEqual(3, len(observed))
+        self.assertEqual(3, len(set(alloc.vlan_id for alloc in observed)))
+        for alloc in observed:
+            self.check_raw_segment(dict(physical_network=TENANT_NET), alloc)
+            self.assertTrue(alloc.allocated)
+
+    def test_allocate_partial_segments_pool_exhausted(self):
+        observed = self.driver.allocate_partially_specified_segments(
+            self.session, VLAN_MAX - VLAN_MIN + 3)
+        self.assertEqual(VLAN_MAX - VLAN_MIN + 1, len(observed))
+        observed = self.driver.allocate_partially_specified_segments(
+            self.session, 1)
+        self.assertEqual([], observed)
+
+    def test_allocate_partial_segments_first_attempt_fails(self):
+        with mock.patch.object(query.Query, 'update', side_effect=[1, 0, 1]):
+            observed = self.driver.allocate_partially_specified_segments(
+                self.session, 2)
+        self.assertEqual(2, len(observed))
+
+    def test_allocate_partial_segments_all_attempts_fail(self):
+        with mock.patch.object(query.Query, 'update', return_value=0):
+            with mock.patch.object(helpers.LOG, 'warning') as log_warning:
+                self.assertRaises(
+                    exc.NoNetworkFoundInMaximumAllowedAttempts,
+                    self.driver.allocate_partially_specified_segments,
+                    self.session, 2)
+                log_warning.assert_called_once_with(mock.ANY, mock.ANY)
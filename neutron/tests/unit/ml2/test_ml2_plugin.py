@@ -15,14 +15,17 @@
 
 import contextlib
 import mock
+from sqlalchemy import event
 import testtools
 import uuid
 import webob
 
+from neutron.api.v2 import router
 from neutron.common import constants
 from neutron.common import exceptions as exc
 from neutron.common import utils
 from neutron import context
+from neutron.db import api as db_api
 from neutron.db import db_base_plugin_v2 as base_plugin
 from neutron.db import l3_db
 from neutron.extensions import external_net as external_net
@@ -38,6 +41,7 @@ from neutron.plugins.ml2 import db as ml2_db
 from neutron.plugins.ml2 import driver_api
 from neutron.plugins.ml2 import driver_context
 from neutron.plugins.ml2.drivers import type_vlan
+from neutron.plugins.ml2 import managers
 from neutron.plugins.ml2 import models
 from neutron.plugins.ml2 import plugin as ml2_plugin
 from neutron.tests import base
@@ -89,6 +93,14 @@ class Ml2PluginV2TestCase(test_plugin.NeutronDbPluginV2TestCase):
         self.driver = ml2_plugin.Ml2Plugin()
         self.context = context.get_admin_context()
 
+    def _use_emulated_bulk(self):
+        # The API emulates bulk requests with the single item create methods
+        # when native bulk is disabled, as with a bulkless mechanism driver
+        plugin_obj = manager.NeutronManager.get_plugin()
+        with mock.patch.object(plugin_obj, '_Ml2Plugin__native_bulk_support',
+                               new=False):
+            self.api = router.APIRouter()
+
 
 class TestMl2BulkToggleWithBulkless(Ml2PluginV2TestCase):
 
@@ -118,12 +130,155 @@ class TestMl2V2HTTPResponse(test_plugin.TestV2HTTPResponse,
 
 class TestMl2NetworksV2(test_plugin.TestNetworksV2,
                         Ml2PluginV2TestCase):
-    pass
+
+    def _count_list_networks_statements(self, filters=None):
+        statements = []
+
+        def _after_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db_api.get_engine()
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        try:
+            nets = self.driver.get_networks(self.context, filters=filters)
+        finally:
+            event.remove(engine, 'after_cursor_execute',
+                         _after_cursor_execute)
+        return len(nets), len(statements)
+
+    def test_list_networks_constant_number_of_queries(self):
+        filters = {external_net.EXTERNAL: [False]}
+        with contextlib.nested(self.network(), self.network()):
+            few = self._count_list_networks_statements()
+            few_filtered = self._count_list_networks_statements(filters)
+            with contextlib.nested(self.network(), self.network(),
+                                   self.network()):
+                many = self._count_list_networks_statements()
+                many_filtered = self._count_list_networks_statements(filters)
+        self.assertEqual((2, 5), (few[0], many[0]))
+        self.assertEqual(few[1], many[1])
+        self.assertEqual((2, 5), (few_filtered[0], many_filtered[0]))
+        self.assertEqual(few_filtered[1], many_filtered[1])
+
+    def _test_create_networks_bulk_plugin_failure(self):
+        # The networks of a bulk request are not created one by one, the
+        # failure is injected while processing the second one
+        ext_manager = manager.NeutronManager.get_plugin().extension_manager
+        orig = ext_manager.process_create_network
+        with mock.patch.object(ext_manager,
+                               'process_create_network') as patched:
+
+            def side_effect(*args, **kwargs):
+                return self._fail_second_call(patched, orig, *args, **kwargs)
+
+            patched.side_effect = side_effect
+            res = self._create_network_bulk(self.fmt, 2, 'test', True)
+            self._validate_behavior_on_bulk_failure(
+                res, 'networks', webob.exc.HTTPServerError.code)
+
+    def test_create_networks_bulk_emulated_plugin_failure(self):
+        self._use_emulated_bulk()
+        plugin_obj = manager.NeutronManager.get_plugin()
+        orig = plugin_obj.create_network
+        with mock.patch.object(plugin_obj,
+                               'create_network') as patched_plugin:
+
+            def side_effect(*args, **kwargs):
+                return self._fail_second_call(patched_plugin, orig,
+                                              *args, **kwargs)
+
+            patched_plugin.side_effect = side_effect
+            res = self._create_network_bulk(self.fmt, 2, 'test', True)
+            self.assertEqual(2, patched_plugin.call_count)
+            self._validate_behavior_on_bulk_failure(
+                res, 'networks', webob.exc.HTTPServerError.code)
+
+    def test_create_networks_bulk_native_plugin_failure(self):
+        self._test_create_networks_bulk_plugin_failure()
+
+    def test_create_networks_bulk_calls_mechanism_drivers_once(self):
+        with contextlib.nested(
+            mock.patch.object(managers.MechanismManager,
+                              'create_network_bulk_precommit'),
+            mock.patch.object(managers.MechanismManager,
+                              'create_network_bulk_postcommit')
+        ) as (precommit, postcommit):
+            res = self._create_network_bulk(self.fmt, 3, 'test', True)
+        self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+        networks = self.deserialize(self.fmt, res)['networks']
+        for hook in (precommit, postcommit):
+            self.assertEqual(1, hook.call_count)
+            contexts = hook.call_args[0][0]
+            self.assertEqual([n['id'] for n in networks],
+                             [c.current['id'] for c in contexts])
+
+    def test_create_networks_bulk_allocates_tenant_segments(self):
+        res = self._create_network_bulk(self.fmt, 3, 'test', True)
+        self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+        networks = self.deserialize(self.fmt, res)['networks']
+        session = self.context.session
+        segments = [ml2_db.get_network_segments(session, n['id'])
+                    for n in networks]
+        self.assertEqual([1, 1, 1], [len(s) for s in segments])
+        self.assertEqual(3, len(set(s[0]['id'] for s in segments)))
 
 
 class TestMl2SubnetsV2(test_plugin.TestSubnetsV2,
                        Ml2PluginV2TestCase):
-    pass
+
+    def _test_create_subnets_bulk_plugin_failure(self):
+        # The subnets of a bulk request are not created one by one, the
+        # failure is injected while processing the second one
+        ext_manager = manager.NeutronManager.get_plugin().extension_manager
+        orig = ext_manager.process_create_subnet
+        with mock.patch.object(ext_manager,
+                               'process_create_subnet') as patched:
+
+            def side_effect(*args, **kwargs):
+                return self._fail_second_call(patched, orig, *args, **kwargs)
+
+            patched.side_effect = side_effect
+            with self.network() as net:
+                res = self._create_subnet_bulk(self.fmt, 2,
+                                               net['network']['id'],
+                                               'test')
+                self._validate_behavior_on_bulk_failure(
+                    res, 'subnets', webob.exc.HTTPServerError.code)
+
+    def test_create_subnets_bulk_emulated_plugin_failure(self):
+        self._use_emulated_bulk()
+        plugin_obj = manager.NeutronManager.get_plugin()
+        orig = plugin_obj.create_subnet
+        with mock.patch.object(plugin_obj,
+                               'create_subnet') as patched_plugin:
+
+            def side_effect(*args, **kwargs):
+                return self._fail_second_call(patched_plugin, orig,
+                                              *args, **kwargs)
+
+            patched_plugin.side_effect = side_effect
+            with self.network() as net:
+                res = self._create_subnet_bulk(self.fmt, 2,
+                                               net['network']['id'],
+                                               'test')
+                self.assertEqual(2, patched_plugin.call_count)
+                self._validate_behavior_on_bulk_failure(
+                    res, 'subnets', webob.exc.HTTPServerError.code)
+
+    def test_create_subnets_bulk_native_plugin_failure(self):
+        self._test_create_subnets_bulk_plugin_failure()
+
+    def test_create_subnets_bulk_overlapping_cidrs(self):
+        config.cfg.CONF.set_override('allow_overlapping_ips', False)
+        with self.network() as net:
+            subnet = {'network_id': net['network']['id'],
+                      'cidr': '10.0.0.0/24',
+                      'ip_version': 4,
+                      'tenant_id': self._tenant_id}
+            res = self._create_bulk_from_list(
+                self.fmt, 'subnet', [{'subnet': subnet}, {'subnet': subnet}])
+            self._validate_behavior_on_bulk_failure(
+                res, 'subnets', webob.exc.HTTPBadRequest.code)
 
 
 class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
@@ -133,6 +288,27 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
             self.assertEqual('DOWN', port['port']['status'])
             self.assertEqual('DOWN', self.port_create_status)
 
+    def test_update_port_statuses(self):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        with self.subnet() as subnet:
+            with contextlib.nested(
+                self.port(subnet=subnet),
+                self.port(subnet=subnet),
+                mock.patch.object(plugin.mechanism_manager,
+                                  'update_port_postcommit')
+            ) as (port1, port2, postcommit):
+                port_ids = [port1['port']['id'], port2['port']['id']]
+                res = plugin.update_port_statuses(
+                    ctx, port_ids + ['invalid-uuid'],
+                    constants.PORT_STATUS_ACTIVE)
+                self.assertEqual(port_ids, res)
+                self.assertEqual(2, postcommit.call_count)
+                for port_id in port_ids:
+                    port = plugin.get_port(ctx, port_id)
+                    self.assertEqual(constants.PORT_STATUS_ACTIVE,
+                                     port['status'])
+
     def test_update_non_existent_port(self):
         ctx = context.get_admin_context()
         plugin = manager.NeutronManager.get_plugin()
@@ -191,6 +367,17 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
                 mock.call(ctx, disassociate_floatingips.return_value)
             ])
 
+    def test_delete_port_notifies_agents(self):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        with contextlib.nested(
+            self.port(do_delete=False),
+            mock.patch.object(plugin.notifier, 'port_delete')
+        ) as (port, port_delete):
+            port_id = port['port']['id']
+            plugin.delete_port(ctx, port_id)
+            port_delete.assert_called_once_with(ctx, port_id)
+
     def test_check_if_compute_port_serviced_by_dvr(self):
         self.assertTrue(utils.is_dvr_serviced('compute:None'))
 
@@ -581,6 +768,63 @@ class TestMultiSegmentNetworks(Ml2PluginV2TestCase):
         self.assertEqual(1, network['network'][pnet.SEGMENTATION_ID])
         self.assertNotIn(mpnet.SEGMENTS, network['network'])
 
+    def test_list_networks_filtered_by_provider(self):
+        for physnet, segmentation_id in (('physnet1', 1), ('physnet2', 200)):
+            data = {'network': {'name': 'net1',
+                                pnet.NETWORK_TYPE: 'vlan',
+                                pnet.PHYSICAL_NETWORK: physnet,
+                                pnet.SEGMENTATION_ID: segmentation_id,
+                                'tenant_id': 'tenant_one'}}
+            network_req = self.new_create_request('networks', data)
+            network_req.get_response(self.api)
+
+        networks = self.driver.get_networks(
+            self.context, filters={pnet.PHYSICAL_NETWORK: ['physnet2']})
+        self.assertEqual([200], [net[pnet.SEGMENTATION_ID]
+                                 for net in networks])
+        networks = self.driver.get_networks(
+            self.context, filters={pnet.NETWORK_TYPE: ['vlan'],
+                                   pnet.SEGMENTATION_ID: [1, 200]})
+        self.assertEqual(2, len(networks))
+
+    def test_list_networks_projects_column_fields(self):
+        with contextlib.nested(self.network(), self.network()):
+            with mock.patch.object(
+                self.driver.type_manager,
+                '_extend_networks_dict_provider') as extend_provider:
+                networks = self.driver.get_networks(
+                    self.context, fields=['id', 'name'])
+        self.assertEqual(2, len(networks))
+        for network in networks:
+            self.assertEqual(set(['id', 'name']), set(network))
+        # The segments are not loaded when no provider field is requested
+        self.assertFalse(extend_provider.called)
+
+    def test_list_networks_provider_fields(self):
+        data = {'network': {'name': 'net1',
+                            pnet.NETWORK_TYPE: 'vlan',
+                            pnet.PHYSICAL_NETWORK: 'physnet1',
+                            pnet.SEGMENTATION_ID: 1,
+                            'tenant_id': 'tenant_one'}}
+        self.new_create_request('networks', data).get_response(self.api)
+        networks = self.driver.get_networks(
+            self.context, fields=['name', pnet.NETWORK_TYPE])
+        self.assertEqual([{'name': 'net1', pnet.NETWORK_TYPE: 'vlan'}],
+                         networks)
+
+    def test_list_networks_column_fields_filtered_by_provider(self):
+        for physnet, segmentation_id in (('physnet1', 1), ('physnet2', 200)):
+            data = {'network': {'name': physnet,
+                                pnet.NETWORK_TYPE: 'vlan',
+                                pnet.PHYSICAL_NETWORK: physnet,
+                                pnet.SEGMENTATION_ID: segmentation_id,
+                                'tenant_id': 'tenant_one'}}
+            self.new_create_request('networks', data).get_response(self.api)
+        networks = self.driver.get_networks(
+            self.context, filters={pnet.PHYSICAL_NETWORK: ['physnet2']},
+            fields=['name'])
+        self.assertEqual([{'name': 'physnet2'}], networks)
+
     def test_create_network_single_multiprovider(self):
         data = {'network': {'name': 'net1',
                             mpnet.SEGMENTS:
@@ -817,6 +1061,19 @@ class TestFaultyMechansimDriver(Ml2PluginV2FaultyDriverTestCase):
             nets = self._list('networks', query_params=query_params)
             self.assertFalse(nets['networks'])
 
+    def test_create_networks_bulk_faulty(self):
+
+        with mock.patch.object(mech_test.TestMechanismDriver,
+                               'create_network_postcommit',
+                               side_effect=ml2_exc.MechanismDriverError):
+            res = self._create_network_bulk(self.fmt, 2, 'test', True)
+            self.assertEqual(500, res.status_int)
+            error = self.deserialize(self.fmt, res)
+            self.assertEqual('MechanismDriverError',
+                             error['NeutronError']['type'])
+            nets = self._list('networks')
+            self.assertFalse(nets['networks'])
+
     def test_delete_network_faulty(self):
 
         with mock.patch.object(mech_test.TestMechanismDriver,
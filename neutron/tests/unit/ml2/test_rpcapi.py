@@ -162,6 +162,60 @@ class RpcCallbacksTestCase(base.BaseTestCase):
             'fake_context', 'fake_port_id', constants.PORT_STATUS_DOWN,
             'fake_host')
 
+    def test_update_devices_up(self):
+        self.plugin._device_to_port_id.side_effect = lambda d: d + '_port'
+        self.plugin.update_port_statuses.return_value = ['dev1_port',
+                                                         'dev2_port']
+        type(self.l3plugin).supported_extension_aliases = (
+            mock.PropertyMock(return_value=['router']))
+        res = self.callbacks.update_devices_up('fake_context',
+                                               devices=['dev1', 'dev2'],
+                                               host='fake_host')
+        self.assertEqual(['dev1', 'dev2'], res)
+        self.plugin.update_port_statuses.assert_called_once_with(
+            'fake_context', mock.ANY, constants.PORT_STATUS_ACTIVE,
+            'fake_host')
+        self.assertEqual(
+            set(['dev1_port', 'dev2_port']),
+            set(self.plugin.update_port_statuses.call_args[0][1]))
+
+    def test_update_devices_up_with_dvr(self):
+        self.plugin._device_to_port_id.side_effect = lambda d: d + '_port'
+        self.plugin.update_port_statuses.return_value = ['dev1_port',
+                                                         'dev2_port']
+        type(self.l3plugin).supported_extension_aliases = (
+            mock.PropertyMock(return_value=['router', 'dvr']))
+        self.callbacks.update_devices_up('fake_context',
+                                         devices=['dev1', 'dev2'])
+        self.assertEqual(2, self.l3plugin.dvr_vmarp_table_update.call_count)
+
+    def test_update_devices_up_with_devices_not_bound_to_host(self):
+        self.plugin.port_bound_to_host.return_value = False
+        res = self.callbacks.update_devices_up('fake_context',
+                                               devices=['dev1', 'dev2'],
+                                               host='fake_host')
+        self.assertEqual(['dev1', 'dev2'], res)
+        self.assertFalse(self.plugin.update_port_statuses.called)
+
+    def test_update_devices_down(self):
+        self.plugin._device_to_port_id.side_effect = lambda d: d + '_port'
+        self.plugin.port_bound_to_host.side_effect = (
+            lambda c, port_id, h: port_id != 'dev3_port')
+        # Only the port of dev1 still exists
+        self.plugin.update_port_statuses.return_value = ['dev1_port_full']
+        res = self.callbacks.update_devices_down(
+            'fake_context', devices=['dev1', 'dev2', 'dev3'],
+            host='fake_host')
+        self.assertEqual([{'device': 'dev1', 'exists': True},
+                          {'device': 'dev2', 'exists': False},
+                          {'device': 'dev3', 'exists': True}], res)
+        self.plugin.update_port_statuses.assert_called_once_with(
+            'fake_context', mock.ANY, constants.PORT_STATUS_DOWN,
+            'fake_host')
+        self.assertEqual(
+            set(['dev1_port', 'dev2_port']),
+            set(self.plugin.update_port_statuses.call_args[0][1]))
+
 
 class RpcApiTestCase(base.BaseTestCase):
 
@@ -216,6 +270,16 @@ class RpcApiTestCase(base.BaseTestCase):
                 segmentation_id='fake_segmentation_id',
                 physical_network='fake_physical_network')
 
+    def test_port_delete(self):
+        rpcapi = plugin_rpc.AgentNotifierApi(topics.AGENT)
+        self._test_rpc_api(
+                rpcapi,
+                topics.get_topic_name(topics.AGENT,
+                                      topics.PORT,
+                                      topics.DELETE),
+                'port_delete', rpc_method='cast',
+                fanout=True, port_id='fake_port_id')
+
     def test_tunnel_update(self):
         rpcapi = plugin_rpc.AgentNotifierApi(topics.AGENT)
         self._test_rpc_api(
@@ -265,3 +329,19 @@ class RpcApiTestCase(base.BaseTestCase):
                            device='fake_device',
                            agent_id='fake_agent_id',
                            host='fake_host')
+
+    def test_update_devices_down(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        self._test_rpc_api(rpcapi, None,
+                           'update_devices_down', rpc_method='call',
+                           devices=['fake_device1', 'fake_device2'],
+                           agent_id='fake_agent_id', host='fake_host',
+                           version='1.4')
+
+    def test_update_devices_up(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        self._test_rpc_api(rpcapi, None,
+                           'update_devices_up', rpc_method='call',
+                           devices=['fake_device1', 'fake_device2'],
+                           agent_id='fake_agent_id', host='fake_host',
+                           version='1.4')
@@ -190,6 +190,14 @@ class TunnelTypeTestMixin(object):
             segment[api.SEGMENTATION_ID] = tunnel_id
             self.driver.release_segment(self.session, segment)
 
+    def test_allocate_tenant_segments(self):
+        segments = self.driver.allocate_tenant_segments(
+            self.session, TUN_MAX - TUN_MIN + 2)
+        self.assertEqual(TUN_MAX - TUN_MIN + 1, len(segments))
+        self.assertEqual(set(moves.xrange(TUN_MIN, TUN_MAX + 1)),
+                         set(s[api.SEGMENTATION_ID] for s in segments))
+        self.assertIsNone(self.driver.allocate_tenant_segment(self.session))
+
 
 class TunnelTypeMultiRangeTestMixin(object):
     DRIVER_CLASS = None
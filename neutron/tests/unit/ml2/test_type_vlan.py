@@ -218,6 +218,18 @@ class VlanTypeTest(testlib_api.SqlTestCase):
         segment = self.driver.allocate_tenant_segment(self.session)
         self.assertIsNone(segment)
 
+    def test_allocate_tenant_segments(self):
+        segments = self.driver.allocate_tenant_segments(
+            self.session, VLAN_MAX - VLAN_MIN + 2)
+        self.assertEqual(VLAN_MAX - VLAN_MIN + 1, len(segments))
+        self.assertEqual(set(range(VLAN_MIN, VLAN_MAX + 1)),
+                         set(s[api.SEGMENTATION_ID] for s in segments))
+        for segment in segments:
+            alloc = self._get_allocation(self.session, segment)
+            self.assertTrue(alloc.allocated)
+            self.assertEqual(TENANT_NET, segment[api.PHYSICAL_NETWORK])
+        self.assertIsNone(self.driver.allocate_tenant_segment(self.session))
+
     def test_release_segment(self):
         segment = self.driver.allocate_tenant_segment(self.session)
         self.driver.release_segment(self.session, segment)
@@ -772,6 +772,17 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
         self.assertEqual(1, len(l3_agents['agents']))
         self.assertEqual(L3_HOSTA, l3_agents['agents'][0]['host'])
 
+    def test_get_router_ids_auto_schedules(self):
+        with self.router() as router:
+            l3_rpc_cb = l3_rpc.L3RpcCallback()
+            self._register_agent_states()
+            ids_a = l3_rpc_cb.get_router_ids(self.adminContext,
+                                             host=L3_HOSTA)
+            ids_b = l3_rpc_cb.get_router_ids(self.adminContext,
+                                             host=L3_HOSTB)
+            self.assertEqual([router['router']['id']], ids_a)
+            self.assertEqual([], ids_b)
+
     def test_router_auto_schedule_restart_l3_agent(self):
         with self.router():
             l3_rpc_cb = l3_rpc.L3RpcCallback()
@@ -371,7 +371,7 @@ class TestOvsNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                               return_value=None),
             mock.patch.object(self.agent.dvr_agent.int_br, 'delete_flows'),
             mock.patch.object(self.agent.dvr_agent.tun_br,
@@ -426,7 +426,7 @@ class TestOvsNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                               return_value=None),
             mock.patch.object(self.agent.dvr_agent.int_br,
                               'delete_flows')) as (reclaim_vlan_fn,
@@ -483,7 +483,7 @@ class TestOvsNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                               return_value=None),
             mock.patch.object(self.agent.dvr_agent.int_br,
                               'delete_flows')) as (reclaim_vlan_fn,
@@ -666,6 +666,58 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                                       updated_ports)
         self.assertEqual(expected, actual)
 
+    def _event(self, name, port_id, ofport=1):
+        return {'name': name, 'ofport': ofport,
+                'external_ids': {'iface-id': port_id,
+                                 'attached-mac': 'fa:16:3e:00:00:01'}}
+
+    def mock_process_ports_events(self, events, registered_ports,
+                                  updated_ports=None):
+        with mock.patch.object(self.agent.int_br, 'get_port_tag_dict',
+                               return_value={}):
+            return self.agent.process_ports_events(events, registered_ports,
+                                                   updated_ports)
+
+    def test_process_ports_events_returns_current_for_no_events(self):
+        events = {'added': [], 'removed': [], 'modified': []}
+        registered_ports = set([1, 3])
+        expected = {'current': registered_ports}
+        actual = self.mock_process_ports_events(events, registered_ports)
+        self.assertEqual(expected, actual)
+
+    def test_process_ports_events_returns_port_changes(self):
+        events = {'added': [self._event('tap3', 3),
+                            self._event('tap4', 4, ofport=['set', []]),
+                            {'name': 'patch-tun', 'ofport': 5,
+                             'external_ids': {}}],
+                  'removed': [self._event('tap2', 2),
+                              self._event('tap5', 5)],
+                  'modified': [self._event('tap6', 6)]}
+        registered_ports = set([1, 2])
+        expected = dict(current=set([1, 3, 6]), added=set([3, 6]),
+                        removed=set([2]))
+        actual = self.mock_process_ports_events(events, registered_ports)
+        self.assertEqual(expected, actual)
+
+    def test_process_ports_events_rewires_replugged_ports(self):
+        events = {'added': [self._event('tap1', 1)],
+                  'removed': [self._event('tap1', 1)],
+                  'modified': []}
+        registered_ports = set([1, 2])
+        updated_ports = set([2, 5])
+        expected = dict(current=set([1, 2]), updated=set([1, 2]))
+        actual = self.mock_process_ports_events(events, registered_ports,
+                                                updated_ports)
+        self.assertEqual(expected, actual)
+
+    def test_process_ports_events_removes_ports_no_longer_ready(self):
+        events = {'added': [], 'removed': [],
+                  'modified': [self._event('tap1', 1, ofport=-1)]}
+        registered_ports = set([1, 2])
+        expected = dict(current=set([2]), added=set(), removed=set([1]))
+        actual = self.mock_process_ports_events(events, registered_ports)
+        self.assertEqual(expected, actual)
+
     def test_update_ports_returns_changed_vlan(self):
         br = ovs_lib.OVSBridge('br-int', 'sudo')
         mac = "ca:fe:de:ad:be:ef"
@@ -710,8 +762,8 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                               return_value=[details]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=port),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down'),
             mock.patch.object(self.agent, func_name)
         ) as (get_dev_fn, get_vif_func, upd_dev_up, upd_dev_down, func):
             skip_devs = self.agent.treat_devices_added_or_updated([{}], False)
@@ -754,8 +806,8 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                               return_value=[dev_mock]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=None),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down'),
             mock.patch.object(self.agent, 'treat_vif_port')
         ) as (get_dev_fn, get_vif_func, upd_dev_up,
               upd_dev_down, treat_vif_port):
@@ -786,8 +838,8 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                               return_value=[fake_details_dict]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=mock.MagicMock()),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_up'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_devices_down'),
             mock.patch.object(self.agent, 'treat_vif_port')
         ) as (get_dev_fn, get_vif_func, upd_dev_up,
               upd_dev_down, treat_vif_port):
@@ -798,13 +850,13 @@ class TestOvsNeutronAgent(base.BaseTestCase):
             self.assertTrue(upd_dev_down.called)
 
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_removed([{}]))
 
     def _mock_treat_devices_removed(self, port_exists):
         details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_devices_down',
                                return_value=details):
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
                 self.assertFalse(self.agent.treat_devices_removed([{}]))
@@ -845,6 +897,60 @@ class TestOvsNeutronAgent(base.BaseTestCase):
              'removed': set(['eth0']),
              'added': set(['eth1'])})
 
+    def test_process_network_ports_pipelined(self):
+        self.agent.device_processing_chunk_size = 2
+        port_info = {'current': set(['tap0', 'tap1', 'tap2', 'tap3']),
+                     'added': set(['tap0', 'tap1', 'tap2']),
+                     'updated': set(['tap3']),
+                     'removed': set(['eth0'])}
+
+        def fake_details(context, devices, agent_id, host):
+            return [{'device': device} for device in devices]
+
+        with contextlib.nested(
+            mock.patch.object(self.agent.sg_agent, "setup_port_filters"),
+            mock.patch.object(self.agent.plugin_rpc,
+                              "get_devices_details_list",
+                              side_effect=fake_details),
+            mock.patch.object(self.agent, "treat_devices_details",
+                              side_effect=[['tap1'], []]),
+            mock.patch.object(self.agent, "treat_devices_removed",
+                              return_value=False)
+        ) as (setup_port_filters, get_details, treat_details,
+              device_removed):
+            self.assertFalse(self.agent.process_network_ports(port_info,
+                                                              False))
+            self.assertEqual(2, get_details.call_count)
+            self.assertEqual(2, setup_port_filters.call_count)
+            filtered_added = set()
+            filtered_updated = set()
+            for call in setup_port_filters.call_args_list:
+                filtered_added |= call[0][0]
+                filtered_updated |= call[0][1]
+            self.assertEqual(set(['tap0', 'tap1', 'tap2']), filtered_added)
+            self.assertEqual(set(['tap3']), filtered_updated)
+            wired = set()
+            for call in treat_details.call_args_list:
+                wired |= set(d['device'] for d in call[0][0])
+            self.assertEqual(set(['tap0', 'tap1', 'tap2', 'tap3']), wired)
+            device_removed.assert_called_once_with(port_info['removed'])
+        self.assertEqual(set(['tap0', 'tap2', 'tap3']), port_info['current'])
+
+    def test_process_network_ports_pipelined_details_failure(self):
+        self.agent.device_processing_chunk_size = 1
+        port_info = {'current': set(['tap0', 'tap1']),
+                     'added': set(['tap0', 'tap1'])}
+        with contextlib.nested(
+            mock.patch.object(self.agent.sg_agent, "setup_port_filters"),
+            mock.patch.object(self.agent.plugin_rpc,
+                              "get_devices_details_list",
+                              side_effect=Exception()),
+            mock.patch.object(self.agent, "treat_devices_details")
+        ) as (setup_port_filters, get_details, treat_details):
+            self.assertTrue(self.agent.process_network_ports(port_info,
+                                                             False))
+            self.assertFalse(treat_details.called)
+
     def test_report_state(self):
         with mock.patch.object(self.agent.state_rpc,
                                "report_state") as report_st:
@@ -268,6 +268,51 @@ class IptablesDriverTestCase(base.BaseTestCase):
 
         self.v4filter_inst.assert_has_calls(calls)
 
+    def test_add_metering_label_rule_incrementally(self):
+        routers = TEST_ROUTERS[:1]
+
+        self.metering.add_metering_label(None, routers)
+        self.v4filter_inst.reset_mock()
+
+        update = copy.deepcopy(routers)
+        update[0]['_metering_labels'] = [{
+            'id': 'c5df2fe5-c600-4a2a-b2f4-c0fb6df73c83',
+            'revision_number': 2,
+            'rule': {
+                'direction': 'egress',
+                'excluded': True,
+                'id': '6f1a261f-2489-4ed1-870c-a62754501379',
+                'metering_label_id': 'c5df2fe5-c600-4a2a-b2f4-c0fb6df73c83',
+                'remote_ip_prefix': '20.0.0.0/24'}}]
+        self.metering.add_metering_label_rule(None, update)
+
+        self.assertEqual(
+            [mock.call.add_rule('neutron-meter-r-c5df2fe5-c60',
+                                '-o qg-6d411f48-ec -s 20.0.0.0/24'
+                                ' -j RETURN',
+                                wrap=False, top=True)],
+            self.v4filter_inst.mock_calls)
+
+    def test_remove_metering_label_rule_incrementally(self):
+        routers = TEST_ROUTERS[:1]
+
+        self.metering.add_metering_label(None, routers)
+        self.v4filter_inst.reset_mock()
+
+        update = copy.deepcopy(routers)
+        label = update[0]['_metering_labels'][0]
+        update[0]['_metering_labels'] = [{'id': label['id'],
+                                          'revision_number': 2,
+                                          'rule': label['rules'][0]}]
+        self.metering.remove_metering_label_rule(None, update)
+
+        self.assertEqual(
+            [mock.call.remove_rule('neutron-meter-r-c5df2fe5-c60',
+                                   '-i qg-6d411f48-ec -d 10.0.0.0/24'
+                                   ' -j neutron-meter-l-c5df2fe5-c60',
+                                   wrap=False, top=False)],
+            self.v4filter_inst.mock_calls)
+
     def test_remove_metering_label(self):
         routers = TEST_ROUTERS[:1]
 
@@ -371,3 +416,42 @@ class IptablesDriverTestCase(base.BaseTestCase):
                                         wrap=False)]
 
         self.v4filter_inst.assert_has_calls(calls)
+
+    def test_get_traffic_counters(self):
+        routers = TEST_ROUTERS[:1]
+        label_id = routers[0]['_metering_labels'][0]['id']
+        chain = 'neutron-meter-l-c5df2fe5-c60'
+        self.metering.add_metering_label(None, routers)
+        get_counters = self.iptables_inst.get_traffic_counters_of_chains
+
+        def read(pkts, bytes):
+            get_counters.return_value = {chain: {'pkts': pkts,
+                                                 'bytes': bytes}}
+            return self.metering.get_traffic_counters(None, routers)
+
+        # The traffic counted since the last read is reported
+        self.assertEqual({label_id: {'pkts': 10, 'bytes': 100}},
+                         read(10, 100))
+        self.assertEqual({label_id: {'pkts': 5, 'bytes': 50}},
+                         read(15, 150))
+        self.assertEqual({label_id: {'pkts': 0, 'bytes': 0}},
+                         read(15, 150))
+        # The chain was created again
+        self.assertEqual({label_id: {'pkts': 3, 'bytes': 30}},
+                         read(3, 30))
+        get_counters.assert_called_with({chain: label_id}, wrap=False)
+
+    def test_get_traffic_counters_after_label_removal(self):
+        routers = TEST_ROUTERS[:1]
+        label_id = routers[0]['_metering_labels'][0]['id']
+        chain = 'neutron-meter-l-c5df2fe5-c60'
+        self.metering.add_metering_label(None, routers)
+        get_counters = self.iptables_inst.get_traffic_counters_of_chains
+        get_counters.return_value = {chain: {'pkts': 10, 'bytes': 100}}
+        self.metering.get_traffic_counters(None, routers)
+
+        self.metering.remove_metering_label(None, routers)
+        self.metering.add_metering_label(None, routers)
+        get_counters.return_value = {chain: {'pkts': 20, 'bytes': 200}}
+        self.assertEqual({label_id: {'pkts': 20, 'bytes': 200}},
+                         self.metering.get_traffic_counters(None, routers))
@@ -12,6 +12,10 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import contextlib
+import copy
+import time
+
 import mock
 from oslo.config import cfg
 
@@ -68,6 +72,17 @@ class TestMeteringOperations(base.BaseTestCase,
         self.agent = metering_agent.MeteringAgent('my agent', cfg.CONF)
         self.driver = self.agent.metering_driver
 
+    def test_metering_loop_warns_when_slow(self):
+        cfg.CONF.set_override('measure_interval', 5)
+        with contextlib.nested(
+            mock.patch('time.time', side_effect=[100, 106, 106]),
+            mock.patch.object(metering_agent, 'LOG'),
+            mock.patch.object(self.agent, '_add_metering_infos')
+        ) as (time, log, add_metering_infos):
+            self.agent.last_report = 106
+            self.agent._metering_loop()
+            self.assertEqual(1, log.warn.call_count)
+
     def test_add_metering_label(self):
         self.agent.add_metering_label(None, ROUTERS)
         self.assertEqual(self.driver.add_metering_label.call_count, 1)
@@ -80,6 +95,114 @@ class TestMeteringOperations(base.BaseTestCase,
         self.agent.update_metering_label_rules(None, ROUTERS)
         self.assertEqual(self.driver.update_metering_label_rules.call_count, 1)
 
+    def _label_rule_update(self, revision_number):
+        router = copy.deepcopy(ROUTERS[0])
+        rule = {'remote_ip_prefix': '10.0.0.0/24',
+                'direction': 'ingress',
+                'metering_label_id': LABEL_ID,
+                'excluded': False,
+                'id': _uuid()}
+        router['_metering_labels'] = [{'id': LABEL_ID,
+                                       'revision_number': revision_number,
+                                       'rule': rule}]
+        return router, rule
+
+    def test_add_metering_label_rule(self):
+        self.agent.routers_updated(None, copy.deepcopy(ROUTERS))
+        router, rule = self._label_rule_update(1)
+
+        self.agent.add_metering_label_rule(None, [router])
+
+        self.driver.add_metering_label_rule.assert_called_once_with(
+            None, [router])
+        label = self.agent.routers[router['id']]['_metering_labels'][0]
+        self.assertEqual([rule], label['rules'])
+        self.assertEqual(1, label['revision_number'])
+        self.assertFalse(self.agent.resync_router_ids)
+
+    def test_remove_metering_label_rule(self):
+        self.agent.routers_updated(None, copy.deepcopy(ROUTERS))
+        router, rule = self._label_rule_update(1)
+        self.agent.add_metering_label_rule(None, [router])
+        router['_metering_labels'][0]['revision_number'] = 2
+
+        self.agent.remove_metering_label_rule(None, [router])
+
+        self.assertEqual(1, self.driver.remove_metering_label_rule.call_count)
+        label = self.agent.routers[router['id']]['_metering_labels'][0]
+        self.assertEqual([], label['rules'])
+        self.assertEqual(2, label['revision_number'])
+
+    def test_metering_label_rule_already_applied(self):
+        self.agent.routers_updated(None, copy.deepcopy(ROUTERS))
+        router, rule = self._label_rule_update(0)
+
+        self.agent.add_metering_label_rule(None, [router])
+
+        self.assertFalse(self.driver.add_metering_label_rule.called)
+        self.assertFalse(self.agent.resync_router_ids)
+
+    def test_missed_metering_label_rule_resyncs_router(self):
+        self.agent.routers_updated(None, copy.deepcopy(ROUTERS))
+        self.agent.fullsync = False
+        self.agent.last_full_sync = time.time()
+        router, rule = self._label_rule_update(2)
+
+        self.agent.add_metering_label_rule(None, [router])
+
+        self.assertFalse(self.driver.add_metering_label_rule.called)
+        self.assertEqual(set([router['id']]), self.agent.resync_router_ids)
+
+        synced = copy.deepcopy(ROUTERS)
+        synced[0]['_metering_labels'][0].update(revision_number=2,
+                                                rules=[rule])
+        with mock.patch.object(self.agent, '_get_sync_data_metering',
+                               return_value=synced) as sync:
+            self.agent._sync_routers_task(None)
+        sync.assert_called_once_with(self.agent.context, [router['id']])
+        self.assertEqual(1, self.driver.remove_metering_label.call_count)
+        self.driver.add_metering_label.assert_called_once_with(None, synced)
+        self.assertEqual(synced[0], self.agent.routers[router['id']])
+        self.assertFalse(self.agent.resync_router_ids)
+
+    def test_sync_routers_task_only_full_syncs_once(self):
+        with mock.patch.object(self.agent, '_get_sync_data_metering',
+                               return_value=copy.deepcopy(ROUTERS)) as sync:
+            self.agent._sync_routers_task(None)
+            self.agent._sync_routers_task(None)
+        sync.assert_called_once_with(self.agent.context)
+        self.assertEqual(1, self.driver.update_routers.call_count)
+
+    def test_sync_routers_task_meters_new_router(self):
+        cfg.CONF.set_override('full_sync_interval', 300)
+        routers = copy.deepcopy(ROUTERS)
+        with contextlib.nested(
+            mock.patch('time.time', return_value=1000),
+            mock.patch.object(self.agent, '_get_sync_data_metering',
+                              return_value=routers)
+        ) as (now, sync):
+            self.agent._sync_routers_task(None)
+
+            new_router = copy.deepcopy(ROUTERS[0])
+            new_router['id'] = _uuid()
+            routers = routers + [new_router]
+            sync.return_value = routers
+            now.return_value = 1200
+            self.agent._sync_routers_task(None)
+            self.assertNotIn(new_router['id'], self.agent.routers)
+
+            now.return_value = 1300
+            self.agent._sync_routers_task(None)
+
+        self.assertEqual([mock.call(self.agent.context)] * 2,
+                         sync.call_args_list)
+        self.driver.update_routers.assert_called_with(None, routers)
+        self.assertEqual(new_router, self.agent.routers[new_router['id']])
+
+        self.agent._add_metering_infos()
+        self.assertIn(new_router,
+                      self.driver.get_traffic_counters.call_args[0][1])
+
     def test_routers_updated(self):
         self.agent.routers_updated(None, ROUTERS)
         self.assertEqual(self.driver.update_routers.call_count, 1)
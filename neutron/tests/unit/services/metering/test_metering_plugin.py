@@ -12,6 +12,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import contextlib
+
 import mock
 from oslo.utils import timeutils
 
@@ -101,11 +103,17 @@ class TestMeteringPlugin(test_db_plugin.NeutronDbPluginV2TestCase,
         self.remove_patch = mock.patch(remove)
         self.mock_remove = self.remove_patch.start()
 
-        update = ('neutron.api.rpc.agentnotifiers.' +
-                  'metering_rpc_agent_api.MeteringAgentNotifyAPI' +
-                  '.update_metering_label_rules')
-        self.update_patch = mock.patch(update)
-        self.mock_update = self.update_patch.start()
+        add_rule = ('neutron.api.rpc.agentnotifiers.' +
+                    'metering_rpc_agent_api.MeteringAgentNotifyAPI' +
+                    '.add_metering_label_rule')
+        self.add_rule_patch = mock.patch(add_rule)
+        self.mock_add_rule = self.add_rule_patch.start()
+
+        remove_rule = ('neutron.api.rpc.agentnotifiers.' +
+                       'metering_rpc_agent_api.MeteringAgentNotifyAPI' +
+                       '.remove_metering_label_rule')
+        self.remove_rule_patch = mock.patch(remove_rule)
+        self.mock_remove_rule = self.remove_rule_patch.start()
 
     def test_add_metering_label_rpc_call(self):
         second_uuid = 'e27fe2df-376e-4ac7-ae13-92f050a21f84'
@@ -116,6 +124,7 @@ class TestMeteringPlugin(test_db_plugin.NeutronDbPluginV2TestCase,
                      'tenant_id': self.tenant_id,
                      '_metering_labels': [
                          {'rules': [],
+                          'revision_number': 0,
                           'id': self.uuid}],
                      'id': self.uuid}]
 
@@ -139,8 +148,7 @@ class TestMeteringPlugin(test_db_plugin.NeutronDbPluginV2TestCase,
                      'tenant_id': self.tenant_id,
                      '_metering_labels': [
                          {'rules': [],
-                          'id': self.uuid},
-                         {'rules': [],
+                          'revision_number': 0,
                           'id': second_uuid}],
                      'id': self.uuid}]
 
@@ -162,6 +170,7 @@ class TestMeteringPlugin(test_db_plugin.NeutronDbPluginV2TestCase,
                      'tenant_id': self.tenant_id,
                      '_metering_labels': [
                          {'rules': [],
+                          'revision_number': 0,
                           'id': self.uuid}],
                      'id': self.uuid}]
 
@@ -180,8 +189,7 @@ class TestMeteringPlugin(test_db_plugin.NeutronDbPluginV2TestCase,
                          'tenant_id': self.tenant_id,
                          '_metering_labels': [
                              {'rules': [],
-                              'id': self.uuid},
-                             {'rules': [],
+                              'revision_number': 0,
                               'id': second_uuid}],
                          'id': self.uuid}]
         expected_remove = [{'status': 'ACTIVE',
@@ -191,6 +199,7 @@ class TestMeteringPlugin(test_db_plugin.NeutronDbPluginV2TestCase,
                             'tenant_id': self.tenant_id,
                             '_metering_labels': [
                                 {'rules': [],
+                                 'revision_number': 0,
                                  'id': second_uuid}],
                             'id': self.uuid}]
 
@@ -205,24 +214,20 @@ class TestMeteringPlugin(test_db_plugin.NeutronDbPluginV2TestCase,
 
     def test_update_metering_label_rules_rpc_call(self):
         second_uuid = 'e27fe2df-376e-4ac7-ae13-92f050a21f84'
+        rule = {'remote_ip_prefix': '10.0.0.0/24',
+                'direction': 'egress',
+                'metering_label_id': self.uuid,
+                'excluded': False,
+                'id': second_uuid}
         expected_add = [{'status': 'ACTIVE',
                          'name': 'router1',
                          'gw_port_id': None,
                          'admin_state_up': True,
                          'tenant_id': self.tenant_id,
                          '_metering_labels': [
-                             {'rules': [
-                                 {'remote_ip_prefix': '10.0.0.0/24',
-                                  'direction': 'ingress',
-                                  'metering_label_id': self.uuid,
-                                  'excluded': False,
-                                  'id': self.uuid},
-                                 {'remote_ip_prefix': '10.0.0.0/24',
-                                  'direction': 'egress',
-                                  'metering_label_id': self.uuid,
-                                  'excluded': False,
-                                  'id': second_uuid}],
-                             'id': self.uuid}],
+                             {'rule': rule,
+                              'revision_number': 2,
+                              'id': self.uuid}],
                          'id': self.uuid}]
 
         expected_del = [{'status': 'ACTIVE',
@@ -231,13 +236,9 @@ class TestMeteringPlugin(test_db_plugin.NeutronDbPluginV2TestCase,
                          'admin_state_up': True,
                          'tenant_id': self.tenant_id,
                          '_metering_labels': [
-                             {'rules': [
-                                 {'remote_ip_prefix': '10.0.0.0/24',
-                                  'direction': 'ingress',
-                                  'metering_label_id': self.uuid,
-                                  'excluded': False,
-                                  'id': self.uuid}],
-                             'id': self.uuid}],
+                             {'rule': rule,
+                              'revision_number': 3,
+                              'id': self.uuid}],
                          'id': self.uuid}]
 
         with self.router(tenant_id=self.tenant_id, set_context=True):
@@ -247,10 +248,10 @@ class TestMeteringPlugin(test_db_plugin.NeutronDbPluginV2TestCase,
                 with self.metering_label_rule(l['id']):
                     self.mock_uuid.return_value = second_uuid
                     with self.metering_label_rule(l['id'], direction='egress'):
-                        self.mock_update.assert_called_with(self.ctx,
-                                                            expected_add)
-                    self.mock_update.assert_called_with(self.ctx,
-                                                        expected_del)
+                        self.mock_add_rule.assert_called_with(self.ctx,
+                                                              expected_add)
+                    self.mock_remove_rule.assert_called_with(self.ctx,
+                                                             expected_del)
 
     def test_delete_metering_label_does_not_clear_router_tenant_id(self):
         tenant_id = '654f6b9d-0f36-4ae5-bd1b-01616794ca60'
@@ -332,6 +333,7 @@ class TestMeteringPluginL3AgentScheduler(
                      'tenant_id': self.tenant_id,
                      '_metering_labels': [
                          {'rules': [],
+                          'revision_number': 0,
                           'id': second_uuid}],
                      'id': self.uuid},
                     {'status': 'ACTIVE',
@@ -341,6 +343,7 @@ class TestMeteringPluginL3AgentScheduler(
                      'tenant_id': self.tenant_id,
                      '_metering_labels': [
                          {'rules': [],
+                          'revision_number': 0,
                           'id': second_uuid}],
                      'id': second_uuid}]
 
@@ -456,6 +459,34 @@ class TestMeteringPluginRpcFromL3Agent(
                 self._remove_external_gateway_from_router(
                     r['id'], s['network_id'])
 
+    def test_get_sync_data_metering_router_ids(self):
+        with self.subnet() as subnet:
+            s = subnet['subnet']
+            self._set_net_external(s['network_id'])
+            with contextlib.nested(
+                self.router(name='router1', subnet=subnet),
+                self.router(name='router2', subnet=subnet)
+            ) as (router1, router2):
+                r1 = router1['router']
+                r2 = router2['router']
+                self._add_external_gateway_to_router(r1['id'],
+                                                     s['network_id'])
+                self._add_external_gateway_to_router(r2['id'],
+                                                     s['network_id'])
+                with self.metering_label(tenant_id=r1['tenant_id']):
+                    callbacks = metering_rpc.MeteringRpcCallbacks(
+                        self.meter_plugin)
+                    data = callbacks.get_sync_data_metering(
+                        self.adminContext, host='agent1',
+                        router_ids=[r2['id']])
+                    self.assertEqual(['router2'],
+                                     [router['name'] for router in data])
+
+                self._remove_external_gateway_from_router(
+                    r1['id'], s['network_id'])
+                self._remove_external_gateway_from_router(
+                    r2['id'], s['network_id'])
+
     def test_get_sync_data_metering_shared(self):
         with self.router(name='router1', tenant_id=self.tenant_id_1):
             with self.router(name='router2', tenant_id=self.tenant_id_2):
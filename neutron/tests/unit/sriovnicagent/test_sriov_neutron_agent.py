@@ -53,9 +53,9 @@ class TestSriovAgent(base.BaseTestCase):
         agent = sriov_nic_agent.SriovNicSwitchAgent({}, {}, 0, None)
         devices = [DEVICE_MAC]
         with mock.patch.object(agent.plugin_rpc,
-                               "update_device_down") as fn_udd:
-            fn_udd.return_value = {'device': DEVICE_MAC,
-                                   'exists': True}
+                               "update_devices_down") as fn_udd:
+            fn_udd.return_value = [{'device': DEVICE_MAC,
+                                    'exists': True}]
             with mock.patch.object(sriov_nic_agent.LOG,
                                    'info') as log:
                 resync = agent.treat_devices_removed(devices)
@@ -67,9 +67,9 @@ class TestSriovAgent(base.BaseTestCase):
         agent = sriov_nic_agent.SriovNicSwitchAgent({}, {}, 0, None)
         devices = [DEVICE_MAC]
         with mock.patch.object(agent.plugin_rpc,
-                               "update_device_down") as fn_udd:
-            fn_udd.return_value = {'device': DEVICE_MAC,
-                                   'exists': False}
+                               "update_devices_down") as fn_udd:
+            fn_udd.return_value = [{'device': DEVICE_MAC,
+                                    'exists': False}]
             with mock.patch.object(sriov_nic_agent.LOG,
                                    'debug') as log:
                 resync = agent.treat_devices_removed(devices)
@@ -81,7 +81,7 @@ class TestSriovAgent(base.BaseTestCase):
         agent = sriov_nic_agent.SriovNicSwitchAgent({}, {}, 0, None)
         devices = [DEVICE_MAC]
         with mock.patch.object(agent.plugin_rpc,
-                               "update_device_down") as fn_udd:
+                               "update_devices_down") as fn_udd:
             fn_udd.side_effect = Exception()
             with mock.patch.object(sriov_nic_agent.LOG,
                                    'debug') as log:
@@ -193,7 +193,7 @@ class TestSriovAgent(base.BaseTestCase):
                                         'aa:bb:cc:dd:ee:ff',
                                         '1:2:3.0',
                                         True)
-        self.assertTrue(agent.plugin_rpc.update_device_up.called)
+        self.assertTrue(agent.plugin_rpc.update_devices_up.called)
 
     def test_treat_devices_added_updated_admin_state_up_false(self):
         agent = self.agent
@@ -212,4 +212,4 @@ class TestSriovAgent(base.BaseTestCase):
                             set(['aa:bb:cc:dd:ee:ff']))
 
         self.assertFalse(resync_needed)
-        self.assertFalse(agent.plugin_rpc.update_device_up.called)
+        self.assertFalse(agent.plugin_rpc.update_devices_up.called)
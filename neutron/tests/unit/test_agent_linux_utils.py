@@ -12,10 +12,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
 import fixtures
 import mock
+from oslo.config import cfg
 import testtools
 
+from neutron.agent.common import config
 from neutron.agent.linux import utils
 from neutron.tests import base
 
@@ -110,6 +114,15 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
                 utils.execute(['ls'])
                 self.assertTrue(log.debug.called)
 
+    def test_return_code_returned(self):
+        with mock.patch.object(utils, 'create_process') as create_process:
+            create_process.return_value = FakeCreateProcess(2), 'ls'
+            self.assertEqual(('', 2), utils.execute(
+                ['ls'], check_exit_code=False, return_code=True))
+            self.assertEqual(('', '', 2), utils.execute(
+                ['ls'], extra_ok_codes=[2], return_stderr=True,
+                return_code=True))
+
     def test_return_code_raise_runtime_do_not_log_fail_as_error(self):
         with mock.patch.object(utils, 'create_process') as create_process:
             create_process.return_value = FakeCreateProcess(1), 'ls'
@@ -119,6 +132,97 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
                 self.assertTrue(log.debug.called)
 
 
+class AgentUtilsExecuteRootwrapDaemonTest(base.BaseTestCase):
+    def setUp(self):
+        super(AgentUtilsExecuteRootwrapDaemonTest, self).setUp()
+        config.register_root_helper(cfg.CONF)
+        cfg.CONF.set_override('root_helper_daemon', 'sudo rootwrap-daemon',
+                              'AGENT')
+        self.client_cls = mock.patch.object(utils, 'rootwrap_client').start()
+        self.client = self.client_cls.Client.return_value
+        mock.patch.multiple(
+            utils.RootwrapDaemonHelper, _client=None, _daemon_cmd=None,
+            _retry_time=0,
+            _retry_interval=utils.DAEMON_RETRY_MIN_INTERVAL,
+            _missing_client_logged=False).start()
+        self.create_process = mock.patch.object(utils,
+                                                'create_process').start()
+        self.create_process.return_value = FakeCreateProcess(0), 'ls'
+
+    def test_execute_through_daemon(self):
+        self.client.execute.return_value = (0, 'out', '')
+        self.assertEqual('out', utils.execute(['ls', 1], root_helper='sudo',
+                                              process_input='in'))
+        self.assertEqual('out', utils.execute(['ls'], root_helper='sudo'))
+        self.client_cls.Client.assert_called_once_with(
+            ['sudo', 'rootwrap-daemon'])
+        self.client.execute.assert_has_calls([mock.call(['ls', '1'], 'in'),
+                                              mock.call(['ls'], None)])
+        self.assertFalse(self.create_process.called)
+
+    def test_execute_through_daemon_failed_command(self):
+        self.client.execute.return_value = (1, '', 'error')
+        self.assertRaises(RuntimeError, utils.execute, ['ls'],
+                          root_helper='sudo')
+        self.assertFalse(self.create_process.called)
+
+    def test_execute_without_root_helper_skips_daemon(self):
+        utils.execute(['ls'])
+        self.assertFalse(self.client.execute.called)
+        self.assertTrue(self.create_process.called)
+
+    def test_execute_with_addl_env_skips_daemon(self):
+        utils.execute(['ls'], root_helper='sudo', addl_env={'foo': 'bar'})
+        self.assertFalse(self.client.execute.called)
+        self.assertTrue(self.create_process.called)
+
+    def test_execute_without_daemon_configured(self):
+        cfg.CONF.set_override('root_helper_daemon', None, 'AGENT')
+        utils.execute(['ls'], root_helper='sudo')
+        self.assertFalse(self.client_cls.Client.called)
+        self.assertTrue(self.create_process.called)
+
+    def test_execute_falls_back_when_daemon_fails(self):
+        self.client.execute.side_effect = Exception()
+        with mock.patch('time.time', return_value=100):
+            utils.execute(['ls'], root_helper='sudo')
+            utils.execute(['ls'], root_helper='sudo')
+        self.assertEqual(1, self.client.execute.call_count)
+        self.assertEqual(2, self.create_process.call_count)
+
+    def test_execute_retries_daemon_with_backoff(self):
+        self.client.execute.side_effect = [Exception(), Exception(),
+                                           (0, 'out', '')]
+        with mock.patch('time.time', return_value=100):
+            utils.execute(['ls'], root_helper='sudo')
+        # The daemon is tried again once the delay has elapsed
+        with mock.patch('time.time', return_value=101):
+            utils.execute(['ls'], root_helper='sudo')
+        self.assertEqual(2, self.client.execute.call_count)
+        # The delay doubles after consecutive failures
+        with mock.patch('time.time', return_value=102):
+            utils.execute(['ls'], root_helper='sudo')
+        self.assertEqual(2, self.client.execute.call_count)
+        with mock.patch('time.time', return_value=103):
+            self.assertEqual('out', utils.execute(['ls'],
+                                                  root_helper='sudo'))
+        self.assertEqual(3, self.client.execute.call_count)
+        # A new daemon is started after each failure
+        self.assertEqual(3, self.client_cls.Client.call_count)
+        self.assertEqual(utils.DAEMON_RETRY_MIN_INTERVAL,
+                         utils.RootwrapDaemonHelper._retry_interval)
+
+    def test_execute_warns_when_client_missing(self):
+        with contextlib.nested(
+            mock.patch.object(utils, 'rootwrap_client', None),
+            mock.patch.object(utils.LOG, 'warning')
+        ) as (client, warning):
+            utils.execute(['ls'], root_helper='sudo')
+            utils.execute(['ls'], root_helper='sudo')
+        self.assertEqual(1, warning.call_count)
+        self.assertEqual(2, self.create_process.call_count)
+
+
 class AgentUtilsGetInterfaceMAC(base.BaseTestCase):
     def test_get_interface_mac(self):
         expect_val = '01:02:03:04:05:06'
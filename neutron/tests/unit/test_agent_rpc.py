@@ -70,6 +70,46 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_update_device_down(self):
         self._test_rpc_call('update_device_down')
 
+    def test_update_devices_down_unsupported(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = oslo_context.RequestContext('fake_user', 'fake_project')
+        expect_val_update_device_down = {'device': 'fake_device',
+                                         'exists': True}
+        with contextlib.nested(
+            mock.patch.object(agent.client, 'call'),
+            mock.patch.object(agent.client, 'prepare'),
+        ) as (
+            mock_call, mock_prepare
+        ):
+            mock_prepare.return_value = agent.client
+            mock_call.side_effect = [messaging.UnsupportedVersion('1.4'),
+                                     expect_val_update_device_down]
+            actual_val = agent.update_devices_down(ctxt, ['fake_device'],
+                                                   'fake_agent_id')
+        self.assertEqual([expect_val_update_device_down], actual_val)
+        mock_call.assert_called_with(ctxt, 'update_device_down',
+                                     device='fake_device',
+                                     agent_id='fake_agent_id', host=None)
+
+    def test_update_devices_up_unsupported(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = oslo_context.RequestContext('fake_user', 'fake_project')
+        with contextlib.nested(
+            mock.patch.object(agent.client, 'call'),
+            mock.patch.object(agent.client, 'prepare'),
+        ) as (
+            mock_call, mock_prepare
+        ):
+            mock_prepare.return_value = agent.client
+            mock_call.side_effect = [messaging.UnsupportedVersion('1.4'),
+                                     None]
+            actual_val = agent.update_devices_up(ctxt, ['fake_device'],
+                                                 'fake_agent_id')
+        self.assertEqual(['fake_device'], actual_val)
+        mock_call.assert_called_with(ctxt, 'update_device_up',
+                                     device='fake_device',
+                                     agent_id='fake_agent_id', host=None)
+
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
@@ -20,6 +20,7 @@ import itertools
 import mock
 from oslo.config import cfg
 from oslo.utils import importutils
+from sqlalchemy import event
 from testtools import matchers
 import webob.exc
 
@@ -34,8 +35,10 @@ from neutron.common import ipv6_utils
 from neutron.common import test_lib
 from neutron.common import utils
 from neutron import context
+from neutron.db import api as db_api
 from neutron.db import db_base_plugin_v2
 from neutron.db import models_v2
+from neutron.db import revision_db
 from neutron import manager
 from neutron.tests import base
 from neutron.tests.unit import test_extensions
@@ -763,6 +766,117 @@ class TestV2HTTPResponse(NeutronDbPluginV2TestCase):
         res = req.get_response(self.api)
         self.assertEqual(res.status_int, webob.exc.HTTPNotFound.code)
 
+    def _get_with_etag(self, req, etag=None,
+                       expected_code=webob.exc.HTTPOk.code):
+        if etag:
+            req.if_none_match = etag
+        res = req.get_response(self.api)
+        self.assertEqual(expected_code, res.status_int)
+        self.assertTrue(res.etag)
+        return res
+
+    def test_list_not_modified(self):
+        self._create_network(self.fmt, 'net1', True)
+        res = self._get_with_etag(self.new_list_request('networks'))
+        res2 = self._get_with_etag(self.new_list_request('networks'),
+                                   res.etag,
+                                   webob.exc.HTTPNotModified.code)
+        self.assertEqual(res.etag, res2.etag)
+        self.assertEqual('', res2.body)
+
+    def test_list_modified_after_update(self):
+        net = self.deserialize(self.fmt,
+                               self._create_network(self.fmt, 'net1', True))
+        res = self._get_with_etag(self.new_list_request('networks'))
+        self._update('networks', net['network']['id'],
+                     {'network': {'name': 'net2'}})
+        res2 = self._get_with_etag(self.new_list_request('networks'),
+                                   res.etag)
+        self.assertNotEqual(res.etag, res2.etag)
+        self.assertEqual('net2',
+                         self.deserialize(self.fmt, res2)['networks'][0]
+                         ['name'])
+
+    def test_list_etag_depends_on_request_and_context(self):
+        res = self._get_with_etag(self.new_list_request('networks'))
+        req = self.new_list_request('networks', params='fields=name')
+        self._get_with_etag(req, res.etag)
+        req = self.new_list_request('networks')
+        req.environ['neutron.context'] = context.Context('', 'tenant')
+        self._get_with_etag(req, res.etag)
+
+    def test_show_not_modified(self):
+        net = self.deserialize(self.fmt,
+                               self._create_network(self.fmt, 'net1', True))
+        req = self.new_show_request('networks', net['network']['id'])
+        res = self._get_with_etag(req)
+        req = self.new_show_request('networks', net['network']['id'])
+        self._get_with_etag(req, res.etag, webob.exc.HTTPNotModified.code)
+
+    def test_ports_etag_follows_port_changes(self):
+        with self.port() as port:
+            res = self._get_with_etag(self.new_list_request('ports'))
+            self._update('networks', port['port']['network_id'],
+                         {'network': {'name': 'net2'}})
+            res = self._get_with_etag(self.new_list_request('ports'),
+                                      res.etag,
+                                      webob.exc.HTTPNotModified.code)
+            # Deleting the IP allocations is a bulk delete on another table
+            ctx = context.get_admin_context()
+            with ctx.session.begin():
+                ctx.session.query(models_v2.IPAllocation).filter_by(
+                    port_id=port['port']['id']).delete()
+            res = self._get_with_etag(self.new_list_request('ports'),
+                                      res.etag)
+            self.assertEqual([], self.deserialize(self.fmt, res)
+                             ['ports'][0]['fixed_ips'])
+
+    def test_networks_etag_ignores_port_changes(self):
+        with self.port() as port:
+            res = self._get_with_etag(self.new_list_request('networks'))
+            self._update('ports', port['port']['id'],
+                         {'port': {'name': 'port2'}})
+            res = self._get_with_etag(self.new_list_request('networks'),
+                                      res.etag,
+                                      webob.exc.HTTPNotModified.code)
+            # Networks list their subnets
+            self._create_subnet(self.fmt, port['port']['network_id'],
+                                '10.0.1.0/24')
+            self._get_with_etag(self.new_list_request('networks'), res.etag)
+
+    def test_revision_counted_per_resource(self):
+        with contextlib.nested(self.network(), self.network()) as nets:
+            ctx = context.get_admin_context()
+            before = revision_db.get_revisions(ctx, 'networks')
+            shards = set()
+            for net in nets:
+                network_id = net['network']['id']
+                shards.add(revision_db._get_shard(network_id))
+                self._update('networks', network_id,
+                             {'network': {'name': 'net2'}})
+            self.assertEqual([before[0] + 2],
+                             revision_db.get_revisions(ctx, 'networks'))
+            counters = ctx.session.query(revision_db.ResourceRevision).filter(
+                revision_db.ResourceRevision.collection == 'networks')
+            # Only the counters of the updated networks were incremented
+            self.assertEqual(shards,
+                             set(c.shard for c in counters if c.revision))
+
+    def test_write_fails_with_revision_bump(self):
+        res = self._get_with_etag(self.new_list_request('networks'))
+        with mock.patch.object(revision_db, '_bump_revision',
+                               side_effect=RuntimeError):
+            res2 = self._create_network(self.fmt, 'net1', True)
+        self.assertEqual(webob.exc.HTTPInternalServerError.code,
+                         res2.status_int)
+        # The change is rolled back with its revision, the ETag stays valid
+        res = self._get_with_etag(self.new_list_request('networks'),
+                                  res.etag, webob.exc.HTTPNotModified.code)
+        self._create_network(self.fmt, 'net1', True)
+        res = self._get_with_etag(self.new_list_request('networks'),
+                                  res.etag)
+        self.assertEqual(1, len(self.deserialize(self.fmt, res)['networks']))
+
 
 class TestPortsV2(NeutronDbPluginV2TestCase):
     def test_create_port_json(self):
@@ -1781,9 +1895,13 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
                     self.assertRaises(n_exc.NeutronException,
                                       plugin.delete_ports_by_device_id,
                                       ctx, 'owner1', network_id)
-                self._show('ports', p1['port']['id'],
+                # The ports are not deleted in any particular order
+                deleted = del_port.call_args_list[0][0][1]
+                remaining = (set([p1['port']['id'], p2['port']['id']]) -
+                             set([deleted])).pop()
+                self._show('ports', deleted,
                            expected_code=webob.exc.HTTPNotFound.code)
-                self._show('ports', p2['port']['id'],
+                self._show('ports', remaining,
                            expected_code=webob.exc.HTTPOk.code)
                 self._show('ports', p3['port']['id'],
                            expected_code=webob.exc.HTTPOk.code)
@@ -4143,3 +4261,70 @@ class NeutronDbPluginV2AsMixinTestCase(testlib_api.SqlTestCase):
         self.net_data['network']['status'] = 'BUILD'
         net = self.plugin.create_network(self.context, self.net_data)
         self.assertEqual(net['status'], 'BUILD')
+
+    def _add_ports(self, count):
+        self.plugin.create_network(self.context, self.net_data)
+        with self.context.session.begin(subtransactions=True):
+            for i in range(count):
+                self.context.session.add(models_v2.Port(
+                    id='port-%d' % i, name='', tenant_id='test-tenant',
+                    network_id='fake-id',
+                    mac_address='fa:16:3e:00:00:%02x' % i,
+                    admin_state_up=True, status='ACTIVE',
+                    device_id='device-%d' % i, device_owner='compute:nova'))
+
+    def _get_ports_statements(self, **kwargs):
+        statements = []
+
+        def _after_cursor_execute(conn, cursor, statement, *args):
+            # Connections are checked with a 'SELECT 1' when taken
+            if 'FROM ports' in statement:
+                statements.append(statement)
+
+        engine = db_api.get_engine()
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        try:
+            ports = self.plugin.get_ports(self.context, **kwargs)
+        finally:
+            event.remove(engine, 'after_cursor_execute',
+                         _after_cursor_execute)
+        return ports, statements
+
+    def test_get_ports_projects_column_fields(self):
+        self._add_ports(2)
+        ports, statements = self._get_ports_statements(
+            fields=['id', 'device_id', 'id'], sorts=[('id', True)])
+        self.assertEqual([{'id': 'port-0', 'device_id': 'device-0'},
+                          {'id': 'port-1', 'device_id': 'device-1'}], ports)
+        self.assertEqual(1, len(statements))
+        self.assertNotIn('ipallocations', statements[0])
+        self.assertNotIn('ports.mac_address', statements[0])
+
+    def test_get_ports_loads_objects_for_non_column_fields(self):
+        self._add_ports(1)
+        ports, statements = self._get_ports_statements(
+            fields=['id', 'fixed_ips'])
+        self.assertEqual([{'id': 'port-0', 'fixed_ips': []}], ports)
+        self.assertIn('ipallocations', statements[0])
+
+    def test_get_networks_projects_column_fields(self):
+        self.plugin.create_network(self.context, self.net_data)
+        nets = self.plugin.get_networks(self.context,
+                                        fields=['name', 'shared'])
+        self.assertEqual([{'name': 'net1', 'shared': False}], nets)
+
+    def _test_get_ports_page(self, sort_dir, marker, expected, bound):
+        self._add_ports(4)
+        ports, statements = self._get_ports_statements(
+            fields=['id'], limit=2, marker=marker,
+            sorts=[('device_owner', sort_dir), ('id', sort_dir)])
+        self.assertEqual(expected, [p['id'] for p in ports])
+        self.assertIn(bound, statements[-1])
+
+    def test_get_ports_page_bounds_first_sort_key(self):
+        self._test_get_ports_page(True, 'port-1', ['port-2', 'port-3'],
+                                  'ports.device_owner >=')
+
+    def test_get_ports_page_reverse_bounds_first_sort_key(self):
+        self._test_get_ports_page(False, 'port-2', ['port-1', 'port-0'],
+                                  'ports.device_owner <=')
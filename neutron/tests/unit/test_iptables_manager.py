@@ -1014,6 +1014,69 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
     def test_get_traffic_counters_with_zero_with_ipv6(self):
         self._test_get_traffic_counters_with_zero_helper(True)
 
+    def test_get_traffic_counters_of_chains(self):
+        self.iptables = iptables_manager.IptablesManager(
+            root_helper=self.root_helper, namespace='ns')
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.iptables.ipv4['filter'].add_chain('chain1', wrap=False)
+        self.iptables.ipv4['filter'].add_chain('chain2', wrap=False)
+        self.iptables.ipv4['filter'].add_chain('chain3', wrap=False)
+
+        self.execute.return_value = (
+            'Chain INPUT (policy ACCEPT 400 packets, 65901 bytes)\n'
+            '    pkts      bytes target     prot opt in     out     source'
+            '               destination         \n'
+            '     400   65901 chain1     all  --  *      *       0.0.0.0/0'
+            '            0.0.0.0/0           \n'
+            '\n'
+            'Chain chain1 (1 references)\n'
+            '    pkts      bytes target     prot opt in     out     source'
+            '               destination         \n'
+            '     100    1000            all  --  *      *       0.0.0.0/0'
+            '            10.0.0.0/24         \n'
+            '      20     200            all  --  *      *       0.0.0.0/0'
+            '            10.0.1.0/24         \n'
+            '\n'
+            'Chain chain2 (1 references)\n'
+            '    pkts      bytes target     prot opt in     out     source'
+            '               destination         \n'
+            '\n'
+            'Chain other (0 references)\n'
+            '    pkts      bytes target     prot opt in     out     source'
+            '               destination         \n'
+            '       5       50            all  --  *      *       0.0.0.0/0'
+            '            0.0.0.0/0           \n')
+
+        accs = self.iptables.get_traffic_counters_of_chains(
+            ['chain1', 'chain2', 'missing'], wrap=False)
+
+        self.assertEqual({'chain1': {'pkts': 120, 'bytes': 1200},
+                          'chain2': {'pkts': 0, 'bytes': 0}}, accs)
+        # The table is listed once and never zeroed
+        self.execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'ns', 'iptables', '-t', 'filter', '-L',
+             '-n', '-v', '-x'], root_helper=self.root_helper)
+
+    def test_get_traffic_counters_of_chains_without_namespace(self):
+        self.iptables = iptables_manager.IptablesManager(
+            root_helper=self.root_helper)
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.iptables.ipv4['filter'].add_chain('chain1', wrap=False)
+        self.execute.return_value = (
+            'Chain chain1 (1 references)\n'
+            '    pkts      bytes target     prot opt in     out     source'
+            '               destination         \n'
+            '     100    1000            all  --  *      *       0.0.0.0/0'
+            '            10.0.0.0/24         \n')
+
+        accs = self.iptables.get_traffic_counters_of_chains(['chain1'],
+                                                            wrap=False)
+
+        self.assertEqual({'chain1': {'pkts': 100, 'bytes': 1000}}, accs)
+        self.execute.assert_called_once_with(
+            ['iptables', '-t', 'filter', '-L', '-n', '-v', '-x'],
+            root_helper=self.root_helper)
+
     def _test_find_last_entry(self, find_str):
         filter_list = [':neutron-filter-top - [0:0]',
                        ':%(bn)s-FORWARD - [0:0]',
@@ -1049,3 +1112,96 @@ class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def test_nat_not_found(self):
         self.assertNotIn('nat', self.iptables.ipv4)
+
+
+class IptablesManagerIncrementalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalTestCase, self).setUp()
+        cfg.CONF.register_opts(a_cfg.IPTABLES_OPTS, 'AGENT')
+        cfg.CONF.set_override('comment_iptables_rules', False, 'AGENT')
+        self.iptables = iptables_manager.IptablesManager(
+            root_helper='sudo', namespace='ns', incremental_apply=True)
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.execute.return_value = ''
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _commands(self):
+        return [c[0][0][4:] for c in self.execute.call_args_list]
+
+    def test_first_apply_is_full(self):
+        iptables = iptables_manager.IptablesManager(incremental_apply=True)
+        with mock.patch.object(iptables, "execute",
+                               return_value='') as execute:
+            iptables.apply()
+        self.assertEqual([['iptables-save', '-c'], ['iptables-restore', '-c']],
+                         [c[0][0] for c in execute.call_args_list])
+
+    def test_apply_without_changes(self):
+        nat = self.iptables.ipv4['nat']
+        nat.add_rule('float-snat', '-s 10.0.0.1 -j SNAT --to 1.2.3.4')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        nat.clear_rules_by_tag(None)
+        nat.remove_rule('float-snat', '-s 10.0.0.1 -j SNAT --to 1.2.3.4')
+        nat.add_rule('float-snat', '-s 10.0.0.1 -j SNAT --to 1.2.3.4')
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_apply_changed_chains_only(self):
+        nat = self.iptables.ipv4['nat']
+        nat.add_rule('PREROUTING', '-d 1.2.3.4 -j DNAT --to 10.0.0.1')
+        nat.add_rule('float-snat', '-s 10.0.0.1 -j SNAT --to 1.2.3.4')
+        nat.add_rule('float-snat', '-s 10.0.0.2 -j SNAT --to 1.2.3.5',
+                     top=True)
+        self.iptables.apply()
+
+        name = iptables_manager.binary_name
+        self.execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'ns', 'iptables-restore', '-n'],
+            process_input='\n'.join([
+                '*nat',
+                ':%s-PREROUTING - [0:0]' % name,
+                ':%s-float-snat - [0:0]' % name,
+                '-A %s-PREROUTING -d 1.2.3.4 -j DNAT --to 10.0.0.1' % name,
+                '-A %s-float-snat -s 10.0.0.2 -j SNAT --to 1.2.3.5' % name,
+                '-A %s-float-snat -s 10.0.0.1 -j SNAT --to 1.2.3.4' % name,
+                'COMMIT',
+                '']),
+            root_helper='sudo')
+
+    def test_apply_new_chain_is_full(self):
+        self.iptables.ipv4['filter'].add_chain('new')
+        self.iptables.apply()
+        self.assertEqual([['iptables-save', '-c'], ['iptables-restore', '-c']],
+                         self._commands())
+
+    def test_apply_unwrapped_rule_is_full(self):
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j ACCEPT',
+                                              wrap=False)
+        self.iptables.apply()
+        self.assertEqual([['iptables-save', '-c'], ['iptables-restore', '-c']],
+                         self._commands())
+
+    def test_apply_after_failure_is_full(self):
+        nat = self.iptables.ipv4['nat']
+        nat.add_rule('float-snat', '-s 10.0.0.1 -j SNAT --to 1.2.3.4')
+        self.execute.side_effect = RuntimeError()
+        self.assertRaises(RuntimeError, self.iptables.apply)
+        self.execute.reset_mock()
+        self.execute.side_effect = None
+
+        self.iptables.apply()
+        self.assertEqual([['iptables-save', '-c'], ['iptables-restore', '-c']],
+                         self._commands())
+
+    def test_apply_without_incremental_is_full(self):
+        self.iptables.incremental_apply = False
+        self.iptables._applied_state = None
+        self.iptables.apply()
+        self.iptables.apply()
+        self.assertEqual([['iptables-save', '-c'], ['iptables-restore', '-c'],
+                          ['iptables-save', '-c'], ['iptables-restore', '-c']],
+                         self._commands())
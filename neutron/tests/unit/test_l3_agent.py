@@ -15,7 +15,9 @@
 
 import contextlib
 import copy
+import os
 
+import eventlet
 import mock
 import netaddr
 from oslo.config import cfg
@@ -27,6 +29,7 @@ from neutron.agent.l3 import agent as l3_agent
 from neutron.agent.l3 import ha
 from neutron.agent.l3 import link_local_allocator as lla
 from neutron.agent.l3 import router_info as l3router
+from neutron.agent.l3 import router_processing_queue as l3_queue
 from neutron.agent.linux import interface
 from neutron.agent.linux import ra
 from neutron.common import config as base_config
@@ -271,6 +274,7 @@ class TestBasicRouterOperations(base.BaseTestCase):
 
     def test_periodic_sync_routers_task_raise_exception(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_router_ids.return_value = ['fake_id']
         self.plugin_api.get_routers.side_effect = ValueError()
         with mock.patch.object(agent, '_cleanup_namespaces') as f:
             self.assertRaises(ValueError, agent.periodic_sync_routers_task,
@@ -285,6 +289,134 @@ class TestBasicRouterOperations(base.BaseTestCase):
             agent.periodic_sync_routers_task(agent.context)
         self.assertTrue(f.called)
 
+    def _test_periodic_sync_routers_task_chunked(self, chunk_size):
+        self.conf.set_override('sync_routers_chunk_size', chunk_size)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_ids = ['r1', 'r2', 'r3', 'r4', 'r5']
+        self.plugin_api.get_router_ids.return_value = router_ids
+        self.plugin_api.get_routers.side_effect = (
+            lambda context, ids: [{'id': id} for id in ids or router_ids])
+        agent._queue = mock.Mock()
+        agent.router_info = {'stale': mock.Mock()}
+        agent.periodic_sync_routers_task(agent.context)
+
+        self.assertFalse(agent.fullsync)
+        queued = [c[0][0] for c in agent._queue.add.call_args_list]
+        self.assertEqual(set(router_ids),
+                         set(u.id for u in queued if u.router))
+        self.assertEqual(['stale'], [u.id for u in queued
+                                     if u.action == l3_queue.DELETE_ROUTER])
+        return [c[0][1] for c in self.plugin_api.get_routers.call_args_list]
+
+    def test_periodic_sync_routers_task_chunked(self):
+        fetched = self._test_periodic_sync_routers_task_chunked(2)
+        self.assertEqual([['r1', 'r2'], ['r3', 'r4'], ['r5']], fetched)
+
+    def test_periodic_sync_routers_task_chunking_disabled(self):
+        fetched = self._test_periodic_sync_routers_task_chunked(0)
+        self.assertEqual([None], fetched)
+        self.assertFalse(self.plugin_api.get_router_ids.called)
+
+    def test_periodic_sync_routers_task_get_router_ids_unsupported(self):
+        self.plugin_api.get_router_ids.side_effect = (
+            messaging.UnsupportedVersion('1.5'))
+        fetched = self._test_periodic_sync_routers_task_chunked(2)
+        self.assertEqual([None], fetched)
+
+    def test_run_router_helper_on_startup_is_deferred(self):
+        self.conf.set_override('prioritize_forwarding_on_startup', True)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        calls = []
+        agent._run_router_helper('r1', 'radvd', calls.append, 'enable')
+        agent._run_router_helper('r1', 'radvd', calls.append, 'disable')
+        agent._run_router_helper('r2', 'radvd', calls.append, 'enable2')
+        self.assertEqual([], calls)
+
+        # Once started, calls for a helper with a deferred call stay in order
+        agent._starting = False
+        agent._run_router_helper('r1', 'radvd', calls.append, 'enable3')
+        agent._run_router_helper('r3', 'radvd', calls.append, 'enable4')
+        self.assertEqual(['enable4'], calls)
+
+        self.assertEqual(('r1', 'radvd'), agent._deferred_helper_keys.get())
+        agent._run_deferred_helper(('r1', 'radvd'))
+        self.assertEqual(['enable4', 'enable3'], calls)
+        self.assertNotIn(('r1', 'radvd'), agent._deferred_helpers)
+        agent._run_router_helper('r1', 'radvd', calls.append, 'disable2')
+        self.assertEqual(['enable4', 'enable3', 'disable2'], calls)
+
+    def test_run_deferred_helper_runs_calls_deferred_meanwhile(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._starting = True
+        self.conf.set_override('prioritize_forwarding_on_startup', True)
+        calls = []
+
+        def helper(arg):
+            calls.append(arg)
+            if arg == 'first':
+                agent._run_router_helper('r1', 'proxy', helper, 'second')
+            raise RuntimeError()
+
+        agent._run_router_helper('r1', 'proxy', helper, 'first')
+        agent._run_deferred_helper(('r1', 'proxy'))
+        self.assertEqual(['first', 'second'], calls)
+        self.assertEqual({}, agent._deferred_helpers)
+
+    def test_periodic_sync_routers_task_startup(self):
+        self.conf.set_override('prioritize_forwarding_on_startup', True)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_router_ids.return_value = ['r1', 'r2']
+        self.plugin_api.get_routers.return_value = [{'id': 'r1'},
+                                                    {'id': 'r2'}]
+        agent._queue = mock.Mock()
+        agent.periodic_sync_routers_task(agent.context)
+
+        self.assertEqual(set(['r1', 'r2']), agent._startup_routers)
+        self.assertEqual(set([agent.get_ns_name('r1'),
+                              agent.get_ns_name('r2')]),
+                         agent._precreated_namespaces)
+        self.assertTrue(agent._starting)
+
+        agent._startup_router_done('r1')
+        self.assertTrue(agent._starting)
+        agent._startup_router_done('r2')
+        self.assertFalse(agent._starting)
+
+    def test_create_router_namespace_precreated(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        ri = l3router.RouterInfo(_uuid(), self.conf.root_helper, {},
+                                 ns_name=agent.get_ns_name('r1'))
+        with mock.patch.object(agent, '_create_namespace') as create:
+            create.side_effect = [None, RuntimeError()]
+            agent._precreate_router_namespaces(['r1', 'r2'])
+            self.assertEqual(set([ri.ns_name]),
+                             agent._precreated_namespaces)
+            create.side_effect = None
+            agent._create_router_namespace(ri)
+            self.assertEqual(2, create.call_count)
+            agent._create_router_namespace(ri)
+            create.assert_called_with(ri.ns_name)
+            self.assertEqual(3, create.call_count)
+
+    def test_router_removed_discards_precreated_namespace(self):
+        self.conf.set_override('router_delete_namespaces', True)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        with mock.patch.object(agent, '_create_namespace'):
+            agent._precreate_router_namespaces(['r1'])
+        agent._router_removed('r1')
+        self.assertEqual(set(), agent._precreated_namespaces)
+        self.mock_ip.netns.delete.assert_called_once_with(
+            agent.get_ns_name('r1'))
+
+    def test_cleanup_namespaces_discards_precreated_namespace(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        with mock.patch.object(agent, '_create_namespace'):
+            agent._precreate_router_namespaces(['r1', 'r2'])
+        agent._cleanup_namespaces(
+            set([agent.get_ns_name('r1'), agent.get_ns_name('r2')]), ['r2'])
+        self.assertEqual(set([agent.get_ns_name('r2')]),
+                         agent._precreated_namespaces)
+
     def test_router_info_create(self):
         id = _uuid()
         ns = "ns-" + id
@@ -599,14 +731,26 @@ class TestBasicRouterOperations(base.BaseTestCase):
     def test_routes_updated_no_namespace(self):
         self._test_routes_updated(namespace=False)
 
+    def _check_routes_batch(self, ri, lines):
+        cmd = ['ip', '-force', '-batch', '-']
+        if ri.ns_name:
+            cmd = ['ip', 'netns', 'exec', ri.ns_name] + cmd
+        args, kwargs = self.utils_exec.call_args
+        self.assertEqual(cmd, args[0])
+        self.assertEqual(sorted(lines),
+                         sorted(kwargs['process_input'].splitlines()))
+
     def _test_routes_updated(self, namespace=True):
         if not namespace:
             self.conf.set_override('use_namespaces', False)
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         router_id = _uuid()
 
-        ri = l3router.RouterInfo(router_id, self.conf.root_helper, {})
+        ns_name = 'qrouter-' + router_id if namespace else None
+        ri = l3router.RouterInfo(router_id, self.conf.root_helper, {},
+                                 ns_name=ns_name)
         ri.router = {}
+        self.utils_exec.return_value = ('', '', 0)
 
         fake_old_routes = []
         fake_new_routes = [{'destination': "110.100.31.0/24",
@@ -617,28 +761,35 @@ class TestBasicRouterOperations(base.BaseTestCase):
         ri.router['routes'] = fake_new_routes
         agent.routes_updated(ri)
 
-        expected = [['ip', 'route', 'replace', 'to', '110.100.30.0/24',
-                    'via', '10.100.10.30'],
-                    ['ip', 'route', 'replace', 'to', '110.100.31.0/24',
-                     'via', '10.100.10.30']]
-
-        self._check_agent_method_called(agent, expected, namespace)
+        self._check_routes_batch(
+            ri, ['route replace to 110.100.30.0/24 via 10.100.10.30',
+                 'route replace to 110.100.31.0/24 via 10.100.10.30'])
 
         fake_new_routes = [{'destination': "110.100.30.0/24",
                             'nexthop': "10.100.10.30"}]
         ri.router['routes'] = fake_new_routes
         agent.routes_updated(ri)
-        expected = [['ip', 'route', 'delete', 'to', '110.100.31.0/24',
-                    'via', '10.100.10.30']]
+        self._check_routes_batch(
+            ri, ['route delete to 110.100.31.0/24 via 10.100.10.30'])
 
-        self._check_agent_method_called(agent, expected, namespace)
         fake_new_routes = []
         ri.router['routes'] = fake_new_routes
         agent.routes_updated(ri)
-
-        expected = [['ip', 'route', 'delete', 'to', '110.100.30.0/24',
-                    'via', '10.100.10.30']]
-        self._check_agent_method_called(agent, expected, namespace)
+        self._check_routes_batch(
+            ri, ['route delete to 110.100.30.0/24 via 10.100.10.30'])
+
+    def test_routes_updated_logs_failed_route(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        ri = l3router.RouterInfo(_uuid(), self.conf.root_helper,
+                                 {'routes': [{'destination': '10.0.0.0/24',
+                                              'nexthop': '1.2.3.4'}]})
+        self.utils_exec.return_value = (
+            '', 'RTNETLINK answers: Network is unreachable\n'
+                'Command failed -:1\n', 1)
+        with mock.patch.object(l3_agent.LOG, 'warn') as warn:
+            agent.routes_updated(ri)
+        self.assertEqual(1, warn.call_count)
+        self.assertEqual(ri.router['routes'], ri.routes)
 
     def _verify_snat_rules(self, rules, router, negate=False):
         interfaces = router[l3_constants.INTERFACE_KEY]
@@ -943,6 +1094,18 @@ vrrp_instance VR_1 {
 
             self.assertEqual(expected, config.get_config_str())
 
+    def _mock_ip_batch(self, failures=None):
+        batch = mock.Mock()
+        batch.execute.return_value = failures or []
+        mock.patch('neutron.agent.linux.ip_lib.IpCommandBatch',
+                   return_value=batch).start()
+        return batch
+
+    def _assert_fip_address_added(self, batch, ip_address):
+        batch.add.assert_called_once_with(
+            'address', 'add', ip_address + '/32', 'brd', ip_address,
+            'scope', 'global', 'dev', mock.ANY)
+
     @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
     def _test_process_router_floating_ip_addresses_add(self, ri,
                                                        agent, IPDevice):
@@ -951,13 +1114,15 @@ vrrp_instance VR_1 {
         IPDevice.return_value = device = mock.Mock()
         device.addr.list.return_value = []
         ri.iptables_manager.ipv4['nat'] = mock.MagicMock()
+        batch = self._mock_ip_batch()
 
         with mock.patch.object(lla.LinkLocalAllocator, '_write'):
             fip_statuses = agent.process_router_floating_ip_addresses(
                 ri, {'id': _uuid()})
         self.assertEqual({fip_id: l3_constants.FLOATINGIP_STATUS_ACTIVE},
                          fip_statuses)
-        device.addr.add.assert_called_once_with(4, '15.1.2.3/32', '15.1.2.3')
+        self._assert_fip_address_added(batch, '15.1.2.3')
+        batch.execute.assert_called_once_with(check_exit_code=False)
 
     def test_process_router_floating_ip_nat_rules_add(self):
         fip = {
@@ -969,6 +1134,7 @@ vrrp_instance VR_1 {
         ri = mock.MagicMock()
         ri.router.get.return_value = [fip]
         ri.router['distributed'].__nonzero__ = lambda self: False
+        ri.floating_ip_nat_map = None
 
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
 
@@ -1039,13 +1205,15 @@ vrrp_instance VR_1 {
         ri.router.get.return_value = []
         type(ri).is_ha = mock.PropertyMock(return_value=False)
         ri.router['distributed'].__nonzero__ = lambda self: False
+        batch = self._mock_ip_batch()
 
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
 
         fip_statuses = agent.process_router_floating_ip_addresses(
             ri, {'id': _uuid()})
         self.assertEqual({}, fip_statuses)
-        device.addr.delete.assert_called_once_with(4, '15.1.2.3/32')
+        batch.add.assert_called_once_with(
+            'address', 'del', '15.1.2.3/32', 'dev', mock.ANY)
         self.mock_driver.delete_conntrack_state.assert_called_once_with(
             root_helper=self.conf.root_helper,
             namespace=ri.ns_name,
@@ -1054,6 +1222,7 @@ vrrp_instance VR_1 {
     def test_process_router_floating_ip_nat_rules_remove(self):
         ri = mock.MagicMock()
         ri.router.get.return_value = []
+        ri.floating_ip_nat_map = None
 
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
 
@@ -1063,6 +1232,112 @@ vrrp_instance VR_1 {
         nat = ri.iptables_manager.ipv4['nat`']
         nat.clear_rules_by_tag.assert_called_once_with('floating_ip')
 
+    def _prepare_router_with_fips(self, count):
+        router = prepare_router_data(enable_snat=True)
+        router[l3_constants.FLOATINGIP_KEY] = [
+            {'id': 'fip-%d' % i,
+             'floating_ip_address': str(netaddr.IPAddress('15.1.0.0') + i),
+             'fixed_ip_address': str(netaddr.IPAddress('192.168.0.0') + i),
+             'port_id': _uuid()}
+            for i in range(count)]
+        ri = l3router.RouterInfo(router['id'], self.conf.root_helper,
+                                 router=router)
+        ri.iptables_manager.ipv4['nat'] = mock.MagicMock()
+        return ri
+
+    @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
+    def test_process_router_floating_ips_only_apply_changes(self, IPDevice):
+        # Work done when one floating IP out of many changes must not
+        # depend on the number of floating IPs of the router.
+        IPDevice.return_value = device = mock.Mock()
+        device.addr.list.return_value = []
+        batch = self._mock_ip_batch()
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        ri = self._prepare_router_with_fips(500)
+        nat = ri.iptables_manager.ipv4['nat']
+        ex_gw_port = {'id': _uuid()}
+
+        agent.process_router_floating_ip_nat_rules(ri)
+        agent.process_router_floating_ip_addresses(ri, ex_gw_port)
+        self.assertEqual(500 * 3, nat.add_rule.call_count)
+        self.assertEqual(500, batch.add.call_count)
+        self.assertEqual(1, batch.execute.call_count)
+
+        nat.reset_mock()
+        device.reset_mock()
+        batch.reset_mock()
+        fips = ri.router[l3_constants.FLOATINGIP_KEY]
+        fips[0]['fixed_ip_address'] = '192.168.1.1'
+        removed = fips.pop()
+        fips.append({'id': 'fip-new',
+                     'floating_ip_address': '15.2.0.1',
+                     'fixed_ip_address': '192.168.2.1',
+                     'port_id': _uuid()})
+
+        agent.process_router_floating_ip_nat_rules(ri)
+        fip_statuses = agent.process_router_floating_ip_addresses(
+            ri, ex_gw_port)
+
+        self.assertFalse(nat.clear_rules_by_tag.called)
+        self.assertEqual(2 * 3, nat.remove_rule.call_count)
+        self.assertEqual(2 * 3, nat.add_rule.call_count)
+        for chain, rule in agent.floating_forward_rules(
+                removed['floating_ip_address'], removed['fixed_ip_address']):
+            nat.remove_rule.assert_any_call(chain, rule)
+        for chain, rule in agent.floating_forward_rules('15.1.0.0',
+                                                        '192.168.1.1'):
+            nat.add_rule.assert_any_call(chain, rule, tag='floating_ip')
+        self.assertFalse(device.addr.list.called)
+        batch.add.assert_has_calls(
+            [mock.call('address', 'add', '15.2.0.1/32', 'brd', '15.2.0.1',
+                       'scope', 'global', 'dev', mock.ANY),
+             mock.call('address', 'del',
+                       removed['floating_ip_address'] + '/32',
+                       'dev', mock.ANY)])
+        self.assertEqual(2, batch.add.call_count)
+        self.assertEqual(1, batch.execute.call_count)
+        self.assertEqual(500, len(fip_statuses))
+
+    @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
+    def test_process_router_floating_ip_addresses_retries_failed(self,
+                                                                 IPDevice):
+        IPDevice.return_value = device = mock.Mock()
+        device.addr.list.return_value = []
+        batch = self._mock_ip_batch()
+        batch.execute.side_effect = [
+            [(['address', 'add', '15.1.0.0/32'], 'RTNETLINK answers')], []]
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        ri = self._prepare_router_with_fips(1)
+
+        fip_statuses = agent.process_router_floating_ip_addresses(
+            ri, {'id': _uuid()})
+        self.assertEqual({'fip-0': l3_constants.FLOATINGIP_STATUS_ERROR},
+                         fip_statuses)
+        fip_statuses = agent.process_router_floating_ip_addresses(
+            ri, {'id': _uuid()})
+        self.assertEqual({'fip-0': l3_constants.FLOATINGIP_STATUS_ACTIVE},
+                         fip_statuses)
+        self.assertEqual(2, batch.add.call_count)
+
+    @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
+    def test_process_router_floating_ip_addresses_retries_failed_removal(
+            self, IPDevice):
+        IPDevice.return_value = device = mock.Mock()
+        device.addr.list.return_value = [{'cidr': '15.1.2.3/32'}]
+        batch = self._mock_ip_batch()
+        batch.execute.side_effect = [
+            [(['address', 'del', '15.1.2.3/32'], 'RTNETLINK answers')], []]
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        ri = self._prepare_router_with_fips(0)
+
+        agent.process_router_floating_ip_addresses(ri, {'id': _uuid()})
+        self.assertFalse(self.mock_driver.delete_conntrack_state.called)
+        self.assertEqual(set(['15.1.2.3/32']), ri.floating_ip_cidrs)
+        agent.process_router_floating_ip_addresses(ri, {'id': _uuid()})
+        self.assertEqual(2, batch.add.call_count)
+        self.assertEqual(1, self.mock_driver.delete_conntrack_state.call_count)
+        self.assertEqual(set(), ri.floating_ip_cidrs)
+
     @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
     def test_process_router_floating_ip_addresses_remap(self, IPDevice):
         fip_id = _uuid()
@@ -1078,6 +1353,7 @@ vrrp_instance VR_1 {
         ri.router['distributed'].__nonzero__ = lambda self: False
         type(ri).is_ha = mock.PropertyMock(return_value=False)
         ri.router.get.return_value = [fip]
+        batch = self._mock_ip_batch()
 
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
 
@@ -1086,8 +1362,7 @@ vrrp_instance VR_1 {
         self.assertEqual({fip_id: l3_constants.FLOATINGIP_STATUS_ACTIVE},
                          fip_statuses)
 
-        self.assertFalse(device.addr.add.called)
-        self.assertFalse(device.addr.delete.called)
+        self.assertFalse(batch.add.called)
 
     @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
     def test_process_router_with_disabled_floating_ip(self, IPDevice):
@@ -1112,8 +1387,9 @@ vrrp_instance VR_1 {
     @mock.patch('neutron.agent.linux.ip_lib.IPDevice')
     def test_process_router_floating_ip_with_device_add_error(self, IPDevice):
         IPDevice.return_value = device = mock.Mock()
-        device.addr.add.side_effect = RuntimeError()
         device.addr.list.return_value = []
+        self._mock_ip_batch(
+            [(['address', 'add', '15.1.2.3/32'], 'RTNETLINK answers')])
         fip_id = _uuid()
         fip = {
             'id': fip_id, 'port_id': _uuid(),
@@ -1401,6 +1677,7 @@ vrrp_instance VR_1 {
             ri = l3router.RouterInfo(router['id'], self.conf.root_helper,
                                      router=router)
             agent.external_gateway_added = mock.Mock()
+            self._mock_ip_batch()
             agent.process_router(ri)
             # Assess the call for putting the floating IP up was performed
             mock_update_fip_status.assert_called_once_with(
@@ -1660,6 +1937,99 @@ vrrp_instance VR_1 {
     def test_disable_metadata_proxy_spawn(self):
         self._configure_metadata_proxy(enableflag=False)
 
+    def test_shared_metadata_proxy(self):
+        self.conf.set_override('state_path', self.temp_dir)
+        self.conf.set_override('metadata_proxy_mode', 'shared')
+        self.utils_replace_file_p.stop()
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_file = os.path.join(
+            agent._get_shared_metadata_proxy_routers_dir(), 'r1')
+        pm = self.external_process.return_value
+        # The proxy is seen running once its pid file is written
+        type(pm).active = mock.PropertyMock(side_effect=[False, False, True,
+                                                         True])
+
+        with mock.patch('eventlet.sleep') as sleep:
+            agent._spawn_metadata_proxy('r1', 'qrouter-r1')
+        with open(router_file) as f:
+            self.assertEqual('qrouter-r1', f.read())
+        self.external_process.assert_called_once_with(
+            self.conf, l3_agent.SHARED_METADATA_PROXY_ID, 'sudo', None)
+        pm.enable.assert_called_once_with(mock.ANY)
+        sleep.assert_called_once_with(
+            l3_agent.SHARED_METADATA_PROXY_START_INTERVAL)
+
+        # The running proxy notices the removal by itself
+        pm.reset_mock()
+        agent._destroy_metadata_proxy('r1', 'qrouter-r1')
+        self.assertFalse(os.path.exists(router_file))
+        self.assertFalse(pm.enable.called)
+        self.assertFalse(pm.reload_cfg.called)
+        pm.disable.assert_called_once_with()
+
+    def test_shared_metadata_proxy_started_once(self):
+        self.conf.set_override('state_path', self.temp_dir)
+        self.conf.set_override('metadata_proxy_mode', 'shared')
+        self.utils_replace_file_p.stop()
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        pm = self.external_process.return_value
+        started = []
+        type(pm).active = mock.PropertyMock(
+            side_effect=lambda: bool(started))
+
+        pool = eventlet.GreenPool()
+
+        def enable(callback):
+            # Another router is added while the proxy starts
+            pool.spawn(agent._spawn_metadata_proxy, 'r2', 'qrouter-r2')
+            eventlet.sleep(0)
+            started.append(True)
+
+        pm.enable.side_effect = enable
+        pool.spawn(agent._spawn_metadata_proxy, 'r1', 'qrouter-r1')
+        pool.waitall()
+        pm.enable.assert_called_once_with(mock.ANY)
+        self.assertEqual(
+            ['r1', 'r2'],
+            sorted(os.listdir(agent._get_shared_metadata_proxy_routers_dir())))
+
+    def _test_metadata_proxy_ha_router(self, mode):
+        self.conf.set_override('metadata_proxy_mode', mode)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        router = {'id': router_id,
+                  'external_gateway_info': {},
+                  'routes': [],
+                  'distributed': False,
+                  'ha': True}
+        with contextlib.nested(
+            mock.patch.object(agent, 'process_ha_router_added'),
+            mock.patch.object(agent, '_add_keepalived_notifiers'),
+            mock.patch.object(agent, '_spawn_metadata_proxy')
+        ) as (ha_router_added, add_notifiers, spawn_proxy):
+            agent._router_added(router_id, router)
+        return add_notifiers, spawn_proxy
+
+    def test_metadata_proxy_ha_router(self):
+        add_notifiers, spawn_proxy = self._test_metadata_proxy_ha_router(
+            'per_router')
+        self.assertEqual(1, add_notifiers.call_count)
+        self.assertFalse(spawn_proxy.called)
+
+    def test_shared_metadata_proxy_ha_router(self):
+        add_notifiers, spawn_proxy = self._test_metadata_proxy_ha_router(
+            'shared')
+        self.assertFalse(add_notifiers.called)
+        spawn_proxy.assert_called_once_with(mock.ANY, mock.ANY)
+
+    def test_destroy_metadata_proxy_per_router(self):
+        self.conf.set_override('state_path', self.temp_dir)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        pm = self.external_process.return_value
+        agent._destroy_metadata_proxy('r1', 'qrouter-r1')
+        self.assertFalse(pm.enable.called)
+        pm.disable.assert_called_once_with()
+
     def test_metadata_nat_rules(self):
         self.conf.set_override('enable_metadata_proxy', False)
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
@@ -1697,6 +2067,25 @@ vrrp_instance VR_1 {
         self.plugin_api.get_external_network_id.assert_called_with(
             agent.context)
 
+    def test_first_router_forwarding_logged_at_info(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_external_network_id.return_value = 'aaa'
+        agent.process_router = mock.Mock()
+        routers = [{'id': _uuid(),
+                    'routes': [],
+                    'admin_state_up': True,
+                    'external_gateway_info': {'network_id': 'aaa'}}
+                   for i in range(2)]
+
+        with mock.patch.object(l3_agent, 'LOG') as log:
+            for router in routers:
+                agent._process_router_if_compatible(router)
+        self.assertEqual(1, log.info.call_count)
+        self.assertEqual(routers[0]['id'],
+                         log.info.call_args[0][1]['router'])
+        self.assertEqual(routers[1]['id'],
+                         log.debug.call_args[0][1]['router'])
+
     def test_process_router_if_compatible_with_cached_ext_net(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         self.plugin_api.get_external_network_id.return_value = 'aaa'
@@ -1787,6 +2176,22 @@ vrrp_instance VR_1 {
             msg = _LE("Error importing interface driver '%s'")
             log.error.assert_called_once_with(msg, 'wrong_driver')
 
+    def _test_invalid_config_value(self, option, value):
+        self.conf.set_override(option, value)
+        with mock.patch.object(l3_agent, 'LOG') as log:
+            self.assertRaises(SystemExit, l3_agent.L3NATAgent,
+                              HOSTNAME, self.conf)
+            self.assertEqual(1, log.error.call_count)
+
+    def test_router_processing_workers_minimum(self):
+        self._test_invalid_config_value('router_processing_workers', 0)
+
+    def test_router_update_aging_interval_minimum(self):
+        self._test_invalid_config_value('router_update_aging_interval', -1)
+
+    def test_sync_routers_chunk_size_minimum(self):
+        self._test_invalid_config_value('sync_routers_chunk_size', -1)
+
     def test_metadata_filter_rules(self):
         self.conf.set_override('enable_metadata_proxy', False)
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
@@ -2144,6 +2549,7 @@ vrrp_instance VR_1 {
             {'cidr': vm_floating_ip + '/32'},
             {'cidr': '19.4.4.1/24'}]
         self.device_exists.return_value = True
+        self._mock_ip_batch()
 
         agent.external_gateway_removed(
             ri, ri.ex_gw_port,
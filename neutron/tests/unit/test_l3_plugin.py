@@ -2144,7 +2144,21 @@ class L3AgentDbSepTestCase(L3BaseForSepTests, L3AgentDbTestCaseBase):
 class L3NatDBIntTestCase(L3BaseForIntTests, L3NatTestCaseBase):
 
     """Unit tests for core plugin with L3 routing integrated."""
-    pass
+
+    def test_get_router_ids_returns_admin_down_routers(self):
+        with contextlib.nested(
+            self.router(),
+            self.router(admin_state_up=False)
+        ) as (r1, r2):
+            l3_rpc_cb = l3_rpc.L3RpcCallback()
+            admin_ctx = context.get_admin_context()
+            router_ids = l3_rpc_cb.get_router_ids(admin_ctx, host='host1')
+            synced = l3_rpc_cb.sync_routers(admin_ctx, host='host1')
+            self.assertEqual(
+                sorted([r1['router']['id'], r2['router']['id']]),
+                sorted(router_ids))
+            self.assertEqual(sorted(router_ids),
+                             sorted(r['id'] for r in synced))
 
 
 class L3NatDBSepTestCase(L3BaseForSepTests, L3NatTestCaseBase):
@@ -14,10 +14,13 @@
 #    under the License.
 
 import os
+import socket
+import struct
 
 import mock
 
 from neutron.agent.linux import ip_lib
+from neutron.agent.linux import netlink
 from neutron.common import exceptions
 from neutron.tests import base
 
@@ -542,6 +545,7 @@ class TestIPCmdBase(base.BaseTestCase):
         self.parent = mock.Mock()
         self.parent.name = 'eth0'
         self.parent.root_helper = 'sudo'
+        self.parent._use_netlink.return_value = False
 
     def _assert_call(self, options, args):
         self.parent.assert_has_calls([
@@ -875,6 +879,127 @@ class TestIpNetnsCommand(TestIPCmdBase):
                                             extra_ok_codes=None)
 
 
+get_links = netlink.get_links
+
+
+class TestNetlinkBackend(base.BaseTestCase):
+    def setUp(self):
+        super(TestNetlinkBackend, self).setUp()
+        self.get_links = mock.patch.object(ip_lib.netlink,
+                                           'get_links').start()
+        self.get_links.return_value = [
+            {'index': 1, 'name': 'lo', 'mtu': 65536, 'state': 'UNKNOWN'},
+            {'index': 2, 'name': 'eth0', 'mtu': 1500, 'state': 'UP',
+             'qdisc': 'mq', 'link/ether': 'cc:dd:ee:ff:ab:cd'}]
+        self.execute = mock.patch.object(ip_lib.utils, 'execute').start()
+        self.device = ip_lib.IPDevice('eth0', 'sudo')
+        self.device.backend = 'netlink'
+
+    def test_use_netlink(self):
+        self.assertTrue(self.device._use_netlink())
+        self.device.backend = 'iproute2'
+        self.assertFalse(self.device._use_netlink())
+
+    def test_use_netlink_force_root(self):
+        self.device.force_root = True
+        self.assertFalse(self.device._use_netlink())
+
+    def test_use_netlink_namespace(self):
+        self.device.namespace = 'ns'
+        with mock.patch('os.geteuid', return_value=0):
+            self.assertTrue(self.device._use_netlink())
+        with mock.patch('os.geteuid', return_value=1000):
+            self.assertTrue(self.device._use_netlink())
+            # The socket helper requires the root helper
+            self.device.root_helper = None
+            self.assertFalse(self.device._use_netlink())
+
+    def test_namespace_query_not_root(self):
+        self.get_links.side_effect = get_links
+        sock = mock.Mock()
+        sock.recv.return_value = netlink.NLMSGHDR.pack(
+            netlink.NLMSGHDR.size + 4, netlink.NLMSG_DONE, 0, 1, 0) + (
+            struct.pack('=i', 0))
+        self.device.namespace = 'ns'
+        helper = netlink.SocketHelper('sudo')
+        with mock.patch('os.geteuid', return_value=1000):
+            with mock.patch.object(netlink, 'get_socket_helper',
+                                   return_value=helper):
+                with mock.patch.object(helper, 'open_socket',
+                                       return_value=sock) as open_socket:
+                    self.assertRaises(RuntimeError, getattr,
+                                      self.device.link, 'address')
+        open_socket.assert_called_once_with('ns')
+        self.assertFalse(self.execute.called)
+
+    def test_namespace_query_socket_helper_failure(self):
+        self.get_links.side_effect = ip_lib.netlink.SocketHelperError()
+        self.execute.return_value = LINK_SAMPLE[1]
+        self.device.namespace = 'ns'
+        with mock.patch('os.geteuid', return_value=1000):
+            self.assertEqual('cc:dd:ee:ff:ab:cd', self.device.link.address)
+        self.assertTrue(self.execute.called)
+
+    def test_get_devices(self):
+        ip = ip_lib.IPWrapper('sudo')
+        ip.backend = 'netlink'
+        self.assertEqual([ip_lib.IPDevice('eth0')],
+                         ip.get_devices(exclude_loopback=True))
+        self.get_links.assert_called_once_with(None, 'sudo')
+        self.assertFalse(self.execute.called)
+
+    def test_link_attributes(self):
+        self.assertEqual('cc:dd:ee:ff:ab:cd', self.device.link.address)
+        self.assertEqual(1500, self.device.link.mtu)
+        self.assertEqual('UP', self.device.link.state)
+        self.assertFalse(self.execute.called)
+
+    def test_link_attributes_missing_device(self):
+        self.device.name = 'tap0'
+        self.assertRaises(RuntimeError, getattr, self.device.link, 'address')
+
+    def test_addr_list(self):
+        addresses = [
+            {'index': 2, 'cidr': '172.16.77.240/24',
+             'broadcast': '172.16.77.255', 'scope': 'global',
+             'ip_version': 4, 'dynamic': False, 'permanent': True},
+            {'index': 2, 'cidr': 'fe80::dfcc:aaff:feb9:76ce/64',
+             'broadcast': '::', 'scope': 'link', 'ip_version': 6,
+             'dynamic': True, 'permanent': False},
+            {'index': 1, 'cidr': '127.0.0.1/8',
+             'broadcast': '127.255.255.255', 'scope': 'host',
+             'ip_version': 4, 'dynamic': False, 'permanent': True}]
+        with mock.patch.object(ip_lib.netlink, 'get_addresses',
+                               return_value=addresses):
+            self.assertEqual(['172.16.77.240/24',
+                              'fe80::dfcc:aaff:feb9:76ce/64'],
+                             [a['cidr'] for a in self.device.addr.list()])
+            self.assertEqual(
+                [{'cidr': '172.16.77.240/24', 'broadcast': '172.16.77.255',
+                  'scope': 'global', 'ip_version': 4, 'dynamic': False}],
+                self.device.addr.list(scope='global', filters=['permanent']))
+            self.assertEqual([], self.device.addr.list(to='172.16.77.1'))
+            self.assertEqual(
+                ['172.16.77.240/24'],
+                [a['cidr'] for a in self.device.addr.list(to='172.16.77.240')])
+        self.assertFalse(self.execute.called)
+
+    def test_get_gateway(self):
+        routes = [
+            {'family': socket.AF_INET, 'dst_len': 24, 'dst': '10.0.0.0',
+             'scope': 'link', 'table': 254, 'oif': 2},
+            {'family': socket.AF_INET, 'dst_len': 0, 'gateway': '10.0.0.2',
+             'scope': 'global', 'table': 100, 'oif': 2},
+            {'family': socket.AF_INET, 'dst_len': 0, 'gateway': '10.0.0.1',
+             'scope': 'global', 'table': 254, 'oif': 2, 'metric': 100}]
+        with mock.patch.object(ip_lib.netlink, 'get_routes',
+                               return_value=routes):
+            self.assertEqual({'gateway': '10.0.0.1', 'metric': 100},
+                             self.device.route.get_gateway())
+            self.assertIsNone(self.device.route.get_gateway(scope='link'))
+        self.assertFalse(self.execute.called)
+
+
 class TestDeviceExists(base.BaseTestCase):
     def test_device_exists(self):
         with mock.patch.object(ip_lib.IPDevice, '_execute') as _execute:
@@ -917,3 +1042,83 @@ class TestIpNeighCommand(TestIPCmdBase):
         self.neigh_cmd.delete(4, '192.168.45.100', 'cc:dd:ee:ff:ab:cd')
         self._assert_sudo([4], ('del', '192.168.45.100', 'lladdr',
                                 'cc:dd:ee:ff:ab:cd', 'dev', 'tap0'))
+
+
+class TestIpCommandBatch(base.BaseTestCase):
+    def setUp(self):
+        super(TestIpCommandBatch, self).setUp()
+        self.execute = mock.patch.object(ip_lib.utils, 'execute').start()
+        self.execute.return_value = ('', '', 0)
+        self.batch = ip_lib.IpCommandBatch('sudo', namespace='ns')
+        self.batch.add('route', 'replace', 'to', '10.0.0.0/24', 'via',
+                       '1.2.3.4')
+        self.batch.add('address', 'add', '1.2.3.5/32', 'dev', 'qg-1')
+
+    def test_execute(self):
+        self.assertEqual([], self.batch.execute())
+        self.execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'ns', 'ip', '-force', '-batch', '-'],
+            root_helper='sudo',
+            process_input='route replace to 10.0.0.0/24 via 1.2.3.4\n'
+                          'address add 1.2.3.5/32 dev qg-1\n',
+            check_exit_code=False, return_stderr=True,
+            log_fail_as_error=False, return_code=True)
+        self.assertEqual(0, len(self.batch))
+
+    def test_execute_empty(self):
+        batch = ip_lib.IpCommandBatch('sudo')
+        self.assertEqual([], batch.execute())
+        self.assertFalse(self.execute.called)
+
+    def test_execute_attributes_failures(self):
+        self.execute.return_value = ('', 'RTNETLINK answers: File exists\n'
+                                         'Command failed -:2\n', 1)
+        self.assertEqual(
+            [(['address', 'add', '1.2.3.5/32', 'dev', 'qg-1'],
+              'RTNETLINK answers: File exists')],
+            self.batch.execute(check_exit_code=False))
+
+    def test_execute_raises_on_failure(self):
+        self.execute.return_value = ('', 'RTNETLINK answers: File exists\n'
+                                         'Command failed -:1\n', 1)
+        self.assertRaises(RuntimeError, self.batch.execute)
+
+    def test_execute_whole_batch_failed(self):
+        self.execute.return_value = ('', 'Cannot open network namespace '
+                                         '"ns": No such file or directory\n',
+                                     255)
+        self.assertRaises(RuntimeError, self.batch.execute,
+                          check_exit_code=False)
+
+    def test_execute_failed_without_error(self):
+        self.execute.return_value = ('', '', 1)
+        self.assertRaises(RuntimeError, self.batch.execute,
+                          check_exit_code=False)
+
+    def test_execute_ignores_warnings_on_success(self):
+        self.execute.return_value = ('', 'Warning: deprecated syntax\n', 0)
+        self.assertEqual([], self.batch.execute())
+
+    def test_execute_attributes_trailing_errors_to_last_failure(self):
+        self.execute.return_value = ('', 'RTNETLINK answers: File exists\n'
+                                         'Command failed -:1\n'
+                                         'Error: device not found\n', 1)
+        self.assertEqual(
+            [(['route', 'replace', 'to', '10.0.0.0/24', 'via', '1.2.3.4'],
+              'RTNETLINK answers: File exists\nError: device not found')],
+            self.batch.execute(check_exit_code=False))
+
+    def test_add_rejects_netns(self):
+        self.assertRaises(ValueError, self.batch.add,
+                          'netns', 'exec', 'ns', 'sh')
+        self.assertEqual(2, len(self.batch))
+
+    def test_add_rejects_other_objects(self):
+        for command in ('exec', 'net', 'monitor', 'xfrm'):
+            self.assertRaises(ValueError, self.batch.add, command, 'list')
+
+    def test_add_rejects_multiple_words(self):
+        for arg in ('1.2.3.4\nnetns exec ns sh', '1.2.3.4 dev', '', ' x'):
+            self.assertRaises(ValueError, self.batch.add,
+                              'route', 'replace', 'to', arg)
+        self.assertEqual(2, len(self.batch))
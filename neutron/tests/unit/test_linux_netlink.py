@@ -0,0 +1,312 @@
+# Copyright 2015 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import _multiprocessing
+import contextlib
+import errno
+import os
+import socket
+import struct
+import threading
+
+import mock
+
+from neutron.agent.linux import netlink
+from neutron.tests import base
+
+
+def _attr(attr_type, value):
+    length = netlink.RTATTR.size + len(value)
+    padding = '\0' * (netlink._align(length) - length)
+    return netlink.RTATTR.pack(length, attr_type) + value + padding
+
+
+def _msg(msg_type, body):
+    return netlink.NLMSGHDR.pack(netlink.NLMSGHDR.size + len(body),
+                                 msg_type, 0, 1, 0) + body
+
+
+LINK = (netlink.IFINFOMSG.pack(0, netlink.ARPHRD_ETHER, 2, 0, 0) +
+        _attr(netlink.IFLA_IFNAME, 'eth0\0') +
+        _attr(netlink.IFLA_MTU, struct.pack('=I', 1500)) +
+        _attr(netlink.IFLA_QDISC, 'mq\0') +
+        _attr(netlink.IFLA_OPERSTATE, '\x06') +
+        _attr(netlink.IFLA_LINKMODE, '\x00') +
+        _attr(netlink.IFLA_GROUP, struct.pack('=I', 0)) +
+        _attr(netlink.IFLA_TXQLEN, struct.pack('=I', 1000)) +
+        _attr(netlink.IFLA_ADDRESS, '\xcc\xdd\xee\xff\xab\xcd') +
+        _attr(netlink.IFLA_BROADCAST, '\xff' * 6))
+
+ADDR = (netlink.IFADDRMSG.pack(socket.AF_INET, 24,
+                               netlink.IFA_F_PERMANENT, 0, 2) +
+        _attr(netlink.IFA_ADDRESS, socket.inet_aton('172.16.77.240')) +
+        _attr(netlink.IFA_LOCAL, socket.inet_aton('172.16.77.240')) +
+        _attr(netlink.IFA_BROADCAST, socket.inet_aton('172.16.77.255')))
+
+ADDR6 = (netlink.IFADDRMSG.pack(socket.AF_INET6, 64, 0, 253, 2) +
+         _attr(netlink.IFA_ADDRESS,
+               '\xfe\x80' + '\0' * 6 + '\xde\xcc\xaa\xff\xfe\xb9\x76\xce'))
+
+ROUTE = (netlink.RTMSG.pack(socket.AF_INET, 0, 0, 0, 254, 3, 0, 1, 0) +
+         _attr(netlink.RTA_TABLE, struct.pack('=I', 254)) +
+         _attr(netlink.RTA_GATEWAY, socket.inet_aton('10.0.0.1')) +
+         _attr(netlink.RTA_OIF, struct.pack('=I', 2)) +
+         _attr(netlink.RTA_PRIORITY, struct.pack('=I', 100)))
+
+
+class TestNetlinkParsing(base.BaseTestCase):
+    def test_parse_link(self):
+        self.assertEqual({'index': 2,
+                          'name': 'eth0',
+                          'mtu': 1500,
+                          'qdisc': 'mq',
+                          'state': 'UP',
+                          'mode': 'DEFAULT',
+                          'group': 'default',
+                          'qlen': 1000,
+                          'link/ether': 'cc:dd:ee:ff:ab:cd',
+                          'brd': 'ff:ff:ff:ff:ff:ff'},
+                         netlink.parse_link(LINK, 0))
+
+    def test_parse_link_numbered_group(self):
+        link = (netlink.IFINFOMSG.pack(0, netlink.ARPHRD_ETHER, 2, 0, 0) +
+                _attr(netlink.IFLA_IFNAME, 'eth0\0') +
+                _attr(netlink.IFLA_LINKMODE, '\x01') +
+                _attr(netlink.IFLA_GROUP, struct.pack('=I', 5)))
+        parsed = netlink.parse_link(link, 0)
+        self.assertEqual('DORMANT', parsed['mode'])
+        self.assertEqual(5, parsed['group'])
+
+    def test_parse_addr(self):
+        self.assertEqual({'index': 2,
+                          'cidr': '172.16.77.240/24',
+                          'broadcast': '172.16.77.255',
+                          'scope': 'global',
+                          'ip_version': 4,
+                          'dynamic': False,
+                          'permanent': True},
+                         netlink.parse_addr(ADDR, 0))
+
+    def test_parse_addr_ipv6(self):
+        self.assertEqual({'index': 2,
+                          'cidr': 'fe80::decc:aaff:feb9:76ce/64',
+                          'broadcast': '::',
+                          'scope': 'link',
+                          'ip_version': 6,
+                          'dynamic': True,
+                          'permanent': False},
+                         netlink.parse_addr(ADDR6, 0))
+
+    def test_parse_route(self):
+        self.assertEqual({'family': socket.AF_INET,
+                          'dst_len': 0,
+                          'scope': 'global',
+                          'table': 254,
+                          'gateway': '10.0.0.1',
+                          'oif': 2,
+                          'metric': 100},
+                         netlink.parse_route(ROUTE, 0))
+
+
+class TestNetlinkDump(base.BaseTestCase):
+    def setUp(self):
+        super(TestNetlinkDump, self).setUp()
+        self.sock = mock.Mock()
+        mock.patch.object(netlink, '_open_socket',
+                          return_value=self.sock).start()
+
+    def test_dump_multipart(self):
+        self.sock.recv.side_effect = [
+            _msg(netlink.RTM_NEWADDR, ADDR) + _msg(netlink.RTM_NEWADDR, ADDR6),
+            _msg(netlink.NLMSG_DONE, struct.pack('=i', 0))]
+        addresses = netlink.get_addresses('ns')
+        self.assertEqual(['172.16.77.240/24', 'fe80::decc:aaff:feb9:76ce/64'],
+                         [a['cidr'] for a in addresses])
+        request = self.sock.sendall.call_args[0][0]
+        length, msg_type, flags, seq, pid = netlink.NLMSGHDR.unpack_from(
+            request)
+        self.assertEqual(netlink.RTM_GETADDR, msg_type)
+        self.assertEqual(netlink.NLM_F_REQUEST | netlink.NLM_F_DUMP, flags)
+        self.assertEqual(len(request), length)
+        self.sock.close.assert_called_once_with()
+
+    def test_dump_error(self):
+        self.sock.recv.return_value = _msg(netlink.NLMSG_ERROR,
+                                           struct.pack('=i', -1))
+        self.assertRaises(OSError, netlink.get_links)
+        self.sock.close.assert_called_once_with()
+
+
+class TestOpenSocket(base.BaseTestCase):
+    def test_missing_namespace(self):
+        with mock.patch('os.open', side_effect=OSError(2, 'No such file')):
+            self.assertRaises(RuntimeError, netlink._open_socket, 'ns')
+
+    def test_enters_and_leaves_namespace(self):
+        with contextlib.nested(
+            mock.patch('os.open'),
+            mock.patch('os.close'),
+            mock.patch.object(netlink, '_setns'),
+            mock.patch('socket.socket')
+        ) as (os_open, os_close, setns, sock):
+            os_open.side_effect = [10, 11]
+            self.assertEqual(sock.return_value, netlink._open_socket('ns'))
+        os_open.assert_has_calls([
+            mock.call('/var/run/netns/ns', mock.ANY),
+            mock.call('/proc/self/ns/net', mock.ANY)])
+        self.assertEqual([mock.call(10), mock.call(11)],
+                         setns.call_args_list)
+        self.assertEqual(2, os_close.call_count)
+
+
+class TestSocketHelper(base.BaseTestCase):
+    def setUp(self):
+        super(TestSocketHelper, self).setUp()
+        mock.patch.object(netlink, '_socket_helpers', {}).start()
+        mock.patch('os.geteuid', return_value=1000).start()
+        self.popen = mock.patch.object(netlink.utils,
+                                       'subprocess_popen').start()
+        self.helper = netlink.get_socket_helper('sudo rootwrap')
+
+    def _start_helper(self, replies):
+        def popen(cmd, stdin):
+            fd = os.dup(stdin)
+            # The helper replies before the request, the socket buffers it
+            for status, sock in replies:
+                os.write(fd, '%d\n' % status)
+                if sock:
+                    _multiprocessing.sendfd(fd, sock.fileno())
+            if replies:
+                self.addCleanup(os.close, fd)
+            else:
+                os.close(fd)
+            return mock.Mock()
+        self.popen.side_effect = popen
+
+    def test_open_socket(self):
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             netlink.NETLINK_ROUTE)
+        self.addCleanup(sock.close)
+        self._start_helper([(0, sock), (errno.ENOENT, None)])
+        received = netlink._open_socket('ns', 'sudo rootwrap')
+        received.close()
+        self.popen.assert_called_once_with(
+            ['sudo', 'rootwrap', netlink.SOCKET_HELPER], stdin=mock.ANY)
+        self.assertRaises(RuntimeError, netlink._open_socket, 'ns2',
+                          'sudo rootwrap')
+        self.assertTrue(netlink.can_dump('ns', 'sudo rootwrap'))
+
+    def test_open_socket_helper_failure(self):
+        self._start_helper([])
+        self.assertRaises(netlink.SocketHelperError,
+                          netlink._open_socket, 'ns', 'sudo rootwrap')
+        self.assertFalse(netlink.can_dump('ns', 'sudo rootwrap'))
+        self.assertRaises(netlink.SocketHelperError,
+                          netlink._open_socket, 'ns', 'sudo rootwrap')
+        self.assertEqual(1, self.popen.call_count)
+
+        # The helper is restarted once the retry interval has elapsed
+        self.helper._retry_time = 0
+        self.assertTrue(netlink.can_dump('ns', 'sudo rootwrap'))
+
+    def test_open_socket_without_root_helper(self):
+        self.assertFalse(netlink.can_dump('ns'))
+        self.assertTrue(netlink.can_dump())
+        self.assertRaises(netlink.SocketHelperError,
+                          netlink._open_socket, 'ns')
+
+
+class TestSocketHelperRoundTrip(base.BaseTestCase):
+    """Runs SocketHelper against the privileged helper in a thread."""
+
+    def setUp(self):
+        super(TestSocketHelperRoundTrip, self).setUp()
+        mock.patch.object(netlink, '_socket_helpers', {}).start()
+        mock.patch('os.geteuid', return_value=1000).start()
+        mock.patch.object(netlink.utils, 'subprocess_popen',
+                          side_effect=self._popen).start()
+        self.served = []
+        open_socket = netlink._open_socket
+
+        def helper_open_socket(namespace=None, root_helper=None):
+            if root_helper:
+                return open_socket(namespace, root_helper)
+            # The helper, running as root, opens the socket in the
+            # namespace of the test
+            self.served.append(namespace)
+            return socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                                 netlink.NETLINK_ROUTE)
+
+        mock.patch.object(netlink, '_open_socket',
+                          side_effect=helper_open_socket).start()
+
+    def _popen(self, cmd, stdin):
+        fd = os.dup(stdin)
+        helper = threading.Thread(target=self._run_helper, args=(fd,))
+        helper.start()
+        process = mock.Mock()
+        process.wait.side_effect = helper.join
+        return process
+
+    def _run_helper(self, fd):
+        # Like neutron-netlink-socket-helper with fd as standard input
+        conn = socket.fromfd(fd, socket.AF_UNIX, socket.SOCK_STREAM)
+        os.close(fd)
+        conn.setblocking(True)
+        try:
+            netlink.serve_sockets(conn)
+        finally:
+            conn.close()
+
+    def test_dump_through_helper(self):
+        helper = netlink.get_socket_helper('sudo rootwrap')
+        links = netlink.get_links('ns', 'sudo rootwrap')
+        self.assertIn('lo', [link['name'] for link in links])
+        self.assertRaises(OSError, netlink.get_links, '../ns',
+                          'sudo rootwrap')
+        self.assertEqual(['ns'], self.served)
+
+        # Closing the connection stops the helper
+        helper._stop()
+        self.assertIsNone(helper._process)
+        self.assertFalse(helper.is_usable())
+
+
+class TestServeSockets(base.BaseTestCase):
+    def _serve(self, *namespaces):
+        conn, helper_conn = socket.socketpair(socket.AF_UNIX,
+                                              socket.SOCK_STREAM)
+        self.addCleanup(conn.close)
+        conn.sendall(''.join('%s\n' % ns for ns in namespaces))
+        conn.shutdown(socket.SHUT_WR)
+        with mock.patch.object(netlink, 'in_namespace') as in_namespace:
+            netlink.serve_sockets(helper_conn)
+        helper_conn.close()
+        return conn, in_namespace
+
+    def test_serve_socket(self):
+        conn, in_namespace = self._serve('qrouter-1')
+        self.assertEqual('0\n', conn.recv(2))
+        fd = _multiprocessing.recvfd(conn.fileno())
+        sock = socket.fromfd(fd, socket.AF_NETLINK, socket.SOCK_RAW)
+        os.close(fd)
+        sock.close()
+        in_namespace.assert_called_once_with('qrouter-1')
+
+    def test_serve_socket_invalid_namespace(self):
+        conn, in_namespace = self._serve('../../proc/1/ns/net', '')
+        self.assertEqual('%d\n%d\n' % (errno.EINVAL, errno.EINVAL),
+                         conn.recv(64))
+        self.assertFalse(in_namespace.called)
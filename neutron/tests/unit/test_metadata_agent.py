@@ -15,6 +15,7 @@
 import contextlib
 import socket
 
+import eventlet
 import mock
 import testtools
 import webob
@@ -48,6 +49,8 @@ class FakeConf(object):
     nova_metadata_insecure = True
     nova_client_cert = 'nova_cert'
     nova_client_priv_key = 'nova_priv_key'
+    nova_metadata_pool_size = 2
+    enable_port_index = False
     cache_url = ''
 
 
@@ -515,6 +518,208 @@ class TestMetadataProxyHandlerNoCache(TestMetadataProxyHandlerCache):
             2, self.qclient.return_value.list_ports.call_count)
 
 
+def _port(port_id, network_id, ip_address, device_id='vm',
+          device_owner='compute:nova'):
+    return {'id': port_id, 'network_id': network_id,
+            'device_id': device_id, 'device_owner': device_owner,
+            'tenant_id': 'tenant', 'mac_address': 'mac',
+            'fixed_ips': [{'subnet_id': 'subnet',
+                           'ip_address': ip_address}]}
+
+
+class TestPortIndex(base.BaseTestCase):
+    def setUp(self):
+        super(TestPortIndex, self).setUp()
+        self.index = agent.PortIndex()
+
+    def test_get_ports(self):
+        self.index.load([_port('p1', 'n1', '10.0.0.1'),
+                         _port('p2', 'n2', '10.0.0.1', device_id='vm2')])
+        self.assertEqual(['vm2'], [p['device_id'] for p in
+                                   self.index.get_ports(['n2', 'n3'],
+                                                        '10.0.0.1')])
+        self.assertEqual([], self.index.get_ports(['n1'], '10.0.0.2'))
+
+    def test_update_moves_address(self):
+        self.index.update(_port('p1', 'n1', '10.0.0.1'))
+        self.index.update(_port('p1', 'n1', '10.0.0.2'))
+        self.assertEqual([], self.index.get_ports(['n1'], '10.0.0.1'))
+        self.assertEqual(1, len(self.index.get_ports(['n1'], '10.0.0.2')))
+
+    def test_remove(self):
+        self.index.update(_port('p1', 'n1', '10.0.0.1'))
+        # A new port reusing the address is not removed with the old one
+        self.index.update(_port('p2', 'n1', '10.0.0.1', device_id='vm2'))
+        self.index.remove('p1')
+        self.index.remove('unknown')
+        self.assertEqual(['vm2'], [p['device_id'] for p in
+                                   self.index.get_ports(['n1'], '10.0.0.1')])
+        self.assertEqual(1, len(self.index))
+
+    def test_router_networks(self):
+        owner = constants.DEVICE_OWNER_ROUTER_INTF
+        self.index.update(_port('p1', 'n1', '10.0.0.1', 'r1', owner))
+        self.index.update(_port('p2', 'n2', '10.0.1.1', 'r1', owner))
+        self.assertEqual(set(['n1', 'n2']),
+                         set(self.index.get_router_networks('r1')))
+        self.index.remove('p1')
+        self.index.remove('p2')
+        self.assertIsNone(self.index.get_router_networks('r1'))
+
+    def test_changes_during_load_take_precedence(self):
+        self.index.begin_load()
+        self.index.update(_port('p1', 'n1', '10.0.0.2'))
+        self.index.remove('p2')
+        self.index.load([_port('p1', 'n1', '10.0.0.1'),
+                         _port('p2', 'n1', '10.0.0.3')])
+        self.assertEqual(1, len(self.index.get_ports(['n1'], '10.0.0.2')))
+        self.assertEqual([], self.index.get_ports(['n1'], '10.0.0.1'))
+        self.assertEqual([], self.index.get_ports(['n1'], '10.0.0.3'))
+
+    def test_rpc_callback(self):
+        callback = agent.PortIndexRpcCallback(self.index)
+        callback.port_update(None, port=_port('p1', 'n1', '10.0.0.1'),
+                             network_type='vxlan', segmentation_id=1,
+                             physical_network=None)
+        self.assertEqual(1, len(self.index))
+        callback.port_delete(None, port_id='p1')
+        self.assertEqual(0, len(self.index))
+
+
+class FakeConfPortIndex(FakeConf):
+    enable_port_index = True
+
+
+class TestMetadataProxyHandlerPortIndex(TestMetadataProxyHandlerBase):
+    fake_conf = FakeConfPortIndex
+
+    def setUp(self):
+        super(TestMetadataProxyHandlerPortIndex, self).setUp()
+        self.create_consumers = mock.patch.object(
+            agent.agent_rpc, 'create_consumers').start()
+        owner = constants.DEVICE_OWNER_ROUTER_INTF
+        self.handler.plugin_rpc.get_ports.return_value = [
+            _port('p1', 'n1', '10.0.0.1', 'r1', owner),
+            _port('p2', 'n1', '10.0.0.5')]
+
+    def test_get_ports_from_index(self):
+        self.handler.load_port_index()
+        ports = self.handler._get_ports('10.0.0.5', router_id='r1')
+        self.assertEqual(['p2'], [p['id'] for p in ports])
+        ports = self.handler._get_ports('10.0.0.5', network_id='n1')
+        self.assertEqual(['p2'], [p['id'] for p in ports])
+        # Only the initial load queried the server
+        self.handler.plugin_rpc.get_ports.assert_called_once_with(
+            self.handler.context, {})
+        self.assertEqual(1, self.create_consumers.call_count)
+
+    def test_get_ports_missing_from_index(self):
+        self.handler.load_port_index()
+        self.handler.plugin_rpc.get_ports.return_value = [
+            _port('p3', 'n1', '10.0.0.6')]
+        ports = self.handler._get_ports('10.0.0.6', network_id='n1')
+        self.assertEqual(['p3'], [p['id'] for p in ports])
+        self.handler.plugin_rpc.get_ports.assert_called_with(
+            self.handler.context,
+            {'network_id': ('n1',),
+             'fixed_ips': {'ip_address': ['10.0.0.6']}})
+
+    def test_get_ports_stale_router_networks(self):
+        self.handler.load_port_index()
+        owner = constants.DEVICE_OWNER_ROUTER_INTF
+        # The router got an interface on n2, which the index missed
+        server_ports = {
+            'device_id': [_port('p1', 'n1', '10.0.0.1', 'r1', owner),
+                          _port('p4', 'n2', '10.1.0.1', 'r1', owner)],
+            'fixed_ips': [_port('p3', 'n2', '10.0.0.6')]}
+
+        def get_ports(context, filters):
+            for key, ports in server_ports.items():
+                if key in filters:
+                    return ports
+
+        self.handler.plugin_rpc.get_ports.side_effect = get_ports
+        ports = self.handler._get_ports('10.0.0.6', router_id='r1')
+        self.assertEqual(['p3'], [p['id'] for p in ports])
+        self.handler.plugin_rpc.get_ports.assert_called_with(
+            self.handler.context,
+            {'network_id': ('n1', 'n2'),
+             'fixed_ips': {'ip_address': ['10.0.0.6']}})
+
+    def test_get_ports_before_index_loaded(self):
+        with mock.patch('eventlet.spawn_n') as spawn_n:
+            self.handler._get_ports('10.0.0.5', router_id='r1')
+        spawn_n.assert_called_once_with(self.handler.load_port_index)
+        self.assertFalse(self.create_consumers.called)
+        # The router networks and the ports were queried from the server
+        self.assertEqual(2, self.handler.plugin_rpc.get_ports.call_count)
+
+    def test_port_index_load_failure(self):
+        self.create_consumers.side_effect = Exception()
+        self.handler.load_port_index()
+        self.handler._get_ports('10.0.0.5', router_id='r1')
+        self.assertIsNone(self.handler._get_port_index())
+        self.assertEqual(1, self.create_consumers.call_count)
+
+    def test_port_index_per_process(self):
+        self.handler.load_port_index()
+        index = self.handler._get_port_index()
+        self.assertIsNotNone(index)
+        self.handler.load_port_index()
+        self.assertIs(index, self.handler._get_port_index())
+        with mock.patch('os.getpid', return_value=-1):
+            self.handler.load_port_index()
+            self.assertIsNot(index, self.handler._get_port_index())
+
+    def test_port_index_loaded_on_worker_start(self):
+        service = mock.Mock()
+        agent.WorkerService(service, self.handler).start()
+        service.pool.spawn_n.assert_called_once_with(
+            self.handler.load_port_index)
+
+
+class TestMetadataProxyHandlerConnectionPool(base.BaseTestCase):
+    """Sends concurrent requests to a local fake nova metadata server."""
+
+    def setUp(self):
+        super(TestMetadataProxyHandlerConnectionPool, self).setUp()
+        self.client_ports = []
+        sock = eventlet.listen(('127.0.0.1', 0))
+        self.addCleanup(sock.close)
+        server = eventlet.spawn(eventlet.wsgi.server, sock, self._nova,
+                                log=mock.Mock())
+        self.addCleanup(server.kill)
+
+        conf = FakeConf()
+        conf.nova_metadata_ip, conf.nova_metadata_port = sock.getsockname()
+        conf.nova_client_cert = ''
+        self.handler = agent.MetadataProxyHandler(conf)
+
+    def _nova(self, environ, start_response):
+        self.client_ports.append(environ['REMOTE_PORT'])
+        # Let other requests queue up on the pool
+        eventlet.sleep(0)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [environ['HTTP_X_INSTANCE_ID']]
+
+    def _request(self, instance_id):
+        req = webob.Request.blank('/latest/meta-data',
+                                  headers={'X-Forwarded-For': '10.0.0.1'})
+        req.response = webob.Response()
+        return self.handler._proxy_request(instance_id, 'tenant_id', req)
+
+    def test_connections_are_reused(self):
+        pool = eventlet.GreenPool()
+        responses = list(pool.imap(self._request,
+                                   ['vm%d' % i for i in range(50)]))
+
+        self.assertEqual(['vm%d' % i for i in range(50)],
+                         [r.body for r in responses])
+        self.assertEqual(50, len(self.client_ports))
+        self.assertEqual(FakeConf.nova_metadata_pool_size,
+                         len(set(self.client_ports)))
+
+
 class TestUnixDomainHttpProtocol(base.BaseTestCase):
     def test_init_empty_client(self):
         u = agent.UnixDomainHttpProtocol(mock.Mock(), '', mock.Mock())
@@ -12,8 +12,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 import socket
 
+import eventlet.queue
 import mock
 import testtools
 import webob
@@ -117,6 +119,16 @@ class TestNetworkMetadataProxyHandler(base.BaseTestCase):
             self.assertEqual(retval.headers['Content-Type'], 'text/plain')
             self.assertEqual(retval.body, 'content')
 
+    def test_proxy_request_reuses_http(self):
+        resp = mock.MagicMock(status=200)
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (resp, 'content')
+            for i in range(3):
+                self.handler._proxy_request('192.168.1.1', 'GET',
+                                            '/latest/meta-data', '', '')
+            mock_http.assert_called_once_with()
+            self.assertEqual(3, mock_http.return_value.request.call_count)
+
     def test_proxy_request_network_200(self):
         self.handler.network_id = 'network_id'
 
@@ -297,6 +309,7 @@ class TestProxyDaemon(base.BaseTestCase):
                     with mock.patch.object(utils, 'cfg') as utils_cfg:
                         cfg.CONF.router_id = 'router_id'
                         cfg.CONF.network_id = None
+                        cfg.CONF.routers_dir = None
                         cfg.CONF.metadata_port = 9697
                         cfg.CONF.pid_file = 'pidfile'
                         cfg.CONF.daemonize = True
@@ -318,6 +331,7 @@ class TestProxyDaemon(base.BaseTestCase):
                     with mock.patch.object(utils, 'cfg') as utils_cfg:
                         cfg.CONF.router_id = 'router_id'
                         cfg.CONF.network_id = None
+                        cfg.CONF.routers_dir = None
                         cfg.CONF.metadata_port = 9697
                         cfg.CONF.pid_file = 'pidfile'
                         cfg.CONF.daemonize = False
@@ -331,3 +345,104 @@ class TestProxyDaemon(base.BaseTestCase):
                                       network_id=None),
                             mock.call().run()]
                         )
+
+
+class TestSharedMetadataProxy(base.BaseTestCase):
+    def setUp(self):
+        super(TestSharedMetadataProxy, self).setUp()
+        self.listen = mock.patch('eventlet.listen').start()
+        self.spawn = mock.patch('eventlet.spawn').start()
+        self.in_namespace = mock.patch(
+            'neutron.agent.linux.netlink.in_namespace').start()
+        self.proxy = ns_proxy.SharedMetadataProxy(self.temp_dir, 9697)
+
+    def _set_routers(self, routers):
+        for router_id in os.listdir(self.temp_dir):
+            os.unlink(os.path.join(self.temp_dir, router_id))
+        for router_id, namespace in routers.items():
+            with open(os.path.join(self.temp_dir, router_id), 'w') as f:
+                f.write(namespace)
+
+    def test_sync(self):
+        self._set_routers({'r1': 'qrouter-r1', 'r2': 'qrouter-r2'})
+        self.proxy.sync()
+        self.assertEqual(set(['r1', 'r2']), set(self.proxy.servers))
+        self.in_namespace.assert_has_calls([mock.call('qrouter-r1')],
+                                           any_order=True)
+        self.listen.assert_called_with(('0.0.0.0', 9697))
+        handler = self.spawn.call_args[0][2]
+        self.assertIn(handler.router_id, ['r1', 'r2'])
+        self.assertIs(self.proxy.http_pool, handler.http_pool)
+
+        r1_sock, r1_thread = self.proxy.servers['r1'][1:]
+        self._set_routers({'r2': 'qrouter-r2', 'r3': ''})
+        self.listen.reset_mock()
+        self.proxy.sync()
+        self.assertEqual(set(['r2', 'r3']), set(self.proxy.servers))
+        r1_thread.kill.assert_called_once_with()
+        r1_sock.close.assert_called_once_with()
+        self.listen.assert_called_once_with(('0.0.0.0', 9697))
+
+    def test_sync_listen_failure(self):
+        self._set_routers({'r1': 'qrouter-r1'})
+        self.listen.side_effect = [RuntimeError(), mock.Mock()]
+        self.proxy.sync()
+        self.assertEqual({}, self.proxy.servers)
+        # The router is retried on the next sync
+        self.proxy.sync()
+        self.assertEqual(['r1'], list(self.proxy.servers))
+
+    def test_sync_missing_dir(self):
+        proxy = ns_proxy.SharedMetadataProxy(
+            os.path.join(self.temp_dir, 'missing'), 9697)
+        proxy.sync()
+        self.assertEqual({}, proxy.servers)
+
+    def test_sync_skips_files_being_written(self):
+        self._set_routers({'r1': 'qrouter-r1', 'tmpabc123': ''})
+        self.proxy.sync()
+        self.assertEqual(['r1'], list(self.proxy.servers))
+
+    def _run(self, polls):
+        # Stops the proxy once it was idle for polls intervals
+        get = mock.patch.object(self.proxy._reload_requests, 'get').start()
+        get.side_effect = [eventlet.queue.Empty()] * polls + [Exception()]
+        with mock.patch.object(self.proxy, 'sync',
+                               wraps=self.proxy.sync) as sync:
+            self.assertRaises(Exception, self.proxy.run)
+        get.assert_called_with(timeout=ns_proxy.ROUTERS_POLL_INTERVAL)
+        return sync.call_count
+
+    def test_run_syncs_when_routers_change(self):
+        with mock.patch.object(self.proxy, '_get_routers_dir_mtime',
+                               side_effect=[1.0, 1.0, 2.0, 2.0]):
+            # The routers are synced at start and when the mtime changed
+            self.assertEqual(2, self._run(polls=2))
+
+    def test_run_idle(self):
+        with mock.patch.object(self.proxy, '_get_routers_dir_mtime',
+                               return_value=1.0):
+            self.assertEqual(1, self._run(polls=3))
+
+    def test_routers_dir_mtime(self):
+        mtime = self.proxy._get_routers_dir_mtime()
+        self.assertEqual(os.stat(self.temp_dir).st_mtime, mtime)
+        proxy = ns_proxy.SharedMetadataProxy(
+            os.path.join(self.temp_dir, 'missing'), 9697)
+        self.assertIsNone(proxy._get_routers_dir_mtime())
+
+    def test_main_shared(self):
+        with mock.patch.object(ns_proxy, 'SharedProxyDaemon') as daemon:
+            with mock.patch.object(ns_proxy, 'config'):
+                with mock.patch.object(ns_proxy, 'cfg') as cfg:
+                    with mock.patch.object(utils, 'cfg'):
+                        cfg.CONF.routers_dir = '/routers'
+                        cfg.CONF.metadata_port = 9697
+                        cfg.CONF.pid_file = 'pidfile'
+                        cfg.CONF.daemonize = False
+                        ns_proxy.main()
+
+                        daemon.assert_has_calls([
+                            mock.call('pidfile', 9697, '/routers'),
+                            mock.call().run()]
+                        )
@@ -611,3 +611,142 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             policy.log_rule_list(common_policy.RuleCheck('rule', 'create_'))
             self.assertTrue(is_e.called)
             self.assertTrue(dbg.called)
+
+    def test_checker_memoizes_by_owner(self):
+        user_context = context.Context('', "user", roles=['user'])
+        checker = policy.Checker(user_context, 'get_port')
+        self.assertEqual(['tenant_id'], checker.fields)
+        with mock.patch.object(policy._ENFORCER, 'enforce',
+                               wraps=policy._ENFORCER.enforce) as enforce:
+            self.assertTrue(checker({'id': 'a', 'tenant_id': 'user'}))
+            self.assertTrue(checker({'id': 'b', 'tenant_id': 'user'}))
+            self.assertFalse(checker({'id': 'c', 'tenant_id': 'other'}))
+            self.assertFalse(checker({'id': 'd', 'tenant_id': 'other'}))
+        self.assertEqual(2, enforce.call_count)
+
+    def test_checker_matches_check(self):
+        user_context = context.Context('', "user", roles=['user'])
+        checker = policy.Checker(user_context, 'get_network')
+        self.assertEqual(['router:external', 'shared', 'tenant_id'],
+                         checker.fields)
+        for target in ({'tenant_id': 'user', 'shared': False},
+                       {'tenant_id': 'other', 'shared': False},
+                       {'tenant_id': 'other', 'shared': True},
+                       {'tenant_id': 'other', 'router:external': True}):
+            self.assertEqual(policy.check(user_context, 'get_network',
+                                          target),
+                             checker(target))
+
+    def test_checker_unknown_check_is_not_memoized(self):
+        self.rules['get_port'] = common_policy.HttpCheck('http', '//fake')
+        checker = policy.Checker(self.context, 'get_port')
+        self.assertIsNone(checker.fields)
+        with mock.patch.object(policy._ENFORCER, 'enforce',
+                               return_value=True) as enforce:
+            checker({'tenant_id': 'fake'})
+            checker({'tenant_id': 'fake'})
+        self.assertEqual(2, enforce.call_count)
+
+    def test_checker_might_not_exist(self):
+        checker = policy.Checker(self.context, 'get_network:foo',
+                                 might_not_exist=True)
+        with mock.patch.object(policy._ENFORCER, 'enforce') as enforce:
+            self.assertTrue(checker({'tenant_id': 'other'}))
+        self.assertFalse(enforce.called)
+
+    def test_checker_computes_credentials_once(self):
+        with mock.patch.object(self.context, 'to_dict',
+                               wraps=self.context.to_dict) as to_dict:
+            checker = policy.Checker(self.context, 'get_port')
+            checker({'tenant_id': 'fake'})
+            checker({'tenant_id': 'other'})
+        to_dict.assert_called_once_with()
+
+    def _test_checker_parent_resource(self, prefetch):
+        self.rules['get_port'] = common_policy.parse_rule(
+            "rule:admin_or_network_owner")
+        user_context = context.Context('', "user", roles=['user'])
+        plugin = manager.NeutronManager.get_instance().plugin
+        networks = [{'id': 'net1', 'tenant_id': 'user'},
+                    {'id': 'net2', 'tenant_id': 'other'}]
+        ports = [{'id': 'p%d' % i, 'network_id': 'net%d' % (i % 2 + 1),
+                  'tenant_id': 'other%d' % i} for i in range(4)]
+        with contextlib.nested(
+            mock.patch.object(plugin, 'get_network',
+                              side_effect=lambda c, id, fields: [
+                                  n for n in networks if n['id'] == id][0]),
+            mock.patch.object(plugin, 'get_networks', return_value=networks)
+        ) as (get_network, get_networks):
+            checker = policy.Checker(user_context, 'get_port')
+            if prefetch:
+                checker.prefetch(ports)
+            self.assertEqual([True, False, True, False],
+                             [checker(port) for port in ports])
+        return checker, get_network, get_networks
+
+    def test_checker_prefetches_parent_resources(self):
+        checker, get_network, get_networks = (
+            self._test_checker_parent_resource(prefetch=True))
+        self.assertFalse(get_network.called)
+        get_networks.assert_called_once_with(
+            mock.ANY, filters={'id': mock.ANY}, fields=['id', 'tenant_id'])
+        self.assertEqual(set(['net1', 'net2']),
+                         set(get_networks.call_args[1]['filters']['id']))
+
+    def _prefetch_networks(self, user_context, ports):
+        plugin = manager.NeutronManager.get_instance().plugin
+        with mock.patch.object(plugin, 'get_networks',
+                               return_value=[]) as get_networks:
+            checker = policy.Checker(user_context, 'get_port')
+            checker.prefetch(ports)
+        return get_networks
+
+    def test_checker_prefetch_skips_admin(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            "rule:admin_or_network_owner")
+        admin_context = context.Context('', "admin", roles=['admin'])
+        ports = [{'id': 'p1', 'network_id': 'net1', 'tenant_id': 'other'}]
+        get_networks = self._prefetch_networks(admin_context, ports)
+        self.assertFalse(get_networks.called)
+
+    def test_checker_prefetch_skips_owned_targets(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            "rule:admin_or_owner or rule:admin_or_network_owner")
+        user_context = context.Context('', "user", roles=['user'])
+        ports = [{'id': 'p1', 'network_id': 'net1', 'tenant_id': 'user'},
+                 {'id': 'p2', 'network_id': 'net2', 'tenant_id': 'other'}]
+        get_networks = self._prefetch_networks(user_context, ports)
+        get_networks.assert_called_once_with(
+            mock.ANY, filters={'id': ['net2']}, fields=['id', 'tenant_id'])
+
+    def test_checker_prefetch_negated_parent_check(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            "rule:admin_or_owner or not tenant_id:%(network:tenant_id)s")
+        user_context = context.Context('', "user", roles=['user'])
+        ports = [{'id': 'p1', 'network_id': 'net1', 'tenant_id': 'user'}]
+        get_networks = self._prefetch_networks(user_context, ports)
+        get_networks.assert_called_once_with(
+            mock.ANY, filters={'id': ['net1']}, fields=['id', 'tenant_id'])
+
+    def test_checker_prefetch_in_chunks(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            "rule:admin_or_network_owner")
+        user_context = context.Context('', "user", roles=['user'])
+        ports = [{'id': 'p%d' % i, 'network_id': 'net%d' % i,
+                  'tenant_id': 'other'} for i in range(3)]
+        with mock.patch.object(policy, 'PREFETCH_CHUNK_SIZE', new=2):
+            get_networks = self._prefetch_networks(user_context, ports)
+        self.assertEqual(
+            [mock.call(mock.ANY, filters={'id': ['net0', 'net1']},
+                       fields=['id', 'tenant_id']),
+             mock.call(mock.ANY, filters={'id': ['net2']},
+                       fields=['id', 'tenant_id'])],
+            get_networks.call_args_list)
+
+    def test_checker_caches_parent_resources(self):
+        checker, get_network, get_networks = (
+            self._test_checker_parent_resource(prefetch=False))
+        self.assertFalse(get_networks.called)
+        self.assertEqual(2, get_network.call_count)
+        self.assertEqual({'id': 'net1', 'tenant_id': 'user'},
+                         checker.parent_cache[('network', 'net1')])
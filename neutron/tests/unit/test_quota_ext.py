@@ -27,10 +27,13 @@ from neutron.common import config
 from neutron.common import constants
 from neutron.common import exceptions
 from neutron import context
+from neutron.db import models_v2
 from neutron.db import quota_db
+from neutron import manager
 from neutron import quota
 from neutron.tests import base
 from neutron.tests.unit import test_api_v2
+from neutron.tests.unit import test_db_plugin
 from neutron.tests.unit import testlib_api
 from neutron.tests.unit import testlib_plugin
 
@@ -429,3 +432,103 @@ class TestQuotaDriverLoad(base.BaseTestCase):
     def test_quota_conf_driver(self):
         self._test_quota_driver('neutron.quota.ConfDriver',
                                 'ConfDriver', True)
+
+
+class TestUsageTrackingQuotaDriver(test_db_plugin.NeutronDbPluginV2TestCase):
+    """Test for neutron.db.quota_db.UsageTrackingQuotaDriver."""
+
+    def setUp(self):
+        cfg.CONF.set_override('quota_driver', quota.QUOTA_TRACKING_DRIVER,
+                              group='QUOTAS')
+        super(TestUsageTrackingQuotaDriver, self).setUp()
+        quota.QUOTAS._driver = None
+        self.addCleanup(setattr, quota.QUOTAS, '_driver', None)
+        self.driver = quota.QUOTAS.get_driver()
+        self.ctx = context.get_admin_context()
+
+    def _get_usage(self, resource):
+        usage = self.ctx.session.query(quota_db.QuotaUsage).filter_by(
+            tenant_id=self._tenant_id, resource=resource).first()
+        return usage and (usage.in_use, usage.dirty)
+
+    def _reserve(self, networks):
+        return quota.QUOTAS.make_reservation(
+            self.ctx, self._tenant_id, {'network': networks})
+
+    def test_driver_loaded(self):
+        self.assertIsInstance(self.driver, quota_db.UsageTrackingQuotaDriver)
+
+    def test_usage_follows_creates_and_deletes(self):
+        self.assertIsNone(self._get_usage('network'))
+        net1 = self._make_network(self.fmt, 'net1', True)
+        self.assertEqual((1, False), self._get_usage('network'))
+        self._make_network(self.fmt, 'net2', True)
+        self.assertEqual((2, False), self._get_usage('network'))
+        self._delete('networks', net1['network']['id'])
+        self.assertEqual((1, False), self._get_usage('network'))
+
+    def test_usage_after_bulk_delete(self):
+        with self.port() as port:
+            self.assertEqual(1, self._get_usage('port')[0])
+            self.ctx.session.query(models_v2.Port).filter_by(
+                id=port['port']['id']).delete(synchronize_session=False)
+            self.assertEqual((1, True), self._get_usage('port'))
+            reservation = quota.QUOTAS.make_reservation(
+                self.ctx, self._tenant_id, {'port': 1})
+            quota.QUOTAS.cancel_reservation(self.ctx, reservation)
+            self.assertEqual((0, False), self._get_usage('port'))
+
+    def test_cascaded_delete_marks_usages_of_tenant_dirty(self):
+        # Pretend the ports of a network are deleted by the database
+        tables = ({'networks': 'network', 'ports': 'port'},
+                  {'networks': set(['port'])})
+        net = self._make_network(self.fmt, 'net1', True)
+        with self.ctx.session.begin():
+            for tenant_id in (self._tenant_id, 'other'):
+                self.ctx.session.add(quota_db.QuotaUsage(
+                    tenant_id=tenant_id, resource='port', in_use=1,
+                    dirty=False))
+        with mock.patch.object(quota_db, 'get_tracked_tables',
+                               return_value=tables):
+            self._delete('networks', net['network']['id'])
+        self.assertEqual((1, True), self._get_usage('port'))
+        other = self.ctx.session.query(quota_db.QuotaUsage).filter_by(
+            tenant_id='other', resource='port').one()
+        self.assertFalse(other.dirty)
+
+    def test_create_does_not_count_resources(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with mock.patch.object(plugin, 'get_networks_count') as count:
+            self._make_network(self.fmt, 'net1', True)
+            res = self._create_network_bulk(self.fmt, 2, 'net', True)
+        self.assertEqual(exc.HTTPCreated.code, res.status_int)
+        self.assertFalse(count.called)
+        self.assertEqual((3, False), self._get_usage('network'))
+
+    def test_bulk_create_over_quota(self):
+        cfg.CONF.set_override('quota_network', 2, group='QUOTAS')
+        self._make_network(self.fmt, 'net1', True)
+        res = self._create_network_bulk(self.fmt, 2, 'net', True)
+        self.assertEqual(exc.HTTPConflict.code, res.status_int)
+        res = self._create_network_bulk(self.fmt, 1, 'net', True)
+        self.assertEqual(exc.HTTPCreated.code, res.status_int)
+        self.assertEqual((2, False), self._get_usage('network'))
+        self.assertEqual(
+            [], self.ctx.session.query(quota_db.Reservation).all())
+
+    def test_reservations_count_until_released(self):
+        cfg.CONF.set_override('quota_network', 3, group='QUOTAS')
+        reservation = self._reserve(2)
+        self.assertRaises(exceptions.OverQuota, self._reserve, 2)
+        quota.QUOTAS.cancel_reservation(self.ctx, reservation)
+        reservation = self._reserve(2)
+        quota.QUOTAS.commit_reservation(self.ctx, reservation)
+        self._reserve(3)
+
+    def test_expired_reservations_are_ignored(self):
+        cfg.CONF.set_override('quota_network', 3, group='QUOTAS')
+        cfg.CONF.set_override('reservation_expiration', -1, group='QUOTAS')
+        self._reserve(2)
+        self._reserve(2)
+        self.assertEqual(
+            1, self.ctx.session.query(quota_db.Reservation).count())
@@ -15,6 +15,9 @@
 
 import datetime
 
+import eventlet
+import mock
+
 from neutron.agent.l3 import router_processing_queue as l3_queue
 from neutron.openstack.common import uuidutils
 from neutron.tests import base
@@ -100,3 +103,85 @@ class TestExclusiveRouterProcessor(base.BaseTestCase):
             raise Exception("Only the master should process a router")
 
         self.assertEqual(2, len([i for i in master.updates()]))
+
+
+class TestRouterProcessingQueue(base.BaseTestCase):
+    def setUp(self):
+        super(TestRouterProcessingQueue, self).setUp()
+        self.time = mock.patch('time.time', return_value=1000.0).start()
+        self.queue = l3_queue.RouterProcessingQueue(aging_interval=60)
+
+    def _add(self, router_id, priority):
+        update = l3_queue.RouterUpdate(router_id, priority)
+        self.queue.add(update)
+        return update
+
+    def _next(self):
+        return self.queue._queue.get_nowait()
+
+    def test_rpc_lane_preferred_over_sync_backlog(self):
+        for i in range(3):
+            self._add('sync-%d' % i, l3_queue.PRIORITY_SYNC_ROUTERS_TASK)
+        self.time.return_value = 1010.0
+        rpc = self._add('rpc', l3_queue.PRIORITY_RPC)
+
+        self.assertEqual(rpc, self._next())
+        self.assertEqual('sync-0', self._next().id)
+
+    def test_aged_sync_update_is_not_starved(self):
+        sync = self._add('sync', l3_queue.PRIORITY_SYNC_ROUTERS_TASK)
+        self.time.return_value = 1061.0
+        self._add('rpc', l3_queue.PRIORITY_RPC)
+
+        self.assertEqual(sync, self._next())
+        self.assertEqual('rpc', self._next().id)
+
+    def test_depths_and_wait_time(self):
+        update = self._add('rpc', l3_queue.PRIORITY_RPC)
+        self._add('sync', l3_queue.PRIORITY_SYNC_ROUTERS_TASK)
+        self.assertEqual(2, self.queue.qsize())
+        self.assertEqual({l3_queue.PRIORITY_RPC: 1,
+                          l3_queue.PRIORITY_SYNC_ROUTERS_TASK: 1},
+                         self.queue.depths())
+        self.assertIsNone(update.wait_time)
+
+        self.time.return_value = 1002.5
+        self.assertEqual(update, self._next())
+        self.assertEqual(2.5, update.wait_time)
+        self.assertEqual({l3_queue.PRIORITY_RPC: 0,
+                          l3_queue.PRIORITY_SYNC_ROUTERS_TASK: 1},
+                         self.queue.depths())
+
+
+class TestRouterProcessingQueueMonkeyPatched(base.BaseTestCase):
+    def setUp(self):
+        super(TestRouterProcessingQueueMonkeyPatched, self).setUp()
+        # The L3 agent monkey patches the standard library when imported
+        eventlet.monkey_patch()
+        self.queue = l3_queue.RouterProcessingQueue()
+
+    def _process(self):
+        return [update.id
+                for rp, update in self.queue.each_update_to_next_router()]
+
+    def test_worker_waits_for_update(self):
+        router_id = _uuid()
+        worker = eventlet.spawn(self._process)
+        eventlet.sleep(0)
+        self.assertEqual(0, self.queue.qsize())
+
+        self.queue.add(l3_queue.RouterUpdate(router_id,
+                                             l3_queue.PRIORITY_RPC))
+        self.assertEqual([router_id], worker.wait())
+        self.assertEqual({l3_queue.PRIORITY_RPC: 0}, self.queue.depths())
+
+    def test_updates_served_by_priority(self):
+        sync_id, rpc_id = _uuid(), _uuid()
+        self.queue.add(l3_queue.RouterUpdate(
+            sync_id, l3_queue.PRIORITY_SYNC_ROUTERS_TASK))
+        self.queue.add(l3_queue.RouterUpdate(rpc_id, l3_queue.PRIORITY_RPC))
+        self.assertEqual(2, self.queue.qsize())
+
+        self.assertEqual([rpc_id], self._process())
+        self.assertEqual([sync_id], self._process())
+        self.assertEqual(0, self.queue.qsize())
@@ -19,6 +19,7 @@ import urllib2
 
 import mock
 from oslo.config import cfg
+from oslo.serialization import jsonutils
 import testtools
 import webob
 import webob.exc
@@ -456,6 +457,86 @@ class JSONDictSerializerTest(base.BaseTestCase):
 
         self.assertEqual(result, expected_json)
 
+    def test_serialize_iter(self):
+        input_dict = {'servers': ({'id': i} for i in range(3)),
+                      'servers_links': [{'rel': 'next'}]}
+        serializer = wsgi.JSONDictSerializer()
+        serializer.chunk_items = 2
+        chunks = list(serializer.serialize_iter(input_dict))
+
+        self.assertEqual(3, len(chunks))
+        self.assertEqual({'servers': [{'id': 0}, {'id': 1}, {'id': 2}],
+                          'servers_links': [{'rel': 'next'}]},
+                         jsonutils.loads(''.join(chunks)))
+
+    def test_serialize_iter_empty_generator(self):
+        serializer = wsgi.JSONDictSerializer()
+        result = ''.join(serializer.serialize_iter(
+            {'servers': (s for s in [])}))
+
+        self.assertEqual({'servers': []}, jsonutils.loads(result))
+
+
+class JSONLibraryTest(base.BaseTestCase):
+
+    def setUp(self):
+        super(JSONLibraryTest, self).setUp()
+        libraries_patcher = mock.patch.dict(wsgi._json_libraries)
+        libraries_patcher.start()
+        self.addCleanup(libraries_patcher.stop)
+        self.library = mock.Mock()
+        self.try_import = mock.patch.object(
+            wsgi.importutils, 'try_import', return_value=self.library).start()
+
+    def test_default_library(self):
+        self.assertEqual(jsonutils, wsgi.get_json_library())
+        self.assertFalse(self.try_import.called)
+
+    def test_configured_library(self):
+        cfg.CONF.set_override('json_library', 'fastjson')
+        self.library.dumps.return_value = '{}'
+        self.library.loads.return_value = {}
+
+        self.assertEqual('{}', wsgi.JSONDictSerializer().serialize({}))
+        self.assertEqual({'body': {}},
+                         wsgi.JSONDeserializer().deserialize('{}'))
+        # The library was tried once when imported
+        self.assertEqual([mock.call({}, default=wsgi._sanitizer)] * 2,
+                         self.library.dumps.call_args_list)
+        self.assertEqual([mock.call('{}')] * 2,
+                         self.library.loads.call_args_list)
+        self.try_import.assert_called_once_with('fastjson')
+
+    def test_missing_library(self):
+        cfg.CONF.set_override('json_library', 'fastjson')
+        self.try_import.return_value = None
+        with mock.patch.object(wsgi.LOG, 'warning') as warning:
+            self.assertEqual(jsonutils, wsgi.get_json_library())
+            self.assertEqual(jsonutils, wsgi.get_json_library())
+        warning.assert_called_once_with(mock.ANY, 'fastjson')
+
+    def _test_unusable_library(self):
+        cfg.CONF.set_override('json_library', 'fastjson')
+        with mock.patch.object(wsgi.LOG, 'warning') as warning:
+            self.assertEqual(jsonutils, wsgi.get_json_library())
+            self.assertEqual(jsonutils, wsgi.get_json_library())
+        warning.assert_called_once_with(mock.ANY, 'fastjson')
+        self.try_import.assert_called_once_with('fastjson')
+
+    def test_library_without_default_argument(self):
+        self.library.dumps.side_effect = TypeError()
+        self._test_unusable_library()
+
+    def test_library_without_loads(self):
+        self.library = object()
+        self.try_import.return_value = self.library
+        self._test_unusable_library()
+
+    def test_library_decoding_wrongly(self):
+        self.library.dumps.return_value = '{}'
+        self.library.loads.return_value = []
+        self._test_unusable_library()
+
 
 class TextDeserializerTest(base.BaseTestCase):
 
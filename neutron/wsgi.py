@@ -19,11 +19,13 @@ Utility methods for working with WSGI servers
 from __future__ import print_function
 
 import errno
+import itertools
 import os
 import socket
 import ssl
 import sys
 import time
+import types
 
 import eventlet.wsgi
 eventlet.patcher.monkey_patch(all=False, socket=True, thread=True)
@@ -31,6 +33,7 @@ from oslo.config import cfg
 from oslo import i18n
 from oslo.serialization import jsonutils
 from oslo.utils import excutils
+from oslo.utils import importutils
 import routes.middleware
 import webob.dec
 import webob.exc
@@ -38,7 +41,7 @@ import webob.exc
 from neutron.common import exceptions as exception
 from neutron import context
 from neutron.db import api
-from neutron.i18n import _LE, _LI
+from neutron.i18n import _LE, _LI, _LW
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import service as common_service
 from neutron.openstack.common import systemd
@@ -72,8 +75,20 @@ socket_opts = [
                       "the server securely")),
 ]
 
+json_opts = [
+    cfg.StrOpt('json_library',
+               default='json',
+               help=_("Module used to serialize API responses and to parse "
+                      "JSON request bodies, for instance simplejson. It "
+                      "must provide the dumps and loads functions of the "
+                      "json module, with the default argument of dumps. "
+                      "json is used if the module cannot be imported or "
+                      "does not provide them.")),
+]
+
 CONF = cfg.CONF
 CONF.register_opts(socket_opts)
+CONF.register_opts(json_opts)
 
 LOG = logging.getLogger(__name__)
 
@@ -373,23 +388,107 @@ class ActionDispatcher(object):
         raise NotImplementedError()
 
 
+def is_streamed(data):
+    """Returns True if some values of a response dict are generators."""
+    return isinstance(data, dict) and any(
+        isinstance(value, types.GeneratorType) for value in data.values())
+
+
 class DictSerializer(ActionDispatcher):
     """Default request body serialization."""
 
     def serialize(self, data, action='default'):
         return self.dispatch(data, action=action)
 
+    def serialize_iter(self, data, action='default'):
+        """Serialize a dict whose values may be generators into chunks.
+
+        The generators are consumed into lists and the dict is serialized
+        at once; subclasses may send it in smaller pieces.
+        """
+        data = dict((key, list(value)
+                     if isinstance(value, types.GeneratorType) else value)
+                    for key, value in data.iteritems())
+        yield self.serialize(data, action)
+
     def default(self, data):
         return ""
 
 
+_json_libraries = {'json': jsonutils}
+
+
+def _sanitizer(obj):
+    return unicode(obj)
+
+
+def _is_json_library_usable(library):
+    """Tries the functions of a JSON library the way they are used."""
+    try:
+        return library.loads(library.dumps({}, default=_sanitizer)) == {}
+    except Exception:
+        return False
+
+
+def get_json_library():
+    """Returns the module configured to encode and decode JSON.
+
+    The module is imported and tried once, json is used instead if it
+    cannot be imported or does not work like json.
+    """
+    name = CONF.json_library
+    try:
+        return _json_libraries[name]
+    except KeyError:
+        library = importutils.try_import(name)
+        if library is None:
+            LOG.warning(_LW("Unable to import JSON library %s, using json "
+                            "instead"), name)
+            library = jsonutils
+        elif not _is_json_library_usable(library):
+            LOG.warning(_LW("JSON library %s does not provide the dumps and "
+                            "loads functions of json, using json instead"),
+                        name)
+            library = jsonutils
+        _json_libraries[name] = library
+        return library
+
+
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
+    # Number of the items of a collection serialized in a chunk
+    chunk_items = 100
+
     def default(self, data):
-        def sanitizer(obj):
-            return unicode(obj)
-        return jsonutils.dumps(data, default=sanitizer)
+        return get_json_library().dumps(data, default=_sanitizer)
+
+    def serialize_iter(self, data, action='default'):
+        """Serialize a dict whose values may be generators into chunks.
+
+        The elements produced by the generators are serialized a few at a
+        time, so that neither the whole list nor the whole document is
+        held in memory.
+        """
+        chunk = '{'
+        for i, (key, value) in enumerate(data.iteritems()):
+            prefix = ', ' if i else ''
+            if not isinstance(value, types.GeneratorType):
+                chunk += '%s%s: %s' % (prefix, self.default(key),
+                                       self.default(value))
+                continue
+            chunk += '%s%s: [' % (prefix, self.default(key))
+            separator = ''
+            while True:
+                items = list(itertools.islice(value, self.chunk_items))
+                if not items:
+                    break
+                # Serializing a list is much faster than each of its items
+                yield chunk + separator + self.default(items)[1:-1]
+                chunk = ''
+                separator = ', '
+            chunk += ']'
+        yield chunk + '}'
 
 
 class ResponseHeaderSerializer(ActionDispatcher):
@@ -456,7 +555,7 @@ class JSONDeserializer(TextDeserializer):
 
     def _from_json(self, datastring):
         try:
-            return jsonutils.loads(datastring)
+            return get_json_library().loads(datastring)
         except ValueError:
             msg = _("Cannot understand JSON")
             raise exception.MalformedRequestBody(reason=msg)
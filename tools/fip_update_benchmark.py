@@ -0,0 +1,142 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the time to apply one floating IP change to a router.
+
+Usage: fip_update_benchmark.py [namespace]
+
+Routers with COUNTS floating IPs get one floating IP added and one removed,
+and the NAT rules of the router are processed and applied like the L3 agent
+does, in three modes:
+
+  rebuild      all floating IP rules are cleared and added again, and the
+               tables are saved and restored
+  reconcile    only the rules of the changed floating IPs are touched, and
+               the tables are saved and restored
+  incremental  only the rules of the changed floating IPs are touched, and
+               only the chains holding them are restored
+
+With a namespace, which requires running as root, the rules are applied to
+it with iptables.  Otherwise iptables is faked: the times only include the
+work of the agent and the iptables commands are counted with the size of
+their input.
+"""
+
+from __future__ import print_function
+
+import shutil
+import sys
+import tempfile
+import timeit
+
+from oslo.config import cfg
+
+from neutron.agent.l3 import agent as l3_agent
+from neutron.agent.l3 import router_info
+from neutron.agent.linux import utils
+from neutron.common import constants
+
+COUNTS = (10, 100, 500, 1000, 2000)
+MODES = ('rebuild', 'reconcile', 'incremental')
+REPEAT = 5
+
+
+class FakeIptables(object):
+    """Keeps the last restored tables and counts the commands run."""
+
+    def __init__(self):
+        self.tables = ''
+        self.commands = 0
+        self.input_size = 0
+
+    def execute(self, cmd, process_input=None, root_helper=None):
+        self.commands += 1
+        self.input_size += len(process_input or '')
+        if cmd[-2].endswith('-save'):
+            return self.tables
+        if cmd[-1] == '-c':
+            self.tables = process_input
+        return ''
+
+
+def floating_ip(i):
+    return {'id': 'fip-%d' % i,
+            'floating_ip_address': '172.24.%d.%d' % (i >> 8, i & 0xff),
+            'fixed_ip_address': '10.0.%d.%d' % (i >> 8, i & 0xff),
+            'host': None}
+
+
+def make_router(count, mode, namespace):
+    ri = router_info.RouterInfo('router', None,
+                                {'distributed': False,
+                                 constants.FLOATINGIP_KEY: [
+                                     floating_ip(i) for i in range(count)]},
+                                ns_name=namespace)
+    ri.iptables_manager.incremental_apply = mode == 'incremental'
+    fake = None
+    if not namespace:
+        fake = FakeIptables()
+        ri.iptables_manager.execute = fake.execute
+    return ri, fake
+
+
+def update(agent, ri, mode, i):
+    fips = ri.router[constants.FLOATINGIP_KEY]
+    fips.pop(0)
+    fips.append(floating_ip(i))
+    if mode == 'rebuild':
+        ri.floating_ip_nat_map = None
+    agent.process_router_floating_ip_nat_rules(ri)
+
+
+def main(argv):
+    namespace = argv[1] if len(argv) > 1 else None
+    lock_path = tempfile.mkdtemp()
+    cfg.CONF.set_override('lock_path', lock_path)
+    try:
+        run(namespace)
+    finally:
+        shutil.rmtree(lock_path)
+
+
+def run(namespace):
+    # Only the floating IP rule methods are used, they need no agent state
+    agent = l3_agent.L3NATAgent.__new__(l3_agent.L3NATAgent)
+    for count in COUNTS:
+        print('%d floating IPs' % count)
+        for mode in MODES:
+            ri, fake = make_router(count, mode, namespace)
+            agent.process_router_floating_ip_nat_rules(ri)
+            updates = iter(range(count, count + REPEAT))
+            if fake:
+                fake.commands = fake.input_size = 0
+            best = min(timeit.repeat(
+                lambda: update(agent, ri, mode, next(updates)),
+                number=1, repeat=REPEAT))
+            if fake:
+                print('  %-12s %8.2f ms %4d commands %10d bytes' %
+                      (mode, best * 1000, fake.commands / REPEAT,
+                       fake.input_size / REPEAT))
+            else:
+                print('  %-12s %8.2f ms' % (mode, best * 1000))
+        if namespace:
+            # Remove the rules and chains added to the namespace
+            for table in ('filter', 'nat', 'raw'):
+                for option in ('-F', '-X'):
+                    utils.execute(['ip', 'netns', 'exec', namespace,
+                                   'iptables', '-t', table, option])
+
+
+if __name__ == '__main__':
+    main(sys.argv)
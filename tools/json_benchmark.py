@@ -0,0 +1,102 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the JSON libraries usable as json_library.
+
+Usage: json_benchmark.py [library ...]
+
+Port and network lists shaped like API responses are serialized, streamed
+and parsed with each library, which defaults to json and simplejson.
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+import uuid
+
+from oslo.config import cfg
+
+from neutron import wsgi
+
+COUNT = 5000
+REPEAT = 3
+
+
+def make_ports(count):
+    network_id = str(uuid.uuid4())
+    subnet_id = str(uuid.uuid4())
+    return [{'id': str(uuid.uuid4()),
+             'name': 'port-%d' % i,
+             'network_id': network_id,
+             'tenant_id': 'a7d2d1ab5b6a4bbcbc4f4f3a47d3c6b1',
+             'mac_address': 'fa:16:3e:%02x:%02x:%02x' % (
+                 i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff),
+             'admin_state_up': True,
+             'status': 'ACTIVE',
+             'device_id': str(uuid.uuid4()),
+             'device_owner': 'compute:nova',
+             'fixed_ips': [{'subnet_id': subnet_id,
+                            'ip_address': '10.%d.%d.%d' % (
+                                i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff)}],
+             'security_groups': [str(uuid.uuid4())],
+             'binding:vif_type': 'ovs',
+             'binding:vif_details': {'port_filter': True,
+                                     'ovs_hybrid_plug': True}}
+            for i in range(count)]
+
+
+def make_networks(count):
+    return [{'id': str(uuid.uuid4()),
+             'name': 'net-%d' % i,
+             'tenant_id': 'a7d2d1ab5b6a4bbcbc4f4f3a47d3c6b1',
+             'admin_state_up': True,
+             'status': 'ACTIVE',
+             'shared': False,
+             'subnets': [str(uuid.uuid4())],
+             'router:external': False,
+             'provider:network_type': 'vxlan',
+             'provider:physical_network': None,
+             'provider:segmentation_id': i}
+            for i in range(count)]
+
+
+def run(name, func):
+    best = min(timeit.repeat(func, number=1, repeat=REPEAT))
+    print('  %-24s %8.1f ms %10.0f items/s' %
+          (name, best * 1000, COUNT / best))
+
+
+def main(argv):
+    libraries = argv[1:] or ['json', 'simplejson']
+    payloads = {'ports': make_ports(COUNT), 'networks': make_networks(COUNT)}
+    serializer = wsgi.JSONDictSerializer()
+    deserializer = wsgi.JSONDeserializer()
+    for library in libraries:
+        cfg.CONF.set_override('json_library', library)
+        print('%s (%s)' % (library, wsgi.get_json_library().__name__))
+        for collection, items in sorted(payloads.items()):
+            data = {collection: items}
+            body = serializer.serialize(data)
+            run('serialize %s' % collection,
+                lambda: serializer.serialize(data))
+            run('stream %s' % collection,
+                lambda: ''.join(serializer.serialize_iter(
+                    {collection: (item for item in items)})))
+            run('parse %s' % collection,
+                lambda: deserializer.deserialize(body))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,226 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the per_router and shared metadata proxy modes of the L3 agent.
+
+Usage: metadata_proxy_benchmark.py [routers ...]
+
+This requires running as root.  A network namespace is created for each
+router, and the metadata of the routers is served like the L3 agent does,
+by one proxy per router or by one shared proxy, in front of a fake metadata
+agent.  For each mode this reports:
+
+  memory    the resident memory of the proxy processes
+  start     the time until all the routers answer metadata requests
+  add       the time until one more router answers metadata requests
+  request   the median time of a metadata request
+"""
+
+from __future__ import print_function
+
+import BaseHTTPServer
+import httplib
+import os
+import shutil
+import socket
+import SocketServer
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from neutron.agent.linux import netlink
+from neutron.agent.linux import utils
+
+COUNTS = (10, 25, 50)
+MODES = ('per_router', 'shared')
+PORT = 9697
+REQUESTS = 500
+TIMEOUT = 60
+PROXY = ('from neutron.agent.metadata import namespace_proxy; '
+         'namespace_proxy.main()')
+
+
+class MetadataAgentHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = self.headers.get('X-Neutron-Router-ID', '')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetadataAgent(SocketServer.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def namespace_name(i):
+    return 'mdbench-%d' % i
+
+
+def create_namespace(i):
+    namespace = namespace_name(i)
+    utils.execute(['ip', 'netns', 'add', namespace])
+    utils.execute(['ip', 'netns', 'exec', namespace,
+                   'ip', 'link', 'set', 'lo', 'up'])
+
+
+def delete_namespace(i):
+    utils.execute(['ip', 'netns', 'delete', namespace_name(i)])
+
+
+def request(i):
+    """Returns the router id served in the namespace of router i."""
+    with netlink.in_namespace(namespace_name(i)):
+        sock = socket.create_connection(('127.0.0.1', PORT))
+    conn = httplib.HTTPConnection('127.0.0.1', PORT)
+    conn.sock = sock
+    try:
+        conn.request('GET', '/latest/meta-data/')
+        return conn.getresponse().read()
+    finally:
+        conn.close()
+
+
+def wait_served(routers):
+    start = time.time()
+    pending = list(routers)
+    while pending:
+        if time.time() - start > TIMEOUT:
+            raise RuntimeError('Routers %s not served' % pending)
+        try:
+            if request(pending[0]) == 'router-%d' % pending[0]:
+                pending.pop(0)
+                continue
+        except (socket.error, httplib.HTTPException):
+            pass
+        time.sleep(0.01)
+    return time.time() - start
+
+
+def rss(pids):
+    """Returns the resident memory of the processes in MB."""
+    total = 0
+    for pid in pids:
+        with open('/proc/%d/status' % pid) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    total += int(line.split()[1])
+    return total / 1024.0
+
+
+class Proxies(object):
+    def __init__(self, mode, work_dir, agent_socket):
+        self.mode = mode
+        self.work_dir = work_dir
+        self.agent_socket = agent_socket
+        self.routers_dir = os.path.join(work_dir, 'routers')
+        self.processes = []
+        self.devnull = open(os.devnull, 'w')
+        os.makedirs(work_dir)
+
+    def _spawn(self, args, namespace=None):
+        cmd = [sys.executable, '-c', PROXY,
+               '--nodaemonize',
+               '--metadata_port=%d' % PORT,
+               '--metadata_proxy_socket=%s' % self.agent_socket,
+               '--pid_file=%s' % os.path.join(
+                   self.work_dir, 'pid-%d' % len(self.processes))] + args
+        if namespace:
+            cmd = ['ip', 'netns', 'exec', namespace] + cmd
+        self.processes.append(subprocess.Popen(
+            cmd, stdout=self.devnull, stderr=self.devnull))
+
+    def add(self, i):
+        if self.mode == 'per_router':
+            self._spawn(['--router_id=router-%d' % i], namespace_name(i))
+            return
+        if not os.path.isdir(self.routers_dir):
+            os.makedirs(self.routers_dir)
+        utils.replace_file(os.path.join(self.routers_dir, 'router-%d' % i),
+                           namespace_name(i))
+        if not self.processes:
+            self._spawn(['--routers_dir=%s' % self.routers_dir])
+
+    def stop(self):
+        for process in self.processes:
+            process.kill()
+            process.wait()
+        self.devnull.close()
+
+
+def run(count, mode, work_dir, agent_socket):
+    proxies = Proxies(mode, work_dir, agent_socket)
+    try:
+        start = time.time()
+        for i in range(count):
+            proxies.add(i)
+        wait_served(range(count))
+        started = time.time() - start
+        memory = rss(p.pid for p in proxies.processes)
+
+        start = time.time()
+        proxies.add(count)
+        wait_served([count])
+        added = time.time() - start
+
+        times = []
+        for n in range(REQUESTS):
+            start = time.time()
+            request(n % (count + 1))
+            times.append(time.time() - start)
+        times.sort()
+        print('  %-11s %8.1f MB %8.2f s %8.1f ms %8.2f ms' %
+              (mode, memory, started, added * 1000,
+               times[len(times) // 2] * 1000))
+    finally:
+        proxies.stop()
+
+
+def main(argv):
+    counts = [int(arg) for arg in argv[1:]] or COUNTS
+    work_dir = tempfile.mkdtemp()
+    agent_socket = os.path.join(work_dir, 'metadata_proxy')
+    agent = MetadataAgent(agent_socket, MetadataAgentHandler)
+    thread = threading.Thread(target=agent.serve_forever)
+    thread.daemon = True
+    thread.start()
+    created = 0
+    try:
+        for count in counts:
+            while created <= count:
+                create_namespace(created)
+                created += 1
+            print('%d routers' % count)
+            print('  %-11s %11s %10s %11s %11s' %
+                  ('mode', 'memory', 'start', 'add', 'request'))
+            for mode in MODES:
+                run(count, mode, os.path.join(work_dir, mode, str(count)),
+                    agent_socket)
+    finally:
+        agent.shutdown()
+        for i in range(created):
+            delete_namespace(i)
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
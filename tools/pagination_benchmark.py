@@ -0,0 +1,115 @@
+#    Copyright 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measures the time to read pages of ports after a marker.
+
+Usage: pagination_benchmark.py [count [connection]]
+
+count ports, 1000000 by default, spread over NETWORKS networks are inserted
+in the database at connection, a SQLite database in memory by default.
+Pages of PAGE_SIZE ports sorted by (network_id, id), as the ports of a
+network are listed, are then read after markers at several depths of the
+list, with the filter of paginate_query and with the plain disjunction it
+used before.
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+import uuid
+
+import sqlalchemy
+from sqlalchemy import orm
+
+from neutron.db import model_base
+from neutron.db import models_v2
+from neutron.db import sqlalchemyutils
+
+COUNT = 1000000
+NETWORKS = 100
+PAGE_SIZE = 100
+DEPTHS = (0.0, 0.25, 0.5, 0.75, 0.99)
+REPEAT = 3
+INSERT_CHUNK = 10000
+
+
+def make_ports(count):
+    network_ids = sorted(str(uuid.uuid4()) for i in range(NETWORKS))
+    for i in range(count):
+        yield {'id': str(uuid.uuid4()),
+               'tenant_id': 'a7d2d1ab5b6a4bbcbc4f4f3a47d3c6b1',
+               'name': 'port-%d' % i,
+               'network_id': network_ids[i % NETWORKS],
+               'mac_address': 'fa:16:3e:%02x:%02x:%02x' % (
+                   i >> 16 & 0xff, i >> 8 & 0xff, i & 0xff),
+               'admin_state_up': True,
+               'status': 'ACTIVE',
+               'device_id': str(uuid.uuid4()),
+               'device_owner': 'compute:nova'}
+
+
+def populate(engine, count):
+    model_base.BASEV2.metadata.create_all(engine)
+    table = models_v2.Port.__table__
+    rows = []
+    for row in make_ports(count):
+        rows.append(row)
+        if len(rows) == INSERT_CHUNK:
+            engine.execute(table.insert(), rows)
+            rows = []
+    if rows:
+        engine.execute(table.insert(), rows)
+
+
+def disjunction_query(query, marker):
+    # The filter of paginate_query without the bound on the first key
+    port = models_v2.Port
+    return query.order_by(port.network_id, port.id).filter(
+        sqlalchemy.sql.or_(
+            port.network_id > marker.network_id,
+            sqlalchemy.sql.and_(port.network_id == marker.network_id,
+                                port.id > marker.id))).limit(PAGE_SIZE)
+
+
+def bounded_query(query, marker):
+    return sqlalchemyutils.paginate_query(
+        query, models_v2.Port, PAGE_SIZE,
+        [('network_id', True), ('id', True)], marker_obj=marker)
+
+
+def run(name, func):
+    best = min(timeit.repeat(func, number=1, repeat=REPEAT))
+    print('  %-24s %8.2f ms' % (name, best * 1000))
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else COUNT
+    connection = argv[2] if len(argv) > 2 else 'sqlite://'
+    engine = sqlalchemy.create_engine(connection)
+    print('Inserting %d ports' % count)
+    populate(engine, count)
+    session = orm.sessionmaker(bind=engine)()
+    query = session.query(models_v2.Port.id)
+    ordered = session.query(models_v2.Port).order_by(
+        models_v2.Port.network_id, models_v2.Port.id)
+    for depth in DEPTHS:
+        marker = ordered.offset(int(count * depth)).first()
+        print('page after %d%% of the ports' % (depth * 100))
+        run('disjunction', lambda: disjunction_query(query, marker).all())
+        run('paginate_query', lambda: bounded_query(query, marker).all())
+
+
+if __name__ == '__main__':
+    main(sys.argv)